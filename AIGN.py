@@ -53,8 +53,14 @@ from core.aign_auto_generation import AutoGenerationMixin
 from core.aign_outline import OutlineMixin
 from core.aign_storyline import StorylineMixin
 from core.aign_writing import WritingMixin
+from core.aign_post_commit import PostCommitMixin
+from core.aign_pipeline import ChapterPipelineMixin
+from core.aign_chapter_digest import ChapterDigestMixin
+from core.aign_story_memory import StoryMemoryMixin
+from core.aign_story_recall import StoryRecallMixin
+from core.novel_content_store import AppendOnlyTextFile, CHAPTER_SEPARATOR
 
-class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, WritingMixin):
+class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, WritingMixin, PostCommitMixin, ChapterPipelineMixin, ChapterDigestMixin, StoryMemoryMixin, StoryRecallMixin):
     def __init__(self, chatLLM):
         self.chatLLM = chatLLM
 
@@ -150,6 +156,7 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
                 "润色要求": {"tokens": 0, "calls": 0},
                 "大纲生成": {"tokens": 0, "calls": 0},
                 "记忆生成": {"tokens": 0, "calls": 0},
+                "章节摘要": {"tokens": 0, "calls": 0},
                 "人物生成": {"tokens": 0, "calls": 0},
                 "故事线生成": {"tokens": 0, "calls": 0},
                 "正文生成": {"tokens": 0, "calls": 0},
@@ -161,11 +168,15 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
                 "润色要求": {"tokens": 0, "calls": 0},
                 "大纲生成": {"tokens": 0, "calls": 0},
                 "记忆生成": {"tokens": 0, "calls": 0},
+                "章节摘要": {"tokens": 0, "calls": 0},
                 "人物生成": {"tokens": 0, "calls": 0},
                 "故事线生成": {"tokens": 0, "calls": 0},
                 "正文生成": {"tokens": 0, "calls": 0},
                 "Humanizer": {"tokens": 0, "calls": 0},
                 "其他": {"tokens": 0, "calls": 0}
+            },
+            "saved": {  # 优化节省的发送Token统计（估算值）
+                "章节摘要合并": {"tokens": 0, "calls": 0}
             }
         }
         
@@ -179,6 +190,8 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             "NovelOutlineWriter": "大纲生成",
             "DetailedOutlineGenerator": "大纲生成",
             "MemoryMaker": "记忆生成",
+            "ChapterDigest": "章节摘要",
+            "StoryMemoryCompressor": "记忆生成",
             "CharacterGenerator": "人物生成",
             "StorylineGenerator": "故事线生成",
             "TitleGenerator": "其他",
@@ -223,11 +236,25 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             "api_calls_with_cache": 0,  # 有缓存信息的API调用次数
         }
         
+        # LLM响应缓存会话（llm_cache_mode=session 时只复用本会话的响应，随存档保存/恢复）
+        from core.agents.response_cache import new_session_id
+        self.llm_cache_session = new_session_id()
+        
+        # 调用追踪（智能体调用、RAG、后处理、存档的 span，用于耗时分析和剩余时间估算）
+        from core.tracing import Tracer
+        self.tracer = Tracer()
+        
+        # 提示词前缀缓存规划（冻结各智能体的静态前缀布局，统计提供商缓存命中率）
+        from core.agents.prefix_planner import PrefixCachePlanner
+        self.prefix_planner = PrefixCachePlanner()
+        
         # RAG风格学习相关状态（用于存储跨阶段的提炼内容）
         self.last_rag_key_elements = ""  # 上次正文生成后提炼的关键元素，供润色阶段使用
         self.rag_usage_stats = {
             "total_references": 0,
             "total_chars": 0, 
+            "cache_hits": 0,  # 检索缓存命中次数（含近似命中）
+            "cache_misses": 0,
             "usage_by_stage": {
                 "正文生成": {"refs": 0, "chars": 0},
                 "润色": {"refs": 0, "chars": 0}, 
@@ -266,6 +293,56 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
         # 生成控制标志
         self.stop_generation = False
         
+        # 章节提交后的记账任务（记忆、全局设定、章节总结）并发设置
+        self.post_commit_max_workers = 3  # 记账任务线程池大小
+        self.post_commit_join_mode = "immediate"  # immediate / next_chapter / prompt_fields
+        self.post_commit_prompt_fields = ("writing_memory", "storyline")  # prompt_fields 模式下下一章必须等待的字段
+        self._post_commit_pending = None
+        
+        # 章节摘要（可选）：一次请求同时生成前文记忆、全局设定和章节总结，解析失败的部分回退到单独的智能体
+        self.chapter_digest = False
+        self.chapter_digest_stats = {"chapters": 0, "fallbacks": 0, "saved_tokens": 0}
+        
+        # 分层记忆（可选）：章节总结 → 卷梗概（每 chapters_per_plot × memory_arc_plots 章一卷）→ 全书梗概，
+        # 写作器的回顾上下文大小与已写章节数无关
+        self.hierarchical_memory = False
+        self.memory_arc_plots = 5  # 每卷包含的剧情单元数
+        self.memory_recent_arcs = 2  # 以卷梗概形式保留的最近卷数，更早的并入全书梗概
+        self.memory_recent_chapters = 5  # 开启后"最近章节总结"保留的章数（另含本卷已写章节）
+        self.story_memory_data = {}  # 存档中的分层记忆数据，首次需要上下文时载入
+        self._story_memory = None
+        
+        # 前文检索（可选）：已写章节增量写入本地 BM25 索引，写每章前按本章故事线与主要人物取回相关片段，
+        # 非精简模式下代替整段发送的前三章正文
+        self.story_recall = False
+        self.story_recall_top_k = 4  # 每章注入的片段数
+        self.story_recall_max_chars = 2400  # 相关前文片段总长度上限
+        self.story_recall_skip_recent = 3  # 不检索最近几章（已在上一章原文/最近章节总结中）
+        self.story_recall_stats = {"updates": 0, "update_ms": 0.0, "max_update_ms": 0.0,
+                                   "searches": 0, "search_ms": 0.0, "passages": 0}
+        self._story_index = None
+        
+        # 章节流水线（可选）：精简模式下润色第N章时预先起草第N+1章
+        self.pipeline_chapters = False
+        self._speculative_draft = None
+        self.pipeline_stats = {"launched": 0, "used": 0, "discarded": 0, "overlap_seconds": 0.0}
+        
+        # 分段流水线（可选）：长章节模式下润色第k段的同时写第k+1段（润色按分段顺序串行，"上一段原文"不受影响；
+        # 提供商并发上限为1时回退为串行）
+        self.pipeline_segments = False
+        self.segment_pipeline_stats = {"chapters": 0, "segments": 0, "saved_seconds": 0.0}
+        
+        # 故事线批次并发（可选）：>1 时并发生成批次，实际并发度受当前提供商上限约束
+        self.storyline_concurrency = 1
+        # 按提供商覆盖默认并发上限，如 {"deepseek": 6}（故事线批次、分块润色、分段流水线、卡顿对冲共用）
+        self.provider_concurrency = {}
+
+        # 分块并行润色（可选）：>1 时把长章节在场景/段落边界切成若干块并发润色，并发度同样受提供商上限约束
+        self.embellish_chunks = 1
+        self.embellish_chunk_min_chars = 8000  # 正文达到此长度才分块
+        self.embellish_chunk_stats = {"chapters": 0, "chunks": 0, "fallbacks": 0, "seams": 0,
+                                      "wall_seconds": 0.0, "serial_seconds": 0.0}
+
         # API连续解析失败检测
         self.consecutive_parse_failures = 0  # 连续解析失败次数
         self.max_consecutive_failures = 3  # 最大允许连续失败次数
@@ -531,6 +608,24 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             name="GlobalContextUpdater",
             temperature=provider_temperature,
         )
+        
+        # 章节摘要生成器（chapter_digest 开启时替代上面三个记账智能体的单独请求）
+        from prompts.AIGN_Prompt_Enhanced import chapter_digest_prompt
+        self.chapter_digest_generator = MarkdownAgent(
+            chatLLM=self.chatLLM,
+            sys_prompt=chapter_digest_prompt,
+            name="ChapterDigest",
+            temperature=base_temperature,
+        )
+        
+        # 分层记忆压缩器（hierarchical_memory 开启时生成卷梗概与全书梗概）
+        from prompts.AIGN_Prompt_Enhanced import story_memory_compressor_prompt
+        self.story_memory_compressor = MarkdownAgent(
+            chatLLM=self.chatLLM,
+            sys_prompt=story_memory_compressor_prompt,
+            name="StoryMemoryCompressor",
+            temperature=base_temperature,
+        )
 
         # 为所有Agent设置parent_aign引用，用于流式输出跟踪
         agents = [
@@ -539,7 +634,7 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             self.memory_maker, self.title_generator, self.title_generator_json, self.ending_writer, 
             self.ending_embellisher, self.storyline_generator, self.character_generator, self.chapter_summary_generator, 
             self.detailed_outline_generator, self.foreshadowing_generator,
-            self.global_context_updater
+            self.global_context_updater, self.chapter_digest_generator, self.story_memory_compressor
         ]
         for agent in agents:
             agent.parent_aign = self
@@ -600,6 +695,8 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
                 (self.detailed_outline_generator, '详细大纲生成器'),
                 (self.foreshadowing_generator, '伏笔生成器'),
                 (self.global_context_updater, '全局设定追踪器'),
+                (self.chapter_digest_generator, '章节摘要生成器'),
+                (self.story_memory_compressor, '分层记忆压缩器'),
                 # 分段生成相关
                 (getattr(self, 'novel_writer_seg1', None), '分段Writer1'),
                 (getattr(self, 'novel_writer_seg2', None), '分段Writer2'),
@@ -1101,6 +1198,8 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
         self.detailed_outline_generator.chatLLM = new_chatllm
         self.foreshadowing_generator.chatLLM = new_chatllm
         self.global_context_updater.chatLLM = new_chatllm
+        self.chapter_digest_generator.chatLLM = new_chatllm
+        self.story_memory_compressor.chatLLM = new_chatllm
         # 分段Agents
         for seg_agent_name in [
             'novel_writer_seg1','novel_writer_seg2','novel_writer_seg3','novel_writer_seg4',
@@ -1162,6 +1261,17 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             print(f"⚠️ 获取模型信息失败: {e}")
             return "未知模型"
 
+    def get_provider_concurrency(self, requested: int) -> int:
+        """向当前提供商同时发出 requested 个请求时的实际并发度（受提供商上限与 provider_concurrency 约束）"""
+        from providers.concurrency import get_provider_concurrency_limit
+        provider = ""
+        try:
+            from config.dynamic_config_manager import get_config_manager
+            provider = get_config_manager().get_current_provider()
+        except Exception:
+            pass
+        return get_provider_concurrency_limit(provider, requested, getattr(self, 'provider_concurrency', None))
+
     # ⚠️ 以下是旧的 genStoryline 实现，已被 StorylineManager 替代
     # 保留注释以供参考
     # ⚠️ 已废弃：此方法已移至 aign_storyline_manager.py 中的 StorylineManager 类
@@ -1234,53 +1344,94 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
         
         return "\n".join(header_lines) + "\n" if header_lines else ""
     
+    def _get_output_file_writer(self, path, transform=None, transform_name=""):
+        """获取输出文件的追加写入器（按路径和变换缓存）"""
+        writers = self.__dict__.setdefault('_output_file_writers', {})
+        key = (path, transform_name)
+        writer = writers.get(key)
+        if writer is None:
+            writer = AppendOnlyTextFile(path, transform=transform)
+            writers[key] = writer
+        return writer
+    
+    def _write_novel_files(self):
+        """把正文写入输出文件：新章节追加写入，文件头变化、已有章节被修改或偏移校验失败时整本重写"""
+        header = self._get_file_header()
+        chunks = self._get_novel_store().snapshot()
+        mode_labels = {"append": "追加", "rewrite": "整本写入", "unchanged": "无新章节"}
+        
+        # 检查是否启用了Fish Audio S2语气标记模式
+        if not self.fishaudio_mode:
+            writer = self._get_output_file_writer(self.current_output_file)
+            mode = writer.write(header, chunks)
+            print(f"💾 已保存到文件（{mode_labels[mode]}）: {self.current_output_file}")
+            return
+        
+        # 保存包含Fish Audio标记的版本
+        fishaudio_file = self.current_output_file.replace('.txt', '_fishaudio.txt')
+        writer = self._get_output_file_writer(fishaudio_file)
+        written_before = writer.chapter_count
+        mode = writer.write(header, chunks)
+        print(f"🎙️ 已保存Fish Audio S2标记版本（{mode_labels[mode]}）: {fishaudio_file}")
+        new_chunks = chunks if mode == "rewrite" else chunks[written_before:]
+        
+        # 清理Fish Audio标记，生成纯净版本（逐章清理，只处理新写入的章节）
+        try:
+            from tts.fishaudio_cleaner import FishAudioTextCleaner
+            cleaner = FishAudioTextCleaner()
+        except ImportError:
+            print("⚠️ Fish Audio清理器不可用，保存原始版本")
+            writer = self._get_output_file_writer(self.current_output_file)
+            mode = writer.write(header, chunks)
+            print(f"💾 已保存到文件（{mode_labels[mode]}）: {self.current_output_file}")
+            return
+        
+        writer = self._get_output_file_writer(
+            self.current_output_file,
+            transform=lambda chunk: cleaner.clean_text(chunk) + CHAPTER_SEPARATOR,
+            transform_name="fishaudio_clean",
+        )
+        mode = writer.write(header, chunks)
+        print(f"📖 已保存纯净版本（{mode_labels[mode]}）: {self.current_output_file}")
+        
+        # 提取并显示本次写入章节的标记统计
+        if new_chunks:
+            markers = cleaner.extract_fishaudio_markers("".join(new_chunks))
+            if markers['total_count'] > 0:
+                print(f"📊 Fish Audio S2标记统计（本次写入{len(new_chunks)}章）:")
+                for category, count in markers['by_category'].items():
+                    if count > 0:
+                        print(f"   • {category}: {count}个")
+    
+    def verify_output_files(self, full=True) -> bool:
+        """按章节偏移校验已写出的输出文件，校验失败时整本重写
+
+        Returns:
+            bool: 所有文件是否都通过校验
+        """
+        writers = self.__dict__.get('_output_file_writers', {})
+        failed = []
+        for (path, _), writer in list(writers.items()):
+            if not writer.chapter_count:
+                continue
+            reason = writer.verify(full=full)
+            if reason:
+                print(f"⚠️ 输出文件校验失败（{reason}）: {path}")
+                writer.reset()
+                failed.append(path)
+        if failed and self.current_output_file:
+            self.saveNovelFileOnly()
+        elif writers:
+            print(f"✅ 输出文件已按章节偏移校验通过（{len(writers)}个文件）")
+        return not failed
+    
     def saveToFile(self, save_metadata=True):
         """保存小说内容到文件"""
         if not self.current_output_file:
             return
             
         try:
-            # 检查是否启用了Fish Audio S2语气标记模式
-            if self.fishaudio_mode:
-                # 保存包含Fish Audio标记的版本
-                fishaudio_file = self.current_output_file.replace('.txt', '_fishaudio.txt')
-                with open(fishaudio_file, "w", encoding="utf-8") as f:
-                    f.write(self._get_file_header())
-                    f.write(self.novel_content)
-                print(f"🎙️ 已保存Fish Audio S2标记版本: {fishaudio_file}")
-                
-                # 清理Fish Audio标记，生成纯净版本
-                try:
-                    from tts.fishaudio_cleaner import FishAudioTextCleaner
-                    cleaner = FishAudioTextCleaner()
-                    cleaned_content = cleaner.clean_text(self.novel_content)
-                    
-                    # 保存清理后的版本（常规文件）
-                    with open(self.current_output_file, "w", encoding="utf-8") as f:
-                        f.write(self._get_file_header())
-                        f.write(cleaned_content)
-                    print(f"📖 已保存纯净版本: {self.current_output_file}")
-                    
-                    # 提取并显示标记统计
-                    markers = cleaner.extract_fishaudio_markers(self.novel_content)
-                    if markers['total_count'] > 0:
-                        print(f"📊 Fish Audio S2标记统计:")
-                        for category, count in markers['by_category'].items():
-                            if count > 0:
-                                print(f"   • {category}: {count}个")
-                        
-                except ImportError:
-                    print("⚠️ Fish Audio清理器不可用，保存原始版本")
-                    with open(self.current_output_file, "w", encoding="utf-8") as f:
-                        f.write(self._get_file_header())
-                        f.write(self.novel_content)
-                    print(f"💾 已保存到文件: {self.current_output_file}")
-            else:
-                # 非Fish Audio模式，正常保存
-                with open(self.current_output_file, "w", encoding="utf-8") as f:
-                    f.write(self._get_file_header())
-                    f.write(self.novel_content)
-                print(f"💾 已保存到文件: {self.current_output_file}")
+            self._write_novel_files()
             
             # 只在指定时才保存元数据
             if save_metadata:
@@ -1298,39 +1449,7 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             return
             
         try:
-            # 检查是否启用了Fish Audio S2语气标记模式
-            if self.fishaudio_mode:
-                # 保存包含Fish Audio标记的版本
-                fishaudio_file = self.current_output_file.replace('.txt', '_fishaudio.txt')
-                with open(fishaudio_file, "w", encoding="utf-8") as f:
-                    f.write(self._get_file_header())
-                    f.write(self.novel_content)
-                print(f"🎙️ 已保存Fish Audio S2标记版本: {fishaudio_file}")
-                
-                # 清理并保存纯净版本
-                try:
-                    from tts.fishaudio_cleaner import FishAudioTextCleaner
-                    cleaner = FishAudioTextCleaner()
-                    cleaned_content = cleaner.clean_text(self.novel_content)
-                    
-                    with open(self.current_output_file, "w", encoding="utf-8") as f:
-                        f.write(self._get_file_header())
-                        f.write(cleaned_content)
-                    print(f"📖 已保存纯净版本: {self.current_output_file}")
-                    
-                except ImportError:
-                    # 如果清理器不可用，至少保存原始版本
-                    with open(self.current_output_file, "w", encoding="utf-8") as f:
-                        f.write(self._get_file_header())
-                        f.write(self.novel_content)
-                    print(f"📖 已保存小说文件: {self.current_output_file}")
-            else:
-                # 非Fish Audio模式，正常保存
-                with open(self.current_output_file, "w", encoding="utf-8") as f:
-                    f.write(self._get_file_header())
-                    f.write(self.novel_content)
-                print(f"📖 已保存小说文件: {self.current_output_file}")
-            
+            self._write_novel_files()
         except Exception as e:
             print(f"❌ 保存小说文件失败: {e}")
             
@@ -1577,7 +1696,7 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
                 },
                 "statistics": {
                     "total_paragraphs": len(self.paragraph_list),
-                    "content_length": len(self.novel_content),
+                    "content_length": self.get_novel_content_length(),
                     "original_outline_length": len(self.novel_outline),
                     "detailed_outline_length": len(self.detailed_outline),
                     "current_outline_length": len(self.getCurrentOutline()),
@@ -2279,19 +2398,59 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
         检查 RAG 风格学习是否启用
         
         Returns:
-            bool: RAG 是否启用且 API 地址已配置
+            bool: RAG 是否启用且 API 地址（本地后端为索引目录）已配置
         """
         try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            enabled = config_manager.get_rag_enabled()
-            api_url = config_manager.get_rag_api_url()
-            return enabled and bool(api_url)
+            from config.dynamic_config_manager import get_config_snapshot
+            config_snapshot = get_config_snapshot()
+            if config_snapshot.rag_backend == "local":
+                return config_snapshot.rag_enabled and bool(config_snapshot.rag_local_index_dir)
+            return config_snapshot.rag_enabled and bool(config_snapshot.rag_api_url)
         except Exception as e:
             print(f"⚠️ 检查RAG配置失败: {e}")
             return False
     
-    def _get_rag_references(self, query: str, top_k: int = 10, for_embellishment: bool = False) -> str:
+    def _get_rag_client(self):
+        """
+        获取共享的 RAG 客户端，服务未配置或不可用时返回 None
+        
+        rag_backend=local 时返回进程内的本地 BM25 索引（接口相同）；
+        HTTP 后端的健康检查结果在客户端内缓存，检索成功后的一段时间内不会再请求 /stats，
+        连续失败时熔断，冷却期内直接跳过。
+        """
+        from config.dynamic_config_manager import get_config_snapshot
+        
+        config_snapshot = get_config_snapshot()
+        if config_snapshot.rag_backend == "local":
+            from utils.local_rag_index import get_local_rag_index
+            index_dir = config_snapshot.rag_local_index_dir
+            if not index_dir:
+                return None
+            index = get_local_rag_index(index_dir)
+            if not index.is_available():
+                print(f"⚠️ 本地 RAG 索引为空 ({index_dir})，跳过风格参考")
+                return None
+            return index
+        
+        from utils.rag_client import get_rag_client
+        api_url = config_snapshot.rag_api_url
+        if not api_url:
+            return None
+        
+        client = get_rag_client(api_url, timeout=30)
+        if not client.is_available():
+            print(f"⚠️ RAG 服务不可用 ({api_url})，跳过风格参考")
+            return None
+        return client
+    
+    def _get_rag_cache(self):
+        """获取共享的 RAG 检索缓存（配置了 rag_cache_dir 时启用磁盘层）"""
+        from utils.rag_cache import get_rag_cache
+        from config.dynamic_config_manager import get_config_snapshot
+        
+        return get_rag_cache(get_config_snapshot().rag_cache_dir)
+    
+    def _get_rag_references(self, query: str, top_k: int = 10, for_embellishment: bool = False, stage: str = None) -> str:
         """
         从 RAG 获取风格参考，失败时返回空字符串（不影响生成流程）
         
@@ -2299,61 +2458,82 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             query: 检索查询文本
             top_k: 返回结果数量，默认10（精简模式下），非精简模式翻倍
             for_embellishment: 是否用于润色阶段
+            stage: 统计用的阶段标签（如"开头生成"），默认按 for_embellishment 取"润色"/"正文生成"
             
         Returns:
             str: 格式化的参考文本，失败返回空字符串
         """
-        try:
-            from utils.rag_client import RAGClient
-            from config.dynamic_config_manager import get_config_manager
-            
-            config_manager = get_config_manager()
-            api_url = config_manager.get_rag_api_url()
-            
-            if not api_url:
-                return ""
-            
-            client = RAGClient(api_url, timeout=30)
+        return self._get_rag_references_batch([query], top_k, for_embellishment, stage)[0]
+    
+    def _get_rag_references_batch(self, queries: list, top_k: int = 10, for_embellishment: bool = False, stage: str = None) -> list:
+        """
+        批量获取风格参考：多个查询并发检索，一次健康检查
+        
+        检索前先查缓存（精确匹配或高度重叠的查询），只有未命中的查询才请求后端。
+        
+        Args:
+            queries: 检索查询文本列表
+            top_k: 每个查询的返回数量，非精简模式翻倍
+            for_embellishment: 是否用于润色阶段
+            stage: 统计用的阶段标签
             
-            # 检查服务是否可用
-            if not client.is_available():
-                print(f"⚠️ RAG 服务不可用 ({api_url})，跳过风格参考")
-                return ""
+        Returns:
+            list: 与 queries 等长的格式化参考文本列表，失败的位置为空字符串
+        """
+        empty = ["" for _ in queries]
+        span = self.tracer.start_span("rag.lookup", stage="RAG检索", queries=len(queries))
+        try:
+            client = self._get_rag_client()
+            if client is None:
+                span.set(skipped=True)
+                return empty
             
             # 根据精简模式调整检索数量：非精简模式时检索数量翻倍
             compact_mode = getattr(self, 'compact_mode', False)
             actual_top_k = top_k if compact_mode else top_k * 2
-            
-            # 执行检索
-            results = client.search(query, top_k=actual_top_k, min_similarity=0.3)
-            
-            if not results:
+            stage = stage or ("润色" if for_embellishment else "正文生成")
+            
+            # 先查缓存，未命中的查询再检索
+            min_similarity = 0.3
+            cache = self._get_rag_cache()
+            namespace = client.cache_namespace
+            cached = [cache.get(namespace, q, actual_top_k, min_similarity) if q else None for q in queries]
+            missing = list(dict.fromkeys(q for q, c in zip(queries, cached) if q and c is None))
+            cache_hits = sum(1 for c in cached if c is not None)
+            self.record_rag_cache(cache_hits, len(missing))
+            span.set(rag_stage=stage, cache_hits=cache_hits, fetched=len(missing))
+            
+            fetched = {}
+            if missing:
+                for q, results in zip(missing, client.search_many(missing, top_k=actual_top_k, min_similarity=min_similarity)):
+                    cache.put(namespace, q, actual_top_k, min_similarity, results)
+                    fetched[q] = results
+            if cache_hits:
+                print(f"📚 RAG ({stage}): 缓存命中 {cache_hits}/{len(queries)} 个查询")
+            all_results = [c if c is not None else fetched.get(q, []) for q, c in zip(queries, cached)]
+            
+            formatted_list = []
+            for results in all_results:
+                if not results:
+                    formatted_list.append("")
+                    continue
+                # 格式化结果
+                formatted = client.format_references(results, max_length=3000)
+                print(f"📚 RAG ({stage}): 检索到 {len(results)} 条参考，共 {len(formatted)} 字符")
+                # 记录RAG使用统计
+                self.record_rag_usage(stage, len(results), len(formatted))
+                formatted_list.append(formatted)
+            
+            if not any(formatted_list):
                 print(f"📚 RAG 检索未找到匹配结果")
-                return ""
-            
-            # 格式化结果
-            formatted = client.format_references(results, max_length=3000)
-            
-            stage = "润色" if for_embellishment else "正文生成"
-            # 特殊判断开头生成
-            import inspect
-            curframe = inspect.currentframe()
-            calframe = inspect.getouterframes(curframe, 2)
-            for f in calframe:
-                if f.function == "genBeginning":
-                    stage = "开头生成"
-                    break
-            
-            print(f"📚 RAG ({stage}): 检索到 {len(results)} 条参考，共 {len(formatted)} 字符")
-            
-            # 记录RAG使用统计
-            self.record_rag_usage(stage, len(results), len(formatted))
-            
-            return formatted
+            return formatted_list
             
         except Exception as e:
             print(f"⚠️ RAG 检索失败: {e}，跳过风格参考")
-            return ""
+            span.set(error=str(e)[:200])
+            return empty
+        finally:
+            self.tracer.end_span(span)
     
     def _extract_key_elements_from_content(self, content: str) -> str:
         """
@@ -2390,6 +2570,11 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
         self.rag_usage_stats["usage_by_stage"][stage]["refs"] += ref_count
         self.rag_usage_stats["usage_by_stage"][stage]["chars"] += char_count
 
+    def record_rag_cache(self, hits: int, misses: int):
+        """记录RAG检索缓存命中统计"""
+        self.rag_usage_stats["cache_hits"] += hits
+        self.rag_usage_stats["cache_misses"] += misses
+
     def get_rag_usage_display(self) -> str:
         """获取RAG使用统计显示文本"""
         if self.rag_usage_stats["total_references"] == 0:
@@ -2404,6 +2589,11 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
             if stats["refs"] > 0:
                 lines.append(f"  • {stage}: {stats['refs']}引用 / {stats['chars']}字符")
         
+        cache_hits = self.rag_usage_stats["cache_hits"]
+        cache_total = cache_hits + self.rag_usage_stats["cache_misses"]
+        if cache_total:
+            lines.append(f"  • 检索缓存: 命中 {cache_hits}/{cache_total} ({cache_hits / cache_total:.0%})")
+        
         return "\n".join(lines)
 
 
@@ -2411,7 +2601,8 @@ class AIGN(StatisticsMixin, AutoGenerationMixin, OutlineMixin, StorylineMixin, W
     
     def save_novel_progress(self, save_path: str = None):
         """保存当前小说生成进度到存档文件"""
-        return self.novel_save_manager.save_to_file(self, save_path)
+        with self.tracer.span("save.progress", stage="存档"):
+            return self.novel_save_manager.save_to_file(self, save_path)
     
     def load_novel_progress(self, save_path: str) -> bool:
         """从存档文件恢复小说生成进度"""
@@ -402,12 +402,14 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                     yield {"content": "请先在配置界面设置API密钥", "total_tokens": 0}
                 return dummy_chatllm
     
-    try:
+    def _build_chatllm(http_client=None):
+        """构建ChatLLM闭包（http_client 为客户端注册表提供的共享连接池）"""
         if provider == "deepseek":
             return deepseekChatLLM(
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "ali":
             return aliChatLLM(
@@ -426,7 +428,8 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
                 base_url=provider_config['base_url'],
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "gemini":
             return geminiChatLLM(
@@ -440,13 +443,15 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
                 system_prompt=provider_config.get('system_prompt', ''),
-                provider_routing=provider_config.get('provider_routing')
+                provider_routing=provider_config.get('provider_routing'),
+                http_client=http_client
             )
         elif provider == "claude":
             return claudeChatLLM(
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "grok":
             from providers.uniai.grokAI import grokChatLLM
@@ -454,14 +459,16 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "fireworks":
             from providers.uniai.fireworksAI import fireworksChatLLM
             return fireworksChatLLM(
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "lambda":
             from providers.uniai.lambdaAI import lambdaChatLLM
@@ -469,7 +476,8 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "lambda2":
             from providers.uniai.lambdaAI import lambdaChatLLM
@@ -477,7 +485,8 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "lambda3":
             from providers.uniai.lambdaAI import lambdaChatLLM
@@ -485,7 +494,8 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "siliconflow":
             from providers.uniai.siliconflowAI import siliconflowChatLLM
@@ -493,7 +503,8 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "nvidia":
             from providers.uniai.nvidiaAI import nvidiaChatLLM
@@ -502,7 +513,8 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
                 system_prompt=provider_config.get('system_prompt', ''),
-                thinking_enabled=provider_config.get('thinking_enabled', True)
+                thinking_enabled=provider_config.get('thinking_enabled', True),
+                http_client=http_client
             )
         elif provider == "omlx":
             from providers.uniai.omlxAI import omlxChatLLM
@@ -510,7 +522,8 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 model_name=provider_config['model_name'],
                 api_key=provider_config['api_key'],
                 base_url=provider_config.get('base_url'),
-                system_prompt=provider_config.get('system_prompt', '')
+                system_prompt=provider_config.get('system_prompt', ''),
+                http_client=http_client
             )
         elif provider == "zenmux":
             from providers.uniai.zenmuxAI import zenmuxChatLLM
@@ -520,10 +533,29 @@ def get_chatllm(allow_incomplete: bool = True, include_system_prompt: bool = Tru
                 base_url=provider_config.get('base_url'),
                 system_prompt=provider_config.get('system_prompt', ''),
                 reasoning_effort=provider_config.get('reasoning_effort', 'high'),
-                zenmux_provider=provider_config.get('zenmux_provider', '')
+                zenmux_provider=provider_config.get('zenmux_provider', ''),
+                http_client=http_client
+            )
+        elif provider == "fake":
+            from providers.uniai.fakeAI import fakeChatLLM
+            return fakeChatLLM(
+                model_name=provider_config['model_name'],
+                api_key=provider_config['api_key'],
+                system_prompt=provider_config.get('system_prompt', ''),
+                base_url=provider_config.get('base_url')
             )
         else:
             raise ValueError(f"不支持的AI提供商: {provider}")
+
+    try:
+        from providers.client_registry import get_client_registry, make_client_key_from_config, make_closure_signature
+        # 同一配置下复用连接池和已构建的闭包，避免每次刷新都新建客户端
+        client_key = make_client_key_from_config(provider, provider_config)
+        signature = make_closure_signature(
+            system_prompt=provider_config.get('system_prompt', ''),
+            provider_routing=provider_config.get('provider_routing'),
+        )
+        return get_client_registry().get_chatllm(provider, client_key, signature, _build_chatllm)
             
     except Exception as e:
         if allow_incomplete:
@@ -9,7 +9,7 @@
 import json
 import os
 from typing import Dict, Any, List, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 import threading
 import time
 try:
@@ -38,6 +38,37 @@ class ProviderConfig:
         if self.provider_routing is None:
             self.provider_routing = {}
 
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """配置快照（不可变）
+
+    每次请求只读取一次，热路径上无需加锁；配置变更时由 DynamicConfigManager 重新发布，
+    version 单调递增，可用于判断配置是否变化。
+    """
+    version: int
+    current_provider: str
+    provider_config: Optional[ProviderConfig]  # 当前提供商配置的副本
+    debug_level: str
+    json_auto_repair: bool
+    fishaudio_mode: bool
+    rag_enabled: bool
+    rag_api_url: str
+    rag_top_k: int
+    rag_backend: str
+    rag_local_index_dir: str
+    rag_cache_dir: str
+    lmstudio_reload_interval: int
+    llm_cache_mode: str
+    llm_cache_max_mb: int
+    trace_export: bool
+    prefix_cache_mode: str
+    context_token_budget: int
+    stall_timeout: int
+    stall_ttft_timeout: int
+    stall_min_tps: float
+    hedge_provider: str
+    resume_partial: bool
+
 # 提供商显示名称映射（用于界面显示）
 PROVIDER_DISPLAY_NAMES = {
     "deepseek": "DeepSeek",
@@ -54,7 +85,8 @@ PROVIDER_DISPLAY_NAMES = {
     "lambda3": "OpenAI兼容模式3",  # Lambda3 显示为 OpenAI兼容模式3
     "siliconflow": "SiliconFlow",
     "nvidia": "NVIDIA",
-    "zenmux": "ZenMux"
+    "zenmux": "ZenMux",
+    "fake": "Fake (离线测试)"
 }
 
 class DynamicConfigManager:
@@ -74,7 +106,22 @@ class DynamicConfigManager:
         self._rag_enabled = False  # RAG风格学习开关
         self._rag_api_url = ""  # RAG API服务地址
         self._rag_top_k = 10  # RAG检索返回数量，默认10，范围5-30
+        self._rag_backend = "http"  # RAG后端：http=外部Style-RAG服务，local=本地BM25索引
+        self._rag_local_index_dir = ""  # 本地RAG索引目录（rag_backend=local时使用）
+        self._rag_cache_dir = ""  # RAG检索结果磁盘缓存目录（为空时只用内存缓存）
         self._lmstudio_reload_interval = 5  # LM Studio模型重载间隔，每N章重载一次，0=不自动重载
+        self._llm_cache_mode = "off"  # LLM响应缓存：off=关闭，session=仅同一生成会话，persistent=跨会话
+        self._llm_cache_max_mb = 512  # LLM响应缓存大小上限（MB，压缩后）
+        self._trace_export = False  # 是否把调用追踪 span 导出到 output/traces/spans.jsonl
+        self._prefix_cache_mode = "fix"  # 提示词前缀缓存规划：off=关闭，warn=仅提示失效，fix=冻结静态字段布局
+        self._context_token_budget = 60000  # 正文/润色请求的输入 token 预算（含系统提示词），0=不限制
+        self._stall_timeout = 120  # 首个数据块之后多少秒没有新数据视为卡顿，0=不检测
+        self._stall_ttft_timeout = 600  # 发出请求后多少秒没有首个数据块视为卡顿（含长提示词预填充），0=不检测
+        self._stall_min_tps = 0.0  # 流式输出速度下限（tokens/s），0=不检测
+        self._hedge_provider = "off"  # 卡顿时的对冲请求：off=不对冲（直接重试），same=同一提供商（本地提供商不对冲），或备用提供商名称
+        self._resume_partial = True  # 流式中断/输出截断时保留已生成的前缀，只续写缺失的部分
+        self._snapshot = None  # 当前发布的 ConfigSnapshot
+        self._snapshot_version = 0
         self._load_default_configs()
         # 尝试从文件加载配置
         self.load_config_from_file()
@@ -287,11 +334,60 @@ class DynamicConfigManager:
                     "qwen/qwen3-14b"
                 ],
                 reasoning_effort="high"  # ZenMux默认思考强度为high
+            ),
+            # 离线假提供商：不访问网络，用于基准测试与离线调试，参数通过 base_url 查询串配置
+            "fake": ProviderConfig(
+                name="fake",
+                api_key="fake",
+                model_name="fake-novelist",
+                base_url="fake://local?ttft_ms=0&tokens_per_second=0&failure_rate=0&truncation_rate=0&seed=0",
+                models=["fake-novelist"]
             )
         }
         
         with self._config_lock:
             self._providers = default_configs
+            self._publish_snapshot()
+    
+    def _publish_snapshot(self):
+        """重新发布配置快照（调用方需持有 _config_lock）"""
+        current_config = self._providers.get(self._current_provider)
+        self._snapshot_version += 1
+        self._snapshot = ConfigSnapshot(
+            version=self._snapshot_version,
+            current_provider=self._current_provider,
+            provider_config=replace(current_config) if current_config else None,
+            debug_level=self._debug_level,
+            json_auto_repair=self._json_auto_repair,
+            fishaudio_mode=self._fishaudio_mode,
+            rag_enabled=self._rag_enabled,
+            rag_api_url=self._rag_api_url,
+            rag_top_k=self._rag_top_k,
+            rag_backend=self._rag_backend,
+            rag_local_index_dir=self._rag_local_index_dir,
+            rag_cache_dir=self._rag_cache_dir,
+            lmstudio_reload_interval=self._lmstudio_reload_interval,
+            llm_cache_mode=self._llm_cache_mode,
+            llm_cache_max_mb=self._llm_cache_max_mb,
+            trace_export=self._trace_export,
+            prefix_cache_mode=self._prefix_cache_mode,
+            context_token_budget=self._context_token_budget,
+            stall_timeout=self._stall_timeout,
+            stall_ttft_timeout=self._stall_ttft_timeout,
+            stall_min_tps=self._stall_min_tps,
+            hedge_provider=self._hedge_provider,
+            resume_partial=self._resume_partial,
+        )
+    
+    def get_snapshot(self) -> ConfigSnapshot:
+        """获取当前配置快照（无锁读取，快照本身不可变）"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._config_lock:
+                if self._snapshot is None:
+                    self._publish_snapshot()
+                snapshot = self._snapshot
+        return snapshot
     
     def get_provider_list(self) -> List[str]:
         """获取所有支持的提供商列表（内部标识符）"""
@@ -410,6 +506,7 @@ class DynamicConfigManager:
                 return False
             
             config = self._providers[provider_name]
+            old_client_key = self._client_key(provider_name, config)
             config.api_key = api_key
             config.model_name = model_name
             config.system_prompt = system_prompt
@@ -417,6 +514,8 @@ class DynamicConfigManager:
                 config.base_url = base_url
             if temperature is not None:
                 config.temperature = temperature
+            self._invalidate_client_if_changed(provider_name, old_client_key)
+            self._publish_snapshot()
             # 更新思考模式 (如果提供了thinking_enabled参数)
             # 注意：web_config_interface可能通过kwargs传递或者我们需要修改此方法签名
             return True
@@ -428,6 +527,7 @@ class DynamicConfigManager:
                 return False
             
             config = self._providers[provider_name]
+            old_client_key = self._client_key(provider_name, config)
             config.api_key = api_key
             config.model_name = model_name
             config.system_prompt = system_prompt
@@ -441,14 +541,39 @@ class DynamicConfigManager:
                 config.reasoning_effort = reasoning_effort
             if zenmux_provider is not None:
                 config.zenmux_provider = zenmux_provider
+            self._invalidate_client_if_changed(provider_name, old_client_key)
+            self._publish_snapshot()
             return True
     
+    def _client_key(self, provider_name: str, config: ProviderConfig) -> tuple:
+        """计算提供商客户端注册表的配置键"""
+        from providers.client_registry import make_client_key_from_config
+        return make_client_key_from_config(provider_name, config)
+    
+    def _invalidate_client_if_changed(self, provider_name: str, old_client_key: tuple):
+        """配置键确实发生变化时，使旧的共享客户端失效（仅修改温度/系统提示词不会丢弃连接池）"""
+        new_client_key = self._client_key(provider_name, self._providers[provider_name])
+        if new_client_key == old_client_key:
+            return
+        from providers.client_registry import get_client_registry
+        if get_client_registry().invalidate(old_client_key):
+            print(f"🔌 {provider_name} 连接配置已变更，已释放旧的共享客户端")
+    
+    def _retain_live_clients(self):
+        """重新加载配置后，释放不再对应任何提供商配置的共享客户端"""
+        from providers.client_registry import get_client_registry
+        live_keys = [self._client_key(name, config) for name, config in self._providers.items()]
+        evicted = get_client_registry().retain(live_keys)
+        if evicted:
+            print(f"🔌 配置已重新加载，已释放{evicted}个过期的共享客户端")
+    
     def set_current_provider(self, provider_name: str) -> bool:
         """设置当前使用的提供商"""
         with self._config_lock:
             if provider_name not in self._providers:
                 return False
             self._current_provider = provider_name
+            self._publish_snapshot()
             return True
     
     def save_config_to_file(self, config_path: str = "runtime_config.json"):
@@ -457,6 +582,8 @@ class DynamicConfigManager:
             config_data = {}
             
             with self._config_lock:
+                # 所有 set_* 方法修改设置后都会经过这里保存，借此重新发布快照
+                self._publish_snapshot()
                 config_data["current_provider"] = self._current_provider
                 config_data["debug_level"] = self._debug_level
                 config_data["json_auto_repair"] = self._json_auto_repair
@@ -468,7 +595,20 @@ class DynamicConfigManager:
                 config_data["rag_enabled"] = self._rag_enabled
                 config_data["rag_api_url"] = self._rag_api_url
                 config_data["rag_top_k"] = self._rag_top_k
+                config_data["rag_backend"] = self._rag_backend
+                config_data["rag_local_index_dir"] = self._rag_local_index_dir
+                config_data["rag_cache_dir"] = self._rag_cache_dir
                 config_data["lmstudio_reload_interval"] = self._lmstudio_reload_interval
+                config_data["llm_cache_mode"] = self._llm_cache_mode
+                config_data["llm_cache_max_mb"] = self._llm_cache_max_mb
+                config_data["trace_export"] = self._trace_export
+                config_data["prefix_cache_mode"] = self._prefix_cache_mode
+                config_data["context_token_budget"] = self._context_token_budget
+                config_data["stall_timeout"] = self._stall_timeout
+                config_data["stall_ttft_timeout"] = self._stall_ttft_timeout
+                config_data["stall_min_tps"] = self._stall_min_tps
+                config_data["hedge_provider"] = self._hedge_provider
+                config_data["resume_partial"] = self._resume_partial
                 config_data["providers"] = {}
                 
                 for name, provider_config in self._providers.items():
@@ -506,7 +646,20 @@ class DynamicConfigManager:
                 self._rag_enabled = config_data.get("rag_enabled", False)
                 self._rag_api_url = config_data.get("rag_api_url", "")
                 self._rag_top_k = config_data.get("rag_top_k", 10)
+                self._rag_backend = config_data.get("rag_backend", "http")
+                self._rag_local_index_dir = config_data.get("rag_local_index_dir", "")
+                self._rag_cache_dir = config_data.get("rag_cache_dir", "")
                 self._lmstudio_reload_interval = config_data.get("lmstudio_reload_interval", 5)
+                self._llm_cache_mode = config_data.get("llm_cache_mode", "off")
+                self._llm_cache_max_mb = config_data.get("llm_cache_max_mb", 512)
+                self._trace_export = config_data.get("trace_export", False)
+                self._prefix_cache_mode = config_data.get("prefix_cache_mode", "fix")
+                self._context_token_budget = config_data.get("context_token_budget", 60000)
+                self._stall_timeout = config_data.get("stall_timeout", 120)
+                self._stall_ttft_timeout = config_data.get("stall_ttft_timeout", 600)
+                self._stall_min_tps = config_data.get("stall_min_tps", 0.0)
+                self._hedge_provider = config_data.get("hedge_provider", "off")
+                self._resume_partial = config_data.get("resume_partial", True)
                 
                 # 不再设置环境变量，统一从配置文件读取
                 
@@ -561,6 +714,9 @@ class DynamicConfigManager:
                             config.zenmux_provider = provider_data["zenmux_provider"]
                             if config.zenmux_provider:
                                 print(f"🔀 {name} zenmux_provider 已加载: {config.zenmux_provider}")
+                
+                self._publish_snapshot()
+                self._retain_live_clients()
             
             print(f"配置已从 {config_path} 加载")
             return True
@@ -577,30 +733,46 @@ class DynamicConfigManager:
             config = self._providers[provider_name]
             
             # 对于非本地提供商，检查API密钥
-            if provider_name not in ("lmstudio", "omlx"):
+            if provider_name not in ("lmstudio", "omlx", "fake"):
                 if not config.api_key or "your-" in config.api_key.lower():
                     return False
             
             return True
     
     def get_chatllm_instance(self):
-        """获取当前配置的ChatLLM实例"""
-        current_config = self.get_current_config()
+        """获取当前配置的ChatLLM实例（同一配置下复用连接池和已构建的闭包）"""
+        return self.get_provider_chatllm(self._current_provider)
+    
+    def get_provider_chatllm(self, provider_name: str):
+        """获取指定提供商的ChatLLM实例（如卡顿时的备用提供商）"""
+        current_config = self.get_provider_config(provider_name)
         if not current_config:
-            raise ValueError("No current provider configured")
+            raise ValueError(f"No configuration for provider {provider_name}")
         
-        if not self.validate_config(self._current_provider):
-            raise ValueError(f"Invalid configuration for {self._current_provider}")
+        if not self.validate_config(provider_name):
+            raise ValueError(f"Invalid configuration for {provider_name}")
         
+        from providers.client_registry import get_client_registry, make_client_key_from_config, make_closure_signature
+        key = make_client_key_from_config(provider_name, current_config)
+        signature = make_closure_signature(
+            system_prompt=current_config.system_prompt,
+            provider_routing=current_config.provider_routing,
+        )
+        return get_client_registry().get_chatllm(
+            provider_name, key, signature,
+            lambda http_client: self._build_chatllm(provider_name, current_config, http_client)
+        )
+    
+    def _build_chatllm(self, provider_name: str, current_config: ProviderConfig, http_client=None):
+        """构建指定提供商的ChatLLM闭包（http_client 为注册表提供的共享连接池）"""
         # 动态导入对应的ChatLLM函数
-        provider_name = self._current_provider
-        
         if provider_name == "deepseek":
             from providers.uniai.deepseekAI import deepseekChatLLM
             return deepseekChatLLM(
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "ali":
             from providers.uniai.aliAI import aliChatLLM
@@ -625,7 +797,8 @@ class DynamicConfigManager:
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "gemini":
             from providers.uniai.geminiAI import geminiChatLLM
@@ -641,14 +814,16 @@ class DynamicConfigManager:
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
                 system_prompt=current_config.system_prompt,
-                provider_routing=current_config.provider_routing
+                provider_routing=current_config.provider_routing,
+                http_client=http_client
             )
         elif provider_name == "claude":
             from providers.uniai.claudeAI import claudeChatLLM
             return claudeChatLLM(
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "grok":
             from providers.uniai.grokAI import grokChatLLM
@@ -656,14 +831,16 @@ class DynamicConfigManager:
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "fireworks":
             from providers.uniai.fireworksAI import fireworksChatLLM
             return fireworksChatLLM(
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "lambda":
             from providers.uniai.lambdaAI import lambdaChatLLM
@@ -671,7 +848,8 @@ class DynamicConfigManager:
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "lambda2":
             from providers.uniai.lambdaAI import lambdaChatLLM
@@ -679,7 +857,8 @@ class DynamicConfigManager:
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "lambda3":
             from providers.uniai.lambdaAI import lambdaChatLLM
@@ -687,7 +866,8 @@ class DynamicConfigManager:
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "siliconflow":
             from providers.uniai.siliconflowAI import siliconflowChatLLM
@@ -696,7 +876,8 @@ class DynamicConfigManager:
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
                 system_prompt=current_config.system_prompt,
-                thinking_enabled=current_config.thinking_enabled
+                thinking_enabled=current_config.thinking_enabled,
+                http_client=http_client
             )
         elif provider_name == "nvidia":
             from providers.uniai.nvidiaAI import nvidiaChatLLM
@@ -705,7 +886,8 @@ class DynamicConfigManager:
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
                 system_prompt=current_config.system_prompt,
-                thinking_enabled=current_config.thinking_enabled
+                thinking_enabled=current_config.thinking_enabled,
+                http_client=http_client
             )
         elif provider_name == "omlx":
             from providers.uniai.omlxAI import omlxChatLLM
@@ -716,7 +898,8 @@ class DynamicConfigManager:
                 model_name=current_config.model_name,
                 api_key=current_config.api_key,
                 base_url=current_config.base_url,
-                system_prompt=current_config.system_prompt
+                system_prompt=current_config.system_prompt,
+                http_client=http_client
             )
         elif provider_name == "zenmux":
             from providers.uniai.zenmuxAI import zenmuxChatLLM
@@ -727,7 +910,16 @@ class DynamicConfigManager:
                 base_url=current_config.base_url,
                 system_prompt=current_config.system_prompt,
                 reasoning_effort=current_config.reasoning_effort,
-                zenmux_provider=current_config.zenmux_provider
+                zenmux_provider=current_config.zenmux_provider,
+                http_client=http_client
+            )
+        elif provider_name == "fake":
+            from providers.uniai.fakeAI import fakeChatLLM
+            return fakeChatLLM(
+                model_name=current_config.model_name,
+                api_key=current_config.api_key,
+                system_prompt=current_config.system_prompt,
+                base_url=current_config.base_url
             )
         else:
             raise ValueError(f"Unsupported provider: {provider_name}")
@@ -970,6 +1162,213 @@ class DynamicConfigManager:
             print(f"设置RAG检索数量失败: {e}")
             return False
 
+    def get_rag_backend(self) -> str:
+        """获取RAG后端类型（http / local）"""
+        with self._config_lock:
+            return self._rag_backend
+    
+    def get_rag_local_index_dir(self) -> str:
+        """获取本地RAG索引目录"""
+        with self._config_lock:
+            return self._rag_local_index_dir
+    
+    def set_rag_backend(self, backend: str, local_index_dir: str = None) -> bool:
+        """设置RAG后端（http=外部服务，local=本地索引）并保存到配置文件"""
+        try:
+            if backend not in ("http", "local"):
+                print(f"⚠️ 无效的RAG后端: {backend}，将使用 http")
+                backend = "http"
+            
+            with self._config_lock:
+                self._rag_backend = backend
+                if local_index_dir is not None:
+                    self._rag_local_index_dir = local_index_dir.strip()
+                
+                index_info = f"，索引目录: {self._rag_local_index_dir or '未设置'}" if backend == "local" else ""
+                print(f"RAG后端已设置为 {backend}{index_info}")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置RAG后端失败: {e}")
+            return False
+
+    def get_rag_cache_dir(self) -> str:
+        """获取RAG检索结果磁盘缓存目录"""
+        with self._config_lock:
+            return self._rag_cache_dir
+    
+    def set_rag_cache_dir(self, cache_dir: str) -> bool:
+        """设置RAG检索结果磁盘缓存目录（为空则只用内存缓存）并保存到配置文件"""
+        try:
+            with self._config_lock:
+                self._rag_cache_dir = (cache_dir or "").strip()
+                print(f"RAG检索缓存目录已设置为: {self._rag_cache_dir or '未设置（仅内存缓存）'}")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置RAG缓存目录失败: {e}")
+            return False
+
+    def get_llm_cache_mode(self) -> str:
+        """获取LLM响应缓存模式（off / session / persistent）"""
+        with self._config_lock:
+            return self._llm_cache_mode
+    
+    def set_llm_cache_mode(self, mode: str, max_mb: int = None) -> bool:
+        """设置LLM响应缓存模式（可同时设置大小上限）并保存到配置文件"""
+        try:
+            if mode not in ("off", "session", "persistent"):
+                print(f"⚠️ 无效的LLM响应缓存模式: {mode}，将使用 off")
+                mode = "off"
+            if max_mb is not None and max_mb <= 0:
+                print(f"⚠️ LLM响应缓存上限必须为正数，当前值: {max_mb}，将使用默认值512")
+                max_mb = 512
+            
+            with self._config_lock:
+                self._llm_cache_mode = mode
+                if max_mb is not None:
+                    self._llm_cache_max_mb = max_mb
+                print(f"LLM响应缓存已设置为 {mode}（上限 {self._llm_cache_max_mb} MB）")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置LLM响应缓存失败: {e}")
+            return False
+
+    def get_trace_export(self) -> bool:
+        """获取是否导出调用追踪 JSONL"""
+        with self._config_lock:
+            return self._trace_export
+    
+    def set_trace_export(self, enabled: bool) -> bool:
+        """设置是否导出调用追踪 JSONL（下次自动生成开始时生效）并保存到配置文件"""
+        try:
+            with self._config_lock:
+                self._trace_export = bool(enabled)
+                print(f"调用追踪导出已{'启用' if self._trace_export else '关闭'}")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置调用追踪导出失败: {e}")
+            return False
+
+    def get_prefix_cache_mode(self) -> str:
+        """获取提示词前缀缓存规划模式（off / warn / fix）"""
+        with self._config_lock:
+            return self._prefix_cache_mode
+    
+    def set_prefix_cache_mode(self, mode: str) -> bool:
+        """设置提示词前缀缓存规划模式并保存到配置文件"""
+        try:
+            if mode not in ("off", "warn", "fix"):
+                print(f"⚠️ 无效的前缀缓存规划模式: {mode}，将使用 fix")
+                mode = "fix"
+            
+            with self._config_lock:
+                self._prefix_cache_mode = mode
+                print(f"提示词前缀缓存规划已设置为 {mode}")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置前缀缓存规划模式失败: {e}")
+            return False
+
+    def get_context_token_budget(self) -> int:
+        """获取正文/润色请求的输入 token 预算（0 表示不限制）"""
+        with self._config_lock:
+            return self._context_token_budget
+    
+    def set_context_token_budget(self, budget: int) -> bool:
+        """设置正文/润色请求的输入 token 预算并保存到配置文件"""
+        try:
+            budget = int(budget)
+            if budget < 0:
+                print(f"⚠️ 上下文预算不能为负数，当前值: {budget}，将使用 0（不限制）")
+                budget = 0
+            
+            with self._config_lock:
+                self._context_token_budget = budget
+                print(f"上下文 token 预算已设置为 {budget if budget else '不限制'}")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置上下文预算失败: {e}")
+            return False
+
+    def get_stall_timeout(self) -> int:
+        """获取流式卡顿判定时间（秒，0 表示不检测）"""
+        with self._config_lock:
+            return self._stall_timeout
+    
+    def get_stall_ttft_timeout(self) -> int:
+        """获取首个数据块的等待上限（秒，0 表示不检测）"""
+        with self._config_lock:
+            return self._stall_ttft_timeout
+    
+    def get_stall_min_tps(self) -> float:
+        """获取流式输出速度下限（tokens/s，0 表示不检测）"""
+        with self._config_lock:
+            return self._stall_min_tps
+    
+    def get_hedge_provider(self) -> str:
+        """获取卡顿时对冲请求使用的提供商（off / same / 提供商名称）"""
+        with self._config_lock:
+            return self._hedge_provider
+    
+    def set_stall_config(self, timeout: int = None, min_tps: float = None, hedge_provider: str = None,
+                         ttft_timeout: int = None) -> bool:
+        """设置流式卡顿检测与对冲请求并保存到配置文件（未给出的项保持不变）"""
+        try:
+            with self._config_lock:
+                if timeout is not None:
+                    timeout = int(timeout)
+                    if timeout < 0:
+                        print(f"⚠️ 卡顿判定时间不能为负数，当前值: {timeout}，将使用 0（不检测）")
+                        timeout = 0
+                    self._stall_timeout = timeout
+                if ttft_timeout is not None:
+                    self._stall_ttft_timeout = max(0, int(ttft_timeout))
+                if min_tps is not None:
+                    self._stall_min_tps = max(0.0, float(min_tps))
+                if hedge_provider is not None:
+                    if hedge_provider not in ("off", "same") and hedge_provider not in self._providers:
+                        print(f"⚠️ 无效的对冲提供商: {hedge_provider}，将使用 off")
+                        hedge_provider = "off"
+                    self._hedge_provider = hedge_provider
+                print(f"流式卡顿检测已设置: {self._stall_timeout or '不检测'}秒无数据 / "
+                      f"首个数据块 {self._stall_ttft_timeout or '不检测'}秒 / "
+                      f"速度下限 {self._stall_min_tps or '不检测'} / 对冲 {self._hedge_provider}")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置流式卡顿检测失败: {e}")
+            return False
+
+    def get_resume_partial(self) -> bool:
+        """获取断点续写开关状态"""
+        with self._config_lock:
+            return self._resume_partial
+    
+    def set_resume_partial(self, enabled: bool) -> bool:
+        """设置断点续写开关并保存到配置文件"""
+        try:
+            with self._config_lock:
+                self._resume_partial = bool(enabled)
+                print(f"断点续写已{'开启' if self._resume_partial else '关闭'}")
+            
+            return self.save_config_to_file()
+            
+        except Exception as e:
+            print(f"设置断点续写失败: {e}")
+            return False
+
     def get_lmstudio_reload_interval(self) -> int:
         """获取LM Studio模型重载间隔（每N章重载一次）"""
         with self._config_lock:
@@ -1016,6 +1415,10 @@ def get_config_manager() -> DynamicConfigManager:
                 _config_manager = DynamicConfigManager()
     return _config_manager
 
+def get_config_snapshot() -> ConfigSnapshot:
+    """获取当前配置快照（请求热路径使用，每次调用解析一次即可）"""
+    return get_config_manager().get_snapshot()
+
 # 兼容性函数
 def get_dynamic_chatllm():
     """获取动态配置的ChatLLM实例"""
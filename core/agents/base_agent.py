@@ -1,10 +1,121 @@
 """Agent subsystem (extracted from aign_agents.py)."""
 
+import copy
+import threading
 import time
 import re
 import tiktoken
 
 from core.agents.retry import Retryer, TokenLimitError, _remove_thinking_content
+from core.agents.token_estimator import estimate_tokens, estimate_joined_tokens
+from core.agents import response_cache
+from core.agents import prefix_planner
+from core.agents import repetition_detector
+from core.agents import stream_hedging
+from core.agents import continuation
+from core import tracing
+from providers.stream_protocol import StreamAccumulator, STREAM_RESET
+
+
+def _get_config_snapshot():
+    """获取配置快照，配置管理器不可用时返回 None"""
+    try:
+        from config.dynamic_config_manager import get_config_snapshot
+        return get_config_snapshot()
+    except Exception:
+        return None
+
+
+class _StreamTiming:
+    """记录流式响应的首 token 延迟、数据块间隔和思考/正文的输出时间段"""
+
+    def __init__(self, request_start: float):
+        self.request_start = request_start
+        self.first_chunk = None
+        self.last_chunk = None
+        self.gaps = []
+        self.content_chars = 0
+        self.reasoning_chars = 0
+        self.content_window = [None, None]
+        self.reasoning_window = [None, None]
+
+    def feed(self, now: float, new_content: str, new_reasoning: str):
+        if self.first_chunk is None:
+            self.first_chunk = now
+        else:
+            self.gaps.append(now - self.last_chunk)
+        self.last_chunk = now
+        if new_content:
+            self.content_chars += len(new_content)
+            self.content_window[0] = self.content_window[0] or now
+            self.content_window[1] = now
+        if new_reasoning:
+            self.reasoning_chars += len(new_reasoning)
+            self.reasoning_window[0] = self.reasoning_window[0] or now
+            self.reasoning_window[1] = now
+
+    def metrics(self, resp: dict, count_tokens, whole_response: bool = False) -> dict:
+        """汇总为 span 属性；Token 数优先使用 API 返回值，否则本地估算
+
+        非流式响应没有逐块时间，TTFT 记为整体耗时，吞吐量按整体耗时计算。
+        """
+        now = time.time()
+        content = resp.get("content") or ""
+        reasoning = resp.get("reasoning_content") or ""
+        reasoning_tokens = resp.get("reasoning_tokens") or (count_tokens(reasoning) if reasoning else 0)
+        content_tokens = (resp.get("completion_tokens") or 0) - (resp.get("reasoning_tokens") or 0)
+        if content_tokens <= 0:
+            content_tokens = count_tokens(content) if content else 0
+        if whole_response:
+            self.first_chunk = self.last_chunk = now
+            self.content_window = [self.request_start, now] if content else [None, None]
+            self.reasoning_window = [None, None]
+
+        def rate(tokens, window):
+            if not tokens or window[0] is None:
+                return 0.0
+            return round(tokens / max(window[1] - window[0], 1e-3), 1) if window[1] > window[0] else 0.0
+
+        metrics = {
+            "ttft_ms": round((self.first_chunk - self.request_start) * 1000, 1) if self.first_chunk else None,
+            "content_chars": len(content) or self.content_chars,
+            "reasoning_chars": len(reasoning) or self.reasoning_chars,
+            "content_tokens": content_tokens,
+            "reasoning_tokens": reasoning_tokens,
+            "content_tps": rate(content_tokens, self.content_window),
+            "reasoning_tps": rate(reasoning_tokens, self.reasoning_window),
+        }
+        if self.gaps:
+            metrics["gap_p95_ms"] = round(tracing.percentile(self.gaps, 0.95) * 1000, 1)
+            metrics["gap_max_ms"] = round(max(self.gaps) * 1000, 1)
+        return metrics
+
+
+class _ForkStreamBuffer:
+    """后台副本（fork）自己的流式跟踪缓冲区：并发请求不再重置或混写父 AIGN 的实时流窗口"""
+
+    def __init__(self):
+        self.operation = ""
+        self.chars = 0
+        self.parts = []
+
+    def start_stream_tracking(self, operation_name):
+        self.operation = operation_name
+        self.chars = 0
+        self.parts = []
+
+    def update_stream_progress(self, new_content, is_reasoning=False):
+        if new_content and not is_reasoning:
+            self.chars += len(new_content)
+            self.parts.append(new_content)
+
+    def end_stream_tracking(self, final_content=""):
+        self.operation = ""
+
+    def set_non_stream_content(self, content, agent_name, token_count=0):
+        self.parts = [content] if content else []
+        self.chars = len(content or "")
+
 
 class MarkdownAgent:
     """专门应对输入输出都是md格式的情况，例如小说生成"""
@@ -110,13 +221,13 @@ class MarkdownAgent:
             resp = chatLLM(messages=self.history)
             # 处理生成器响应
             if hasattr(resp, '__next__'):
-                final_result = None
+                stream_accumulator = StreamAccumulator()
                 try:
                     for chunk in resp:
-                        final_result = chunk
+                        stream_accumulator.feed(chunk)
                 except Exception as generator_error:
                     print(f"Warning: Error iterating generator: {generator_error}")
-                resp = final_result if final_result else {"content": "AI初始化失败", "total_tokens": 0}
+                resp = stream_accumulator.result() if stream_accumulator.chunk_count else {"content": "AI初始化失败", "total_tokens": 0}
             else:
                 # 非流式响应：直接使用返回的结果
                 print(f"🔧 {self.name} 初始化使用非流式响应")
@@ -148,28 +259,11 @@ class MarkdownAgent:
         Returns:
             int: 估算的 token 数量
         """
-        if not text:
-            return 0
-        
-        chinese_chars = 0
-        ascii_chars = 0
-        other_chars = 0
-        
-        for ch in text:
-            if '\u4e00' <= ch <= '\u9fff' or '\u3400' <= ch <= '\u4dbf':
-                chinese_chars += 1
-            elif ord(ch) < 128:
-                ascii_chars += 1
-            else:
-                other_chars += 1
-        
-        # DeepSeek/Qwen 的中文 token 效率：
-        # - 中文：约 0.6-0.7 token/字（常用词2-3字编为1 token）
+        # 按字符类别批量统计（结果与逐字符加权完全一致），长文本按内容缓存
+        # - 中文：约 0.7 token/字（常用词2-3字编为1 token）
         # - 英文/ASCII：约 0.25 token/字符（约4字符/token）
         # - 其他字符（日韩/符号等）：约 1.0 token/字符
-        tokens = chinese_chars * 0.7 + ascii_chars * 0.25 + other_chars * 1.0
-        
-        return max(1, int(tokens))
+        return estimate_tokens(text)
     
     def get_token_limit(self) -> int:
         """获取当前智能体的 token 限制
@@ -207,11 +301,12 @@ class MarkdownAgent:
             dict: {"is_repetitive": bool, "detail": str, "clean_end_pos": int}
                   clean_end_pos 为最后一个正常内容的位置（用于截断）
         """
-        if not text or len(text) < 200:
+        if not text or len(text) < repetition_detector.MIN_TEXT_LENGTH:
             return {"is_repetitive": False, "detail": "", "clean_end_pos": len(text) if text else 0}
         
         # 策略1: 检查末尾区域（最后800字符）是否有2-4字的短语大量重复
-        tail_size = min(800, len(text))
+        # 阈值与流式检测共用（core/agents/repetition_detector）
+        tail_size = min(repetition_detector.TAIL_SIZE, len(text))
         tail = text[-tail_size:]
         
         for ngram_len in [2, 3, 4]:
@@ -219,7 +314,7 @@ class MarkdownAgent:
             for i in range(len(tail) - ngram_len + 1):
                 ngram = tail[i:i+ngram_len]
                 # 跳过纯标点或空白
-                if all(c in ' \n\r\t，。！？、；：""''【】（）' for c in ngram):
+                if all(c in repetition_detector.REPETITION_PUNCTUATION for c in ngram):
                     continue
                 ngram_counts[ngram] = ngram_counts.get(ngram, 0) + 1
             
@@ -228,10 +323,7 @@ class MarkdownAgent:
             # 2字: 在800字中出现80+次 (10%密度) 且绝对数量>=50
             # 3字: 在800字中出现64+次 (8%密度) 且绝对数量>=40
             # 4字: 在800字中出现48+次 (6%密度) 且绝对数量>=30
-            density_thresholds = {2: (0.10, 50), 3: (0.08, 40), 4: (0.06, 30)}
-            pct_threshold, min_count = density_thresholds[ngram_len]
-            total_positions = len(tail) - ngram_len + 1
-            count_threshold = max(min_count, int(total_positions * pct_threshold))
+            count_threshold = repetition_detector.ngram_count_threshold(ngram_len, len(tail))
             
             for ngram, count in ngram_counts.items():
                 if count >= count_threshold:
@@ -244,7 +336,7 @@ class MarkdownAgent:
                     }
         
         # 策略2: 检查较长片段（6-15字符）的循环重复
-        for seg_len in [6, 8, 10, 15]:
+        for seg_len in repetition_detector.SEGMENT_LENGTHS:
             if len(tail) < seg_len * 4:
                 continue
             # 取末尾的一段作为候选重复片段
@@ -259,7 +351,7 @@ class MarkdownAgent:
                 else:
                     break
             
-            if repeat_count >= 5:
+            if repeat_count >= repetition_detector.MIN_SEGMENT_REPEATS:
                 clean_pos = len(text) - tail_size + (check_pos + seg_len)
                 return {
                     "is_repetitive": True,
@@ -298,15 +390,86 @@ class MarkdownAgent:
         
         return best_pos
 
-    def query(self, user_input: str) -> dict:
+    def query(self, user_input: str, resume_from: str = "") -> dict:
         """查询AI代理
         
         Args:
             user_input: 用户输入的内容
+            resume_from: 上次被截断的响应中的有效前缀，给出时请求模型从该处续写，
+                         返回的content为前缀与续写内容拼接后的完整响应
             
         Returns:
             dict: 包含content和total_tokens的响应字典
         """
+        with self._get_tracer().span(tracing.AGENT_QUERY_SPAN, agent=self.name) as span:
+            try:
+                return self._query_checked(user_input, resume_from)
+            finally:
+                # 每次 _do_query 尝试（含 Retryer 与 Token/重复检查触发的重试）各记一个 llm.request
+                span.set(attempts=span.children, retries=max(0, span.children - 1))
+    
+    def _get_tracer(self):
+        """关联 AIGN 实例时使用其追踪器，否则使用进程级追踪器"""
+        tracer = getattr(getattr(self, 'parent_aign', None), 'tracer', None)
+        return tracer or tracing.get_tracer()
+    
+    def _stop_requested(self) -> bool:
+        """是否收到停止信号
+        
+        只有在 stop_generation 被明确设置为 True 时才停止；auto_generation_running 仅在自动生成
+        已启动（_auto_gen_ever_started）后变为 False 时才视为停止，避免在大纲生成等非自动生成场景误判。
+        """
+        cancel_event = getattr(self, '_cancel_event', None)
+        if cancel_event is not None and cancel_event.is_set():
+            return True
+        parent_aign = getattr(self, 'parent_aign', None)
+        if not parent_aign:
+            return False
+        if getattr(parent_aign, 'stop_generation', False):
+            return True
+        auto_gen_ever_started = getattr(parent_aign, '_auto_gen_ever_started', False)
+        return auto_gen_ever_started and not getattr(parent_aign, 'auto_generation_running', True)
+    
+    def _watch_stream(self, resp, config_snapshot, provider: str, full_messages: list):
+        """为流式响应加上卡顿检测；卡顿时按配置向同一/备用提供商发出对冲请求"""
+        if config_snapshot is None or (config_snapshot.stall_timeout <= 0 and config_snapshot.stall_ttft_timeout <= 0
+                                       and config_snapshot.stall_min_tps <= 0):
+            return resp
+        
+        hedge_provider = config_snapshot.hedge_provider
+        if hedge_provider in ("same", provider):
+            # 本地推理服务单卡排队（并发上限为1），对冲请求只会和原请求抢同一个槽位
+            from providers.concurrency import get_provider_concurrency_limit
+            overrides = getattr(getattr(self, 'parent_aign', None), 'provider_concurrency', None)
+            if get_provider_concurrency_limit(provider, 2, overrides) <= 1:
+                hedge_provider = "off"
+        start_hedge = None
+        if hedge_provider != "off":
+            def start_hedge():
+                chatLLM = self.chatLLM
+                if hedge_provider not in ("same", provider):
+                    from config.dynamic_config_manager import get_config_manager
+                    chatLLM = get_config_manager().get_provider_chatllm(hedge_provider)
+                return chatLLM(
+                    messages=full_messages,
+                    temperature=self.temperature,
+                    top_p=self.top_p,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                )
+        
+        return stream_hedging.HedgedStream(
+            resp, start_hedge, provider,
+            stall_timeout=config_snapshot.stall_timeout,
+            min_tokens_per_second=config_snapshot.stall_min_tps,
+            hedge_provider=provider if hedge_provider == "same" else hedge_provider,
+            should_stop=self._stop_requested,
+            label=self.name,
+            ttft_timeout=config_snapshot.stall_ttft_timeout,
+        )
+    
+    def _query_checked(self, user_input: str, resume_from: str = "") -> dict:
+        """执行查询并做 Token 长度与重复循环检查，不通过时重试"""
         # Token长度检查和重试机制
         max_token_retries = 3
         token_retry_count = 0
@@ -314,7 +477,7 @@ class MarkdownAgent:
         max_repetition_retries = 2
         
         while token_retry_count < max_token_retries:
-            resp = self._do_query(user_input)
+            resp = self._do_query(user_input, resume_from=resume_from)
             
             # Token长度检查
             response_content = resp.get("content", "")
@@ -360,16 +523,17 @@ class MarkdownAgent:
                         # 抛出特殊的 TokenLimitError 异常，用于区分 token 超限错误
                         raise TokenLimitError(error_msg)
                     
-                    # 短暂延迟后重试
+                    # 短暂延迟后重试（丢弃缓存的响应，避免重试时再次命中）
+                    self._discard_cached_response()
                     time.sleep(1.5)
                     continue
                 
-                # Token长度正常，检查重复循环
-                repetition_result = self.detect_repetition_loop(response_content)
+                # Token长度正常，检查重复循环（流式输出中已确认并提前断开的直接使用其结果）
+                repetition_result = resp.pop("repetition", None) or self.detect_repetition_loop(response_content)
                 if repetition_result["is_repetitive"]:
                     repetition_retry_count += 1
                     detail = repetition_result["detail"]
-                    print(f"🔁 [{self.name}] 检测到重复循环: {detail}")
+                    print(f"🔁 [{self.name}] 检测到重复循环: {detail}（前{repetition_result['clean_end_pos']}字正常）")
                     
                     if hasattr(self, 'parent_aign') and self.parent_aign:
                         self.parent_aign.log_message(
@@ -377,6 +541,7 @@ class MarkdownAgent:
                             f"正在重试 ({repetition_retry_count}/{max_repetition_retries})"
                         )
                     
+                    self._discard_cached_response()
                     if repetition_retry_count <= max_repetition_retries:
                         print(f"🔄 正在进行第 {repetition_retry_count}/{max_repetition_retries} 次重复重试...")
                         time.sleep(1.5)
@@ -418,27 +583,62 @@ class MarkdownAgent:
         raise ValueError(f"{self.name}: Token检查重试循环异常退出")
     
     @Retryer(max_retries=3)
-    def _do_query(self, user_input: str) -> dict:
-        """实际执行查询的内部方法
+    def _do_query(self, user_input: str, resume_from: str = "") -> dict:
+        """实际执行查询的内部方法（每次尝试记录一个 llm.request span）
+        
+        流式输出中途失败时，失败响应的 partial_content 带有已接收内容中的有效前缀，
+        Retryer 把它作为 resume_from 传给下一次尝试，只续写缺失的部分。
         
         Args:
             user_input: 用户输入的内容
+            resume_from: 已生成的有效前缀，给出时请求模型从该处续写
             
         Returns:
             dict: 包含content和total_tokens的响应字典
         """
+        with self._get_tracer().span(tracing.LLM_REQUEST_SPAN, agent=self.name) as span:
+            resp = self._do_query_traced(user_input, span, resume_from)
+            if resume_from:
+                span.set(resumed_chars=len(resume_from))
+            if "流式输出失败" in resp.get("content", ""):
+                span.set(error="流式输出失败")
+                if resume_from:
+                    # 续写也中断了：已有前缀加上本次接收的部分，供下一次继续续写
+                    partial = continuation.stitch(resume_from, resp.get("partial_content", ""))
+                    resp["partial_content"] = continuation.resumable_prefix(partial)
+                if not resp.get("partial_content"):
+                    resp.pop("partial_content", None)
+            elif resume_from:
+                resp = self._stitch_resumed(resume_from, resp)
+            return resp
+    
+    def _stitch_resumed(self, resume_from: str, resp: dict) -> dict:
+        """把续写响应拼接到已生成的前缀之后（重复检测结果的位置随之平移）"""
+        content = resp.get("content", "")
+        stitched = continuation.stitch(resume_from, content)
+        offset = len(stitched) - len(content)
+        resp = dict(resp)
+        resp["content"] = stitched
+        repetition = resp.get("repetition")
+        if repetition:
+            resp["repetition"] = dict(repetition, clean_end_pos=repetition["clean_end_pos"] + offset,
+                                      aborted_at=repetition["aborted_at"] + offset)
+        continuation.get_resume_stats().record(self.name, kept_chars=len(resume_from), new_chars=len(content))
+        print(f"🧩 [{self.name}] 断点续写完成: 保留已生成 {len(resume_from)}字，续写 {len(content)}字，"
+              f"拼接后 {len(stitched)}字")
+        return resp
+    
+    def _do_query_traced(self, user_input: str, span, resume_from: str = "") -> dict:
+        """_do_query 的实现，把 TTFT、数据块间隔和吞吐量写入 span"""
+        # 本次调用统一使用同一份配置快照（系统提示词、调试级别、提供商）
+        config_snapshot = _get_config_snapshot()
+        
         # 获取提供商层面的系统提示词（叠加模式）
         # 每次调用动态获取，不存储在history中，避免重复累积
         provider_system_prompt = ""
-        try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            current_config = config_manager.get_current_config()
-            if current_config and current_config.system_prompt:
-                provider_system_prompt = current_config.system_prompt.strip()
-        except Exception as e:
-            # 获取失败时静默处理，不影响正常流程
-            pass
+        current_config = config_snapshot.provider_config if config_snapshot else None
+        if current_config and current_config.system_prompt:
+            provider_system_prompt = current_config.system_prompt.strip()
         
         # 构建完整的消息列表
         full_messages = []
@@ -456,29 +656,36 @@ class MarkdownAgent:
         full_messages.extend(self.history)
         full_messages.append({"role": "user", "content": user_input})
         
+        # 3. 断点续写：追加已生成的前缀与续写指令（不写入 history）
+        if resume_from:
+            full_messages = continuation.build_messages(full_messages, resume_from)
+            print(f"🧩 {self.name}: 从断点续写（已生成 {len(resume_from)}字）")
+        
         # 计算完整提示词长度
         total_prompt_length = sum(len(msg["content"]) for msg in full_messages)
         
+        # 前缀缓存指纹：与本智能体上次请求的前缀比较，变化时提示失效原因
+        prefix_info = None
+        planned = getattr(self, '_planned_input', None)
+        planner = self._get_prefix_planner()
+        if planner is not None and planned is not None and planned[0] is user_input:
+            prefix_info = planner.observe(self.name, provider_system_prompt, self.history, planned[1])
+            span.set(prefix_fp=prefix_info["fingerprint"], prefix_warm=prefix_info["warm"],
+                     prefix_chars=prefix_info["prefix_chars"])
+        
         # 🔢 Token累积统计 - 计算发送的Token数
         sent_tokens = 0
         if hasattr(self, 'parent_aign') and self.parent_aign:
             if self.parent_aign.token_accumulation_stats.get("enabled", False):
                 # 计算发送的提示词总Token数
-                total_prompt_text = "\n".join([msg["content"] for msg in full_messages])
-                sent_tokens = self.count_tokens(total_prompt_text)
+                # 按消息分别计数后合并，系统提示词等稳定部分命中缓存
+                sent_tokens = estimate_joined_tokens(msg["content"] for msg in full_messages)
         
         # 调试信息：显示发送给大模型的完整提示词（从配置文件和环境变量读取调试级别）
         import os
         
-        # 优先从配置文件读取调试级别，如果失败则使用默认值
-        debug_level = '1'  # 默认值
-        try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            debug_level = config_manager.get_debug_level()
-        except Exception:
-            # 如果配置管理器不可用，使用默认值而不是环境变量
-            debug_level = '1'
+        # 从配置快照读取调试级别，配置管理器不可用时使用默认值
+        debug_level = config_snapshot.debug_level if config_snapshot else '1'
         
         if debug_level == '2':  # 详细模式：显示完整提示词
             print("=" * 60)
@@ -487,7 +694,7 @@ class MarkdownAgent:
             
             # 计算token数量
             user_input_tokens = self.count_tokens(user_input)
-            total_prompt_tokens = self.count_tokens("\n".join([msg["content"] for msg in full_messages]))
+            total_prompt_tokens = estimate_joined_tokens(msg["content"] for msg in full_messages)
             
             print(f"📊 输入统计:")
             print(f"   📤 用户输入长度: {len(user_input)} 字符 / {user_input_tokens} tokens")
@@ -514,7 +721,7 @@ class MarkdownAgent:
         elif debug_level == '1':  # 基础调试模式：只显示关键统计信息
             # 计算token数量
             user_input_tokens = self.count_tokens(user_input)
-            total_prompt_tokens = self.count_tokens("\n".join([msg["content"] for msg in full_messages]))
+            total_prompt_tokens = estimate_joined_tokens(msg["content"] for msg in full_messages)
             
             # 显示智能体名称和风格信息
             agent_name = getattr(self, 'name', 'Unknown')
@@ -608,27 +815,43 @@ class MarkdownAgent:
         
         # 默认使用流式输出，但NVIDIA API使用非流式模式以避免流式问题
         use_stream = True
-        try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            current_provider = config_manager.current_provider
-            if current_provider and current_provider.lower() == 'nvidia':
-                use_stream = False
-                print(f"🔧 检测到NVIDIA提供商，使用非流式模式")
-        except Exception:
-            pass  # 获取失败时默认使用流式
+        current_provider = config_snapshot.current_provider if config_snapshot else ""
+        if current_provider and current_provider.lower() == 'nvidia':
+            use_stream = False
+            print(f"🔧 检测到NVIDIA提供商，使用非流式模式")
+        
+        # ♻️ 响应缓存（可选）：相同提供商/模型/消息/采样参数的请求直接回放已付费的响应
+        cache, cache_key, cache_session, require_session = self._resolve_response_cache(config_snapshot, full_messages)
+        cached_resp = cache.get(cache_key, cache_session if require_session else None) if cache else None
+        cache_hit = cached_resp is not None
+        self._set_last_response_cache_key(cache_key)
         
         # ⏱️ 开始API调用计时
         api_start_time = time.time()
-        
-        resp = self.chatLLM(
-            messages=full_messages,
-            temperature=self.temperature,
-            top_p=self.top_p,
-            max_tokens=self.max_tokens,
-            stream=use_stream,  # 根据提供商类型动态决定是否使用流式输出
+        span.set(
+            provider=current_provider,
+            model=current_config.model_name if current_config else "",
+            stream=use_stream,
+            cache_hit=cache_hit,
+            prompt_chars=total_prompt_length,
+            prepare_ms=round(span.duration * 1000, 1),
         )
         
+        if cache_hit:
+            print(f"♻️ {self.name}: 命中响应缓存（{len(cached_resp.get('content', ''))}字符），跳过API调用")
+            resp = response_cache.replay_stream(cached_resp) if use_stream else dict(cached_resp)
+        else:
+            resp = self.chatLLM(
+                messages=full_messages,
+                temperature=self.temperature,
+                top_p=self.top_p,
+                max_tokens=self.max_tokens,
+                stream=use_stream,  # 根据提供商类型动态决定是否使用流式输出
+            )
+            if hasattr(resp, '__next__'):
+                resp = self._watch_stream(resp, config_snapshot, current_provider, full_messages)
+        response_ok = False
+        
         # 处理流式和非流式响应
         if hasattr(resp, '__next__'):  # 检查是否为生成器
             print(f"🔧 {self.name}: 检测到流式响应，开始处理生成器")
@@ -644,14 +867,21 @@ class MarkdownAgent:
                 min_content_length = 5  # 标题只需要5个字符即可
             else:
                 min_content_length = 50  # 其他智能体需要50个字符
+            if resume_from:
+                min_content_length = 1  # 续写只输出缺失的尾部，可能很短（下面按拼接后的内容判断是否完整）
             
             chunk_count = 0  # 记录接收到的数据块数量
             last_chunk_time = time.time()  # 记录最后接收数据块的时间
-            accumulated_reasoning = ""  # 跟踪思维链内容（用于显示，不保存到正文）
+            stream_timing = _StreamTiming(api_start_time)
+            # 增量累积器：提供商只yield增量，正文/思维链只在需要时拼接一次
+            stream_accumulator = StreamAccumulator()
+            # 增量重复检测：确认陷入循环后立即断开，不再为后续的重复内容付费
+            loop_detector = repetition_detector.StreamingRepetitionDetector(self._find_repetition_start)
+            loop_result = None
 
             # 开始流式跟踪（如果有父AIGN实例）
             if hasattr(self, 'parent_aign') and self.parent_aign:
-                self.parent_aign.start_stream_tracking(f"{self.name}生成")
+                self._stream_sink().start_stream_tracking(f"{self.name}生成")
 
             try:
                 for chunk in resp:
@@ -659,26 +889,28 @@ class MarkdownAgent:
                     # 注意：只有在 stop_generation 被明确设置为 True 时才停止
                     # auto_generation_running 仅在自动生成模式下有效（已启动后被停止的情况）
                     # 避免在大纲生成等非自动生成场景误判停止
-                    if hasattr(self, 'parent_aign') and self.parent_aign:
-                        should_stop = getattr(self.parent_aign, 'stop_generation', False)
-                        # 仅当 auto_generation_running 曾经被设置为 True（即自动生成已启动）后变为 False 时才视为停止
-                        # 通过检查是否存在 _auto_gen_ever_started 标志来判断
-                        auto_gen_ever_started = getattr(self.parent_aign, '_auto_gen_ever_started', False)
-                        if auto_gen_ever_started and not getattr(self.parent_aign, 'auto_generation_running', True):
-                            should_stop = True
-                        if should_stop:
-                            print(f"\n🛑 检测到停止信号，中断流式输出...")
-                            if hasattr(resp, 'close') and callable(resp.close):
-                                try:
-                                    resp.close()
-                                    print("✅ 已关闭流式输出连接")
-                                except Exception as e:
-                                    print(f"⚠️ 关闭流连接失败: {e}")
-                            raise InterruptedError("用户停止了生成")
+                    if self._stop_requested():
+                        print(f"\n🛑 检测到停止信号，中断流式输出...")
+                        if hasattr(resp, 'close') and callable(resp.close):
+                            try:
+                                resp.close()
+                                print("✅ 已关闭流式输出连接")
+                            except Exception as e:
+                                print(f"⚠️ 关闭流连接失败: {e}")
+                        raise InterruptedError("用户停止了生成")
+                    
+                    if isinstance(chunk, dict) and chunk.get("type") == STREAM_RESET:
+                        # 对冲请求胜出：丢弃原请求已输出的内容，从头显示对冲请求的输出
+                        stream_accumulator.reset()
+                        loop_detector = repetition_detector.StreamingRepetitionDetector(self._find_repetition_start)
+                        if hasattr(self, 'parent_aign') and self.parent_aign:
+                            self._stream_sink().start_stream_tracking(f"{self.name}生成（对冲请求）")
+                        continue
                     
-                    final_result = chunk
                     chunk_count += 1
                     last_chunk_time = time.time()
+                    new_content, new_reasoning = stream_accumulator.feed(chunk)
+                    stream_timing.feed(last_chunk_time, new_content, new_reasoning)
                     
                     # 检查是否应该打印到console（如果父AIGN启用了WebUI流模式，则不打印到console）
                     should_print_to_console = True
@@ -686,36 +918,38 @@ class MarkdownAgent:
                         if getattr(self.parent_aign, 'enable_webui_stream', False):
                             should_print_to_console = False
                     
-                    # 跟踪思维链内容（如果有，用于显示）
-                    if chunk and 'reasoning_content' in chunk and chunk['reasoning_content']:
-                        new_reasoning = chunk['reasoning_content'][len(accumulated_reasoning):]
-                        if new_reasoning:
-                            accumulated_reasoning = chunk['reasoning_content']
-                            # 如果未启用WebUI流模式，输出到console
-                            if should_print_to_console:
-                                print(new_reasoning, end='', flush=True)
-                            # 如果启用WebUI流模式，更新WebUI
-                            if hasattr(self, 'parent_aign') and self.parent_aign:
-                                self.parent_aign.update_stream_progress(new_reasoning, is_reasoning=True)
+                    # 思维链增量（用于显示，不保存到正文）
+                    if new_reasoning:
+                        # 如果未启用WebUI流模式，输出到console
+                        if should_print_to_console:
+                            print(new_reasoning, end='', flush=True)
+                        # 如果启用WebUI流模式，更新WebUI
+                        if hasattr(self, 'parent_aign') and self.parent_aign:
+                            self._stream_sink().update_stream_progress(new_reasoning, is_reasoning=True)
                     
-                    # 跟踪新增内容（正文内容，用于保存）
-                    if chunk and 'content' in chunk:
-                        new_content = chunk['content'][len(accumulated_content):]
-                        accumulated_content = chunk['content']
+                    # 正文增量（用于保存）
+                    if new_content:
+                        # 如果未启用WebUI流模式，输出到console
+                        if should_print_to_console:
+                            print(new_content, end='', flush=True)
+                        # 如果启用WebUI流模式，更新WebUI
+                        if hasattr(self, 'parent_aign') and self.parent_aign:
+                            self._stream_sink().update_stream_progress(new_content, is_reasoning=False)
 
-                        if new_content:
-                            # 如果未启用WebUI流模式，输出到console
-                            if should_print_to_console:
-                                print(new_content, end='', flush=True)
-                            # 如果启用WebUI流模式，更新WebUI
-                            if hasattr(self, 'parent_aign') and self.parent_aign:
-                                self.parent_aign.update_stream_progress(new_content, is_reasoning=False)
-                        
-                        # 检查是否长时间没有新内容（超时检测）
-                        if time.time() - last_chunk_time > 30:  # 30秒超时
-                            print(f"⚠️ 流式输出超时: 30秒内未收到新数据")
+                        loop_result = loop_detector.feed(new_content)
+                        if loop_result:
+                            print(f"\n🔁 [{self.name}] 流式输出中确认重复循环，提前断开连接: {loop_result['detail']}")
+                            if hasattr(resp, 'close') and callable(resp.close):
+                                try:
+                                    resp.close()
+                                except Exception as e:
+                                    print(f"⚠️ 关闭流连接失败: {e}")
                             break
 
+                # 流结束后只拼接一次完整结果（提供商可能在汇总事件中给出二次处理后的正文）
+                final_result = stream_accumulator.result()
+                accumulated_content = final_result.get("content", "")
+
                 # 检查流式输出是否成功完成
                 if accumulated_content and len(accumulated_content) >= min_content_length:
                     # 检查是否包含正常的结束标记
@@ -724,18 +958,21 @@ class MarkdownAgent:
                         '以上', '总结', '结论', '因此', '总之', '最后'
                     ]
                     
+                    # 续写时按拼接后的完整内容（已有前缀 + 本次输出的尾部）判断是否完整
+                    checked_content = resume_from + accumulated_content if resume_from else accumulated_content
+                    
                     # 检查内容是否包含成功标记
-                    has_success_marker = any(marker in accumulated_content for marker in success_markers)
+                    has_success_marker = any(marker in checked_content for marker in success_markers)
                     
                     # 检查内容长度是否足够（对短输出智能体使用不同的阈值）
                     is_short_output_agent = self.name in short_output_agents
                     if is_short_output_agent:
-                        has_sufficient_length = len(accumulated_content) >= min_content_length  # 标题等短内容只需满足最小长度
+                        has_sufficient_length = len(checked_content) >= min_content_length  # 标题等短内容只需满足最小长度
                     else:
-                        has_sufficient_length = len(accumulated_content) > 200
+                        has_sufficient_length = len(checked_content) > 200
                     
                     # 检查内容是否看起来完整（不是被截断的）
-                    looks_complete = not accumulated_content.endswith('...') and not accumulated_content.endswith('..')
+                    looks_complete = not checked_content.endswith('...') and not checked_content.endswith('..')
                     
                     # 检查是否接收到足够的数据块（对短输出智能体放宽要求）
                     if is_short_output_agent:
@@ -751,8 +988,8 @@ class MarkdownAgent:
                     success_criteria = [
                         has_success_marker,
                         (has_sufficient_length and looks_complete and has_enough_chunks),
-                        (len(accumulated_content) > 500),  # 如果内容很长，直接认为成功
-                        (is_short_output_agent and len(accumulated_content) >= min_content_length)  # 短输出智能体特殊通道
+                        (len(checked_content) > 500),  # 如果内容很长，直接认为成功
+                        (is_short_output_agent and len(checked_content) >= min_content_length),  # 短输出智能体特殊通道
                     ]
                     
                     if any(success_criteria) and reasonable_time:
@@ -768,12 +1005,17 @@ class MarkdownAgent:
                             print(f"   ❌ 缺少成功标记且内容长度不足")
                 else:
                     print(f"⚠️ 流式输出内容过短或为空: {len(accumulated_content)} 字符, {chunk_count}个数据块")
+                
+                # 因重复循环提前断开的响应交给 _query_checked 的重复重试处理，不按流式失败重试
+                if loop_result:
+                    stream_successful = True
 
             except Exception as generator_error:
+                accumulated_content = stream_accumulator.content
                 if isinstance(generator_error, InterruptedError):
                     # 确保结束流式跟踪
                     if hasattr(self, 'parent_aign') and self.parent_aign:
-                        self.parent_aign.end_stream_tracking(accumulated_content)
+                        self._stream_sink().end_stream_tracking(accumulated_content)
                     raise  # 重新抛出，让外层捕获
                     
                 error_msg = str(generator_error)
@@ -800,10 +1042,16 @@ class MarkdownAgent:
                     if hasattr(self, 'parent_aign') and self.parent_aign:
                         self.parent_aign.log_message(f"⚠️ 流式输出一般错误: {error_msg}")
             
+            span.set(chunks=chunk_count, **stream_timing.metrics(final_result or {}, self.count_tokens))
+            if loop_result:
+                span.set(repetition_abort_at=loop_result["aborted_at"], clean_end_pos=loop_result["clean_end_pos"])
+            if isinstance(resp, stream_hedging.HedgedStream) and resp.stall_reason:
+                span.set(stall=resp.stall_reason, hedged=resp.hedged, hedge_winner=resp.winner)
+
             # 结束流式跟踪
             if hasattr(self, 'parent_aign') and self.parent_aign:
                 if stream_successful:
-                    self.parent_aign.end_stream_tracking(accumulated_content)
+                    self._stream_sink().end_stream_tracking(accumulated_content)
                 else:
                     # 流式输出失败，记录错误信息
                     self.parent_aign.log_message(f"❌ 流式输出失败: 内容长度{len(accumulated_content)}字符，需要重试")
@@ -832,20 +1080,26 @@ class MarkdownAgent:
                     "content": f"流式输出失败，需要重试。原因: {error_reason} | 详情: {error_details}", 
                     "total_tokens": 0
                 }
+                # 保留已接收内容中的有效前缀，重试时从断点续写（_do_query 决定是否足够长）
+                if getattr(config_snapshot, 'resume_partial', True) and not loop_result:
+                    resp["partial_content"] = continuation.trim_to_boundary(accumulated_content)
                 print(f"❌ 流式输出失败: {error_reason}")
                 print(f"📊 失败详情: {error_details}")
             else:
-                resp = final_result if final_result else {
-                    "content": accumulated_content, 
-                    "total_tokens": 0,
-                    "reasoning_content": accumulated_reasoning  # 返回思维链内容
-                }
+                resp = final_result  # 包含content、reasoning_content（思维链）和usage信息
+                response_ok = True
+                if loop_result:
+                    # 重复的响应不写入响应缓存
+                    resp["repetition"] = loop_result
+                    response_ok = False
                 print(f"✅ 流式输出成功: {len(accumulated_content)}字符, {chunk_count}个数据块")
 
         else:
             # 非流式响应：直接使用返回的结果
             print(f"🔧 {self.name}: 检测到非流式响应，直接处理结果")
             print(f"✅ 非流式输出: {len(resp.get('content', ''))}字符")
+            response_ok = bool(resp.get('content'))
+            span.set(**_StreamTiming(api_start_time).metrics(resp, self.count_tokens, whole_response=True))
             
             # 为非流式模式更新流式输出窗口，显示完整的API调用信息
             if hasattr(self, 'parent_aign') and self.parent_aign:
@@ -853,12 +1107,15 @@ class MarkdownAgent:
                 token_count = resp.get('total_tokens', 0)
                 
                 # 使用专门的方法设置非流式内容
-                self.parent_aign.set_non_stream_content(response_content, self.name, token_count)
+                self._stream_sink().set_non_stream_content(response_content, self.name, token_count)
                 
                 # 记录日志
                 self.parent_aign.log_message(f"✅ {self.name}生成完成: {len(response_content)}字符，Token使用: {token_count}（非流式模式）")
         
         
+        if cache and response_ok and not cache_hit:
+            cache.put(cache_key, resp, cache_session)
+        
         # 显示API响应统计信息（紧凑格式）
         if debug_level in ['1', '2']:
             response_length = len(resp.get("content", ""))
@@ -867,6 +1124,10 @@ class MarkdownAgent:
             response_tokens = self.count_tokens(resp.get("content", ""))
             print(f"� 响应:{response_length}字/{response_tokens}tk | 耗时:{api_time:.1f}s | 总token:{total_tokens}")
         
+        # 命中缓存的响应没有发送请求，不计入Token/时间/费用统计
+        if cache_hit:
+            return resp
+        
         # 🔢 Token累积统计 - 记录发送和接收的Token数
         if hasattr(self, 'parent_aign') and self.parent_aign:
             if self.parent_aign.token_accumulation_stats.get("enabled", False):
@@ -951,10 +1212,52 @@ class MarkdownAgent:
             if hasattr(self.parent_aign, 'record_siliconflow_cache_info'):
                 self.parent_aign.record_siliconflow_cache_info(resp)
         
+        if prefix_info is not None:
+            planner.record_usage(self.name, prefix_info["warm"], resp)
+            span.set(prompt_tokens=resp.get("prompt_tokens"), prompt_cache_hit_tokens=resp.get("prompt_cache_hit_tokens"))
+        
         # 注意：use_memory逻辑已经移动到 query() 方法中
         return resp
 
 
+    def _resolve_response_cache(self, config_snapshot, full_messages: list) -> tuple:
+        """根据配置返回 (响应缓存, 缓存键, 会话ID, 是否只复用本会话条目)，未启用时缓存为 None"""
+        mode = getattr(config_snapshot, 'llm_cache_mode', 'off') if config_snapshot else 'off'
+        if mode not in ('session', 'persistent'):
+            return None, None, None, False
+        try:
+            cache = response_cache.get_response_cache(max_bytes=config_snapshot.llm_cache_max_mb * 1024 * 1024)
+        except Exception as e:
+            print(f"⚠️ 响应缓存不可用，直接调用API: {e}")
+            return None, None, None, False
+        provider_config = config_snapshot.provider_config
+        cache_key = response_cache.make_cache_key(
+            config_snapshot.current_provider,
+            provider_config.model_name if provider_config else "",
+            full_messages, self.temperature, self.top_p, self.max_tokens,
+            base_url=provider_config.base_url if provider_config else "",
+            system_prompt=provider_config.system_prompt if provider_config else "",
+        )
+        parent_aign = getattr(self, 'parent_aign', None)
+        session = getattr(parent_aign, 'llm_cache_session', None) or response_cache.PROCESS_SESSION
+        return cache, cache_key, session, mode == 'session'
+    
+    def _set_last_response_cache_key(self, cache_key):
+        """记录当前线程最近一次请求的缓存键（线程局部：同一智能体被多个线程调用时互不覆盖）"""
+        local = self.__dict__.get('_response_cache_local')
+        if local is None:
+            local = self.__dict__.setdefault('_response_cache_local', threading.local())
+        local.key = cache_key
+    
+    def _discard_cached_response(self):
+        """丢弃当前线程最近一次请求对应的缓存条目（响应未通过检查、即将重试时调用）"""
+        cache_key = getattr(self.__dict__.get('_response_cache_local'), 'key', None)
+        if cache_key:
+            try:
+                response_cache.get_response_cache().discard(cache_key)
+            except Exception as e:
+                print(f"⚠️ 丢弃缓存响应失败: {e}")
+
     def _remove_thinking_content(self, text: str) -> str:
         """移除可能存在的<think>标签及其内容"""
         if not text:
@@ -981,7 +1284,7 @@ class MarkdownAgent:
         
         return result.strip()
 
-    def getOutput(self, input_content: str, output_keys: list) -> dict:
+    def getOutput(self, input_content: str, output_keys: list, resume_from: str = "") -> dict:
         """解析类md格式中 # key 的内容，未解析全部output_keys中的key会报错
         
         支持两种格式：
@@ -991,11 +1294,12 @@ class MarkdownAgent:
         Args:
             input_content: 输入内容
             output_keys: 期望输出的键列表
+            resume_from: 上次被截断的原始响应中的有效前缀，给出时从该处续写后再解析
             
         Returns:
             dict: 解析后的键值对
         """
-        resp = self.query(input_content)
+        resp = self.query(input_content, resume_from)
         raw_content = resp["content"]
         # 清理可能存在的思维链标签（如NVIDIA deepseek模型的<think>标签）
         output = self._remove_thinking_content(raw_content)
@@ -1117,6 +1421,7 @@ class MarkdownAgent:
                             continue
 
                     truncated_output = output[:100] + "..." if len(output) > 100 else output
+                    self._discard_cached_response()
                     raise ValueError(f"fail to parse {k} in output (length: {len(output)}):\n{truncated_output}\n\n")
 
         # 保存原始响应文本，供截断检测器检查完成标识
@@ -1231,30 +1536,23 @@ class MarkdownAgent:
         
         return None
 
-    def invoke(self, inputs: dict, output_keys: list) -> dict:
+    def invoke(self, inputs: dict, output_keys: list, resume_from: str = "") -> dict:
         """
         使用输入字典调用agent，并解析输出
         
         Args:
             inputs: 输入字典，键为标题，值为内容
             output_keys: 期望输出的键列表
+            resume_from: 上次调用被截断的原始响应（_raw_response）中的有效前缀，
+                         给出时只请求缺失的部分（inputs 必须与上次调用相同）
             
         Returns:
             dict: 解析后的输出字典
         """
-        input_content = ""
-        for k, v in inputs.items():
-            if isinstance(v, str) and len(v) > 0:
-                input_content += f"# {k}\n{v}\n\n"
-
         # 调试信息：显示构建的输入内容（根据调试等级显示）
-        debug_level = '1'  # 默认值
-        try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            debug_level = config_manager.get_debug_level()
-        except Exception:
-            debug_level = '1'
+        config_snapshot = _get_config_snapshot()
+        debug_level = config_snapshot.debug_level if config_snapshot else '1'
+        input_content = self._build_input_content(inputs, config_snapshot)
         
         if debug_level == '2':
             print("📝 构建的输入内容（完整信息）:")
@@ -1291,10 +1589,48 @@ class MarkdownAgent:
             
             print("-" * 40)
 
-        result = Retryer(self.getOutput)(input_content, output_keys)
+        result = Retryer(self.getOutput)(input_content, output_keys, resume_from)
 
         return result
     
+    def _get_prefix_planner(self):
+        """关联 AIGN 实例时返回其前缀缓存规划器，否则返回 None"""
+        return getattr(getattr(self, 'parent_aign', None), 'prefix_planner', None)
+    
+    def _build_input_content(self, inputs: dict, config_snapshot=None) -> str:
+        """按前缀缓存规划拼接输入（静态字段在前且顺序冻结），并记下静态字段供 _do_query 计算前缀指纹"""
+        mode = getattr(config_snapshot, 'prefix_cache_mode', 'fix') if config_snapshot else 'fix'
+        planner = self._get_prefix_planner()
+        if planner is None or mode not in ('warn', 'fix'):
+            self._planned_input = None
+            return prefix_planner.render_inputs(inputs.items())
+        input_content, static_fields = planner.plan(self.name, inputs, mode)
+        self._planned_input = (input_content, static_fields)
+        return input_content
+    
+    def fork(self, cancel_event=None, foreground=False):
+        """创建共享 chatLLM、提示词与父 AIGN 的副本，供同一智能体的多个请求并发调用
+        
+        invoke() 会在实例上记录本次请求的状态（前缀规划、流式跟踪），同一实例不能并发调用。
+        
+        Args:
+            cancel_event: threading.Event，设置后副本的请求像收到停止信号一样中断（只影响该副本）
+            foreground: 为 True 时副本沿用本实例的流式输出目标（WebUI 实时流窗口）；
+                默认副本的流式输出写入自己的缓冲区，同一时刻只让一个前台请求显示在窗口中
+        """
+        clone = copy.copy(self)
+        if not foreground:
+            clone._stream_buffer = _ForkStreamBuffer()
+        clone.history = list(self.history)
+        clone._planned_input = None
+        clone._response_cache_local = threading.local()
+        clone._cancel_event = cancel_event
+        return clone
+    
+    def _stream_sink(self):
+        """流式跟踪的目标：后台副本为自己的缓冲区，否则为父 AIGN"""
+        return self.__dict__.get('_stream_buffer') or self.parent_aign
+    
     def clear_memory(self):
         """清除对话记忆，保留系统提示词"""
         if self.use_memory:
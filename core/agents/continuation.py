@@ -0,0 +1,146 @@
+"""
+断点续写 - 流式中断或输出被截断时保留已生成的有效前缀，只请求缺失的尾部
+
+原有的重试都是从头再来：流式输出在 80% 处断开、润色缺少 ===EMBELLISH_COMPLETE===、
+故事线少了最后几章，都要把整章重新生成一遍。续写请求在原消息后追加两条消息：
+- assistant：已生成的有效前缀（截到最后一个完整句子/行，丢弃写到一半的句子）
+- user：续写指令，并引用前缀末尾一小段，要求从该处之后接着输出、不重复已有内容
+
+没有使用"助手预填充"（让模型直接接着 assistant 消息往下写）：只有部分提供商支持
+（DeepSeek 的 prefix 测试接口、Claude），"从这里继续"的消息在所有 OpenAI 兼容接口上都可用。
+模型常会把前缀最后一两句重写一遍再往下写，stitch() 去掉续写开头与前缀末尾重叠的部分，
+以及重复输出的段落标记（===润色结果===、# 段落 等）。拼接后的内容由调用方重新校验。
+"""
+
+import re
+import threading
+
+from core.embellish_truncation_detector import VALID_ENDING_PUNCTUATION
+
+
+MIN_PREFIX_CHARS = 200          # 有效前缀短于此长度时直接从头重试（续写省不了多少）
+TAIL_HINT_CHARS = 120           # 续写指令中引用的前缀末尾长度
+MAX_OVERLAP_CHARS = 600         # 拼接时检查的最大重叠长度
+MIN_OVERLAP_CHARS = 6           # 短于此长度的重叠只在是完整句子时去除（避免误删"。"之类的巧合）
+
+CONTINUE_PROMPT = (
+    "你的上一条回复在中途被截断了。请从截断处继续输出剩余内容：\n"
+    "- 紧接在下面这段结尾之后开始写，不要重复已经输出的内容\n"
+    "- 保持与前文相同的格式，写完后照常输出结束标记\n"
+    "- 不要添加任何说明或前言\n"
+    "{hint}"
+    "\n上一条回复的结尾：\n{tail}"
+)
+
+_MARKER_LINE_RE = re.compile(r"^(===[^=\n]+===|#{1,3} [^\n]+)$")
+
+
+def _is_boundary(char: str) -> bool:
+    return char == "\n" or char in VALID_ENDING_PUNCTUATION
+
+
+def trim_to_boundary(text: str) -> str:
+    """截到最后一个完整句子或行（含结尾标点），丢弃写到一半的句子"""
+    if not text:
+        return ""
+    for pos in range(len(text) - 1, -1, -1):
+        if _is_boundary(text[pos]):
+            return text[:pos + 1]
+    return ""
+
+
+def resumable_prefix(text: str) -> str:
+    """可用于续写的有效前缀，不够 MIN_PREFIX_CHARS 时返回空字符串"""
+    prefix = trim_to_boundary(text or "")
+    return prefix if len(prefix.strip()) >= MIN_PREFIX_CHARS else ""
+
+
+def build_messages(messages: list, prefix: str, hint: str = "") -> list:
+    """在原消息后追加已生成的前缀与续写指令
+
+    Args:
+        messages: 原请求的完整消息列表
+        prefix: 已生成的有效前缀（通常来自 resumable_prefix）
+        hint: 额外的续写说明（例如"从第5章开始"），附在指令列表之后
+    """
+    tail = prefix[-TAIL_HINT_CHARS:].strip()
+    prompt = CONTINUE_PROMPT.format(hint=f"- {hint}\n" if hint else "", tail=tail)
+    return list(messages) + [
+        {"role": "assistant", "content": prefix},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _overlap_length(prefix: str, continuation: str) -> int:
+    """前缀末尾与续写开头相同部分的最大长度
+
+    短于 MIN_OVERLAP_CHARS 的重叠只在恰好是完整句子时去除（例如重写了"雨还在下。"）。
+    """
+    longest = min(len(prefix), len(continuation), MAX_OVERLAP_CHARS)
+    for length in range(longest, 1, -1):
+        if not prefix.endswith(continuation[:length]):
+            continue
+        if length >= MIN_OVERLAP_CHARS or length == len(prefix) or _is_boundary(prefix[-length - 1]):
+            return length
+    return 0
+
+
+def stitch(prefix: str, continuation: str) -> str:
+    """拼接前缀与续写内容，去除续写开头重复的段落标记和与前缀末尾重叠的部分"""
+    if not continuation:
+        return prefix
+    body = continuation.lstrip()
+    # 续写开头重复输出了前缀中已有的段落标记
+    first_line, _, rest = body.partition("\n")
+    marker = first_line.strip()
+    if _MARKER_LINE_RE.match(marker) and "END" not in marker and marker in prefix:
+        body = rest.lstrip()
+    overlap = _overlap_length(prefix, body)
+    if overlap:
+        return prefix + body[overlap:]
+    # 没有重叠：保留续写原有的开头换行（新段落），否则直接接在前缀之后
+    if continuation[:1] == "\n" and not prefix.endswith("\n"):
+        return prefix + "\n" + body
+    return prefix + body
+
+
+class ResumeStats:
+    """按来源（智能体名/故事线）统计续写次数、保留的前缀长度与续写生成的长度（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, source: str, kept_chars: int, new_chars: int):
+        with self._lock:
+            stats = self._stats.setdefault(source, {"resumes": 0, "kept_chars": 0, "new_chars": 0})
+            stats["resumes"] += 1
+            stats["kept_chars"] += kept_chars
+            stats["new_chars"] += new_chars
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {source: dict(stats) for source, stats in self._stats.items()}
+
+    def get_stats_display(self) -> str:
+        """生成续写统计显示文本，没有续写时返回空字符串"""
+        stats = self.get_stats()
+        if not stats:
+            return ""
+        lines = ["", "🧩 断点续写:"]
+        for source, entry in sorted(stats.items()):
+            lines.append(f"  • {source}: 续写 {entry['resumes']}次，保留已生成 {entry['kept_chars']}字，"
+                         f"续写生成 {entry['new_chars']}字")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_resume_stats = ResumeStats()
+
+
+def get_resume_stats() -> ResumeStats:
+    """获取进程级续写统计"""
+    return _resume_stats
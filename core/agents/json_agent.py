@@ -4,7 +4,7 @@ import time
 import re
 import tiktoken
 
-from core.agents.base_agent import MarkdownAgent
+from core.agents.base_agent import MarkdownAgent, _get_config_snapshot
 
 class JSONMarkdownAgent(MarkdownAgent):
     """
@@ -41,9 +41,8 @@ class JSONMarkdownAgent(MarkdownAgent):
             bool: 是否启用JSON修复
         """
         try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            return config_manager.get_json_auto_repair()
+            from config.dynamic_config_manager import get_config_snapshot
+            return get_config_snapshot().json_auto_repair
         except Exception:
             return True  # 默认启用
         
@@ -99,6 +98,7 @@ class JSONMarkdownAgent(MarkdownAgent):
                 return response
             else:
                 print(f"❌ JSON修复失败 (第 {attempt + 1} 次尝试): {error_msg}")
+                self._discard_cached_response()
                 if attempt < max_attempts - 1:
                     print(f"🔄 准备重试...")
                     time.sleep(1)  # 短暂延迟
@@ -144,10 +144,7 @@ class JSONMarkdownAgent(MarkdownAgent):
         Returns:
             dict: 解析后的JSON对象
         """
-        input_content = ""
-        for k, v in inputs.items():
-            if isinstance(v, str) and len(v) > 0:
-                input_content += f"# {k}\n{v}\n\n"
+        input_content = self._build_input_content(inputs, _get_config_snapshot())
         
         # 调试信息
         print("📝 构建的JSON输入内容:")
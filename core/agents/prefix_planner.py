@@ -0,0 +1,280 @@
+"""
+前缀缓存规划器 - 让同一智能体在各章之间发送字节一致的提示词前缀，并统计提供商缓存命中率
+
+DeepSeek / SiliconFlow 等提供商的上下文缓存按前缀匹配：请求必须从第一个字节起与之前的请求一致，
+才能复用已缓存的部分。一次请求的前缀由以下部分依次组成：
+    提供商系统提示词（可选的独立 system 消息） + 智能体系统提示词 + 首次回复 + 输入中的静态字段
+静态字段是整本小说生成过程中基本不变的字段（大纲、人物列表、写作要求等，优先级 < STATIC_PRIORITY_LIMIT），
+其余字段（全局设定、前文记忆、故事线、上文等）为动态字段，排在静态字段之后。
+
+规划器对每个（小说, 智能体）冻结一份静态前缀布局：
+- 布局：静态字段按首次出现的顺序固定，之后新出现的静态字段追加在静态段末尾，不插入已有字段之间；
+  动态字段按优先级排在后面
+- 易变字段：内容变化过或缺失过（空字段被跳过）的静态字段（如在详细大纲与基础大纲之间切换的"大纲"）
+  移到静态段末尾，其后不再有稳定字段，变化时只失效它自己之后的部分
+- 指纹：对前缀各组成部分分别取哈希，前缀变化时指出是哪一部分导致失效（提供商系统提示词、
+  智能体提示词、某个静态字段的内容、静态字段缺失）
+- 统计：把指纹与提供商返回的 prompt_cache_hit_tokens / cached_tokens 关联，
+  分别统计前缀未变（预热）和前缀刚变化（冷启动）的请求的命中率
+
+模式 prefix_cache_mode：
+    off   保持原有行为（输入按调用方给出的顺序拼接，_reorder_inputs_for_cache 使用规划器引入前的优先级）
+    warn  按优先级排序并在前缀失效时提示
+    fix   冻结静态字段布局（默认），并在前缀失效时提示
+"""
+
+import hashlib
+import json
+import threading
+
+
+PREFIX_CACHE_MODES = ("off", "warn", "fix")
+STATIC_PRIORITY_LIMIT = 30
+UNKNOWN_FIELD_PRIORITY = 100
+
+# 字段优先级（数字越小越靠前）
+FIELD_PRIORITY = {
+    # === 固定字段（整个小说生成过程中不变） ===
+    "小说大纲": 10,
+    "大纲": 11,
+    "基础大纲": 12,
+    "详细大纲": 13,
+    "人物列表": 14,
+    "用户想法": 15,
+    "写作要求": 16,
+    "润色想法": 17,
+    "用户要求": 18,
+    # === 缓慢变化字段（多章才变一次） ===
+    "伏笔设定": 30,
+    "全局设定": 31,
+    "当前全局设定": 31,
+    "风格参考": 32,
+    "是否最终章": 33,
+    "全书梗概": 34,
+    "前卷梗概": 35,
+    # === 结构/上下文字段（每章变化但可能部分重叠） ===
+    "前五章总结": 40,
+    "最近章节总结": 41,
+    "前2章故事线": 42,
+    "后2章故事线": 43,
+    "前三章正文（不含上一章）": 44,
+    "相关前文片段": 46,
+    "后五章梗概（仅供参考，不可写入本章）": 45,
+    # === 动态字段（每章/每段都变化） ===
+    "前文记忆": 60,
+    "临时设定": 61,
+    "计划": 62,
+    "当前章节": 63,
+    "当前章节号": 63,
+    "本章故事线": 64,
+    "故事线": 65,
+    "本章分段（参考）": 66,
+    "当前分段": 67,
+    "前章过渡提示": 68,
+    "上一章原文": 70,
+    "上文内容": 71,
+    "上文结尾": 72,
+    "要润色的内容": 80,
+    "要润色的结尾内容": 81,
+    "要润色的开头内容": 82,
+    "本章正文": 80,
+}
+
+# 规划器引入前的优先级（off 模式沿用）："当前全局设定"每章都会改写，原先排在大纲之前
+LEGACY_FIELD_PRIORITY = {
+    "当前全局设定": 10,
+}
+
+
+def field_priority(key: str, legacy: bool = False) -> int:
+    if legacy and key in LEGACY_FIELD_PRIORITY:
+        return LEGACY_FIELD_PRIORITY[key]
+    return FIELD_PRIORITY.get(key, UNKNOWN_FIELD_PRIORITY)
+
+
+def is_static_field(key: str) -> bool:
+    return field_priority(key) < STATIC_PRIORITY_LIMIT
+
+
+def order_by_priority(inputs: dict, mode: str = "fix") -> dict:
+    """按字段优先级重排（稳定排序，未知字段放到最后，不删除任何字段；off 模式使用原有优先级）"""
+    legacy = mode not in ("warn", "fix")
+    return dict(sorted(inputs.items(), key=lambda item: field_priority(item[0], legacy)))
+
+
+def render_inputs(items) -> str:
+    """把 (键, 值) 序列拼接为智能体输入（跳过空字段）"""
+    return "".join(f"# {k}\n{v}\n\n" for k, v in items if isinstance(v, str) and v)
+
+
+def _digest(value) -> str:
+    payload = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class _AgentPrefix:
+    """单个智能体的冻结布局、当前前缀指纹和命中统计"""
+
+    def __init__(self):
+        self.static_order = []       # 冻结的静态字段顺序
+        self.volatile = []           # 变化过或缺失过的静态字段（排在静态段末尾）
+        self.static_values = {}      # 各静态字段上次的内容哈希
+        self.parts = None            # 上次请求的前缀组成部分哈希
+        self.fingerprint = None
+        self.invalidations = 0
+        self.requests = 0
+        self.warm_requests = 0
+        self.reported = 0            # 提供商返回了缓存字段的请求数
+        self.prompt_tokens = 0
+        self.hit_tokens = 0
+        self.warm_prompt_tokens = 0
+        self.warm_hit_tokens = 0
+        self.prefix_chars = 0
+
+
+class PrefixCachePlanner:
+    """前缀缓存规划器（线程安全，每个 AIGN 实例一份）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents = {}
+        self._warned = set()
+
+    def reset(self):
+        """清空冻结布局与统计（切换小说时调用）"""
+        with self._lock:
+            self._agents.clear()
+            self._warned.clear()
+
+    def _state(self, agent_name: str) -> _AgentPrefix:
+        state = self._agents.get(agent_name)
+        if state is None:
+            state = self._agents[agent_name] = _AgentPrefix()
+        return state
+
+    def plan(self, agent_name: str, inputs: dict, mode: str = "fix") -> tuple:
+        """
+        按模式排布智能体输入
+
+        Returns:
+            tuple: (输入文本, 静态字段列表[(键, 值)])；off 模式下静态字段列表为空
+        """
+        items = [(k, v) for k, v in inputs.items() if isinstance(v, str) and v]
+        if mode not in ("warn", "fix"):
+            return render_inputs(items), []
+
+        ordered = sorted(items, key=lambda item: field_priority(item[0]))
+        static = [item for item in ordered if is_static_field(item[0])]
+        dynamic = [item for item in ordered if not is_static_field(item[0])]
+        if mode == "fix":
+            with self._lock:
+                state = self._state(agent_name)
+                current = {key: _digest(value) for key, value in static}
+                for key, digest in state.static_values.items():
+                    if current.get(key) != digest and key not in state.volatile:
+                        state.volatile.append(key)
+                state.static_values.update(current)
+                for key, _ in static:
+                    if key not in state.static_order:
+                        state.static_order.append(key)
+                layout = [key for key in state.static_order if key not in state.volatile] + state.volatile
+                position = {key: i for i, key in enumerate(layout)}
+            static.sort(key=lambda item: position[item[0]])
+        return render_inputs(static + dynamic), static
+
+    def observe(self, agent_name: str, provider_system_prompt: str, history: list, static_fields: list) -> dict:
+        """
+        计算本次请求的前缀指纹，与上次比较
+
+        Args:
+            agent_name: 智能体名称
+            provider_system_prompt: 提供商层面的系统提示词（无则为空）
+            history: 智能体历史消息（系统提示词与首次回复）
+            static_fields: plan() 返回的静态字段
+
+        Returns:
+            dict: {"fingerprint", "warm", "reasons", "prefix_chars"}
+        """
+        parts = {"提供商系统提示词": _digest(provider_system_prompt or "")}
+        parts["智能体提示词"] = _digest([(m.get("role"), m.get("content")) for m in history])
+        for key, value in static_fields:
+            parts[f"字段 {key}"] = _digest(value)
+        fingerprint = _digest(list(parts.items()))
+        prefix_chars = (len(provider_system_prompt or "") + sum(len(m.get("content") or "") for m in history)
+                        + len(render_inputs(static_fields)))
+
+        with self._lock:
+            state = self._state(agent_name)
+            previous = state.parts
+            warm = state.fingerprint == fingerprint
+            reasons = []
+            if previous is not None and not warm:
+                reasons = [name for name, digest in parts.items() if previous.get(name) != digest]
+                reasons += [f"{name}（缺失）" for name in previous if name not in parts]
+                state.invalidations += 1
+            state.parts = parts
+            state.fingerprint = fingerprint
+            state.prefix_chars = prefix_chars
+            warn_key = (agent_name, tuple(reasons))
+            should_warn = bool(reasons) and warn_key not in self._warned
+            if should_warn:
+                self._warned.add(warn_key)
+
+        if should_warn:
+            print(f"⚠️ [{agent_name}] 提示词前缀变化，提供商缓存将失效: {', '.join(reasons)}")
+        return {"fingerprint": fingerprint, "warm": warm, "reasons": reasons, "prefix_chars": prefix_chars}
+
+    def record_usage(self, agent_name: str, warm: bool, resp: dict):
+        """记录提供商返回的前缀缓存命中信息"""
+        prompt_tokens = resp.get("prompt_tokens") or 0
+        hit = resp.get("prompt_cache_hit_tokens")
+        if hit is None:
+            hit = resp.get("cached_tokens")
+        with self._lock:
+            state = self._state(agent_name)
+            state.requests += 1
+            state.warm_requests += int(warm)
+            if hit is None or not prompt_tokens:
+                return
+            state.reported += 1
+            state.prompt_tokens += prompt_tokens
+            state.hit_tokens += hit
+            if warm:
+                state.warm_prompt_tokens += prompt_tokens
+                state.warm_hit_tokens += hit
+
+    def stats(self) -> dict:
+        """各智能体的请求数、失效次数和命中率"""
+        with self._lock:
+            result = {}
+            for name, state in self._agents.items():
+                if not state.requests:
+                    continue
+                result[name] = {
+                    "requests": state.requests,
+                    "warm_requests": state.warm_requests,
+                    "invalidations": state.invalidations,
+                    "prefix_chars": state.prefix_chars,
+                    "reported": state.reported,
+                    "prompt_tokens": state.prompt_tokens,
+                    "hit_tokens": state.hit_tokens,
+                    "hit_rate": state.hit_tokens / state.prompt_tokens if state.prompt_tokens else 0.0,
+                    "warm_hit_rate": (state.warm_hit_tokens / state.warm_prompt_tokens
+                                      if state.warm_prompt_tokens else 0.0),
+                }
+            return result
+
+    def totals(self) -> dict:
+        """所有智能体合计"""
+        stats = self.stats().values()
+        prompt_tokens = sum(s["prompt_tokens"] for s in stats)
+        hit_tokens = sum(s["hit_tokens"] for s in stats)
+        return {
+            "requests": sum(s["requests"] for s in stats),
+            "warm_requests": sum(s["warm_requests"] for s in stats),
+            "invalidations": sum(s["invalidations"] for s in stats),
+            "reported": sum(s["reported"] for s in stats),
+            "prompt_tokens": prompt_tokens,
+            "hit_tokens": hit_tokens,
+            "hit_rate": hit_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
@@ -0,0 +1,159 @@
+"""
+流式重复循环检测 - 在流式输出过程中增量检测 LLM 陷入重复，确认后提前断开连接
+
+MarkdownAgent.detect_repetition_loop 在整段响应接收完之后才检测，模型陷入循环时要先付完
+最多 max_tokens 个 token 的费用和几分钟的等待。StreamingRepetitionDetector 接在流式循环上，
+使用与之相同的阈值（本模块的常量由两者共用）：
+- 策略1：末尾 800 字内某个 2/3/4 字短语（非纯标点）的出现次数达到密度阈值
+- 策略2：末尾某个 6/8/10/15 字片段首尾相接连续重复 5 次
+
+增量实现，每次检查只看上次检查以来新增的内容，开销与已输出的长度无关：
+- n 字短语：只有终点落在新增内容中的短语出现次数会增加；短语出现 k 次时其中每个字至少出现 k 次，
+  先用 str.count 筛出末尾区域的高频字，只对由高频字组成的短语统计出现次数（正常正文中很少）
+- 片段循环：末尾有 k 个周期为 p 的首尾相接的相同片段 ⇔ 末尾 (k-1)·p 字与其前移 p 字的切片相等，
+  每个周期一次切片比较
+每累计 CHECK_INTERVAL_CHARS 个新字符在数据块结束时检查一次，判定与整段检测在同一文本上的结果一致。
+
+首次满足阈值后再接收 CONFIRM_CHARS 个字符，条件仍成立才确认，避免分隔线、拟声词等短暂重复被误判。
+确认后给出与 detect_repetition_loop 相同格式的结果（含 clean_end_pos），由调用方断开连接并交给重试逻辑。
+"""
+
+import re
+
+
+TAIL_SIZE = 800                 # 检测的末尾区域长度
+MIN_TEXT_LENGTH = 200           # 短于此长度的文本不检测
+# n 字短语: (在末尾区域中的密度阈值, 最少出现次数)
+NGRAM_DENSITY_THRESHOLDS = {2: (0.10, 50), 3: (0.08, 40), 4: (0.06, 30)}
+SEGMENT_LENGTHS = (6, 8, 10, 15)
+MIN_SEGMENT_REPEATS = 5
+# 只由这些字符组成的短语不计数
+REPETITION_PUNCTUATION = ' \n\r\t，。！？、；：""【】（）'
+CONFIRM_CHARS = 200
+CHECK_INTERVAL_CHARS = 64       # 每累计这么多新字符检查一次（远小于确认窗口，不影响断开时机）
+
+def ngram_count_threshold(ngram_len: int, tail_length: int) -> int:
+    """末尾区域长度为 tail_length 时，n 字短语判定为重复所需的出现次数"""
+    pct_threshold, min_count = NGRAM_DENSITY_THRESHOLDS[ngram_len]
+    return max(min_count, int((tail_length - ngram_len + 1) * pct_threshold))
+
+
+def _overlapping_count(text: str, gram: str) -> int:
+    """gram 在 text 中的出现次数（允许重叠，与逐位置统计一致）"""
+    return len(re.findall(f"(?={re.escape(gram)})", text))
+
+
+class StreamingRepetitionDetector:
+    """增量重复循环检测器（每个流式请求一个实例）"""
+
+    def __init__(self, find_repetition_start=None):
+        """
+        Args:
+            find_repetition_start: (text, ngram) -> int，确认短语重复时计算 clean_end_pos，
+                                   通常为 MarkdownAgent._find_repetition_start；为空时使用重复被发现的位置
+        """
+        self._find_repetition_start = find_repetition_start
+        self._parts = []
+        self.length = 0
+        self._window = ""           # 末尾 TAIL_SIZE 字
+        self._scan_all = True       # 下次检查时扫描整个末尾区域（刚达到最小长度、候选未确认）
+        self._checked_length = 0
+        self._pending = None
+        self.result = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, text: str):
+        """输入正文增量；确认重复后返回检测结果（之后不再处理输入），否则返回 None"""
+        if self.result is not None or not text:
+            return self.result
+        self._parts.append(text)
+        self.length += len(text)
+        self._window = (self._window + text)[-TAIL_SIZE:]
+        if self.length < MIN_TEXT_LENGTH:
+            return None
+
+        unchecked = self.length - self._checked_length
+        if self._pending is None and (unchecked >= CHECK_INTERVAL_CHARS or self._scan_all):
+            tail = self._window
+            new_from = 0 if self._scan_all else max(0, len(tail) - unchecked)
+            self._scan_all = False
+            self._checked_length = self.length
+            self._pending = self._find_candidate(tail, new_from)
+        if self._pending and self.length - self._pending["at"] >= CONFIRM_CHARS:
+            if self._still_holds(self._pending):
+                self.result = self._confirm(self._pending)
+                return self.result
+            self._pending = None
+            self._scan_all = True
+        return None
+
+    def _find_candidate(self, tail: str, new_from: int):
+        """检查终点位于 tail[new_from:] 的短语和末尾片段，返回待确认的候选
+
+        窗口中其余短语的出现次数只会减少（阈值随末尾区域变长只增不减），不可能新达到阈值。
+        短语出现 k 次时其中每个字至少出现 k 次：先用 str.count 筛出高频字，只统计由高频字组成的短语。
+        """
+        thresholds = {n: ngram_count_threshold(n, len(tail)) for n in NGRAM_DENSITY_THRESHOLDS}
+        longest = max(thresholds)
+        min_threshold = min(thresholds.values())
+        region_from = max(0, new_from - longest + 1)
+        char_counts = {char: tail.count(char) for char in set(tail[region_from:])}
+        hot_run = 0                 # 以当前位置结尾的连续高频字个数
+        checked = set()
+        for end in range(region_from, len(tail)):
+            hot_run = hot_run + 1 if char_counts[tail[end]] >= min_threshold else 0
+            if end < new_from or hot_run < 2:
+                continue
+            for n in range(2, min(hot_run, longest) + 1):
+                gram = tail[end - n + 1:end + 1]
+                threshold = thresholds[n]
+                if gram in checked or min(char_counts[char] for char in gram) < threshold:
+                    continue
+                checked.add(gram)
+                if gram.strip(REPETITION_PUNCTUATION) and _overlapping_count(tail, gram) >= threshold:
+                    return {"kind": "ngram", "gram": gram, "at": self.length}
+        for period in SEGMENT_LENGTHS:
+            if self._segment_repeats(period):
+                return {"kind": "segment", "period": period, "at": self.length}
+        return None
+
+    def _segment_repeats(self, period: int) -> bool:
+        """末尾 period 字的片段是否首尾相接重复了 MIN_SEGMENT_REPEATS 次（一次切片比较）"""
+        span = (MIN_SEGMENT_REPEATS - 1) * period
+        tail = self._window
+        return len(tail) >= span + period and tail[-span:] == tail[-span - period:-period]
+
+    def _still_holds(self, pending: dict) -> bool:
+        if pending["kind"] == "ngram":
+            tail = self._window
+            gram = pending["gram"]
+            return _overlapping_count(tail, gram) >= ngram_count_threshold(len(gram), len(tail))
+        return self._segment_repeats(pending["period"])
+
+    def _confirm(self, pending: dict) -> dict:
+        tail = self._window
+        if pending["kind"] == "ngram":
+            gram = pending["gram"]
+            count = _overlapping_count(tail, gram)
+            threshold = ngram_count_threshold(len(gram), len(tail))
+            clean_pos = self._find_repetition_start(self.text, gram) if self._find_repetition_start else pending["at"]
+            detail = f"短语'{gram}'在末尾重复了{count}次(阈值{threshold})"
+        else:
+            period = pending["period"]
+            candidate = tail[-period:]
+            repeats = 0
+            check_pos = len(tail) - period
+            while check_pos >= 0 and tail[check_pos:check_pos + period] == candidate:
+                repeats += 1
+                check_pos -= period
+            clean_pos = self.length - repeats * period
+            detail = f"片段'{candidate[:20]}...'连续重复了{repeats}次"
+        return {
+            "is_repetitive": True,
+            "detail": f"{detail}，流式输出第{self.length}字时确认",
+            "clean_end_pos": max(0, clean_pos),
+            "aborted_at": self.length,
+        }
@@ -0,0 +1,199 @@
+"""
+LLM 响应缓存 - MarkdownAgent._do_query 层面的内容寻址缓存（默认关闭）
+
+_execute_with_retry 因后处理失败重跑段落生成、从 .novel_save 中途恢复、用相同输入重新生成
+大纲/标题时，已经付费的响应会被丢弃后重新请求。开启缓存后：
+- 键 = sha256(提供商, 模型, base_url, 提供商系统提示词, 完整消息列表, temperature, top_p, max_tokens)
+- 存储 = 单个 SQLite 文件，响应 JSON 经 zlib 压缩；总大小超过上限时按最近使用时间淘汰
+- 模式 llm_cache_mode：
+    off        不使用（默认）
+    session    只复用同一生成会话（AIGN.llm_cache_session，随存档保存/恢复）写入的条目
+    persistent 复用任意会话写入的条目
+- 流式调用命中时，用 replay_stream() 把缓存内容回放为快速的增量事件流，
+  调用方的流式跟踪、完整性检查、WebUI 更新逻辑不变
+- 响应未通过 Token 上限/重复检测/格式解析时，调用方应 discard()，避免重试时再次命中同一响应
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from providers.stream_protocol import delta_event, final_event
+
+
+CACHE_MODES = ("off", "session", "persistent")
+DEFAULT_CACHE_PATH = os.path.join("output", "llm_cache", "responses.sqlite3")
+DEFAULT_MAX_MB = 512
+EVICT_TARGET_RATIO = 0.9        # 淘汰到上限的 90%，避免每次写入都触发淘汰
+REPLAY_CHUNKS = 32              # 回放时每段文本最多拆成的块数
+REPLAY_MIN_CHUNK_CHARS = 16
+
+# 未关联 AIGN 实例的智能体使用进程级会话
+PROCESS_SESSION = uuid.uuid4().hex
+
+
+def new_session_id() -> str:
+    """生成新的缓存会话 ID"""
+    return uuid.uuid4().hex
+
+
+def make_cache_key(provider: str, model: str, messages: list, temperature, top_p, max_tokens,
+                   base_url: str = "", system_prompt: str = "") -> str:
+    """按请求内容计算缓存键（base_url 与提供商配置的系统提示词变化时不复用旧响应）"""
+    payload = json.dumps(
+        [provider or "", model or "", base_url or "", system_prompt or "", messages, temperature, top_p, max_tokens],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def replay_stream(resp: dict):
+    """把缓存的响应回放为增量事件流（思考内容在前、正文在后，最后一个汇总事件）"""
+    for text, is_reasoning in ((resp.get("reasoning_content") or "", True), (resp.get("content") or "", False)):
+        if not text:
+            continue
+        step = max(REPLAY_MIN_CHUNK_CHARS, -(-len(text) // REPLAY_CHUNKS))
+        for start in range(0, len(text), step):
+            piece = text[start:start + step]
+            yield delta_event(reasoning_content=piece) if is_reasoning else delta_event(piece)
+    extra = {k: v for k, v in resp.items() if k not in ("type", "content", "reasoning_content", "total_tokens")}
+    yield final_event(resp.get("total_tokens"), **extra)
+
+
+class ResponseCache:
+    """LLM 响应的磁盘缓存（SQLite + zlib，线程安全）"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        """
+        Args:
+            path: SQLite 文件路径
+            max_bytes: 压缩后响应的总大小上限
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, session TEXT, payload BLOB, size INTEGER,"
+            " created REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "discards": 0}
+
+    def get(self, key: str, session: str = None):
+        """
+        查找缓存的响应
+
+        Args:
+            key: 缓存键
+            session: 非 None 时只返回该会话写入的条目
+
+        Returns:
+            dict: 响应字典，未命中返回 None
+        """
+        with self._lock:
+            if session is None:
+                row = self._conn.execute("SELECT payload FROM responses WHERE key = ?", (key,)).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT payload FROM responses WHERE key = ? AND session = ?", (key, session)
+                ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.stats["hits"] += 1
+        try:
+            return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+        except (zlib.error, ValueError) as e:
+            print(f"⚠️ 响应缓存条目损坏，已删除: {e}")
+            self.discard(key)
+            return None
+
+    def put(self, key: str, resp: dict, session: str):
+        """写入响应（覆盖同键条目），超过大小上限时淘汰最久未使用的条目"""
+        payload = zlib.compress(json.dumps(resp, ensure_ascii=False, default=str).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, session, payload, size, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, session, payload, len(payload), now, now),
+            )
+            self._total_bytes += len(payload) - (old[0] if old else 0)
+            self.stats["stores"] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+
+    def _evict_locked(self):
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+
+    def discard(self, key: str):
+        """删除条目（响应未通过调用方的检查时使用）"""
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= row[0]
+            self.stats["discards"] += 1
+
+    def clear(self):
+        """删除全部条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(path: str = DEFAULT_CACHE_PATH, max_bytes: int = None) -> ResponseCache:
+    """获取共享的响应缓存（按文件路径复用连接），max_bytes 非 None 时更新大小上限"""
+    key = os.path.abspath(path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResponseCache(path, max_bytes or DEFAULT_MAX_MB * 1024 * 1024)
+            _caches[key] = cache
+        elif max_bytes:
+            cache.max_bytes = max_bytes
+        return cache
+
+
+def reset_response_caches():
+    """关闭所有共享响应缓存"""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
@@ -82,6 +82,8 @@ def Retryer(func=None, max_retries=3):
     
     当使用 LM Studio 时，连续失败 max_retries 次后会自动卸载模型以清空 KV Cache，
     然后再进行一轮额外重试。
+    流式输出中途失败的结果带有 partial_content（已生成的有效前缀）时，下一次尝试以
+    resume_from=partial_content 调用，只续写缺失的部分（断点续写，见 core.agents.continuation）。
     
     Args:
         func: 要装饰的函数
@@ -115,6 +117,10 @@ def Retryer(func=None, max_retries=3):
                     
                     if should_retry:
                         print(f"🔄 第{attempt + 1}次尝试失败，检测到流式输出问题: {content[:100]}...")
+                        # 流式输出中途失败时保留已生成的有效前缀，下一次尝试只续写缺失的部分
+                        if result.get('partial_content'):
+                            kwargs['resume_from'] = result['partial_content']
+                            print(f"🧩 保留已生成的{len(result['partial_content'])}字，下一次尝试从断点续写")
                         if attempt < max_retries - 1:  # 不是最后一次尝试
                             print(f"⏳ 等待重试... ({attempt + 1}/{max_retries})")
                             time.sleep(2.333)
@@ -0,0 +1,291 @@
+"""
+流式卡顿检测与对冲请求 - 流式响应卡住时发出重复请求，保留先完成的一个
+
+原流式循环阻塞在 ``for chunk in resp`` 上：连接不断但不再出数据时，只能等到客户端超时
+（deepseekChatLLM 为 30 分钟），之后 Retryer 固定等待 2.333 秒从头重试，期间停止按钮也不生效。
+HedgedStream 包装提供商的生成器，由后台线程拉取数据块，调用方按固定间隔轮询：
+- 卡顿：首个数据块之后超过 stall_timeout 秒没有新的数据块（含思维链），或首个数据块之后
+  最近 RATE_WINDOW_SECONDS 秒的输出速度低于 min_tokens_per_second
+- 首个数据块：发出请求后超过 ttft_timeout 秒仍没有任何数据块（长提示词的预填充可能很慢，单独设置上限）
+- 对冲：卡顿时向同一提供商（或配置的备用提供商）发出一次相同的请求，两个流同时进行，
+  先完成的一个胜出，另一个被取消；对冲请求胜出时先发出重置事件（stream_protocol.STREAM_RESET），
+  调用方丢弃原请求已输出的内容
+- 不对冲（hedge_provider = "off"）或对冲之后两个流都没有进展：抛出 TimeoutError，交给原有的重试逻辑
+- 等待期间检查停止标志，停止时取消所有流并抛出 InterruptedError
+
+对冲开始后两个流的数据块先缓存，分出胜负后再输出胜出者的内容。
+后台线程阻塞在网络读取上时无法立即结束，取消后在收到下一个数据块（或连接超时）时关闭生成器。
+每个提供商的卡顿、对冲、胜负次数与最长数据块间隔记录在 get_stall_stats() 中，用于调整阈值。
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+from core.agents.token_estimator import estimate_tokens
+from providers.stream_protocol import STREAM_DELTA, reset_event
+
+
+HEDGE_MODES = ("off", "same")   # 另可填写备用提供商名称
+POLL_SECONDS = 0.5              # 轮询停止标志与卡顿条件的间隔
+RATE_WINDOW_SECONDS = 30        # 输出速度的统计窗口
+
+_CHUNK, _END, _ERROR = "chunk", "end", "error"
+
+
+class _StreamPump(threading.Thread):
+    """在后台线程中拉取一个流式生成器，把数据块放入共享队列"""
+
+    def __init__(self, label: str, stream, events: queue.Queue):
+        super().__init__(name=f"stream-pump-{label}", daemon=True)
+        self.label = label
+        self.stream = stream
+        self.events = events
+        self.cancelled = threading.Event()
+        self.chunks = []            # 对冲开始后缓存的数据块
+        self.started = time.time()
+        self.last_chunk = None      # 收到首个数据块之前为 None，卡顿计时从首个数据块开始
+
+    def run(self):
+        try:
+            for chunk in self.stream:
+                if self.cancelled.is_set():
+                    break
+                self.events.put((self.label, _CHUNK, chunk))
+            else:
+                self.events.put((self.label, _END, None))
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.events.put((self.label, _ERROR, e))
+        finally:
+            if self.cancelled.is_set():
+                close = getattr(self.stream, "close", None)
+                if callable(close):
+                    try:
+                        close()
+                    except Exception:
+                        pass
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class HedgedStream:
+    """带卡顿检测与对冲请求的流式响应（可迭代，产出与提供商相同的数据块）"""
+
+    def __init__(self, stream, start_hedge, provider: str, stall_timeout: float,
+                 min_tokens_per_second: float = 0, hedge_provider: str = "same", should_stop=None, label: str = "",
+                 ttft_timeout: float = 0):
+        """
+        Args:
+            stream: 提供商返回的流式生成器
+            start_hedge: 无参函数，发出对冲请求并返回新的流式生成器；为空时不对冲
+            provider: 原请求的提供商（统计用）
+            stall_timeout: 首个数据块之后多少秒没有新数据块视为卡顿，<=0 表示不检测
+            min_tokens_per_second: 输出速度下限，<=0 表示不检测
+            hedge_provider: 对冲请求的提供商（统计与日志用）
+            should_stop: 无参函数，返回 True 时中断
+            label: 日志前缀（智能体名）
+            ttft_timeout: 发出请求后多少秒没有首个数据块视为卡顿，<=0 表示不检测
+        """
+        self._start_hedge = start_hedge
+        self.provider = provider
+        self.hedge_provider = hedge_provider if start_hedge else "off"
+        self.stall_timeout = stall_timeout
+        self.ttft_timeout = ttft_timeout
+        self.min_tokens_per_second = min_tokens_per_second
+        self._should_stop = should_stop
+        self._label = label
+        self._events = queue.Queue()
+        self._pumps = {"primary": _StreamPump("primary", stream, self._events)}
+        self.stall_reason = None
+        self.hedged = False
+        self.winner = None
+        self.max_gap = 0.0          # 原请求在对冲前的最长数据块间隔（秒）
+        self._iterator = self._run()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        """取消所有仍在进行的流"""
+        for pump in self._pumps.values():
+            pump.cancel()
+        self._iterator.close()
+
+    def _run(self):
+        primary = self._pumps["primary"]
+        primary.start()
+        started = last_check = time.time()
+        first_chunk = None
+        recent = deque()            # (时间, tokens)，只在对冲前统计原请求
+        failed = set()
+        try:
+            while True:
+                try:
+                    label, kind, payload = self._events.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    label = kind = payload = None
+                now = time.time()
+
+                if kind == _CHUNK:
+                    pump = self._pumps[label]
+                    if not self.hedged:
+                        if pump.last_chunk is not None:
+                            self.max_gap = max(self.max_gap, now - pump.last_chunk)
+                        first_chunk = first_chunk or now
+                        if self.min_tokens_per_second > 0 and isinstance(payload, dict) and payload.get("type") == STREAM_DELTA:
+                            recent.append((now, estimate_tokens(payload.get("delta", "")) +
+                                           estimate_tokens(payload.get("reasoning_delta", ""))))
+                        pump.last_chunk = now
+                        yield payload
+                    else:
+                        pump.last_chunk = now
+                        pump.chunks.append(payload)
+                elif kind == _ERROR:
+                    failed.add(label)
+                    if not self.hedged or len(failed) == len(self._pumps):
+                        raise payload
+                    print(f"⚠️ [{self._label}] {'对冲请求' if label == 'hedge' else '原请求'}失败，等待另一个: {payload}")
+                elif kind == _END:
+                    # 未对冲时原请求正常结束；对冲后先结束的一个胜出
+                    self.winner = label
+                    if self.hedged:
+                        yield from self._finish(label)
+                    return
+
+                if label is not None and now - last_check < POLL_SECONDS:
+                    continue
+                last_check = now
+                if self._should_stop and self._should_stop():
+                    raise InterruptedError("用户停止了生成")
+                if self.hedged:
+                    reasons = [self._check_idle(now, pump) for name, pump in self._pumps.items() if name not in failed]
+                    if all(reasons):
+                        raise TimeoutError(f"流式输出卡顿: 原请求与对冲请求都没有新数据（{'；'.join(reasons)}）")
+                    continue
+                reason = self._check_stall(now, primary, first_chunk, recent)
+                if reason:
+                    if primary.last_chunk is not None:
+                        self.max_gap = max(self.max_gap, now - primary.last_chunk)
+                    self.stall_reason = reason
+                    if self._start_hedge is None:
+                        raise TimeoutError(f"流式输出卡顿: {reason}")
+                    self._launch_hedge(reason, now - started)
+        finally:
+            for pump in self._pumps.values():
+                pump.cancel()
+            _stall_stats.record(self.provider, stalled=self.stall_reason, gap=self.max_gap,
+                                hedge_provider=self.hedge_provider if self.hedged else None,
+                                hedge_won=self.winner == "hedge")
+
+    def _check_idle(self, now: float, pump: _StreamPump):
+        """没有数据块的时间超过阈值时返回原因：首个数据块之前按 ttft_timeout，之后按 stall_timeout"""
+        if pump.last_chunk is None:
+            if self.ttft_timeout > 0 and now - pump.started > self.ttft_timeout:
+                return f"{now - pump.started:.0f}秒没有收到首个数据块"
+        elif self.stall_timeout > 0 and now - pump.last_chunk > self.stall_timeout:
+            return f"{now - pump.last_chunk:.0f}秒没有新数据"
+        return None
+
+    def _check_stall(self, now: float, pump: _StreamPump, first_chunk, recent: deque):
+        idle = self._check_idle(now, pump)
+        if idle:
+            return idle
+        if self.min_tokens_per_second > 0 and first_chunk and now - first_chunk >= RATE_WINDOW_SECONDS:
+            while recent and recent[0][0] < now - RATE_WINDOW_SECONDS:
+                recent.popleft()
+            rate = sum(tokens for _, tokens in recent) / RATE_WINDOW_SECONDS
+            if rate < self.min_tokens_per_second:
+                return f"输出速度 {rate:.1f} tokens/s 低于下限 {self.min_tokens_per_second:g}"
+        return None
+
+    def _launch_hedge(self, reason: str, elapsed: float):
+        print(f"\n🐢 [{self._label}] 流式输出卡顿（{reason}，已等待{elapsed:.0f}秒），"
+              f"向 {self.hedge_provider} 发出对冲请求")
+        self.hedged = True
+        try:
+            hedge_stream = self._start_hedge()
+        except Exception as e:
+            raise TimeoutError(f"流式输出卡顿（{reason}），对冲请求失败: {e}")
+        if not hasattr(hedge_stream, "__next__"):
+            # 非流式结果：当作只有一个数据块的流
+            hedge_stream = iter([hedge_stream])
+        pump = _StreamPump("hedge", hedge_stream, self._events)
+        self._pumps["hedge"] = pump
+        pump.start()
+
+    def _finish(self, winner: str):
+        """对冲后某个流先结束：取消另一个并输出胜出者缓存的数据块"""
+        loser = "hedge" if winner == "primary" else "primary"
+        self._pumps[loser].cancel()
+        print(f"🏁 [{self._label}] {'对冲请求' if winner == 'hedge' else '原请求'}先完成，已取消另一个")
+        if winner == "hedge":
+            yield reset_event()
+        yield from self._pumps[winner].chunks
+
+
+class StallStats:
+    """按提供商统计流式请求的卡顿与对冲情况（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, provider: str, stalled: str = None, gap: float = 0.0, hedge_provider: str = None,
+               hedge_won: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(provider or "unknown", {
+                "requests": 0, "stalls": 0, "slow": 0, "hedges": 0, "hedge_wins": 0, "primary_wins": 0,
+                "max_gap": 0.0, "gaps": deque(maxlen=200),
+            })
+            stats["requests"] += 1
+            stats["max_gap"] = max(stats["max_gap"], gap)
+            stats["gaps"].append(gap)
+            if stalled:
+                stats["slow" if "速度" in stalled else "stalls"] += 1
+            if hedge_provider:
+                stats["hedges"] += 1
+                stats["hedge_wins" if hedge_won else "primary_wins"] += 1
+
+    def get_stats(self) -> dict:
+        """返回 {提供商: 统计}，gap_p95 为最近 200 次请求中最长数据块间隔的 95 分位（秒）"""
+        with self._lock:
+            result = {}
+            for provider, stats in self._stats.items():
+                gaps = sorted(stats["gaps"])
+                entry = {key: value for key, value in stats.items() if key != "gaps"}
+                entry["gap_p95"] = gaps[min(len(gaps) - 1, int(len(gaps) * 0.95))] if gaps else 0.0
+                result[provider] = entry
+            return result
+
+    def get_stats_display(self) -> str:
+        """生成卡顿统计显示文本，没有卡顿时返回空字符串"""
+        stats = self.get_stats()
+        if not any(entry["stalls"] or entry["slow"] for entry in stats.values()):
+            return ""
+        lines = ["", "🐢 流式卡顿与对冲请求:"]
+        for provider, entry in sorted(stats.items()):
+            line = (f"  • {provider}: 请求 {entry['requests']}次，卡顿 {entry['stalls']}次，速度过低 {entry['slow']}次，"
+                    f"最长间隔 {entry['max_gap']:.1f}s（p95 {entry['gap_p95']:.1f}s）")
+            if entry["hedges"]:
+                line += f"，对冲 {entry['hedges']}次（对冲胜出 {entry['hedge_wins']} / 原请求胜出 {entry['primary_wins']}）"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_stall_stats = StallStats()
+
+
+def get_stall_stats() -> StallStats:
+    """获取进程级卡顿统计"""
+    return _stall_stats
+
@@ -0,0 +1,117 @@
+"""
+Token 估算器 - MarkdownAgent.count_tokens 的批量字符分类实现
+
+估算规则与原逐字符循环完全一致（适用于 DeepSeek/Qwen 等中文优化模型）：
+- 中文（U+4E00-U+9FFF、U+3400-U+4DBF）：0.7 token/字
+- ASCII：0.25 token/字符
+- 其他字符：1.0 token/字符
+结果为 max(1, int(总和))，空文本为 0。
+
+实现上不再逐字符循环：
+- ASCII 数量 = len(text.encode("ascii", "ignore"))
+- 中文数量 = UTF-16 高字节落在中文区间的码元数（bytes.translate 删除其余字节后取长度）
+各类字符数可加，拼接文本的估算等于各部分计数之和再加分隔符，
+因此大纲、人物列表、系统提示词等稳定字段的计数按内容缓存，一次请求只需统计动态部分。
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+
+# UTF-16 高字节：0x4E-0x9F 对应 U+4E00-U+9FFF，0x34-0x4D 对应 U+3400-U+4DFF
+_CJK_HIGH_BYTES = bytes(list(range(0x34, 0x4E)) + list(range(0x4E, 0xA0)))
+_NON_CJK_HIGH_BYTES = bytes(b for b in range(256) if b not in _CJK_HIGH_BYTES)
+# U+4DC0-U+4DFF（易经卦象符号）与扩展A共享高字节 0x4D，但不计为中文
+_YIJING_RE = re.compile('[\u4dc0-\u4dff]')
+
+CACHE_MIN_CHARS = 512          # 短于此长度的文本直接统计，不进缓存
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_CHARS = 16_000_000   # 缓存键（文本本身）总字符数上限
+
+_cache = OrderedDict()
+_cache_chars = 0
+_cache_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def _classify(text: str) -> tuple:
+    """统计 (中文数, ASCII数, 其他字符数)"""
+    length = len(text)
+    if text.isascii():
+        return 0, length, 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    high_bytes = text.encode("utf-16-be", "surrogatepass")[0::2]
+    chinese_chars = len(high_bytes.translate(None, _NON_CJK_HIGH_BYTES))
+    if b"\x4d" in high_bytes:
+        chinese_chars -= len(_YIJING_RE.findall(text))
+    # 非BMP字符在 UTF-16 中占两个码元（代理对，高字节 0xD8-0xDF），只计入"其他"
+    return chinese_chars, ascii_chars, length - chinese_chars - ascii_chars
+
+
+def count_char_classes(text: str) -> tuple:
+    """统计文本的 (中文数, ASCII数, 其他字符数)，长文本按内容缓存"""
+    global _cache_chars
+    if not text:
+        return 0, 0, 0
+    if len(text) < CACHE_MIN_CHARS:
+        return _classify(text)
+
+    with _cache_lock:
+        counts = _cache.get(text)
+        if counts is not None:
+            _cache.move_to_end(text)
+            cache_stats["hits"] += 1
+            return counts
+
+    counts = _classify(text)
+    with _cache_lock:
+        cache_stats["misses"] += 1
+        if text not in _cache:
+            _cache[text] = counts
+            _cache_chars += len(text)
+            while _cache and (len(_cache) > CACHE_MAX_ENTRIES or _cache_chars > CACHE_MAX_CHARS):
+                evicted, _ = _cache.popitem(last=False)
+                _cache_chars -= len(evicted)
+    return counts
+
+
+def tokens_from_counts(chinese_chars: int, ascii_chars: int, other_chars: int) -> int:
+    """按字符类别计数估算 token 数（与原公式逐项相同，保证浮点结果一致）"""
+    if not (chinese_chars or ascii_chars or other_chars):
+        return 0
+    tokens = chinese_chars * 0.7 + ascii_chars * 0.25 + other_chars * 1.0
+    return max(1, int(tokens))
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数量"""
+    if not text:
+        return 0
+    return tokens_from_counts(*count_char_classes(text))
+
+
+def estimate_joined_tokens(texts, separator: str = "\n") -> int:
+    """估算 separator.join(texts) 的 token 数量，不实际拼接"""
+    texts = list(texts)
+    chinese_chars = ascii_chars = other_chars = 0
+    for text in texts:
+        c, a, o = count_char_classes(text)
+        chinese_chars += c
+        ascii_chars += a
+        other_chars += o
+    if len(texts) > 1 and separator:
+        c, a, o = count_char_classes(separator)
+        joins = len(texts) - 1
+        chinese_chars += c * joins
+        ascii_chars += a * joins
+        other_chars += o * joins
+    return tokens_from_counts(chinese_chars, ascii_chars, other_chars)
+
+
+def clear_cache():
+    """清空计数缓存"""
+    global _cache_chars
+    with _cache_lock:
+        _cache.clear()
+        _cache_chars = 0
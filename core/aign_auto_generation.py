@@ -76,6 +76,7 @@ class AutoGenerationMixin:
                 # 启用API时间和费用统计系统
                 print("⏱️ 启用API时间和费用统计...")
                 self.start_api_time_tracking()
+                self.start_trace_session()
                 print("✅ 时间统计已启用")
                 
                 # 启用SiliconFlow缓存统计系统
@@ -143,7 +144,8 @@ class AutoGenerationMixin:
                     try:
                         # 在生成前从WebUI刷新最新的写作/润色要求
                         self._refresh_webui_settings()
-                        self.genBeginning(self.user_requirements, self.embellishment_idea)
+                        with self.tracer.span("chapter", chapter=1, beginning=True):
+                            self.genBeginning(self.user_requirements, self.embellishment_idea)
                         print("✅ 开头生成完成")
                     except Exception as e:
                         print(f"❌ 生成开头失败: {e}")
@@ -165,11 +167,8 @@ class AutoGenerationMixin:
                     progress_msg = f"📊 进度: {self.chapter_count}/{self.target_chapter_count} ({progress:.1f}%)"
                     
                     if self.chapter_count > 0:
-                        # 如果已经生成了章节，显示时间预估
-                        avg_time_per_chapter = elapsed_time / self.chapter_count
-                        remaining_chapters = self.target_chapter_count - self.chapter_count
-                        estimated_remaining_time = avg_time_per_chapter * remaining_chapters
-                        time_msg = f"⏱️  预计剩余时间: {self.format_time_duration(estimated_remaining_time)}"
+                        # 如果已经生成了章节，按各阶段每章耗时分布预估剩余时间
+                        time_msg = f"⏱️  预计剩余时间: {self.get_remaining_time_display(elapsed_time)}"
                     else:
                         # 第一章生成时，显示已用时间
                         time_msg = f"⏱️  已用时间: {self.format_time_duration(elapsed_time)}"
@@ -192,6 +191,7 @@ class AutoGenerationMixin:
 
                         # 在生成前从WebUI刷新最新的写作/润色要求
                         self._refresh_webui_settings()
+                        chapter_span = self.tracer.start_span("chapter", chapter=next_chapter_num)
                         self.genNextParagraph(self.user_requirements, self.embellishment_idea)
                         chapter_time = time.time() - chapter_start_time
                         success_msg = f"✅ 第{self.chapter_count}章生成完成，耗时: {self.format_time_duration(chapter_time, include_seconds=True)}"
@@ -209,6 +209,7 @@ class AutoGenerationMixin:
 
                         # 同步生成结果到WebUI
                         self._sync_to_webui(success_msg)
+                        self.tracer.end_span(chapter_span)
 
                         # LM Studio 定期重载模型以清空 KV Cache
                         try:
@@ -237,6 +238,10 @@ class AutoGenerationMixin:
                     except Exception as e:
                         error_msg = f"❌ 生成第{next_chapter_num}章时出错: {e}"
                         print(error_msg)
+                        current_span = self.tracer.current_span()
+                        if current_span is not None and current_span.name == "chapter":
+                            current_span.set(error=str(e)[:200])
+                            self.tracer.end_span(current_span)
                         
                         # 🔧 关键修复：检查 chapter_count 是否被提前递增但内容未提交
                         # genBeginning 将开头作为第1章（chapter_count=1），所以 paragraph_list 长度应 == chapter_count
@@ -266,6 +271,34 @@ class AutoGenerationMixin:
                         self.auto_generation_running = False
                         break
                 
+                # 丢弃未使用的流水线预起草草稿
+                self.discard_speculative_draft()
+                pipeline_summary = self.get_pipeline_stats_display()
+                if pipeline_summary:
+                    print(pipeline_summary)
+                chunk_summary = self.get_embellish_chunk_stats_display()
+                if chunk_summary:
+                    print(chunk_summary)
+                
+                # 合并仍在后台运行的章节记账任务，并刷新存档
+                try:
+                    if self.flush_post_commit_tasks():
+                        self.save_novel_progress()
+                except Exception as e:
+                    print(f"⚠️ 合并章节后处理结果失败: {e}")
+                digest_summary = self.get_chapter_digest_stats_display()
+                if digest_summary:
+                    print(digest_summary)
+                recall_summary = self.get_story_recall_stats_display()
+                if recall_summary:
+                    print(recall_summary)
+                
+                # 生成结束时逐章校验追加写入的输出文件
+                try:
+                    self.verify_output_files()
+                except Exception as e:
+                    print(f"⚠️ 输出文件校验失败: {e}")
+                
                 total_time = time.time() - start_time
                 # 🔧 验证章节确实全部生成：chapter_count 和 paragraph_list 都要达到目标
                 actual_paragraphs = len(self.paragraph_list)
@@ -428,6 +461,14 @@ class AutoGenerationMixin:
                     if time_summary:
                         print(time_summary)
             finally:
+                self.discard_speculative_draft()
+                
+                # 确保后台记账任务和文件写入全部完成
+                try:
+                    self.flush_post_commit_tasks()
+                except Exception as e:
+                    print(f"⚠️ 合并章节后处理结果失败: {e}")
+                
                 # 关闭Token统计系统
                 if self.token_accumulation_stats.get("enabled", False):
                     self.token_accumulation_stats["enabled"] = False
@@ -596,10 +637,7 @@ class AutoGenerationMixin:
             time_stats['elapsed'] = f"{int(elapsed//3600):02d}:{int((elapsed%3600)//60):02d}:{int(elapsed%60):02d}"
 
             if generation_status['current_chapter'] > 0:
-                avg_time_per_chapter = elapsed / generation_status['current_chapter']
-                remaining_chapters = generation_status['target_chapters'] - generation_status['current_chapter']
-                estimated_remaining = avg_time_per_chapter * remaining_chapters
-                time_stats['estimated_remaining'] = self.format_time_duration(estimated_remaining)
+                time_stats['estimated_remaining'] = self.get_remaining_time_display(elapsed)
             else:
                 time_stats['estimated_remaining'] = "计算中..."
         else:
@@ -651,6 +689,30 @@ class AutoGenerationMixin:
             }
         }
 
+    @property
+    def current_stream_content(self):
+        """当前实时流内容
+
+        内部以增量片段列表保存，读取时才拼接一次，
+        避免每个流式数据块都对整段文本做 += 复制。
+        读取（UI线程合并片段）与追加（生成线程）共用一把锁，合并时不会丢失追加的片段。
+        """
+        with self._get_stream_content_lock():
+            parts = self.__dict__.get('_stream_content_parts')
+            if not parts:
+                return ""
+            if len(parts) > 1:
+                parts[:] = ["".join(parts)]
+            return parts[0]
+
+    @current_stream_content.setter
+    def current_stream_content(self, value):
+        with self._get_stream_content_lock():
+            self._stream_content_parts = [value] if value else []
+
+    def _get_stream_content_lock(self):
+        return self.__dict__.setdefault('_stream_content_lock', threading.Lock())
+
     def start_stream_tracking(self, operation_name):
         """开始跟踪流式输出"""
         import time
@@ -674,19 +736,20 @@ class AutoGenerationMixin:
             self.current_stream_chars += len(new_content)
             # 只在启用WebUI流模式时更新current_stream_content（故事线和正文生成时）
             if self.enable_webui_stream:
-                # 更新实时流内容（区分思维链和正文）
-                if is_reasoning:
-                    # 思维链内容使用特殊标记，便于在WebUI中区分显示
-                    if not hasattr(self, '_in_reasoning_block') or not self._in_reasoning_block:
-                        self.current_stream_content += "\n🧠 [思维过程]\n"
-                        self._in_reasoning_block = True
-                    self.current_stream_content += new_content
-                else:
-                    # 正文内容
-                    if hasattr(self, '_in_reasoning_block') and self._in_reasoning_block:
-                        self.current_stream_content += "\n📝 [正文内容]\n"
-                        self._in_reasoning_block = False
-                    self.current_stream_content += new_content
+                # 更新实时流内容（区分思维链和正文），只追加增量片段
+                with self._get_stream_content_lock():
+                    parts = self.__dict__.setdefault('_stream_content_parts', [])
+                    if is_reasoning:
+                        # 思维链内容使用特殊标记，便于在WebUI中区分显示
+                        if not hasattr(self, '_in_reasoning_block') or not self._in_reasoning_block:
+                            parts.append("\n🧠 [思维过程]\n")
+                            self._in_reasoning_block = True
+                    else:
+                        # 正文内容
+                        if hasattr(self, '_in_reasoning_block') and self._in_reasoning_block:
+                            parts.append("\n📝 [正文内容]\n")
+                            self._in_reasoning_block = False
+                    parts.append(new_content)
             # 静默更新字符计数，不输出进度日志
 
     def end_stream_tracking(self, final_content=""):
@@ -0,0 +1,142 @@
+"""AIGN consolidated chapter digest mixin (memory, global context and chapter summary in one request)."""
+
+import json
+
+from core.aign_post_commit import POST_COMMIT_FIELD_LABELS
+
+
+# 后处理字段 -> 章节摘要输出中的区块名（顺序与提示词中的输出顺序一致）
+DIGEST_SECTIONS = {
+    "writing_memory": "新的记忆",
+    "global_context": "全局设定",
+    "storyline": "章节总结",
+}
+
+# 记入 token_accumulation_stats["saved"] 的类别
+DIGEST_SAVED_CATEGORY = "章节摘要合并"
+
+
+class ChapterDigestMixin:
+    """Opt-in single bookkeeping request per chapter.
+
+    记忆生成器、全局设定追踪器和章节总结生成器各自读一遍本章正文，并各自重复人物列表、大纲等输入，
+    记账部分的输入 token 约为一章正文的三倍。开启 chapter_digest 后，后处理只发送一次请求，
+    按 # 新的记忆 / # 全局设定 / # 章节总结 分区输出，由 getOutput 的分区解析器拆开；
+    某一部分缺失、被截断或不是合法 JSON 时，只有这一部分回退到原来的单独智能体。
+    """
+
+    def compute_chapter_digest(self, chapter_number, chapter_content, memory_args, context_inputs, summarize,
+                               agent=None) -> dict:
+        """一次请求生成本章的新记忆、全局设定和章节总结（只读输入快照，可在后台线程执行）
+
+        Args:
+            chapter_number: 章节号
+            chapter_content: 本章正文
+            memory_args: (前文记忆, 未记忆的正文, 人物列表)，本章不需要更新记忆时为 None
+            context_inputs: _build_global_context_inputs() 的输入快照
+            summarize: 是否生成章节总结
+            agent: 后台线程使用的 chapter_digest_generator 副本（默认使用共享实例）
+
+        Returns:
+            dict: {字段: 结果}，只包含解析成功的部分；请求失败时为空字典
+        """
+        fields = [field for field, wanted in (("writing_memory", memory_args is not None),
+                                              ("global_context", True),
+                                              ("storyline", summarize)) if wanted]
+        inputs = self._build_chapter_digest_inputs(chapter_content, memory_args, context_inputs, summarize)
+        print(f"🗂️ 正在生成第{chapter_number}章摘要（{'、'.join(POST_COMMIT_FIELD_LABELS[f] for f in fields)}合并为一次请求）...")
+        try:
+            resp = (agent or self.chapter_digest_generator).invoke(inputs=inputs, output_keys=[])
+        except Exception as e:
+            print(f"⚠️ 第{chapter_number}章摘要生成失败，全部回退到单独生成: {e}")
+            return {}
+
+        results = self._parse_chapter_digest(resp, fields)
+        if not results:
+            return results
+
+        # 节省的输入 token = 解析成功的部分单独请求时的输入 - 合并请求的输入
+        separate_inputs = {
+            "writing_memory": lambda: (self.memory_maker, self._build_memory_inputs(*memory_args)),
+            "global_context": lambda: (self.global_context_updater, context_inputs),
+            "storyline": lambda: (self.chapter_summary_generator,
+                                  self._build_chapter_summary_inputs(chapter_content, chapter_number)),
+        }
+        separate_tokens = sum(self._estimate_request_tokens(*separate_inputs[field]()) for field in results)
+        saved = separate_tokens - self._estimate_request_tokens(self.chapter_digest_generator, inputs)
+        with self._get_stats_lock():
+            self.chapter_digest_stats["chapters"] += 1
+            self.chapter_digest_stats["saved_tokens"] += saved
+        self.record_saved_tokens(DIGEST_SAVED_CATEGORY, saved)
+        print(f"✅ 第{chapter_number}章摘要完成: {'、'.join(POST_COMMIT_FIELD_LABELS[f] for f in results)}，"
+              f"节省输入约{saved:,} tokens")
+        return results
+
+    def _build_chapter_digest_inputs(self, chapter_content, memory_args, context_inputs, summarize) -> dict:
+        """在全局设定追踪器的输入上补充记忆与总结所需的部分（正文、人物列表等只发送一次）"""
+        inputs = dict(context_inputs)
+        inputs["本章正文"] = chapter_content
+        if memory_args is not None:
+            # 未记忆的正文以本章结尾，只把本章之前的部分单独发送
+            earlier = memory_args[1].strip()
+            body = chapter_content.strip()
+            if body and earlier.endswith(body):
+                earlier = earlier[:-len(body)].strip()
+            inputs["此前未记忆的正文"] = earlier
+        inputs["需要更新记忆"] = "是" if memory_args is not None else "否"
+        inputs["需要章节总结"] = "是" if summarize else "否"
+        return self._reorder_inputs_for_cache(inputs)
+
+    def _parse_chapter_digest(self, resp: dict, fields: list) -> dict:
+        """从分区解析结果中取出各部分，缺失或不完整的部分不返回"""
+        raw = resp.get("_raw_response", "")
+        present = [f for f in fields if (resp.get(DIGEST_SECTIONS[f]) or "").strip()]
+        # 没有 # END 说明响应被截断，最后一个输出的区块可能不完整
+        if present and "# END" not in raw:
+            last = max(present, key=lambda f: raw.rfind(f"# {DIGEST_SECTIONS[f]}"))
+            print(f"⚠️ 章节摘要缺少结束标记，{POST_COMMIT_FIELD_LABELS[last]}可能不完整")
+            present.remove(last)
+
+        results = {}
+        for field in present:
+            text = resp[DIGEST_SECTIONS[field]].strip()
+            if field == "writing_memory":
+                results[field] = self._clip_memory(text)
+            elif field == "global_context":
+                results[field] = text
+            else:
+                summary_str = text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+                try:
+                    summary_data = json.loads(summary_str)
+                except json.JSONDecodeError:
+                    print("⚠️ 章节摘要中的章节总结不是合法JSON")
+                    continue
+                if isinstance(summary_data, dict):
+                    self._print_chapter_summary(summary_data)
+                    results[field] = summary_data
+        return results
+
+    def _estimate_request_tokens(self, agent, inputs: dict) -> int:
+        """估算智能体一次请求的输入 token（系统提示词与历史消息 + 本次输入）"""
+        from core.agents.prefix_planner import render_inputs
+        from core.agents.token_estimator import estimate_joined_tokens
+        return estimate_joined_tokens([msg["content"] for msg in agent.history] + [render_inputs(inputs.items())])
+
+    def _digest_or_compute(self, digest_future, field, func, *args):
+        """取章节摘要中该字段的结果；没有合并请求或该部分解析失败时调用单独的智能体"""
+        if digest_future is not None:
+            results = digest_future.result()
+            if field in results:
+                return results[field]
+            with self._get_stats_lock():
+                self.chapter_digest_stats["fallbacks"] += 1
+            print(f"↩️ 章节摘要未包含有效的{POST_COMMIT_FIELD_LABELS[field]}，回退到单独生成")
+        return func(*args)
+
+    def get_chapter_digest_stats_display(self) -> str:
+        """生成章节摘要统计显示文本，没有使用章节摘要时返回空字符串"""
+        stats = getattr(self, 'chapter_digest_stats', None)
+        if not stats or stats["chapters"] == 0:
+            return ""
+        return (f"🗂️ 章节摘要: {stats['chapters']}章合并为单次请求，回退单独生成{stats['fallbacks']}项，"
+                f"节省输入约{stats['saved_tokens']:,} tokens")
@@ -71,19 +71,17 @@ class ChapterManager:
                 print(f"📦 长章节启用（{mode_desc.get(segment_count, '精简模式')}）：仅使用前2/后2章总结，不发送原文")
             for i in range(max(1, self.aign.chapter_count - 1), self.aign.chapter_count + 1):
                 if i > 0:
-                    for ch in self.aign.storyline.get("chapters", []):
-                        if ch.get("chapter_number") == i:
-                            prev_chapters.append(f"第{i}章：{ch.get('plot_summary', '无梗概')}")
-                            break
+                    ch = self.aign.get_storyline_chapter(i)
+                    if ch:
+                        prev_chapters.append(f"第{i}章：{ch.get('plot_summary', '无梗概')}")
             compact_prev_storyline = "\n".join(prev_chapters)
             
             # 后2章的故事线
             next_chapters = []
             for i in range(self.aign.chapter_count + 2, min(self.aign.chapter_count + 4, self.aign.target_chapter_count + 1)):
-                for ch in self.aign.storyline.get("chapters", []):
-                    if ch.get("chapter_number") == i:
-                        next_chapters.append(f"第{i}章：{ch.get('plot_summary', '无梗概')}")
-                        break
+                ch = self.aign.get_storyline_chapter(i)
+                if ch:
+                    next_chapters.append(f"第{i}章：{ch.get('plot_summary', '无梗概')}")
             compact_next_storyline = "\n".join(next_chapters)
         
         # 显示故事线上下文信息
@@ -382,11 +380,7 @@ class ChapterManager:
         prev_summaries = []
         for i in range(max(1, chapter_number - 5), chapter_number):
             if i > 0:
-                chapter_data = None
-                for ch in self.aign.storyline.get("chapters", []):
-                    if ch.get("chapter_number") == i:
-                        chapter_data = ch
-                        break
+                chapter_data = self.aign.get_storyline_chapter(i)
                 
                 if chapter_data:
                     summary = f"第{i}章：{chapter_data.get('plot_summary', '无梗概')}"
@@ -398,11 +392,7 @@ class ChapterManager:
         # 获取后5章的梗概
         next_outlines = []
         for i in range(chapter_number + 1, min(chapter_number + 6, self.aign.target_chapter_count + 1)):
-            chapter_data = None
-            for ch in self.aign.storyline.get("chapters", []):
-                if ch.get("chapter_number") == i:
-                    chapter_data = ch
-                    break
+            chapter_data = self.aign.get_storyline_chapter(i)
             
             if chapter_data:
                 outline = f"第{i}章：{chapter_data.get('plot_summary', '无梗概')}"
@@ -414,11 +404,11 @@ class ChapterManager:
         # 获取上一章原文
         if chapter_number > 1 and hasattr(self.aign, 'paragraph_list') and self.aign.paragraph_list:
             # 尝试找到上一章的内容
-            prev_chapter_content = ""
-            for paragraph in reversed(self.aign.paragraph_list):
-                if f"第{chapter_number - 1}章" in paragraph:
-                    prev_chapter_content = paragraph
-                    break
+            if hasattr(self.aign, 'get_chapter_paragraph'):
+                prev_chapter_content = self.aign.get_chapter_paragraph(chapter_number - 1)
+            else:
+                from core.aign_utilities import get_previous_chapter_content
+                prev_chapter_content = get_previous_chapter_content(self.aign.paragraph_list, chapter_number)
             
             if prev_chapter_content:
                 context["last_chapter_content"] = prev_chapter_content
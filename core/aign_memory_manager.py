@@ -259,11 +259,7 @@ class MemoryManager:
         prev_summaries = []
         for i in range(max(1, chapter_number - 5), chapter_number):
             if i > 0:
-                chapter_data = None
-                for ch in self.aign.storyline.get("chapters", []):
-                    if ch.get("chapter_number") == i:
-                        chapter_data = ch
-                        break
+                chapter_data = self.aign.get_storyline_chapter(i)
                 
                 if chapter_data:
                     summary = f"第{i}章：{chapter_data.get('plot_summary', '无梗概')}"
@@ -275,11 +271,7 @@ class MemoryManager:
         # 获取后5章的梗概
         next_outlines = []
         for i in range(chapter_number + 1, min(chapter_number + 6, self.aign.target_chapter_count + 1)):
-            chapter_data = None
-            for ch in self.aign.storyline.get("chapters", []):
-                if ch.get("chapter_number") == i:
-                    chapter_data = ch
-                    break
+            chapter_data = self.aign.get_storyline_chapter(i)
             
             if chapter_data:
                 outline = f"第{i}章：{chapter_data.get('plot_summary', '无梗概')}"
@@ -291,11 +283,11 @@ class MemoryManager:
         # 获取上一章原文
         if chapter_number > 1 and hasattr(self.aign, 'paragraph_list') and self.aign.paragraph_list:
             # 尝试找到上一章的内容
-            prev_chapter_content = ""
-            for paragraph in reversed(self.aign.paragraph_list):
-                if f"第{chapter_number - 1}章" in paragraph:
-                    prev_chapter_content = paragraph
-                    break
+            if hasattr(self.aign, 'get_chapter_paragraph'):
+                prev_chapter_content = self.aign.get_chapter_paragraph(chapter_number - 1)
+            else:
+                from core.aign_utilities import get_previous_chapter_content
+                prev_chapter_content = get_previous_chapter_content(self.aign.paragraph_list, chapter_number)
             
             if prev_chapter_content:
                 context["last_chapter_content"] = prev_chapter_content
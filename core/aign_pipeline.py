@@ -0,0 +1,307 @@
+"""AIGN pipelined chapter generation mixin (draft chapter N+1 while chapter N is embellished,
+and write segment k+1 while segment k is embellished in long-chapter mode)."""
+
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SegmentEmbellishStage:
+    """长章节分段生成的润色阶段：主线程写第k+1段的同时，后台线程润色第k段
+
+    分段循环原本是 写第k段 → 润色第k段 → 写第k+1段，而写第k+1段只依赖第k段的草稿与本章 plot_segments。
+    润色阶段只有一个工作线程，按分段顺序执行：第k段开始润色时第k-1段已润色完成，
+    "上一段原文"照常取上一段的润色结果。4段模式下每章由 8 次串行调用变为约 5 次调用的时长。
+
+    submit() 在主线程构建好润色输入后调用（不在后台线程读取生成状态）；finish() 等待全部润色完成并返回各段结果。
+    未开启流水线（pipeline_segments=False）或提供商并发上限为1时 submit() 直接在主线程润色，行为与原串行循环一致。
+    任一分段润色失败时取消尚未开始的润色任务，之后的 write()/submit()/finish() 抛出该异常，主线程停止写后续分段。
+    """
+
+    def __init__(self, aign, chapter_number: int, prev_max_chars: int = None, enabled: bool = True):
+        """
+        Args:
+            aign: AIGN 实例
+            chapter_number: 当前章节号
+            prev_max_chars: "上一段原文"最多保留上一段润色结果的末尾多少字符，None 表示全文
+            enabled: 是否与写作并行执行
+        """
+        self.aign = aign
+        self.chapter_number = chapter_number
+        self.prev_max_chars = prev_max_chars
+        self.parts = []
+        self.write_seconds = 0.0
+        self.embellish_seconds = 0.0
+        self._futures = []
+        self._error = None
+        self._start = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aign-segment") if enabled else None
+
+    def write(self, writer_agent, inputs: dict, output_keys: list) -> dict:
+        """在主线程调用写作器（计时用）"""
+        self._raise_if_failed()
+        start = time.time()
+        try:
+            return writer_agent.invoke(inputs=inputs, output_keys=output_keys)
+        finally:
+            self.write_seconds += time.time() - start
+
+    def submit(self, emb_agent, emb_inputs: dict, seg_text: str, context_label: str):
+        """提交一个分段的润色任务（"上一段原文"在任务开始时由上一段的润色结果填入）"""
+        self._raise_if_failed()
+        if self._executor is None:
+            self._embellish(emb_agent, emb_inputs, seg_text, context_label)
+        else:
+            # 后台润色使用副本：流式输出不重置主线程写作器正在显示的实时流窗口
+            self._futures.append(self._executor.submit(self._embellish, emb_agent.fork(), emb_inputs, seg_text, context_label))
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    def _embellish(self, emb_agent, emb_inputs: dict, seg_text: str, context_label: str):
+        if self._error is not None:
+            return
+        inputs = dict(emb_inputs)
+        if self.parts:
+            # 为非首段添加上一段润色后的原文，确保段落衔接流畅
+            prev_seg = self.parts[-1]
+            if self.prev_max_chars and len(prev_seg) > self.prev_max_chars:
+                inputs["上一段原文"] = prev_seg[-self.prev_max_chars:]
+                print(f"   📎 已添加上一段原文（截取{self.prev_max_chars}/{len(prev_seg)}字符）以确保段落衔接")
+            else:
+                inputs["上一段原文"] = prev_seg
+                print(f"   📎 已添加上一段原文({len(prev_seg)}字符)以确保段落衔接")
+        start = time.time()
+        try:
+            final_seg = self.aign._embellish_with_retry(
+                embellisher=emb_agent,
+                embellish_inputs=inputs,
+                original_content=seg_text,
+                chapter_number=self.chapter_number,
+                context_label=context_label,
+            )
+        except Exception as e:
+            # 后续分段的"上一段原文"依赖本段结果：记录失败并取消排队中的润色任务
+            self._error = e
+            for future in list(self._futures):
+                future.cancel()
+            print(f"❌ [{context_label}] 润色失败，停止本章分段流水线: {e}")
+            raise
+        finally:
+            self.embellish_seconds += time.time() - start
+        self.parts.append(final_seg)
+
+    def finish(self) -> list:
+        """等待所有分段润色完成，返回按顺序排列的润色结果"""
+        for future in self._futures:
+            if not future.cancelled():
+                future.result()
+        self.close()
+        self._raise_if_failed()
+        wall = time.time() - self._start
+        saved = max(0.0, self.write_seconds + self.embellish_seconds - wall)
+        if self._executor is not None:
+            stats = self.aign.segment_pipeline_stats
+            stats["chapters"] += 1
+            stats["segments"] += len(self.parts)
+            stats["saved_seconds"] += saved
+            print(f"⛓️ 分段流水线：第{self.chapter_number}章{len(self.parts)}段，墙钟{wall:.1f}秒，"
+                  f"写作{self.write_seconds:.1f}秒 + 润色{self.embellish_seconds:.1f}秒，节省{saved:.1f}秒")
+        return self.parts
+
+    def close(self):
+        """结束润色线程（异常退出时取消尚未开始的润色任务，等待进行中的任务结束）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ChapterPipelineMixin:
+    """Opt-in speculative drafting of the next chapter during embellishment.
+
+    精简模式下，下一章写作输入主要来自故事线和上一章结尾2000字符，而非润色后的全文。
+    开启 pipeline_chapters 后，第N章进入润色时即用第N章的未润色草稿结尾在后台起草第N+1章；
+    第N+1章润色时通过"上一段原文"拿到第N章润色后的结尾，由润色器完成边界衔接。
+
+    一致性保护：
+    - 后台线程只产出草稿，从不写 paragraph_list / chapter_count，提交只发生在主线程
+    - 草稿绑定 (目标章节号, 生成会话, 段落数)，任一不符即丢弃，回退到正常串行生成
+    - 草稿被取用一次后立即清除，重试时不会再次使用
+    """
+
+    def _get_pipeline_executor(self):
+        executor = getattr(self, '_pipeline_executor', None)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aign-pipeline")
+            self._pipeline_executor = executor
+        return executor
+
+    def _can_pipeline_next_chapter(self, is_compact_mode, skip_generic, is_ending_phase, is_final_chapter) -> bool:
+        """判断是否可以在润色当前章节时预先起草下一章"""
+        if not getattr(self, 'pipeline_chapters', False):
+            return False
+        if not is_compact_mode or skip_generic or is_ending_phase or is_final_chapter:
+            return False
+        if not self.enable_chapters or not getattr(self, 'auto_generation_running', False):
+            return False
+        if getattr(self, 'stop_generation', False):
+            return False
+        # 只在顺序生成时启用（缺失章节修复会临时回拨 chapter_count）
+        if len(self.paragraph_list) != self.chapter_count:
+            return False
+        # 下一章若进入结尾阶段或需要分段生成，输入结构不同，不做预起草
+        following_chapter = self.chapter_count + 2
+        if following_chapter > self.target_chapter_count:
+            return False
+        if self.enable_ending and following_chapter >= self.target_chapter_count * 0.95:
+            return False
+        # 第N+1章写完一卷时，第N+2章需要的卷梗概要等第N+1章的章节总结
+        if getattr(self, 'hierarchical_memory', False) and (following_chapter - 1) % self._get_story_memory().arc_chapters == 0:
+            return False
+        if getattr(self, 'long_chapter_mode', 0) > 0:
+            following_story = self.getCurrentChapterStoryline(following_chapter)
+            if isinstance(following_story, dict) and (following_story.get('plot_segments') or following_story.get('segments')):
+                return False
+        return True
+
+    def launch_speculative_draft(self, draft_text, writing_plan, temp_setting):
+        """第N章润色开始前调用：在后台起草第N+1章
+
+        Args:
+            draft_text: 第N章未润色的草稿
+            writing_plan: 第N章写作器返回的计划
+            temp_setting: 第N章写作器返回的临时设定
+        """
+        self.discard_speculative_draft()
+
+        target_chapter = self.chapter_count + 2
+        inputs = self._build_compact_writer_inputs(
+            target_chapter,
+            last_paragraph_excerpt=(draft_text or "")[-2000:],
+            writing_plan=writing_plan,
+            temp_setting=temp_setting,
+        )
+        if self.detailed_outline and self.detailed_outline != self.getCurrentOutline():
+            inputs["详细大纲"] = self.detailed_outline
+        inputs = self._prepare_writer_inputs(self.novel_writer_compact, inputs, target_chapter)
+
+        # 在副本上起草：前缀规划、响应缓存键、流式跟踪等实例状态不与前台写作器共享
+        cancel_event = threading.Event()
+        writer = self.novel_writer_compact.fork(cancel_event=cancel_event)
+        self._speculative_draft = {
+            "chapter_number": target_chapter,
+            "session_id": getattr(self, 'generation_session_id', 0),
+            # 第N章提交后 paragraph_list 应恰好增加一项
+            "expected_paragraph_count": len(self.paragraph_list) + 1,
+            "start_time": time.time(),
+            "cancel_event": cancel_event,
+            "future": self._get_pipeline_executor().submit(self._run_speculative_draft, writer, target_chapter, inputs),
+        }
+        self.pipeline_stats["launched"] += 1
+        print(f"🚀 流水线：已在后台开始起草第{target_chapter}章（基于第{target_chapter - 1}章未润色草稿）")
+
+    def _run_speculative_draft(self, writer, chapter_number, inputs):
+        """后台线程：在写作器副本上起草，只返回结果，不修改任何生成状态"""
+        try:
+            resp = writer.invoke(
+                inputs=inputs,
+                output_keys=["段落", "计划", "临时设定"],
+            )
+            return {"ok": True, "resp": resp, "end_time": time.time()}
+        except Exception as e:
+            if writer._cancel_event.is_set():
+                return {"ok": False, "error": e, "end_time": time.time()}
+            print(f"⚠️ 流水线：第{chapter_number}章预起草失败，将按常规流程生成: {e}")
+            if not isinstance(e, InterruptedError):
+                traceback.print_exc()
+            return {"ok": False, "error": e, "end_time": time.time()}
+
+    def take_speculative_draft(self, chapter_number):
+        """取用第 chapter_number 章的预起草结果
+
+        Returns:
+            dict | None: 写作器响应（含 段落/计划/临时设定），不可用时返回 None
+        """
+        draft = getattr(self, '_speculative_draft', None)
+        if not draft:
+            return None
+        self._speculative_draft = None
+
+        reason = None
+        if draft["chapter_number"] != chapter_number:
+            reason = f"目标章节不符（草稿为第{draft['chapter_number']}章）"
+        elif draft["session_id"] != getattr(self, 'generation_session_id', 0):
+            reason = "生成会话已变化"
+        elif draft["expected_paragraph_count"] != len(self.paragraph_list):
+            reason = f"段落数不符（期望{draft['expected_paragraph_count']}，实际{len(self.paragraph_list)}）"
+        elif getattr(self, 'stop_generation', False):
+            reason = "已收到停止信号"
+        if reason:
+            self._cancel_speculative_future(draft)
+            self.pipeline_stats["discarded"] += 1
+            print(f"🗑️ 流水线：丢弃第{draft['chapter_number']}章预起草草稿：{reason}")
+            return None
+
+        wait_start = time.time()
+        result = draft["future"].result()
+        waited = time.time() - wait_start
+        if not result["ok"]:
+            self.pipeline_stats["discarded"] += 1
+            return None
+
+        resp = result["resp"]
+        if not resp.get("段落"):
+            self.pipeline_stats["discarded"] += 1
+            print(f"🗑️ 流水线：第{chapter_number}章预起草结果为空，按常规流程生成")
+            return None
+
+        overlap = max(0.0, (result["end_time"] - draft["start_time"]) - waited)
+        self.pipeline_stats["used"] += 1
+        self.pipeline_stats["overlap_seconds"] += overlap
+        print(f"⚡ 流水线：使用第{chapter_number}章预起草草稿（与上一章润色重叠{overlap:.1f}秒，等待{waited:.1f}秒）")
+        return resp
+
+    def discard_speculative_draft(self):
+        """丢弃尚未取用的预起草草稿（停止、重试或配置变化时调用）"""
+        draft = getattr(self, '_speculative_draft', None)
+        if draft:
+            self._speculative_draft = None
+            self._cancel_speculative_future(draft)
+            self.pipeline_stats["discarded"] += 1
+            print(f"🗑️ 流水线：丢弃第{draft['chapter_number']}章预起草草稿")
+
+    def _cancel_speculative_future(self, draft):
+        """取消预起草请求：未开始的直接取消，已在进行的发出中断信号并等待其结束，之后前台才会重用写作器"""
+        future = draft["future"]
+        if future.cancel():
+            return
+        draft["cancel_event"].set()
+        try:
+            future.result()
+        except Exception:
+            pass
+
+    def start_segment_pipeline(self, chapter_number, prev_max_chars=None) -> SegmentEmbellishStage:
+        """开始一章的分段生成：返回润色阶段，pipeline_segments 开启且提供商允许2个并发请求时润色与下一段的写作并行"""
+        enabled = getattr(self, 'pipeline_segments', False)
+        if enabled and self.get_provider_concurrency(2) < 2:
+            # 本地单槽服务器（LM Studio 等）上两个请求只会排队，后台润色反而拖慢写作
+            if not getattr(self, '_segment_pipeline_serial_noted', False):
+                print("⛓️ 当前提供商并发上限为1，分段流水线回退为串行")
+                self._segment_pipeline_serial_noted = True
+            enabled = False
+        return SegmentEmbellishStage(self, chapter_number, prev_max_chars=prev_max_chars, enabled=enabled)
+
+    def get_pipeline_stats_display(self) -> str:
+        """生成流水线统计显示文本"""
+        lines = []
+        stats = getattr(self, 'pipeline_stats', None)
+        if stats and stats["launched"] > 0:
+            lines.append(f"🚀 章节流水线: 预起草{stats['launched']}次，采用{stats['used']}次，"
+                         f"丢弃{stats['discarded']}次，累计重叠{self.format_time_duration(stats['overlap_seconds'], include_seconds=True)}")
+        segment_stats = getattr(self, 'segment_pipeline_stats', None)
+        if segment_stats and segment_stats["chapters"] > 0:
+            lines.append(f"⛓️ 分段流水线: {segment_stats['chapters']}章共{segment_stats['segments']}段，"
+                         f"写作与润色重叠节省{self.format_time_duration(segment_stats['saved_seconds'], include_seconds=True)}")
+        return "\n".join(lines)
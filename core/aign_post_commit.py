@@ -0,0 +1,247 @@
+"""AIGN post-commit bookkeeping mixin (concurrent memory / global context / summary updates)."""
+
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 汇合时机
+# - immediate:     本章返回前等待全部任务（三个任务彼此并行）
+# - next_chapter:  下一章开始前等待全部任务（与章节间的存档/同步等操作重叠）
+# - prompt_fields: 下一章只等待其提示词需要的字段，其余字段在下一次提交时合并（固定滞后一章）
+POST_COMMIT_JOIN_MODES = ("immediate", "next_chapter", "prompt_fields")
+
+# 合并顺序固定，保证无论任务完成先后，结果都一致
+POST_COMMIT_MERGE_ORDER = ("writing_memory", "global_context", "storyline")
+
+POST_COMMIT_FIELD_LABELS = {
+    "writing_memory": "前文记忆",
+    "global_context": "全局设定",
+    "storyline": "章节总结",
+}
+
+
+class PostCommitMixin:
+    """Run post-chapter bookkeeping agents concurrently and merge results deterministically."""
+
+    def _get_post_commit_executor(self):
+        """获取记账任务线程池（有界，懒加载）"""
+        executor = getattr(self, '_post_commit_executor', None)
+        if executor is None:
+            max_workers = max(1, int(getattr(self, 'post_commit_max_workers', 3) or 1))
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aign-post-commit")
+            self._post_commit_executor = executor
+        return executor
+
+    def _get_post_commit_io_executor(self):
+        """获取文件写入线程（单线程，保证写入顺序）"""
+        executor = getattr(self, '_post_commit_io_executor', None)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aign-post-commit-io")
+            self._post_commit_io_executor = executor
+        return executor
+
+    def _get_post_commit_join_mode(self) -> str:
+        mode = getattr(self, 'post_commit_join_mode', 'immediate')
+        if mode not in POST_COMMIT_JOIN_MODES:
+            print(f"⚠️ 未知的后处理汇合模式: {mode}，使用 immediate")
+            return "immediate"
+        return mode
+
+    def dispatch_post_commit_tasks(self, chapter_number, chapter_content, chapter_display_title=None):
+        """章节提交后并发派发记忆、全局设定和章节总结任务
+
+        任务只读取派发时的输入快照并返回结果，不直接修改 AIGN 状态；
+        结果在汇合点按 POST_COMMIT_MERGE_ORDER 的固定顺序合并。
+        每个任务使用智能体的后台副本（fork），流式输出写入副本自己的缓冲区，
+        不会互相重置实时流窗口，也不会覆盖下一章写作器正在显示的输出。
+
+        Args:
+            chapter_number: 刚提交的章节号
+            chapter_content: 刚提交的章节正文
+            chapter_display_title: 用于日志显示的章节标题
+        """
+        # 上一轮延迟的字段必须先合并，本轮任务的输入才基于最新结果
+        self.join_post_commit_tasks()
+
+        executor = self._get_post_commit_executor()
+        futures = {}
+
+        no_memory_snapshot = self.no_memory_paragraph
+        memory_args = None
+        if len(no_memory_snapshot) > 2000:
+            memory_args = (self.writing_memory, no_memory_snapshot, self.character_list)
+        context_inputs = self._build_global_context_inputs()
+        summarize = self.enable_chapters and chapter_number > 0
+
+        # 章节摘要（可选）：三项合并为一次请求，先于各字段任务提交，各字段任务等待其结果，解析失败的部分单独生成
+        digest_future = None
+        if getattr(self, 'chapter_digest', False):
+            digest_future = executor.submit(
+                self.compute_chapter_digest, chapter_number, chapter_content, memory_args, context_inputs, summarize,
+                self.chapter_digest_generator.fork(),
+            )
+
+        if memory_args is not None:
+            futures["writing_memory"] = executor.submit(
+                self._run_post_commit_task, "writing_memory",
+                self._digest_or_compute, digest_future, "writing_memory", self._compute_memory_update, *memory_args,
+                self.memory_maker.fork(),
+            )
+
+        futures["global_context"] = executor.submit(
+            self._run_post_commit_task, "global_context",
+            self._digest_or_compute, digest_future, "global_context", self._compute_global_context_update, context_inputs,
+            self.global_context_updater.fork(),
+        )
+
+        if summarize:
+            if digest_future is None:
+                print(f"📋 正在生成{chapter_display_title or f'第{chapter_number}章'}的剧情总结...")
+            futures["storyline"] = executor.submit(
+                self._run_post_commit_task, "storyline",
+                self._digest_or_compute, digest_future, "storyline", self.generateChapterSummary, chapter_content, chapter_number,
+                self.chapter_summary_generator.fork(),
+            )
+
+        self._post_commit_pending = {
+            "chapter_number": chapter_number,
+            "display_title": chapter_display_title or f"第{chapter_number}章",
+            "futures": futures,
+            "consumed_memory_length": len(no_memory_snapshot),
+            "dispatch_time": time.time(),
+            "task_durations": {},
+        }
+        print(f"⚡ 第{chapter_number}章后处理已并发派发: "
+              f"{', '.join(POST_COMMIT_FIELD_LABELS[f] for f in POST_COMMIT_MERGE_ORDER if f in futures)}")
+
+        mode = self._get_post_commit_join_mode()
+        if mode == "immediate":
+            self.join_post_commit_tasks()
+        else:
+            # 正文文件先在后台写入，元数据在合并后再保存
+            self._submit_post_commit_io(self.saveToFile, False)
+
+    def _run_post_commit_task(self, field, func, *args):
+        """在线程池中执行单个记账任务，记录耗时；异常转为结果返回，不向上传播"""
+        start = time.time()
+        span = self.tracer.start_span("post_commit.task", stage=POST_COMMIT_FIELD_LABELS.get(field, field), field=field)
+        try:
+            return {"ok": True, "value": func(*args), "duration": time.time() - start}
+        except Exception as e:
+            print(f"⚠️ {POST_COMMIT_FIELD_LABELS.get(field, field)}更新失败（不影响正文生成）: {e}")
+            traceback.print_exc()
+            span.set(error=str(e)[:200])
+            return {"ok": False, "error": e, "duration": time.time() - start}
+        finally:
+            self.tracer.end_span(span)
+
+    def _get_post_commit_prompt_fields(self) -> tuple:
+        """下一章提示词必须等待的字段"""
+        if self._get_post_commit_join_mode() == "prompt_fields":
+            return tuple(getattr(self, 'post_commit_prompt_fields', ("writing_memory", "storyline")))
+        return POST_COMMIT_MERGE_ORDER
+
+    def join_post_commit_before_next_chapter(self):
+        """下一章构建提示词之前的汇合点"""
+        self.join_post_commit_tasks(fields=self._get_post_commit_prompt_fields())
+
+    def join_post_commit_tasks(self, fields=None) -> bool:
+        """等待并合并挂起的记账任务
+
+        Args:
+            fields: 只合并这些字段（None 表示全部）；未列出的字段保持挂起
+
+        Returns:
+            bool: 是否合并了任何结果
+        """
+        pending = getattr(self, '_post_commit_pending', None)
+        if not pending:
+            return False
+
+        futures = pending["futures"]
+        merge_fields = [f for f in POST_COMMIT_MERGE_ORDER if f in futures and (fields is None or f in fields)]
+        if not merge_fields:
+            return False
+
+        # 等待在途的文件写入，避免合并时修改正在被序列化的数据
+        with self.tracer.span("post_commit.join", stage="后处理等待", fields=merge_fields):
+            self._wait_post_commit_io()
+
+            results = {}
+            for field in merge_fields:
+                results[field] = futures.pop(field).result()
+
+        for field in merge_fields:
+            result = results[field]
+            pending["task_durations"][field] = result["duration"]
+            if result["ok"]:
+                self._merge_post_commit_result(field, result["value"], pending)
+
+        if not futures:
+            self._post_commit_pending = None
+            self._report_post_commit_timing(pending)
+
+        self._submit_post_commit_io(self._save_after_post_commit_merge)
+        return True
+
+    def _merge_post_commit_result(self, field, value, pending):
+        """在调用线程中把单个任务结果写回 AIGN 状态"""
+        if field == "writing_memory":
+            if value is None:
+                return
+            self.writing_memory = value
+            # 只移除已被本次记忆吸收的部分，保留之后追加的正文
+            self.no_memory_paragraph = self.no_memory_paragraph[pending["consumed_memory_length"]:]
+        elif field == "global_context":
+            if value:
+                self._apply_global_context_update(value, save=False)
+        elif field == "storyline":
+            if value:
+                self.updateStorylineWithSummary(pending["chapter_number"], value)
+                print(f"✅ {pending['display_title']}的故事线已更新")
+
+    def _report_post_commit_timing(self, pending):
+        durations = pending["task_durations"]
+        if not durations:
+            return
+        wall_time = time.time() - pending["dispatch_time"]
+        serial_time = sum(durations.values())
+        print(f"⚡ 第{pending['chapter_number']}章后处理完成: {len(durations)}个任务，"
+              f"墙钟{wall_time:.1f}秒（串行约{serial_time:.1f}秒）")
+
+    def _save_after_post_commit_merge(self):
+        """合并后的持久化（在文件写入线程中执行）"""
+        with self.tracer.span("save.post_commit", stage="存档"):
+            self.recordNovel()
+            if self._get_post_commit_join_mode() == "immediate":
+                self.saveToFile(save_metadata=True)
+            else:
+                self.saveMetadataToFile()
+            if hasattr(self, 'auto_save_manager') and self.global_context:
+                try:
+                    self.auto_save_manager.save_global_context(self.global_context)
+                except Exception as save_err:
+                    print(f"⚠️ 全局设定自动保存失败: {save_err}")
+
+    def _submit_post_commit_io(self, func, *args):
+        """把文件写入排入单线程队列"""
+        with self.__dict__.setdefault('_post_commit_io_lock', threading.Lock()):
+            def run():
+                try:
+                    func(*args)
+                except Exception as e:
+                    print(f"⚠️ 后台保存失败: {e}")
+            self._post_commit_io_future = self._get_post_commit_io_executor().submit(run)
+
+    def _wait_post_commit_io(self):
+        future = getattr(self, '_post_commit_io_future', None)
+        if future is not None:
+            future.result()
+
+    def flush_post_commit_tasks(self) -> bool:
+        """合并所有挂起的任务并等待文件写入完成（生成结束、停止或最终章前调用）"""
+        merged = self.join_post_commit_tasks()
+        self._wait_post_commit_io()
+        return merged
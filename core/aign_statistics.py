@@ -1,10 +1,17 @@
 """AIGN statistics and monitoring mixin (extracted from AIGN.py)."""
 
+import threading
 import time
 
 
 class StatisticsMixin:
-    """Token, API timing, and SiliconFlow cache statistics."""
+    """Token, API timing, and SiliconFlow cache statistics.
+
+    记录方法会被章节后处理线程池、分块润色等并发请求调用，累加统计都在统计锁内完成。
+    """
+
+    def _get_stats_lock(self):
+        return self.__dict__.setdefault('_stats_lock', threading.RLock())
 
     # ========== Token累积统计方法 ==========
     
@@ -13,8 +20,8 @@ class StatisticsMixin:
         
         在autoGenerate开始时调用，清零所有统计计数器
         """
-        for direction in ["sent", "received"]:
-            for category in self.token_accumulation_stats[direction]:
+        for direction in ["sent", "received", "saved"]:
+            for category in self.token_accumulation_stats.get(direction, {}):
                 self.token_accumulation_stats[direction][category]["tokens"] = 0
                 self.token_accumulation_stats[direction][category]["calls"] = 0
         
@@ -33,8 +40,9 @@ class StatisticsMixin:
         if category not in self.token_accumulation_stats["sent"]:
             category = "其他"
         
-        self.token_accumulation_stats["sent"][category]["tokens"] += token_count
-        self.token_accumulation_stats["sent"][category]["calls"] += 1
+        with self._get_stats_lock():
+            self.token_accumulation_stats["sent"][category]["tokens"] += token_count
+            self.token_accumulation_stats["sent"][category]["calls"] += 1
     
     def record_received_tokens(self, category: str, token_count: int):
         """记录从API接收的Token数
@@ -49,8 +57,35 @@ class StatisticsMixin:
         if category not in self.token_accumulation_stats["received"]:
             category = "其他"
         
-        self.token_accumulation_stats["received"][category]["tokens"] += token_count
-        self.token_accumulation_stats["received"][category]["calls"] += 1
+        with self._get_stats_lock():
+            self.token_accumulation_stats["received"][category]["tokens"] += token_count
+            self.token_accumulation_stats["received"][category]["calls"] += 1
+    
+    def record_saved_tokens(self, category: str, token_count: int):
+        """记录优化节省的发送Token数（估算值，如章节摘要合并请求相对单独请求少发送的Token）
+        
+        Args:
+            category: 节省来源（如"章节摘要合并"）
+            token_count: 节省的Token数量（可能为负，表示比单独请求多发送）
+        """
+        if not self.token_accumulation_stats.get("enabled", False):
+            return
+        
+        with self._get_stats_lock():
+            saved_stats = self.token_accumulation_stats.setdefault("saved", {})
+            entry = saved_stats.setdefault(category, {"tokens": 0, "calls": 0})
+            entry["tokens"] += token_count
+            entry["calls"] += 1
+    
+    def _get_saved_tokens_lines(self):
+        """优化节省的Token明细行，没有数据时返回空列表"""
+        saved_items = [(cat, data) for cat, data in self.token_accumulation_stats.get("saved", {}).items() if data["calls"] > 0]
+        if not saved_items:
+            return []
+        lines = ["💡 节省发送Token（估算）:"]
+        for category, data in saved_items:
+            lines.append(f"  • {category}: {data['tokens']:,} tokens - {data['calls']}次")
+        return lines
     
     def get_token_accumulation_display(self, show_details=True):
         """生成格式化的Token统计显示文本（实时更新）
@@ -143,6 +178,7 @@ class StatisticsMixin:
         # 总体统计
         lines.append("")
         lines.append(f"💰 总Token消耗: {total_tokens:,} tokens")
+        lines.extend(self._get_saved_tokens_lines())
         lines.append("─" * 60)
         
         # 添加RAG统计
@@ -216,18 +252,107 @@ class StatisticsMixin:
         if total_calls > 0:
             avg_tokens_per_call = total_tokens / total_calls
             lines.append(f"⚡ 平均每次调用: {int(avg_tokens_per_call):,} tokens")
+        lines.extend(self._get_saved_tokens_lines())
             
         # 添加RAG统计
         rag_stats = self.get_rag_usage_display()
         if rag_stats:
              lines.append(rag_stats)
         
+        # 添加提示词前缀缓存统计
+        prefix_stats = self.get_prefix_cache_display()
+        if prefix_stats:
+            lines.append(prefix_stats)
+        
+        # 添加连接复用统计
+        connection_stats = self.get_connection_reuse_display()
+        if connection_stats:
+            lines.append(connection_stats)
+        
+        # 添加流式卡顿与对冲请求统计
+        stall_stats = self.get_stream_stall_display()
+        if stall_stats:
+            lines.append(stall_stats)
+        
+        # 添加断点续写统计
+        resume_stats = self.get_resume_display()
+        if resume_stats:
+            lines.append(resume_stats)
+        
         lines.append("━" * 60)
         lines.append("")
         
         return "\n".join(lines)
 
     
+    def get_connection_reuse_display(self):
+        """生成提供商连接复用统计显示文本
+        
+        Returns:
+            str: 格式化的连接复用统计，没有数据时返回空字符串
+        """
+        try:
+            from providers.client_registry import get_client_registry
+            return get_client_registry().get_stats_display()
+        except Exception:
+            return ""
+    
+    def get_stream_stall_display(self):
+        """生成流式卡顿与对冲请求统计显示文本
+        
+        Returns:
+            str: 按提供商格式化的卡顿统计，没有发生卡顿时返回空字符串
+        """
+        try:
+            from core.agents.stream_hedging import get_stall_stats
+            return get_stall_stats().get_stats_display()
+        except Exception:
+            return ""
+    
+    def get_resume_display(self):
+        """生成断点续写统计显示文本
+        
+        Returns:
+            str: 按来源（智能体/故事线）格式化的续写统计，没有续写时返回空字符串
+        """
+        try:
+            from core.agents.continuation import get_resume_stats
+            return get_resume_stats().get_stats_display()
+        except Exception:
+            return ""
+    
+    def get_prefix_cache_display(self, show_agents=True):
+        """生成提示词前缀缓存统计显示文本
+        
+        Args:
+            show_agents: 是否逐个智能体显示
+            
+        Returns:
+            str: 格式化的前缀缓存统计，没有数据时返回空字符串
+        """
+        planner = getattr(self, 'prefix_planner', None)
+        if planner is None:
+            return ""
+        totals = planner.totals()
+        if not totals["requests"]:
+            return ""
+        
+        lines = ["", "🧊 提示词前缀缓存:"]
+        summary = (f"  • 请求 {totals['requests']}次，前缀未变 {totals['warm_requests']}次，"
+                   f"前缀失效 {totals['invalidations']}次")
+        lines.append(summary)
+        if totals["reported"]:
+            lines.append(f"  • 提供商缓存命中: {totals['hit_tokens']:,} / {totals['prompt_tokens']:,} tokens "
+                         f"({totals['hit_rate'] * 100:.1f}%)")
+        else:
+            lines.append("  • 提供商未返回缓存命中信息")
+        if show_agents:
+            for name, stats in sorted(planner.stats().items(), key=lambda item: -item[1]["prompt_tokens"]):
+                hit_info = f"，命中率 {stats['hit_rate'] * 100:.1f}%（前缀未变时 {stats['warm_hit_rate'] * 100:.1f}%）" if stats["reported"] else ""
+                lines.append(f"    - {name}: {stats['requests']}次，静态前缀 {stats['prefix_chars']:,}字，"
+                             f"失效 {stats['invalidations']}次{hit_info}")
+        return "\n".join(lines)
+    
     # ========== SiliconFlow缓存统计方法 ==========
     
     def reset_siliconflow_cache_stats(self):
@@ -266,14 +391,15 @@ class StatisticsMixin:
         reasoning_tokens = api_response.get("reasoning_tokens", 0) or 0
         
         # 累加统计
-        if prompt_cache_hit > 0 or prompt_cache_miss > 0:
-            self.siliconflow_cache_stats["total_prompt_cache_hit"] += prompt_cache_hit
-            self.siliconflow_cache_stats["total_prompt_cache_miss"] += prompt_cache_miss
-            self.siliconflow_cache_stats["total_prompt_tokens"] += prompt_tokens
-            self.siliconflow_cache_stats["api_calls_with_cache"] += 1
-        
-        if reasoning_tokens > 0:
-            self.siliconflow_cache_stats["total_reasoning_tokens"] += reasoning_tokens
+        with self._get_stats_lock():
+            if prompt_cache_hit > 0 or prompt_cache_miss > 0:
+                self.siliconflow_cache_stats["total_prompt_cache_hit"] += prompt_cache_hit
+                self.siliconflow_cache_stats["total_prompt_cache_miss"] += prompt_cache_miss
+                self.siliconflow_cache_stats["total_prompt_tokens"] += prompt_tokens
+                self.siliconflow_cache_stats["api_calls_with_cache"] += 1
+            
+            if reasoning_tokens > 0:
+                self.siliconflow_cache_stats["total_reasoning_tokens"] += reasoning_tokens
     
     def get_siliconflow_cache_display(self):
         """生成SiliconFlow缓存统计显示文本
@@ -365,27 +491,28 @@ class StatisticsMixin:
         if not self.api_time_stats.get("enabled", False):
             return
         
-        # 更新时间统计
-        self.api_time_stats["total_api_calls"] += 1
-        self.api_time_stats["total_api_time_ms"] += api_time_ms
-        self.api_time_stats["chapter_api_calls"] += 1
-        self.api_time_stats["chapter_total_time_ms"] += api_time_ms
+        with self._get_stats_lock():
+            # 更新时间统计
+            self.api_time_stats["total_api_calls"] += 1
+            self.api_time_stats["total_api_time_ms"] += api_time_ms
+            self.api_time_stats["chapter_api_calls"] += 1
+            self.api_time_stats["chapter_total_time_ms"] += api_time_ms
         
-        # 更新Token统计（用于费用计算）
-        self.api_time_stats["total_input_tokens"] += input_tokens
-        self.api_time_stats["total_output_tokens"] += output_tokens
+            # 更新Token统计（用于费用计算）
+            self.api_time_stats["total_input_tokens"] += input_tokens
+            self.api_time_stats["total_output_tokens"] += output_tokens
         
-        # 记录API直接返回的费用（如果有）
-        if api_cost > 0:
-            self.api_time_stats["total_direct_cost"] += api_cost
+            # 记录API直接返回的费用（如果有）
+            if api_cost > 0:
+                self.api_time_stats["total_direct_cost"] += api_cost
         
-        # 添加到最近调用列表
-        self.api_time_stats["api_times"].append(api_time_ms)
+            # 添加到最近调用列表
+            self.api_time_stats["api_times"].append(api_time_ms)
         
-        # 限制追踪数量
-        max_tracked = self.api_time_stats.get("max_tracked_calls", 50)
-        if len(self.api_time_stats["api_times"]) > max_tracked:
-            self.api_time_stats["api_times"] = self.api_time_stats["api_times"][-max_tracked:]
+            # 限制追踪数量
+            max_tracked = self.api_time_stats.get("max_tracked_calls", 50)
+            if len(self.api_time_stats["api_times"]) > max_tracked:
+                self.api_time_stats["api_times"] = self.api_time_stats["api_times"][-max_tracked:]
         
         # 日志记录
         time_sec = api_time_ms / 1000
@@ -395,8 +522,9 @@ class StatisticsMixin:
     
     def reset_chapter_api_stats(self):
         """重置章节API统计（每章开始时调用）"""
-        self.api_time_stats["chapter_api_calls"] = 0
-        self.api_time_stats["chapter_total_time_ms"] = 0
+        with self._get_stats_lock():
+            self.api_time_stats["chapter_api_calls"] = 0
+            self.api_time_stats["chapter_total_time_ms"] = 0
     
     def get_api_time_display(self):
         """生成格式化的API时间统计显示文本（实时更新）
@@ -467,15 +595,7 @@ class StatisticsMixin:
             target_chapters = getattr(self, 'target_chapter_count', 0)
             
             if current_chapter > 0 and target_chapters > current_chapter:
-                # 基于已完成章节的平均时间估算
-                avg_time_per_chapter = elapsed_seconds / current_chapter
-                remaining_chapters = target_chapters - current_chapter
-                estimated_remaining_sec = avg_time_per_chapter * remaining_chapters
-                
-                est_remaining_min = int(estimated_remaining_sec // 60)
-                est_remaining_sec = int(estimated_remaining_sec % 60)
-                
-                lines.append(f"  • 预计剩余: {est_remaining_min}分{est_remaining_sec}秒")
+                lines.append(f"  • 预计剩余: {self.get_remaining_time_display(elapsed_seconds)}")
                 
                 # 估算最终费用
                 if total_cost > 0:
@@ -483,6 +603,14 @@ class StatisticsMixin:
                     estimated_total_cost = avg_cost_per_chapter * target_chapters
                     lines.append(f"  • 预计总费用: ${estimated_total_cost:.4f}")
         
+        trace_summary = self.get_trace_summary_display()
+        if trace_summary:
+            lines.append(trace_summary)
+        
+        prefix_summary = self.get_prefix_cache_display(show_agents=False)
+        if prefix_summary:
+            lines.append(prefix_summary)
+        
         lines.append("")
         
         return "\n".join(lines)
@@ -585,3 +713,87 @@ class StatisticsMixin:
         lines.append("")
         
         return "\n".join(lines)
+
+    
+    # ========== 调用追踪方法 ==========
+    
+    def start_trace_session(self):
+        """开始新的追踪会话（autoGenerate开始时调用），按配置决定是否导出JSONL"""
+        from core.tracing import DEFAULT_TRACE_PATH
+        from config.dynamic_config_manager import get_config_snapshot
+        
+        self.tracer.reset()
+        export = getattr(get_config_snapshot(), 'trace_export', False)
+        self.tracer.set_export(DEFAULT_TRACE_PATH if export else None)
+        if export:
+            print(f"🔬 调用追踪已启用，span 导出到 {DEFAULT_TRACE_PATH}（trace {self.tracer.trace_id}）")
+    
+    def estimate_remaining_time(self, elapsed_seconds: float = None):
+        """估算剩余生成时间
+        
+        已有完成章节的追踪数据时，按各阶段每章耗时的中位数求和估算（保守值取p90）；
+        否则退回到已用时间 / 已完成章节数的平均值。
+        
+        Args:
+            elapsed_seconds: 已用时间（仅用于退回平均值估算）
+            
+        Returns:
+            tuple: (预计秒数, 保守秒数或None)，无法估算时返回 None
+        """
+        current_chapter = getattr(self, 'chapter_count', 0)
+        remaining_chapters = getattr(self, 'target_chapter_count', 0) - current_chapter
+        if remaining_chapters <= 0:
+            return None
+        
+        estimate = self.tracer.estimate_remaining(remaining_chapters)
+        if estimate:
+            return estimate
+        
+        if current_chapter > 0 and elapsed_seconds:
+            return elapsed_seconds / current_chapter * remaining_chapters, None
+        return None
+    
+    def get_remaining_time_display(self, elapsed_seconds: float = None) -> str:
+        """格式化的剩余时间估算（如“12分钟（保守 15分钟）”）"""
+        estimate = self.estimate_remaining_time(elapsed_seconds)
+        if not estimate:
+            return "计算中..."
+        expected, pessimistic = estimate
+        text = self.format_time_duration(expected)
+        if pessimistic and self.format_time_duration(pessimistic) != text:
+            text += f"（保守 {self.format_time_duration(pessimistic)}）"
+        return text
+    
+    def get_trace_summary_display(self):
+        """生成调用追踪摘要（TTFT、吞吐量、重试和各阶段每章耗时）
+        
+        Returns:
+            str: 格式化的追踪摘要，没有数据时返回空字符串
+        """
+        tracer = getattr(self, 'tracer', None)
+        if tracer is None:
+            return ""
+        
+        requests = tracer.request_summary()
+        stages = tracer.stage_distribution()
+        if not requests["requests"] and not stages:
+            return ""
+        
+        lines = ["", "🔬 调用追踪"]
+        if requests["requests"]:
+            lines.append(
+                f"  • LLM请求: {requests['requests']}次 | 重试 {requests['retries']}次 | "
+                f"TTFT p50 {requests['ttft_p50'] / 1000:.2f}s / p95 {requests['ttft_p95'] / 1000:.2f}s"
+            )
+            throughput = f"  • 正文 {requests['content_tps']:.0f} tok/s"
+            if requests["reasoning_tps"]:
+                throughput += f" | 思考 {requests['reasoning_tps']:.0f} tok/s"
+            if requests["gap_max"]:
+                throughput += f" | 块间隔 p95 {requests['gap_p95'] / 1000:.2f}s / 最大 {requests['gap_max'] / 1000:.1f}s"
+            lines.append(throughput)
+        if stages:
+            top = list(stages.items())[:6]
+            lines.append("  • 每章耗时（中位数）: " + " | ".join(f"{name} {stage['p50']:.1f}s" for name, stage in top))
+        if tracer.exporting:
+            lines.append(f"  • 追踪记录: trace {tracer.trace_id}")
+        return "\n".join(lines)
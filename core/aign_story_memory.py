@@ -0,0 +1,137 @@
+"""AIGN hierarchical story memory mixin (chapter summaries -> arc summaries -> book synopsis)."""
+
+from core.hierarchical_memory import (
+    ARC_SUMMARY_MAX_CHARS,
+    SYNOPSIS_MAX_CHARS,
+    HierarchicalMemory,
+)
+
+
+class StoryMemoryMixin:
+    """Opt-in hierarchical memory that keeps the writer's recap context bounded.
+
+    开启 hierarchical_memory 后，每 chapters_per_plot × memory_arc_plots 章为一卷：
+    整卷写完后生成卷梗概，超出最近 memory_recent_arcs 卷的旧卷依次并入全书梗概。
+    写作器的输入增加"全书梗概"和"前卷梗概"，非精简模式的"最近章节总结"缩短为
+    最近 memory_recent_chapters 章与本卷已写章节。压缩在需要上下文时按需执行，
+    存档恢复后也是在首次需要时校验并补齐。
+    """
+
+    def _get_story_memory(self) -> HierarchicalMemory:
+        """当前设置下的分层记忆（卷长度变化或刚从存档恢复时重新载入）"""
+        arc_chapters = max(1, int(getattr(self, 'chapters_per_plot', 2) or 1)) * max(1, int(getattr(self, 'memory_arc_plots', 5) or 1))
+        recent_arcs = getattr(self, 'memory_recent_arcs', 2)
+        memory = getattr(self, '_story_memory', None)
+        if memory is None or memory.arc_chapters != arc_chapters:
+            memory = HierarchicalMemory.from_dict(getattr(self, 'story_memory_data', None), arc_chapters, recent_arcs)
+            self._story_memory = memory
+        memory.recent_arcs = max(0, int(recent_arcs))
+        return memory
+
+    def get_story_memory_data(self) -> dict:
+        """存档用的分层记忆数据"""
+        if getattr(self, '_story_memory', None) is not None:
+            return self._story_memory.to_dict()
+        return getattr(self, 'story_memory_data', None) or {}
+
+    def load_story_memory_data(self, data):
+        """从存档恢复分层记忆（只保存数据，首次需要上下文时再校验、补齐）"""
+        self.story_memory_data = data or {}
+        self._story_memory = None
+
+    def _collect_chapter_summaries(self, last_chapter: int) -> dict:
+        """第1..last_chapter章的总结 {章节号: 文本}（取自故事线，章节总结写回后为实际剧情）"""
+        summaries = {}
+        for chapter_number in range(1, last_chapter + 1):
+            chapter = self.get_storyline_chapter(chapter_number)
+            if chapter:
+                title = chapter.get("title", "")
+                plot_summary = chapter.get("plot_summary", "")
+                summaries[chapter_number] = f"《{title}》：{plot_summary}" if title else plot_summary
+        return summaries
+
+    def ensure_story_memory(self, chapter_number):
+        """写第 chapter_number 章之前补齐分层记忆：失效检测 → 并入全书梗概 → 生成卷梗概
+
+        Returns:
+            HierarchicalMemory: 未开启分层记忆时返回 None
+        """
+        if not getattr(self, 'hierarchical_memory', False):
+            return None
+        memory = self._get_story_memory()
+        summaries = self._collect_chapter_summaries(memory.closed_arcs(chapter_number) * memory.arc_chapters)
+        stale = memory.invalidate(summaries, chapter_number)
+        if stale:
+            print(f"🏔️ 分层记忆：第{'、'.join(str(i) for i in stale)}卷的章节总结已变化，重新汇总")
+
+        work = memory.pending_work(chapter_number)
+        if work:
+            print(f"🏔️ 分层记忆：写第{chapter_number}章前需要压缩{len(work)}项（每卷{memory.arc_chapters}章）")
+        for kind, arc_index in work:
+            start, end = memory.arc_range(arc_index)
+            fingerprint = memory.arc_fingerprint(arc_index, summaries)
+            chapter_text = "\n".join(f"第{i}章{summaries[i]}" for i in range(start, end + 1) if summaries.get(i))
+            if not chapter_text:
+                # 该卷没有任何章节总结（故事线缺失），记为空，不发送请求
+                if kind == "arc":
+                    memory.set_arc(arc_index, "", fingerprint)
+                else:
+                    memory.fold_arc(arc_index, memory.synopsis, fingerprint)
+                continue
+            try:
+                if kind == "arc":
+                    summary = self._compress_story_memory("卷梗概", start, end, chapter_text, "", ARC_SUMMARY_MAX_CHARS)
+                    memory.set_arc(arc_index, summary, fingerprint)
+                    print(f"✅ 第{arc_index}卷（第{start}-{end}章）卷梗概已生成 ({len(memory.arcs[arc_index]['summary'])}字符)")
+                else:
+                    # 已有卷梗概时并入卷梗概，否则（重建时）直接并入该卷的章节总结
+                    entry = memory.arcs.get(arc_index)
+                    content = entry["summary"] if entry and entry.get("summary") else chapter_text
+                    synopsis = self._compress_story_memory("全书梗概", start, end, content, memory.synopsis, SYNOPSIS_MAX_CHARS)
+                    memory.fold_arc(arc_index, synopsis, fingerprint)
+                    print(f"✅ 第{arc_index}卷已并入全书梗概 ({len(memory.synopsis)}字符，覆盖第1-{end}章)")
+            except Exception as e:
+                # 必须按卷号顺序并入，失败后停止，下一章再从这里继续
+                print(f"⚠️ 分层记忆压缩失败（不影响正文生成，下一章重试）: {e}")
+                break
+        self.story_memory_data = memory.to_dict()
+        return memory
+
+    def _compress_story_memory(self, level, start, end, content, synopsis, max_chars) -> str:
+        """调用分层记忆压缩器生成卷梗概或新的全书梗概"""
+        resp = self.story_memory_compressor.invoke(
+            inputs=self._reorder_inputs_for_cache({
+                "人物列表": self.character_list,
+                "压缩层级": level,
+                "章节范围": f"第{start}-{end}章" if level == "卷梗概" else f"第1-{end}章",
+                "长度上限": f"{max_chars}字",
+                "已有全书梗概": synopsis,
+                "待压缩内容": content,
+            }),
+            output_keys=["梗概"],
+        )
+        return resp["梗概"]
+
+    def get_story_memory_context(self, chapter_number) -> dict:
+        """写第 chapter_number 章时的分层记忆上下文 {"全书梗概", "前卷梗概"}（未开启时为空字典）"""
+        memory = self.ensure_story_memory(chapter_number)
+        if memory is None:
+            return {}
+        return {
+            "全书梗概": memory.synopsis,
+            "前卷梗概": memory.recent_arc_summaries(chapter_number),
+        }
+
+    def _inject_story_memory_to_inputs(self, inputs: dict, chapter_number) -> dict:
+        """把全书梗概、前卷梗概注入写作器的输入（原地修改，空字段不注入）"""
+        for key, value in self.get_story_memory_context(chapter_number).items():
+            if value:
+                inputs[key] = value
+        return inputs
+
+    def get_story_memory_summary_start(self, chapter_number, max_summary_chapters) -> int:
+        """"最近章节总结"的起始章：开启分层记忆时只取最近几章与本卷已写章节，否则取最近 max_summary_chapters 章"""
+        if not getattr(self, 'hierarchical_memory', False):
+            return max(1, chapter_number - max_summary_chapters)
+        recent = min(max_summary_chapters, getattr(self, 'memory_recent_chapters', 5))
+        return self._get_story_memory().summary_start(chapter_number, recent)
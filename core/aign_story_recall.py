@@ -0,0 +1,195 @@
+"""AIGN story recall mixin (BM25 retrieval over the novel's own earlier chapters)."""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+
+STORY_INDEX_MAX_SEGMENTS = 64     # 增量段数超过此值时重建为单段
+STORY_INDEX_STALE_RATIO = 0.2     # 过期片段（章节被重写前的版本）占比超过此值时重建
+STORY_RECALL_CANDIDATES = 4       # 检索候选数 = top_k × 此倍数（过滤过期版本后再取前 top_k）
+
+
+def _signature(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class StoryRecallMixin:
+    """Opt-in retrieval of relevant passages from earlier chapters.
+
+    写作器只看得到最近几章正文和最近的章节总结，第40章出场的人物或埋下的物品到第300章时，
+    除非恰好留在全局设定里，否则完全不可见。开启 story_recall 后，已写章节的正文片段和故事线
+    条目增量写入 utils.local_rag_index 的本地 BM25 索引（字符二元组、mmap 只读段），
+    写每章前以"本章故事线"和本章主要人物为查询，取最相关的 story_recall_top_k 个片段作为
+    "相关前文片段"；非精简模式下以此代替整段发送的前三章正文。
+
+    只索引早于最近 story_recall_skip_recent 章的章节（这些章节的正文与章节总结已经稳定，
+    更近的章节已在上一章原文/最近章节总结中）。每个片段记录来源版本，章节被重写后旧版本
+    在检索时过滤，过期片段或增量段过多时整体重建。
+    """
+
+    # ---------- 索引 ----------
+
+    def _get_story_index_dir(self) -> str:
+        """索引目录：与输出文件同名的 _story_index 目录（尚无输出文件时放在 output 下）"""
+        output_file = getattr(self, 'current_output_file', '')
+        if output_file:
+            return os.path.splitext(output_file)[0] + "_story_index"
+        return os.path.join("output", f"{getattr(self, 'novel_title', '') or 'novel'}_story_index")
+
+    def _get_story_index(self):
+        """当前小说的本地索引（输出文件变化时重新打开）"""
+        from utils.local_rag_index import LocalRAGIndex
+        index_dir = os.path.abspath(self._get_story_index_dir())
+        index = getattr(self, '_story_index', None)
+        if index is None or index.index_dir != index_dir:
+            if index is not None:
+                index.close()
+            try:
+                index = LocalRAGIndex(index_dir)
+            except (ValueError, OSError) as e:
+                print(f"⚠️ 前文索引无法加载，重新构建: {e}")
+                shutil.rmtree(index_dir, ignore_errors=True)
+                index = LocalRAGIndex(index_dir)
+            self._story_index = index
+        return index
+
+    def _story_recall_sources(self, chapter_number) -> dict:
+        """写第 chapter_number 章时应当在索引中的来源 {"正文:章号@版本": (章号, 类型, 文本)}"""
+        sources = {}
+        last_stable = chapter_number - 1 - max(0, int(getattr(self, 'story_recall_skip_recent', 3)))
+        for i in range(1, last_stable + 1):
+            content = self.get_chapter_paragraph(i)
+            if content:
+                sources[f"正文:{i}@{_signature(content)}"] = (i, "正文", content)
+            chapter = self.get_storyline_chapter(i)
+            if isinstance(chapter, dict) and chapter.get("plot_summary"):
+                characters = chapter.get("main_characters") or []
+                text = "\n".join(part for part in (
+                    f"《{chapter.get('title', '')}》{chapter['plot_summary']}",
+                    f"主要人物：{'、'.join(characters) if isinstance(characters, list) else characters}" if characters else "",
+                ) if part)
+                sources[f"故事线:{i}@{_signature(text)}"] = (i, "故事线", text)
+        return sources
+
+    def sync_story_index(self, chapter_number) -> int:
+        """把写第 chapter_number 章前已稳定的章节增量写入索引，返回新增片段数（未开启时为0）"""
+        if not getattr(self, 'story_recall', False):
+            return 0
+        from utils.local_rag_index import LocalRAGIndex, split_into_chunks
+        start = time.perf_counter()
+        with self.__dict__.setdefault('_story_index_lock', threading.Lock()):
+            index = self._get_story_index()
+            sources = self._story_recall_sources(chapter_number)
+            indexed = index.get_sources()
+            stale = [key for key in indexed if key not in sources]
+            rebuild = bool(indexed) and (len(stale) > STORY_INDEX_STALE_RATIO * max(len(sources), 1)
+                                         or index.get_stats()["segments"] >= STORY_INDEX_MAX_SEGMENTS)
+            if rebuild:
+                index.close()
+                shutil.rmtree(index.index_dir, ignore_errors=True)
+                index = self._story_index = LocalRAGIndex(index.index_dir)
+                indexed = {}
+            missing = [key for key in sources if key not in indexed]
+            added = 0
+            if missing:
+                documents = []
+                for key in missing:
+                    chapter, kind, text = sources[key]
+                    chunks = split_into_chunks(text) if kind == "正文" else [text]
+                    documents.extend((chunk, {"source": f"第{chapter}章", "type": kind, "chapter": chapter, "key": key})
+                                     for chunk in chunks)
+                added = index.add_documents(documents, {key: "" for key in missing})
+            live = set(sources)
+            if live != getattr(self, '_story_recall_live', None):
+                self._story_recall_live = live
+                self._story_recall_version = getattr(self, '_story_recall_version', 0) + 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if missing or rebuild:
+            self.story_recall_stats["updates"] += 1
+            self.story_recall_stats["update_ms"] += elapsed_ms
+            self.story_recall_stats["max_update_ms"] = max(self.story_recall_stats["max_update_ms"], elapsed_ms)
+            print(f"🗃️ 前文索引{'重建' if rebuild else '更新'}: +{added}个片段，共{index.doc_count}个（{elapsed_ms:.1f} ms）")
+        return added
+
+    # ---------- 检索 ----------
+
+    def _build_story_recall_query(self, chapter_number) -> str:
+        """检索查询：本章故事线的标题、梗概和主要人物"""
+        chapter = self.get_storyline_chapter(chapter_number)
+        if not isinstance(chapter, dict):
+            return str(chapter or "")
+        characters = chapter.get("main_characters") or []
+        if isinstance(characters, list):
+            characters = " ".join(characters)
+        return " ".join(str(part) for part in (
+            chapter.get("title", ""), chapter.get("plot_summary", ""), characters,
+            " ".join(chapter.get("key_events", []) or []) if isinstance(chapter.get("key_events"), list) else "",
+        ) if part)
+
+    def get_story_recall_context(self, chapter_number) -> str:
+        """写第 chapter_number 章时的相关前文片段（未开启、无可检索章节或检索失败时为空字符串）"""
+        if not getattr(self, 'story_recall', False):
+            return ""
+        cache = self.__dict__.setdefault('_story_recall_cache', {})
+        try:
+            self.sync_story_index(chapter_number)
+            cache_key = (chapter_number, self._story_recall_version)
+            if cache_key in cache:
+                return cache[cache_key]
+            query = self._build_story_recall_query(chapter_number)
+            index = self._get_story_index()
+            if not query or not index.doc_count:
+                return ""
+            start = time.perf_counter()
+            top_k = max(1, int(getattr(self, 'story_recall_top_k', 4)))
+            live = getattr(self, '_story_recall_live', set())
+            results = [r for r in index.search(query, top_k=top_k * STORY_RECALL_CANDIDATES, min_similarity=0.0)
+                       if r["metadata"].get("key") in live][:top_k]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            print(f"⚠️ 前文检索失败（不影响正文生成）: {e}")
+            return ""
+
+        max_chars = int(getattr(self, 'story_recall_max_chars', 2400))
+        parts = []
+        total = 0
+        for result in results:
+            metadata = result["metadata"]
+            part = f"【{metadata['source']}·{metadata['type']}】{result['content']}"
+            if parts and total + len(part) > max_chars:
+                break
+            parts.append(part[:max_chars])
+            total += len(parts[-1])
+        text = "\n\n".join(parts)
+
+        self.story_recall_stats["searches"] += 1
+        self.story_recall_stats["search_ms"] += elapsed_ms
+        self.story_recall_stats["passages"] += len(parts)
+        if parts:
+            chapters = sorted({r["metadata"]["chapter"] for r in results[:len(parts)]})
+            print(f"🔎 第{chapter_number}章相关前文: {len(parts)}个片段（第{'、'.join(map(str, chapters))}章，"
+                  f"{total}字符，{elapsed_ms:.1f} ms）")
+        # 索引未变化时，长章节的各个分段使用同一份结果；只保留最新版本的缓存
+        for key in [k for k in cache if k[1] != cache_key[1]]:
+            del cache[key]
+        cache[cache_key] = text
+        return text
+
+    def _inject_story_recall_to_inputs(self, inputs: dict, chapter_number) -> dict:
+        """把相关前文片段注入写作器的输入（原地修改，为空时不注入）"""
+        recall = self.get_story_recall_context(chapter_number)
+        if recall:
+            inputs["相关前文片段"] = recall
+        return inputs
+
+    def get_story_recall_stats_display(self) -> str:
+        """生成前文检索统计显示文本，没有检索过时返回空字符串"""
+        stats = getattr(self, 'story_recall_stats', None)
+        if not stats or stats["searches"] == 0:
+            return ""
+        avg_update = stats["update_ms"] / stats["updates"] if stats["updates"] else 0.0
+        return (f"🔎 前文检索: {stats['searches']}次，平均 {stats['search_ms'] / stats['searches']:.1f} ms，"
+                f"注入{stats['passages']}个片段；索引更新{stats['updates']}次，平均 {avg_update:.1f} ms / 最大 {stats['max_update_ms']:.1f} ms")
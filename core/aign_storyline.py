@@ -1140,11 +1140,8 @@ class StorylineMixin:
         if not self.storyline or "chapters" not in self.storyline:
             return ""
         
-        for chapter in self.storyline["chapters"]:
-            if chapter["chapter_number"] == chapter_number:
-                return chapter
-        
-        return ""
+        chapter = self.get_storyline_chapter(chapter_number)
+        return chapter if chapter is not None else ""
     
     def getSurroundingStorylines(self, chapter_number, range_size=5):
         """获取前后章节的故事线"""
@@ -1154,26 +1151,24 @@ class StorylineMixin:
         # 获取前5章故事线
         prev_chapters = []
         for i in range(max(1, chapter_number - range_size), chapter_number):
-            for chapter in self.storyline["chapters"]:
-                if chapter["chapter_number"] == i:
-                    chapter_title = chapter.get("title", "")
-                    if chapter_title:
-                        prev_chapters.append(f"第{i}章《{chapter_title}》：{chapter['plot_summary']}")
-                    else:
-                        prev_chapters.append(f"第{i}章：{chapter['plot_summary']}")
-                    break
+            chapter = self.get_storyline_chapter(i)
+            if chapter:
+                chapter_title = chapter.get("title", "")
+                if chapter_title:
+                    prev_chapters.append(f"第{i}章《{chapter_title}》：{chapter['plot_summary']}")
+                else:
+                    prev_chapters.append(f"第{i}章：{chapter['plot_summary']}")
         
         # 获取后5章故事线
         next_chapters = []
         for i in range(chapter_number + 1, min(len(self.storyline["chapters"]) + 1, chapter_number + range_size + 1)):
-            for chapter in self.storyline["chapters"]:
-                if chapter["chapter_number"] == i:
-                    chapter_title = chapter.get("title", "")
-                    if chapter_title:
-                        next_chapters.append(f"第{i}章《{chapter_title}》：{chapter['plot_summary']}")
-                    else:
-                        next_chapters.append(f"第{i}章：{chapter['plot_summary']}")
-                    break
+            chapter = self.get_storyline_chapter(i)
+            if chapter:
+                chapter_title = chapter.get("title", "")
+                if chapter_title:
+                    next_chapters.append(f"第{i}章《{chapter_title}》：{chapter['plot_summary']}")
+                else:
+                    next_chapters.append(f"第{i}章：{chapter['plot_summary']}")
         
         prev_storyline = "\n".join(prev_chapters) if prev_chapters else ""
         next_storyline = "\n".join(next_chapters) if next_chapters else ""
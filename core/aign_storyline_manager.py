@@ -3,7 +3,7 @@ AIGN故事线管理模块 - 处理故事线生成、验证、修复
 
 本模块包含:
 - StorylineManager类：管理故事线的所有操作
-- 分批生成故事线
+- 分批生成故事线（串行，或按提供商上限并发 + 交界缝合）
 - 故事线验证和质量检查
 - 失败批次的检测和修复
 - 故事线状态管理
@@ -19,6 +19,13 @@ from core.storyline_chapter_utils import (
     normalize_chapter_title,
     validate_storyline_chapter_integrity,
 )
+from core.storyline_scheduler import (
+    STITCH_CONTEXT_CHAPTERS,
+    build_batch_plot_anchor,
+    format_stitch_chapters,
+    parse_stitch_response,
+    plan_storyline_batches,
+)
 from core.storyline_title_service import StorylineTitleService, is_valid_storyline_title
 
 
@@ -146,221 +153,38 @@ class StorylineManager:
         self.aign.storyline = {"chapters": []}
         self.aign.failed_batches = []  # 跟踪失败的批次
         
-        # 分批生成故事线
-        batch_count = 0
-        for start_chapter in range(1, self.aign.target_chapter_count + 1, chapters_per_batch):
-            end_chapter = min(start_chapter + chapters_per_batch - 1, self.aign.target_chapter_count)
-            batch_count += 1
-            
-            print(f"\n📝 正在生成第{batch_count}批故事线：第{start_chapter}-{end_chapter}章")
-            print(f"📋 当前批次章节数：{end_chapter - start_chapter + 1}")
-            
-            # 更新当前批次状态
-            if hasattr(self.aign, 'current_generation_status'):
-                self.aign.current_generation_status.update({
-                    "current_batch": batch_count,
-                    "current_chapter": start_chapter,
-                    "progress": (batch_count - 1) / self.aign.current_generation_status["total_batches"] * 100
-                })
-            
-            # 使用新的详细状态更新方法
-            if hasattr(self.aign, 'update_webui_status'):
-                self.aign.update_webui_status("故事线生成进度", f"正在生成第{start_chapter}-{end_chapter}章的故事线")
-            
-            # 准备输入
-            inputs = {
-                "大纲": current_outline,
-                "人物列表": self.aign.character_list,
-                "用户想法": getattr(self.aign, 'user_idea', ''),
-                "写作要求": getattr(self.aign, 'user_requirements', ''),
-                "章节范围": f"{start_chapter}-{end_chapter}章"
-            }
-            
-            # 如果有伏笔设定，加入上下文
-            foreshadowing = getattr(self.aign, 'foreshadowing', '')
-            if foreshadowing:
-                inputs["伏笔设定"] = foreshadowing
-                print(f"🔮 已加入伏笔设定上下文 ({len(foreshadowing)} 字符)")
-            
-            # 如果有详细大纲，也一同发送给AI提供更多上下文
-            if getattr(self.aign, 'detailed_outline', '') and self.aign.detailed_outline != getattr(self.aign, 'novel_outline', ''):
-                inputs["详细大纲"] = self.aign.detailed_outline
-                print(f"📋 已加入详细大纲上下文")
-            
-            # 如果有基础大纲且与当前使用的不同，也加入
-            if getattr(self.aign, 'novel_outline', '') and self.aign.novel_outline != current_outline:
-                inputs["基础大纲"] = self.aign.novel_outline
-                print(f"📋 已加入基础大纲上下文")
-            
-            # 如果有前置故事线，加入上下文
-            if self.aign.storyline["chapters"]:
-                prev_storyline = self._format_prev_storyline(self.aign.storyline["chapters"][-5:])
-                inputs["前置故事线"] = prev_storyline
-                print(f"📚 已加入前置故事线上下文（最近{min(5, len(self.aign.storyline['chapters']))}章）")
-            
-            # 尝试生成批次故事线
-            try:
-                # 使用增强的故事线生成器（如果可用）
-                try:
-                    from core.enhanced_storyline_generator import EnhancedStorylineGenerator
-                    # 传递AIGN实例以支持实时数据流显示
-                    enhanced_generator = EnhancedStorylineGenerator(self.storyline_generator.chatLLM, aign_instance=self.aign)
-                    
-                    # 准备消息（_build_storyline_prompt 返回 prompt 和 segment_count）
-                    prompt, segment_count = self._build_storyline_prompt(inputs, start_chapter, end_chapter)
-                    messages = [{"role": "user", "content": prompt}]
-                    
-                    # 使用从 _build_storyline_prompt 返回的 segment_count
-                    # 不再重新获取，避免不一致
-                    require_segments = segment_count > 0
-                    
-                    print("\n" + "=" * 70)
-                    print(f"🔍 使用提示词构建时确定的 segment_count")
-                    print("=" * 70)
-                    print(f"📦 segment_count: {segment_count} (类型: {type(segment_count).__name__})")
-                    print(f"📋 require_segments: {require_segments}")
-                    print("=" * 70 + "\n")
-                    
-                    print("\n" + "⚡" * 35)
-                    print(f"⚡⚡⚡ 准备调用增强生成器（批次{batch_count}）⚡⚡⚡")
-                    print("⚡" * 35)
-                    print(f"📋 require_segments: {require_segments} (类型: {type(require_segments).__name__})")
-                    print(f"📦 segment_count: {segment_count} (类型: {type(segment_count).__name__})")
-                    print(f"📏 完整提示词长度: {len(prompt)} 字符")
-                    print(f"🎯 期望生成: {end_chapter - start_chapter + 1} 章")
-                    if require_segments:
-                        print(f"❌ 输出格式: 每章包含 {segment_count} 个 plot_segments")
-                    else:
-                        print(f"✅ 输出格式: 仅梗概，不含 plot_segments")
-                    print("⚡" * 35 + "\n")
-                    
-                    # 使用增强生成器生成故事线
-                    print(f"🚀 正在调用 enhanced_generator.generate_storyline_batch()...")
-                    print(f"   参数: require_segments={require_segments}, segment_count={segment_count}")
-                    batch_storyline, generation_status = enhanced_generator.generate_storyline_batch(
-                        messages=messages,
-                        temperature=0.8,
-                        require_segments=require_segments,
-                        segment_count=segment_count,
-                        start_chapter=start_chapter,
-                        end_chapter=end_chapter,
-                    )
-                    
-                    if batch_storyline is None:
-                        error_msg = f"第{start_chapter}-{end_chapter}章故事线生成失败: {generation_status}"
-                        print(f"❌ {error_msg}")
-                        if hasattr(self.aign, 'current_generation_status'):
-                            self.aign.current_generation_status["errors"].append(error_msg)
-                        self.aign.failed_batches.append({
-                            "start_chapter": start_chapter,
-                            "end_chapter": end_chapter,
-                            "error": generation_status
-                        })
-                        continue
-                    
-                    print(f"✅ 故事线生成成功，使用方法: {generation_status}")
-                    
-                except ImportError:
-                    # 回退到标准生成方式
-                    print("⚠️ 增强故事线生成器不可用，使用标准生成方式")
-                    from core.storyline_markdown_parser import parse_storyline_markdown
-                    
-                    prompt_text, seg_count = self._build_storyline_prompt(inputs, start_chapter, end_chapter)
-                    resp = self.storyline_generator.query(prompt_text)
-                    resp_content = resp.get('content', '')
-                    
-                    if resp_content:
-                        batch_storyline = parse_storyline_markdown(resp_content)
-                        if not batch_storyline:
-                            error_msg = f"第{start_chapter}-{end_chapter}章故事线生成失败（Markdown解析失败）"
-                            print(f"❌ {error_msg}")
-                            self.aign.failed_batches.append({
-                                "start_chapter": start_chapter,
-                                "end_chapter": end_chapter,
-                                "error": "Markdown解析失败"
-                            })
-                            continue
-                    else:
-                        error_msg = f"第{start_chapter}-{end_chapter}章故事线生成失败"
-                        print(f"❌ {error_msg}")
-                        self.aign.failed_batches.append({
-                            "start_chapter": start_chapter,
-                            "end_chapter": end_chapter,
-                            "error": "未返回内容"
-                        })
-                        continue
-                
-                # 批次规范化：去重、修正章节号、统一标题
-                normalized_chapters, norm_meta = normalize_batch_chapters(
-                    batch_storyline.get("chapters", []),
-                    start_chapter,
-                    end_chapter,
-                )
-                batch_storyline["chapters"] = normalized_chapters
-
-                # 故事线阶段：补全/规范化本批次章节标题
-                batch_storyline["chapters"], title_meta = self._ensure_batch_chapter_titles(
-                    batch_storyline["chapters"],
-                )
-                if title_meta.get("heuristic_fixed") or title_meta.get("llm_fixed"):
-                    print(
-                        f"📖 本批次标题补全：启发式 {title_meta.get('heuristic_fixed', 0)} 章，"
-                        f"LLM {title_meta.get('llm_fixed', 0)} 章"
-                    )
-
-                # 严格验证批次故事线
-                validation_result = self._validate_storyline_batch(
-                    batch_storyline, start_chapter, end_chapter
-                )
+        batches = plan_storyline_batches(self.aign.target_chapter_count, chapters_per_batch)
+        concurrency = self._get_storyline_concurrency()
+        if concurrency > 1 and len(batches) > 1:
+            self._generate_batches_concurrently(batches, current_outline, concurrency)
+        else:
+            # 分批串行生成故事线
+            for batch_count, (start_chapter, end_chapter) in enumerate(batches, 1):
+                print(f"\n📝 正在生成第{batch_count}批故事线：第{start_chapter}-{end_chapter}章")
+                print(f"📋 当前批次章节数：{end_chapter - start_chapter + 1}")
                 
-                if not validation_result["valid"]:
-                    error_msg = f"故事线验证失败: {validation_result['error']}"
-                    print(f"❌ {error_msg}")
-                    if hasattr(self.aign, 'current_generation_status'):
-                        self.aign.current_generation_status["errors"].append(error_msg)
-                    self.aign.failed_batches.append({
-                        "start_chapter": start_chapter,
-                        "end_chapter": end_chapter,
-                        "error": validation_result['error']
+                # 更新当前批次状态
+                if hasattr(self.aign, 'current_generation_status'):
+                    self.aign.current_generation_status.update({
+                        "current_batch": batch_count,
+                        "current_chapter": start_chapter,
+                        "progress": (batch_count - 1) / self.aign.current_generation_status["total_batches"] * 100
                     })
-                    continue
-                
-                # 验证通过，按章节号合并到总故事线（同号覆盖，避免重复）
-                self.aign.storyline["chapters"] = merge_storyline_chapters(
-                    self.aign.storyline.get("chapters", []),
-                    batch_storyline["chapters"],
-                )
                 
-                print(f"✅ 第{start_chapter}-{end_chapter}章故事线生成完成")
-                print(f"📊 本批次生成章节数：{len(batch_storyline['chapters'])}")
-                print(f"📊 验证结果：{validation_result['summary']}")
+                # 使用新的详细状态更新方法
+                if hasattr(self.aign, 'update_webui_status'):
+                    self.aign.update_webui_status("故事线生成进度", f"正在生成第{start_chapter}-{end_chapter}章的故事线")
                 
-                # 显示生成的章节标题
-                if batch_storyline["chapters"]:
-                    print(f"📖 本批次章节标题：")
-                    for chapter in batch_storyline["chapters"][:3]:  # 只显示前3章
-                        ch_num = chapter.get("chapter_number", "?")
-                        ch_title = chapter.get("title", "未知标题")
-                        print(f"   第{ch_num}章: {ch_title}")
-                    if len(batch_storyline["chapters"]) > 3:
-                        print(f"   ... 还有{len(batch_storyline['chapters']) - 3}章")
+                inputs = self._prepare_batch_inputs(current_outline, start_chapter, end_chapter)
                 
-                # 更新进度
-                if hasattr(self.aign, 'current_generation_status'):
-                    self.aign.current_generation_status["progress"] = batch_count / self.aign.current_generation_status["total_batches"] * 100
-                    self.aign.current_generation_status["current_batch"] = batch_count
+                # 如果有前置故事线，加入上下文
+                if self.aign.storyline["chapters"]:
+                    prev_storyline = self._format_prev_storyline(self.aign.storyline["chapters"][-5:])
+                    inputs["前置故事线"] = prev_storyline
+                    print(f"📚 已加入前置故事线上下文（最近{min(5, len(self.aign.storyline['chapters']))}章）")
                 
-            except Exception as e:
-                error_msg = f"第{start_chapter}-{end_chapter}章故事线生成异常: {str(e)}"
-                print(f"❌ {error_msg}")
-                if hasattr(self.aign, 'current_generation_status'):
-                    self.aign.current_generation_status["errors"].append(error_msg)
-                self.aign.failed_batches.append({
-                    "start_chapter": start_chapter,
-                    "end_chapter": end_chapter,
-                    "error": str(e)
-                })
-                continue
+                result = self._generate_storyline_batch(inputs, start_chapter, end_chapter, batch_count)
+                self._commit_storyline_batch(result, batch_count)
         
         # 全局去重与标题规范化
         target_chapters = getattr(self.aign, 'target_chapter_count', 0)
@@ -432,6 +256,364 @@ class StorylineManager:
         
         return self.aign.storyline
     
+    def _get_storyline_concurrency(self) -> int:
+        """获取故事线批次并发度（storyline_concurrency 受当前提供商上限约束）"""
+        requested = getattr(self.aign, 'storyline_concurrency', 1)
+        concurrency = self.aign.get_provider_concurrency(requested)
+        if concurrency < (requested or 1):
+            print(f"📦 故事线并发度受当前提供商上限约束：{requested} → {concurrency}")
+        return concurrency
+    
+    def _get_plot_structure(self):
+        """生成与详细大纲一致的动态剧情结构（用于并发批次的阶段锚点）"""
+        try:
+            from core.dynamic_plot_structure import generate_plot_structure
+            return generate_plot_structure(
+                self.aign.target_chapter_count,
+                chapters_per_plot=getattr(self.aign, 'chapters_per_plot', 2),
+                num_climaxes=getattr(self.aign, 'num_climaxes', 20)
+            )
+        except Exception as e:
+            print(f"⚠️ 剧情结构生成失败，并发批次将只以详细大纲为锚点: {e}")
+            return None
+    
+    def _prepare_batch_inputs(self, current_outline, start_chapter, end_chapter):
+        """准备批次故事线的公共输入（不含前置故事线）"""
+        inputs = {
+            "大纲": current_outline,
+            "人物列表": self.aign.character_list,
+            "用户想法": getattr(self.aign, 'user_idea', ''),
+            "写作要求": getattr(self.aign, 'user_requirements', ''),
+            "章节范围": f"{start_chapter}-{end_chapter}章"
+        }
+        
+        # 如果有伏笔设定，加入上下文
+        foreshadowing = getattr(self.aign, 'foreshadowing', '')
+        if foreshadowing:
+            inputs["伏笔设定"] = foreshadowing
+            print(f"🔮 已加入伏笔设定上下文 ({len(foreshadowing)} 字符)")
+        
+        # 如果有详细大纲，也一同发送给AI提供更多上下文
+        if getattr(self.aign, 'detailed_outline', '') and self.aign.detailed_outline != getattr(self.aign, 'novel_outline', ''):
+            inputs["详细大纲"] = self.aign.detailed_outline
+            print(f"📋 已加入详细大纲上下文")
+        
+        # 如果有基础大纲且与当前使用的不同，也加入
+        if getattr(self.aign, 'novel_outline', '') and self.aign.novel_outline != current_outline:
+            inputs["基础大纲"] = self.aign.novel_outline
+            print(f"📋 已加入基础大纲上下文")
+        
+        return inputs
+    
+    def _generate_storyline_batch(self, inputs, start_chapter, end_chapter, batch_count, stream_to_ui=True):
+        """生成并验证单个批次的故事线
+        
+        只返回结果，不修改 AIGN 的故事线和失败记录（可在工作线程中调用），
+        由 _commit_storyline_batch 在调用线程中合并。
+        stream_to_ui=False 时生成过程不写入 AIGN 的实时流窗口（并发批次只让一个批次显示）。
+        
+        Returns:
+            dict: ok / chapters / validation / error / error_msg / duration
+        """
+        result = {
+            "start_chapter": start_chapter,
+            "end_chapter": end_chapter,
+            "ok": False,
+            "chapters": [],
+            "validation": None,
+            "error": "",
+            "error_msg": "",
+        }
+        batch_start_time = time.time()
+        
+        # 尝试生成批次故事线
+        try:
+            # 使用增强的故事线生成器（如果可用）
+            try:
+                from core.enhanced_storyline_generator import EnhancedStorylineGenerator
+                # 传递AIGN实例以支持实时数据流显示
+                enhanced_generator = EnhancedStorylineGenerator(
+                    self.storyline_generator.chatLLM, aign_instance=self.aign if stream_to_ui else None
+                )
+                
+                # 准备消息（_build_storyline_prompt 返回 prompt 和 segment_count）
+                prompt, segment_count = self._build_storyline_prompt(inputs, start_chapter, end_chapter)
+                messages = [{"role": "user", "content": prompt}]
+                
+                # 使用从 _build_storyline_prompt 返回的 segment_count
+                # 不再重新获取，避免不一致
+                require_segments = segment_count > 0
+                
+                print("\n" + "=" * 70)
+                print(f"🔍 使用提示词构建时确定的 segment_count")
+                print("=" * 70)
+                print(f"📦 segment_count: {segment_count} (类型: {type(segment_count).__name__})")
+                print(f"📋 require_segments: {require_segments}")
+                print("=" * 70 + "\n")
+                
+                print("\n" + "⚡" * 35)
+                print(f"⚡⚡⚡ 准备调用增强生成器（批次{batch_count}）⚡⚡⚡")
+                print("⚡" * 35)
+                print(f"📋 require_segments: {require_segments} (类型: {type(require_segments).__name__})")
+                print(f"📦 segment_count: {segment_count} (类型: {type(segment_count).__name__})")
+                print(f"📏 完整提示词长度: {len(prompt)} 字符")
+                print(f"🎯 期望生成: {end_chapter - start_chapter + 1} 章")
+                if require_segments:
+                    print(f"❌ 输出格式: 每章包含 {segment_count} 个 plot_segments")
+                else:
+                    print(f"✅ 输出格式: 仅梗概，不含 plot_segments")
+                print("⚡" * 35 + "\n")
+                
+                # 使用增强生成器生成故事线
+                print(f"🚀 正在调用 enhanced_generator.generate_storyline_batch()...")
+                print(f"   参数: require_segments={require_segments}, segment_count={segment_count}")
+                batch_storyline, generation_status = enhanced_generator.generate_storyline_batch(
+                    messages=messages,
+                    temperature=0.8,
+                    require_segments=require_segments,
+                    segment_count=segment_count,
+                    start_chapter=start_chapter,
+                    end_chapter=end_chapter,
+                )
+                
+                if batch_storyline is None:
+                    error_msg = f"第{start_chapter}-{end_chapter}章故事线生成失败: {generation_status}"
+                    print(f"❌ {error_msg}")
+                    result.update(error=generation_status, error_msg=error_msg)
+                    return result
+                
+                print(f"✅ 故事线生成成功，使用方法: {generation_status}")
+                
+            except ImportError:
+                # 回退到标准生成方式
+                print("⚠️ 增强故事线生成器不可用，使用标准生成方式")
+                from core.storyline_markdown_parser import parse_storyline_markdown
+                
+                prompt_text, seg_count = self._build_storyline_prompt(inputs, start_chapter, end_chapter)
+                resp = self.storyline_generator.query(prompt_text)
+                resp_content = resp.get('content', '')
+                
+                if resp_content:
+                    batch_storyline = parse_storyline_markdown(resp_content)
+                    if not batch_storyline:
+                        error_msg = f"第{start_chapter}-{end_chapter}章故事线生成失败（Markdown解析失败）"
+                        print(f"❌ {error_msg}")
+                        result["error"] = "Markdown解析失败"
+                        return result
+                else:
+                    error_msg = f"第{start_chapter}-{end_chapter}章故事线生成失败"
+                    print(f"❌ {error_msg}")
+                    result["error"] = "未返回内容"
+                    return result
+            
+            # 批次规范化：去重、修正章节号、统一标题
+            normalized_chapters, norm_meta = normalize_batch_chapters(
+                batch_storyline.get("chapters", []),
+                start_chapter,
+                end_chapter,
+            )
+            batch_storyline["chapters"] = normalized_chapters
+
+            # 故事线阶段：补全/规范化本批次章节标题
+            batch_storyline["chapters"], title_meta = self._ensure_batch_chapter_titles(
+                batch_storyline["chapters"],
+            )
+            if title_meta.get("heuristic_fixed") or title_meta.get("llm_fixed"):
+                print(
+                    f"📖 本批次标题补全：启发式 {title_meta.get('heuristic_fixed', 0)} 章，"
+                    f"LLM {title_meta.get('llm_fixed', 0)} 章"
+                )
+
+            # 严格验证批次故事线
+            validation_result = self._validate_storyline_batch(
+                batch_storyline, start_chapter, end_chapter
+            )
+            
+            if not validation_result["valid"]:
+                error_msg = f"故事线验证失败: {validation_result['error']}"
+                print(f"❌ {error_msg}")
+                result.update(error=validation_result['error'], error_msg=error_msg)
+                return result
+            
+            result.update(ok=True, chapters=batch_storyline["chapters"], validation=validation_result)
+            return result
+            
+        except Exception as e:
+            error_msg = f"第{start_chapter}-{end_chapter}章故事线生成异常: {str(e)}"
+            print(f"❌ {error_msg}")
+            result.update(error=str(e), error_msg=error_msg)
+            return result
+        finally:
+            result["duration"] = time.time() - batch_start_time
+    
+    def _commit_storyline_batch(self, result, batch_count):
+        """把批次结果合并到总故事线（在调用线程中按批次顺序执行）
+        
+        Returns:
+            bool: 是否合并成功
+        """
+        start_chapter = result["start_chapter"]
+        end_chapter = result["end_chapter"]
+        
+        if not result["ok"]:
+            if result.get("error_msg") and hasattr(self.aign, 'current_generation_status'):
+                self.aign.current_generation_status["errors"].append(result["error_msg"])
+            self.aign.failed_batches.append({
+                "start_chapter": start_chapter,
+                "end_chapter": end_chapter,
+                "error": result["error"]
+            })
+            return False
+        
+        # 验证通过，按章节号合并到总故事线（同号覆盖，避免重复）
+        chapters = result["chapters"]
+        self.aign.storyline["chapters"] = merge_storyline_chapters(
+            self.aign.storyline.get("chapters", []),
+            chapters,
+        )
+        
+        print(f"✅ 第{start_chapter}-{end_chapter}章故事线生成完成")
+        print(f"📊 本批次生成章节数：{len(chapters)}")
+        print(f"📊 验证结果：{result['validation']['summary']}")
+        
+        # 显示生成的章节标题
+        if chapters:
+            print(f"📖 本批次章节标题：")
+            for chapter in chapters[:3]:  # 只显示前3章
+                ch_num = chapter.get("chapter_number", "?")
+                ch_title = chapter.get("title", "未知标题")
+                print(f"   第{ch_num}章: {ch_title}")
+            if len(chapters) > 3:
+                print(f"   ... 还有{len(chapters) - 3}章")
+        
+        # 更新进度
+        if hasattr(self.aign, 'current_generation_status'):
+            self.aign.current_generation_status["progress"] = batch_count / self.aign.current_generation_status["total_batches"] * 100
+            self.aign.current_generation_status["current_batch"] = batch_count
+        return True
+    
+    def _generate_batches_concurrently(self, batches, current_outline, concurrency):
+        """并发生成故事线批次
+        
+        第一批之外的每批都以详细大纲和动态剧情结构中的阶段为锚点，不读取前一批的结果
+        （是否拿到前置故事线不取决于线程调度，提示词和需要缝合的交界在每次运行中都相同）。
+        结果按批次顺序合并，最后串行缝合各批次的交界。只有第1批的流式输出显示在实时流窗口中。
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        plot_structure = self._get_plot_structure()
+        
+        print(f"\n⚡ 故事线并发生成：共{len(batches)}批，并发度 {concurrency}")
+        if hasattr(self.aign, 'log_message'):
+            self.aign.log_message(f"⚡ 故事线并发生成：共{len(batches)}批，并发度 {concurrency}")
+        
+        def run_batch(batch_count, start_chapter, end_chapter):
+            print(f"\n📝 [并发] 开始生成第{batch_count}批故事线：第{start_chapter}-{end_chapter}章")
+            inputs = self._prepare_batch_inputs(current_outline, start_chapter, end_chapter)
+            anchor = build_batch_plot_anchor(plot_structure, start_chapter, end_chapter)
+            if anchor:
+                inputs["剧情阶段锚点"] = anchor
+            
+            result = self._generate_storyline_batch(
+                inputs, start_chapter, end_chapter, batch_count, stream_to_ui=batch_count == 1
+            )
+            # 非首批没有真实的前置故事线，交界需要缝合
+            result["anchored"] = batch_count > 1
+            return result
+        
+        wall_start = time.time()
+        results = []
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="aign-storyline") as executor:
+            futures = [
+                executor.submit(run_batch, batch_count, start_chapter, end_chapter)
+                for batch_count, (start_chapter, end_chapter) in enumerate(batches, 1)
+            ]
+            # 按批次顺序合并，保证结果与完成先后无关
+            for batch_count, future in enumerate(futures, 1):
+                result = future.result()
+                results.append(result)
+                self._commit_storyline_batch(result, batch_count)
+                if hasattr(self.aign, 'update_webui_status'):
+                    self.aign.update_webui_status(
+                        "故事线生成进度",
+                        f"已完成第{batch_count}/{len(batches)}批（并发度{concurrency}）"
+                    )
+        generation_time = time.time() - wall_start
+        
+        stitch_start = time.time()
+        stitched = self._stitch_batch_seams(results)
+        stitch_time = time.time() - stitch_start
+        
+        wall_time = generation_time + stitch_time
+        serial_time = sum(r.get("duration", 0) for r in results)
+        speedup = serial_time / wall_time if wall_time > 0 else 1.0
+        print(f"⚡ 故事线并发生成完成：墙钟{wall_time:.1f}秒（含缝合{stitch_time:.1f}秒），"
+              f"串行约{serial_time:.1f}秒，加速{speedup:.2f}x，缝合交界{stitched}处")
+        if hasattr(self.aign, 'current_generation_status'):
+            self.aign.current_generation_status.update({
+                "storyline_concurrency": concurrency,
+                "storyline_wall_seconds": round(wall_time, 1),
+                "storyline_serial_seconds": round(serial_time, 1),
+                "storyline_stitch_seconds": round(stitch_time, 1),
+                "storyline_stitched_seams": stitched,
+                "storyline_speedup": round(speedup, 2),
+            })
+    
+    def _stitch_batch_seams(self, results):
+        """串行缝合：修正锚点批次与前一批次交界处的 transition_to_next / continuation_from_prev
+        
+        Returns:
+            int: 成功缝合的交界数
+        """
+        chat_llm = getattr(self.storyline_generator, "chatLLM", None)
+        if chat_llm is None:
+            print("⚠️ 故事线交界缝合跳过：无可用 chatLLM")
+            return 0
+        
+        from prompts.common.storyline_stitch_prompt import storyline_stitch_prompt
+        
+        by_number = {ch.get("chapter_number"): ch for ch in self.aign.storyline.get("chapters", [])}
+        stitched = 0
+        for prev_result, next_result in zip(results, results[1:]):
+            if not next_result.get("anchored") or not (prev_result["ok"] and next_result["ok"]):
+                continue
+            seam = prev_result["end_chapter"]
+            before = [by_number[n] for n in range(seam - STITCH_CONTEXT_CHAPTERS + 1, seam + 1) if n in by_number]
+            after = [by_number[n] for n in range(seam + 1, seam + 1 + STITCH_CONTEXT_CHAPTERS) if n in by_number]
+            if not before or not after:
+                continue
+            
+            user_prompt = (
+                f"**前一批次的最后{len(before)}章:**\n{format_stitch_chapters(before, include_continuation=False)}\n"
+                f"**后一批次的最初{len(after)}章:**\n{format_stitch_chapters(after, include_continuation=True)}\n"
+                f"请重写第{seam}章的衔接下章与第{seam + 1}章的承接上章。"
+            )
+            try:
+                messages = [
+                    {"role": "system", "content": storyline_stitch_prompt},
+                    {"role": "user", "content": user_prompt},
+                ]
+                response = chat_llm(messages, temperature=0.5, stream=False)
+                content = ""
+                if isinstance(response, dict):
+                    content = response.get("content") or ""
+                elif isinstance(response, str):
+                    content = response
+                fixed = parse_stitch_response(content)
+            except Exception as e:
+                print(f"⚠️ 第{seam}/{seam + 1}章交界缝合失败，保留原衔接: {e}")
+                continue
+            
+            if fixed.get("transition_to_next"):
+                before[-1]["transition_to_next"] = fixed["transition_to_next"]
+            if fixed.get("continuation_from_prev"):
+                after[0]["continuation_from_prev"] = fixed["continuation_from_prev"]
+            if fixed:
+                stitched += 1
+                print(f"🧵 已缝合第{seam}/{seam + 1}章交界")
+        return stitched
+    
+
     def _build_storyline_prompt(self, inputs: dict, start_chapter: int, end_chapter: int):
         """构建故事线生成的提示词
         
@@ -521,6 +703,13 @@ class StorylineManager:
         if inputs.get('详细大纲'):
             prompt += f"**详细大纲:**\n{inputs['详细大纲']}\n\n"
         
+        if inputs.get('剧情阶段锚点'):
+            prompt += f"**本批次所处剧情阶段:**\n{inputs['剧情阶段锚点']}\n\n"
+            if not inputs.get('前置故事线') and start_chapter > 1:
+                prompt += (f"**注意：** 本批次与前面的批次并行规划，看不到前置故事线。"
+                           f"请严格以详细大纲和上述剧情阶段为准安排第{start_chapter}章的起点，"
+                           f"承接上章按大纲推断即可，交界处的衔接会在之后统一校正。\n\n")
+        
         if inputs.get('伏笔设定'):
             prompt += f"**伏笔设定（请在故事线中安排埋设和揭示）:**\n{inputs['伏笔设定']}\n\n"
         
@@ -31,12 +31,13 @@ class AIGNUtilities:
         Returns:
             str: 完整的小说内容
         """
-        novel_content = ""
-        paragraph_list = getattr(self.aign, 'paragraph_list', [])
-        
-        for paragraph in paragraph_list:
-            novel_content += f"{paragraph}\n\n"
+        if hasattr(self.aign, 'updateNovelContent'):
+            # 增量同步章节存储，避免每次重建整本字符串
+            self.aign.updateNovelContent()
+            return self.aign.novel_content
         
+        paragraph_list = getattr(self.aign, 'paragraph_list', [])
+        novel_content = "".join(f"{paragraph}\n\n" for paragraph in paragraph_list)
         self.aign.novel_content = novel_content
         return novel_content
     
@@ -733,14 +734,14 @@ def get_previous_chapter_content(paragraph_list, chapter_number):
     if chapter_number <= 1 or not paragraph_list:
         return ""
     
-    # 尝试找到上一章的内容
-    prev_chapter_content = ""
+    # 按标题行解析章节号（子串匹配会让"第1章"误匹配"第11章"）
+    from core.chapter_index import parse_paragraph_chapter_number
+    
     for paragraph in reversed(paragraph_list):
-        if f"第{chapter_number - 1}章" in paragraph:
-            prev_chapter_content = paragraph
-            break
+        if parse_paragraph_chapter_number(paragraph) == chapter_number - 1:
+            return paragraph
     
-    return prev_chapter_content
+    return ""
 
 
 def build_context_for_generation(storyline_data, paragraph_list, chapter_number, target_chapter_count):
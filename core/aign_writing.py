@@ -7,6 +7,9 @@ import json
 import traceback
 from datetime import datetime
 
+from core.chapter_index import ChapterIndex
+from core.novel_content_store import NovelContentStore
+
 
 class WritingMixin:
     """Beginning, paragraph generation, memory, and embellishment."""
@@ -61,66 +64,116 @@ class WritingMixin:
         Returns:
             重新排序后的输入字典（不删除任何字段）
         """
-        # 定义字段优先级（数字越小越靠前）
-        field_priority = {
-            # === 固定字段（整个小说生成过程中不变） ===
-            "小说大纲": 10,
-            "大纲": 11,
-            "基础大纲": 12,
-            "详细大纲": 13,
-            "人物列表": 14,
-            "用户想法": 15,
-            "写作要求": 16,
-            "润色想法": 17,
-            "用户要求": 18,
-            # === 缓慢变化字段（多章才变一次） ===
-            "伏笔设定": 30,
-            "全局设定": 31,
-            "风格参考": 32,
-            "是否最终章": 33,
-            # === 结构/上下文字段（每章变化但可能部分重叠） ===
-            "前五章总结": 40,
-            "最近章节总结": 41,
-            "前2章故事线": 42,
-            "后2章故事线": 43,
-            "前三章正文（不含上一章）": 44,
-            "后五章梗概（仅供参考，不可写入本章）": 45,
-            # === 动态字段（每章/每段都变化） ===
-            "前文记忆": 60,
-            "临时设定": 61,
-            "计划": 62,
-            "当前章节": 63,
-            "本章故事线": 64,
-            "故事线": 65,
-            "本章分段（参考）": 66,
-            "当前分段": 67,
-            "前章过渡提示": 68,
-            "上一章原文": 70,
-            "上文内容": 71,
-            "上文结尾": 72,
-            "要润色的内容": 80,
-            "要润色的结尾内容": 81,
-            "要润色的开头内容": 82,
-            # === 辅助Agent字段 ===
-            "当前全局设定": 10,
-            "本章正文": 80,
-            "当前章节号": 63,
-        }
-        
-        # 按优先级排序，未知字段放到最后
-        sorted_items = sorted(
-            inputs.items(),
-            key=lambda item: field_priority.get(item[0], 100)
-        )
+        from core.agents.prefix_planner import order_by_priority
         
-        return dict(sorted_items)
+        try:
+            from config.dynamic_config_manager import get_config_snapshot
+            mode = get_config_snapshot().prefix_cache_mode
+        except Exception:
+            mode = "fix"
+        # 优先级表与智能体输入的前缀规划共用（core/agents/prefix_planner.FIELD_PRIORITY）
+        return order_by_priority(inputs, mode)
+
+    def _prepare_writer_inputs(self, agent, inputs: dict, chapter_number) -> dict:
+        """正文写作器输入的统一装配：注入伏笔设定、卷/全书梗概、相关前文片段、全局设定，重排后按预算裁剪
+
+        串行写作、长章节分段写作与预起草下一章都经过这里，保证各路径发送的字段一致。
+
+        Args:
+            agent: 将要调用的写作器
+            inputs: 写作器的基础输入（原地注入）
+            chapter_number: 正在写的章节号
+        Returns:
+            装配并裁剪后的输入字典
+        """
+        self._inject_foreshadowing_to_inputs(inputs)
+        self._inject_story_memory_to_inputs(inputs, chapter_number)
+        self._inject_story_recall_to_inputs(inputs, chapter_number)
+        return self._fit_inputs_to_budget(agent, self._inject_global_context_to_inputs(inputs))
+
+    def _fit_inputs_to_budget(self, agent, inputs: dict) -> dict:
+        """按上下文 token 预算裁剪正文/润色输入（见 core/context_assembler）
 
+        预算为整个请求的输入 token 数，先扣除该智能体的系统提示词与历史消息，剩余部分分配给输入字段。
+        超出预算时按字段价值从低到高裁剪，并打印每个被裁剪字段的原因。
+
+        Args:
+            agent: 将要调用的智能体（用于扣除系统提示词并在日志中标明）
+            inputs: 已注入伏笔/全局设定并重排后的输入字典
+        Returns:
+            未超出预算时返回原字典，否则返回裁剪后的新字典
+        """
+        from core.context_assembler import assemble_context
+        from core.agents.token_estimator import estimate_joined_tokens
+
+        try:
+            from config.dynamic_config_manager import get_config_snapshot
+            budget = int(get_config_snapshot().context_token_budget)
+        except Exception:
+            budget = 0
+        if budget <= 0:
+            return inputs
+
+        history = getattr(agent, 'history', None) or []
+        prompt_tokens = estimate_joined_tokens(m.get("content") or "" for m in history)
+        assembled, trims, total = assemble_context(inputs, budget - prompt_tokens)
+        if not trims:
+            return inputs
+
+        agent_name = getattr(agent, 'name', '智能体')
+        saved = sum(before - after for _, before, after, _ in trims)
+        print(f"✂️ [{agent_name}] 输入超出上下文预算（约{prompt_tokens + total:,} > {budget:,} tokens），按价值从低到高裁剪 {saved:,} tokens：")
+        for key, before, after, note in trims:
+            print(f"   • {key}: {before:,} → {after:,} tokens（{note}）")
+        if prompt_tokens + total - saved > budget:
+            print(f"⚠️ [{agent_name}] 可裁剪字段已达下限，输入仍超出预算约{prompt_tokens + total - saved - budget:,} tokens")
+        self.log_message(f"✂️ {agent_name} 输入超出上下文预算，已裁剪: {', '.join(key for key, _, _, _ in trims)}")
+        return assembled
+
+
+    def _get_novel_store(self) -> NovelContentStore:
+        """获取按章节索引的正文存储（懒加载）"""
+        store = self.__dict__.get('_novel_store')
+        if store is None:
+            store = self.__dict__.setdefault('_novel_store', NovelContentStore())
+        return store
+
+    @property
+    def novel_content(self):
+        # 整本正文只在读取时才拼接，并缓存到下一次章节变化
+        return self._get_novel_store().text
+
+    @novel_content.setter
+    def novel_content(self, value):
+        self._get_novel_store().set_text(value)
+
+    def get_novel_content_length(self) -> int:
+        """正文总字符数（不触发整本拼接）"""
+        return len(self._get_novel_store())
 
     def updateNovelContent(self):
-        self.novel_content = ""
-        for paragraph in self.paragraph_list:
-            self.novel_content += f"{paragraph}\n\n"
-        return self.novel_content
+        # 只同步新增或被修改的章节，不再每章重建整本字符串
+        self._get_novel_store().sync(self.paragraph_list)
+        self._get_chapter_index().sync_paragraphs(self.paragraph_list)
+
+    def _get_chapter_index(self) -> ChapterIndex:
+        """获取章节号索引（懒加载）"""
+        index = self.__dict__.get('_chapter_index')
+        if index is None:
+            index = self.__dict__.setdefault('_chapter_index', ChapterIndex())
+        return index
+
+    def rebuild_chapter_index(self):
+        """整体重建章节索引（加载存档后调用）"""
+        self._get_chapter_index().sync_paragraphs(self.paragraph_list, force=True)
+
+    def get_chapter_paragraph(self, chapter_number) -> str:
+        """按章节号获取正文，找不到返回空字符串"""
+        return self._get_chapter_index().get_paragraph(self.paragraph_list, chapter_number)
+
+    def get_storyline_chapter(self, chapter_number):
+        """按章节号获取故事线条目，找不到返回 None"""
+        return self._get_chapter_index().get_storyline_chapter(getattr(self, 'storyline', None), chapter_number)
 
     def get_recent_novel_preview(self, limit_chapters: int = 5) -> str:
         """返回仅用于界面显示的最近N章正文，减少浏览器负担。
@@ -322,13 +375,18 @@ class WritingMixin:
         context_label: str = "章节润色",
         output_key: str = "润色结果",
         use_foreshadowing: bool = True,
+        allow_chunking: bool = True,
     ) -> str:
         """带截断自动重试的润色调用。
         
+        开启分块润色（embellish_chunks > 1）且原文达到 embellish_chunk_min_chars 时，
+        改为 _embellish_in_chunks() 分块并发润色，每块各自按下面的策略重试。
+        
         重试策略：
         1. 第1次：正常润色
-        2. 截断→第2次：直接重试
-        3. 仍截断→第3次：加入长度控制指令（控制润色后内容长度不超过原文的指定倍数）
+        2. 截断→第2次：输出在中途被截断（没有完成标识和结束标记）时保留已润色的部分，
+           以相同输入从断点续写；否则直接重试
+        3. 仍截断→第3次：续写有进展时继续续写，否则加入长度控制指令（控制润色后内容长度不超过原文的指定倍数）
         4. 仍截断→回退到润色前原文
         
         Args:
@@ -339,6 +397,7 @@ class WritingMixin:
             context_label: 上下文标签
             output_key: 输出键名（默认 "润色结果"）
             use_foreshadowing: 是否注入伏笔信息
+            allow_chunking: 是否允许分块润色（分块内部的调用为 False）
             
         Returns:
             str: 润色后的内容（或回退到原文）
@@ -365,6 +424,16 @@ class WritingMixin:
                 f"\n润色后内容必须控制在15000字以内。"
             )
         
+        if allow_chunking:
+            chunked = self._embellish_in_chunks(
+                embellisher, embellish_inputs, original_content, chapter_number, context_label,
+                output_key, use_foreshadowing, chinese_char_count if content_too_long else 0,
+            )
+            if chunked is not None:
+                return chunked
+        
+        resume_from = ""            # 上一次被截断的响应中的有效前缀
+        invoke_inputs = None
         for attempt in range(1, max_attempts + 1):
             attempt_label = f"{context_label}-尝试{attempt}"
             
@@ -380,7 +449,10 @@ class WritingMixin:
                 if attempt == 1:
                     print(f"📏 [{attempt_label}] 已注入正文精简指令")
             
-            if attempt == 3:
+            if resume_from:
+                print(f"🧩 [{attempt_label}] 第{attempt}次尝试: 保留已润色的{len(resume_from)}字，从断点续写")
+                self.log_message(f"🧩 第{chapter_number}章 润色被截断，保留已润色部分从断点续写...")
+            elif attempt == 3:
                 # 第3次尝试：加入长度控制指令
                 original_len = len(original_content)
                 # 计算建议的润色后最大字数（原文的2.5倍，但最多8000字）
@@ -404,15 +476,18 @@ class WritingMixin:
                 self.log_message(f"🔄 第{chapter_number}章 检测到润色截断，正在重试...")
             
             try:
-                # 执行润色
-                if use_foreshadowing:
-                    invoke_inputs = self._inject_global_context_to_inputs(self._inject_foreshadowing_to_inputs(current_inputs))
-                else:
-                    invoke_inputs = self._reorder_inputs_for_cache(current_inputs)
+                # 执行润色（续写时沿用上一次的输入，保证与被截断的响应对应）
+                if not resume_from:
+                    if use_foreshadowing:
+                        invoke_inputs = self._inject_global_context_to_inputs(self._inject_foreshadowing_to_inputs(current_inputs))
+                    else:
+                        invoke_inputs = self._reorder_inputs_for_cache(current_inputs)
+                    invoke_inputs = self._fit_inputs_to_budget(embellisher, invoke_inputs)
                     
                 resp = embellisher.invoke(
                     inputs=invoke_inputs,
                     output_keys=[output_key],
+                    resume_from=resume_from,
                 )
                 polished = resp[output_key]
                 raw_response = resp.get("_raw_response", "")
@@ -435,7 +510,10 @@ class WritingMixin:
                         self.log_message(f"✅ 第{chapter_number}章 润色重试成功（第{attempt}次），内容完整")
                     return polished
                 
-                # 截断了，判断是否继续重试
+                # 截断了：丢弃缓存的截断响应（否则相同输入的重试会再次命中它），再判断是续写还是重新生成
+                embellisher._discard_cached_response()
+                next_resume = self._embellish_resume_prefix(result, raw_response)
+                resume_from = next_resume if len(next_resume) > len(resume_from) else ""
                 if attempt < max_attempts:
                     print(f"⚠️ [{attempt_label}] 检测到截断，将进行第{attempt + 1}次尝试...")
                 else:
@@ -461,6 +539,122 @@ class WritingMixin:
         # 理论上不会到这里
         return original_content
 
+    def _embellish_in_chunks(
+        self,
+        embellisher,
+        embellish_inputs: dict,
+        original_content: str,
+        chapter_number: int,
+        context_label: str,
+        output_key: str,
+        use_foreshadowing: bool,
+        condense_chars: int = 0,
+    ):
+        """分块并发润色：在场景/段落边界切块，每块带衔接窗口单独润色（截断检测与重试只针对该块），再拼接去重
+        
+        Args:
+            condense_chars: 整章正文过长时的汉字数（>0 时按块长比例要求每块精简），否则为0
+            
+        Returns:
+            str: 拼接后的润色结果；未开启分块、正文不够长或无法切分时返回 None（由调用方整章润色）
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from core.embellish_chunker import plan_chunk_count, split_chunks, chunk_context, stitch_chunks
+        
+        chunk_count = plan_chunk_count(
+            len(original_content), getattr(self, 'embellish_chunks', 1), getattr(self, 'embellish_chunk_min_chars', 0)
+        )
+        # 原文必须是输入中的某一项（要润色的内容 / 要润色的结尾内容），才能替换为分块原文
+        content_key = next((key for key, value in embellish_inputs.items() if value == original_content), None)
+        if chunk_count <= 1 or not content_key:
+            return None
+        chunks, separators = split_chunks(original_content, chunk_count)
+        if len(chunks) <= 1:
+            return None
+        contexts = [chunk_context(chunks, index) for index in range(len(chunks))]
+        concurrency = self.get_provider_concurrency(len(chunks))
+        print(f"\n✂️ [{context_label}] 第{chapter_number}章分块润色：{len(original_content)}字切为{len(chunks)}块"
+              f"（{'/'.join(str(len(chunk)) for chunk in chunks)}字），并发度 {concurrency}")
+        self.log_message(f"✂️ 第{chapter_number}章分块润色：{len(chunks)}块，并发度 {concurrency}")
+        
+        def run_chunk(index):
+            chunk = chunks[index]
+            before, after = contexts[index]
+            inputs = dict(embellish_inputs)
+            inputs[content_key] = chunk
+            inputs["当前分块"] = (
+                f"第{index + 1}/{len(chunks)}块。本章正文分块润色，只润色并输出“{content_key}”中的文字；"
+                f"上文衔接/下文衔接只用于保持语气与情节连贯，不要润色或输出其中的内容"
+            )
+            if before:
+                inputs["上文衔接（仅供参考，不要输出）"] = before
+            if after:
+                inputs["下文衔接（仅供参考，不要输出）"] = after
+            if condense_chars:
+                limit = max(500, int(15000 * len(chunk) / len(original_content)))
+                inputs["润色要求"] = (
+                    str(inputs.get("润色要求") or "")
+                    + f"\n\n【⚠️ 正文精简要求】本章正文过长（{condense_chars}汉字），请在保持关键剧情和对话不变的前提下"
+                    f"删减重复描写、冗余心理活动和流水账过渡，本块润色后控制在{limit}字以内。"
+                )
+            start = time.time()
+            polished = self._embellish_with_retry(
+                embellisher=embellisher.fork(foreground=index == 0),  # 只有第一块显示在实时流窗口
+                embellish_inputs=inputs,
+                original_content=chunk,
+                chapter_number=chapter_number,
+                context_label=f"{context_label}-分块{index + 1}/{len(chunks)}",
+                output_key=output_key,
+                use_foreshadowing=use_foreshadowing,
+                allow_chunking=False,
+            )
+            return polished, time.time() - start
+        
+        wall_start = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="aign-embellish") as executor:
+            results = list(executor.map(run_chunk, range(len(chunks))))
+        wall_time = time.time() - wall_start
+        
+        parts = [polished for polished, _ in results]
+        fallbacks = sum(1 for part, chunk in zip(parts, chunks) if part == chunk)
+        polished, seams = stitch_chunks(parts, separators, contexts)
+        serial_time = sum(duration for _, duration in results)
+        stats = self.embellish_chunk_stats
+        stats["chapters"] += 1
+        stats["chunks"] += len(chunks)
+        stats["fallbacks"] += fallbacks
+        stats["seams"] += seams
+        stats["wall_seconds"] += wall_time
+        stats["serial_seconds"] += serial_time
+        print(f"✂️ [{context_label}] 分块润色完成：{len(polished)}字，墙钟{wall_time:.1f}秒，串行约{serial_time:.1f}秒，"
+              f"交界去重{seams}段" + (f"，{fallbacks}块回退原文" if fallbacks else ""))
+        if fallbacks:
+            self.log_message(f"⚠️ 第{chapter_number}章分块润色：{fallbacks}/{len(chunks)}块润色失败，已使用该块原文")
+        return polished
+    
+    def get_embellish_chunk_stats_display(self) -> str:
+        """生成分块润色统计显示文本，没有分块润色时返回空字符串"""
+        stats = getattr(self, 'embellish_chunk_stats', None)
+        if not stats or stats["chapters"] == 0:
+            return ""
+        speedup = stats["serial_seconds"] / stats["wall_seconds"] if stats["wall_seconds"] > 0 else 1.0
+        return (f"✂️ 分块润色: {stats['chapters']}章共{stats['chunks']}块，回退原文{stats['fallbacks']}块，"
+                f"交界去重{stats['seams']}段，墙钟{stats['wall_seconds']:.1f}秒（串行约{stats['serial_seconds']:.1f}秒，"
+                f"加速{speedup:.2f}x）")
+
+    def _embellish_resume_prefix(self, truncation: dict, raw_response: str) -> str:
+        """润色输出在中途被截断（没有完成标识和结束标记）时返回可续写的有效前缀，否则返回空字符串"""
+        if not raw_response or truncation["details"].get("has_end_marker", True):
+            return ""
+        try:
+            from config.dynamic_config_manager import get_config_snapshot
+            if not get_config_snapshot().resume_partial:
+                return ""
+        except Exception:
+            pass
+        from core.agents.continuation import resumable_prefix
+        return resumable_prefix(raw_response)
+
 
     def genBeginning(self, user_requirements=None, embellishment_idea=None):
         # 在生成前刷新chatLLM以确保使用最新配置
@@ -619,7 +813,7 @@ class WritingMixin:
             print("📚 RAG (开头生成): 正在检索风格参考...")
             # 构建查询：故事线 + 写作要求（精简版）
             rag_query = f"{storyline_for_beginning} {self.user_requirements}"
-            rag_references = self._get_rag_references(rag_query, top_k=self.rag_top_k, for_embellishment=False)
+            rag_references = self._get_rag_references(rag_query, top_k=self.rag_top_k, for_embellishment=False, stage="开头生成")
             if rag_references:
                 print(f"📚 RAG: 已添加风格参考 ({len(rag_references)} 字符)")
             else:
@@ -667,112 +861,111 @@ class WritingMixin:
             else:
                 enhanced_context = self.getEnhancedContext(1)
 
-            for seg_index in range(1, segment_count + 1):
-                # 选择当前分段
-                segment = None
-                for seg in story_segments:
-                    if str(seg.get('index')) == str(seg_index):
-                        segment = seg
-                        break
-                segment = segment or story_segments[seg_index - 1]
-
-                current_seg_text = f"第{seg_index}段《{segment.get('segment_title','')}》\n{segment.get('segment_summary','')}"
-                refs = []
-                for j in range(1, segment_count + 1):
-                    if j == seg_index:
-                        continue
-                    sj = None
-                    for s in story_segments:
-                        if str(s.get('index')) == str(j):
-                            sj = s
+            segment_stage = self.start_segment_pipeline(self.chapter_count + 1)
+            prev_draft = ""
+            try:
+                for seg_index in range(1, segment_count + 1):
+                    # 选择当前分段
+                    segment = None
+                    for seg in story_segments:
+                        if str(seg.get('index')) == str(seg_index):
+                            segment = seg
                             break
-                    sj = sj or story_segments[j - 1]
-                    refs.append(f"第{j}段《{sj.get('segment_title','')}》：{sj.get('segment_summary','')}")
-                refs_text = "\n".join(refs)
-
-                # 选择writer与输入
-                if getattr(self, 'compact_mode', False):
-                    writer_agent = getattr(self, f"novel_writer_compact_seg{seg_index}", self.novel_writer_compact)
-                    seg_inputs = {
-                        "大纲": self.getCurrentOutline(),
-                        "写作要求": self.user_requirements,
-                        "风格参考": rag_references,
-                        "前文记忆": self.writing_memory,
-                        "临时设定": self.temp_setting,
-                        "计划": self.writing_plan,
-                        "本章故事线": storyline_for_beginning,
-                        "本章分段（参考）": refs_text,
-                        "当前分段": current_seg_text,
-                        "前2章故事线": compact_prev_storyline,
-                        "后2章故事线（仅供参考，不可写入本章）": compact_next_storyline,
-                    }
-                else:
-                    writer_agent = getattr(self, f"novel_writer_seg{seg_index}", self.novel_writer)
-                    seg_inputs = {
-                        "用户想法": self.user_idea,
-                        "大纲": self.getCurrentOutline(),
-                        "人物列表": self.character_list,
-                        "前文记忆": self.writing_memory,
-                        "临时设定": self.temp_setting,
-                        "计划": self.writing_plan,
-                        "写作要求": self.user_requirements,
-                        "润色想法": self.embellishment_idea,
-                        "上文内容": self.getLastParagraph(),
-                        "本章故事线": storyline_for_beginning,
-                        "本章分段（参考）": refs_text,
-                        "当前分段": current_seg_text,
-                        "前五章总结": enhanced_context["prev_chapters_summary"] if not getattr(self, 'compact_mode', False) else "",
-                        "后五章梗概（仅供参考，不可写入本章）": enhanced_context["next_chapters_outline"] if not getattr(self, 'compact_mode', False) else "",
-                        "上一章原文": enhanced_context["last_chapter_content"] if not getattr(self, 'compact_mode', False) else "",
-                        "风格参考": rag_references,
-                    }
-                seg_resp = writer_agent.invoke(inputs=self._inject_global_context_to_inputs(self._inject_foreshadowing_to_inputs(seg_inputs)), output_keys=["段落", "计划", "临时设定"])
-                seg_text = seg_resp["段落"]
-                last_plan = seg_resp.get("计划", last_plan)
-                last_setting = seg_resp.get("临时设定", last_setting)
-
-                # 分段润色
-                if getattr(self, 'compact_mode', False):
-                    emb_agent = getattr(self, f"novel_embellisher_compact_seg{seg_index}", self.novel_embellisher_compact)
-                    emb_inputs = {
-                        "大纲": self.getCurrentOutline(),
-                        "润色要求": self.embellishment_idea,
-                        "要润色的内容": seg_text,
-                        "前2章故事线": compact_prev_storyline,
-                        "后2章故事线（仅供参考，不可写入本章）": compact_next_storyline,
-                        "本章故事线": storyline_for_beginning,
-                        "当前分段": current_seg_text,
-                        "风格参考": rag_references,
-                    }
-                    # 为非首段添加上一段润色后的原文，确保段落衔接流畅
-                    if seg_index > 1 and len(parts) > 0:
-                        emb_inputs["上一段原文"] = parts[-1]  # 使用上一个segment的润色结果
-                        print(f"   📎 已添加上一段原文({len(parts[-1])}字符)以确保段落衔接")
-                else:
-                    emb_agent = getattr(self, f"novel_embellisher_seg{seg_index}", self.novel_embellisher)
-                    emb_inputs = {
-                        "大纲": self.getCurrentOutline(),
-                        "人物列表": self.character_list,
-                        "临时设定": last_setting,
-                        "计划": last_plan,
-                        "润色要求": self.embellishment_idea,
-                        "上文": self.getLastParagraph(),
-                        "要润色的内容": seg_text,
-                        "前五章总结": enhanced_context.get("prev_chapters_summary", "") if not getattr(self, 'compact_mode', False) else "",
-                        "后五章梗概（仅供参考，不可写入本章）": enhanced_context.get("next_chapters_outline", "") if not getattr(self, 'compact_mode', False) else "",
-                        "上一章原文": enhanced_context.get("last_chapter_content", "") if not getattr(self, 'compact_mode', False) else "",
-                        "本章故事线": storyline_for_beginning,
-                        "当前分段": current_seg_text,
-                    }
-                final_seg = self._embellish_with_retry(
-                    embellisher=emb_agent,
-                    embellish_inputs=emb_inputs,
-                    original_content=seg_text,
-                    chapter_number=self.chapter_count + 1,
-                    context_label=f"分段{seg_index}",
-                )
-                
-                parts.append(final_seg)
+                    segment = segment or story_segments[seg_index - 1]
+
+                    current_seg_text = f"第{seg_index}段《{segment.get('segment_title','')}》\n{segment.get('segment_summary','')}"
+                    refs = []
+                    for j in range(1, segment_count + 1):
+                        if j == seg_index:
+                            continue
+                        sj = None
+                        for s in story_segments:
+                            if str(s.get('index')) == str(j):
+                                sj = s
+                                break
+                        sj = sj or story_segments[j - 1]
+                        refs.append(f"第{j}段《{sj.get('segment_title','')}》：{sj.get('segment_summary','')}")
+                    refs_text = "\n".join(refs)
+
+                    # 选择writer与输入
+                    if getattr(self, 'compact_mode', False):
+                        writer_agent = getattr(self, f"novel_writer_compact_seg{seg_index}", self.novel_writer_compact)
+                        seg_inputs = {
+                            "大纲": self.getCurrentOutline(),
+                            "写作要求": self.user_requirements,
+                            "风格参考": rag_references,
+                            "前文记忆": self.writing_memory,
+                            "临时设定": self.temp_setting,
+                            "计划": self.writing_plan,
+                            "本章故事线": storyline_for_beginning,
+                            "本章分段（参考）": refs_text,
+                            "当前分段": current_seg_text,
+                            "前2章故事线": compact_prev_storyline,
+                            "后2章故事线（仅供参考，不可写入本章）": compact_next_storyline,
+                            "上文结尾": prev_draft[-2000:],
+                        }
+                    else:
+                        writer_agent = getattr(self, f"novel_writer_seg{seg_index}", self.novel_writer)
+                        seg_inputs = {
+                            "用户想法": self.user_idea,
+                            "大纲": self.getCurrentOutline(),
+                            "人物列表": self.character_list,
+                            "前文记忆": self.writing_memory,
+                            "临时设定": self.temp_setting,
+                            "计划": self.writing_plan,
+                            "写作要求": self.user_requirements,
+                            "润色想法": self.embellishment_idea,
+                            "上文内容": prev_draft[-2000:] or self.getLastParagraph(),
+                            "本章故事线": storyline_for_beginning,
+                            "本章分段（参考）": refs_text,
+                            "当前分段": current_seg_text,
+                            "前五章总结": enhanced_context["prev_chapters_summary"] if not getattr(self, 'compact_mode', False) else "",
+                            "后五章梗概（仅供参考，不可写入本章）": enhanced_context["next_chapters_outline"] if not getattr(self, 'compact_mode', False) else "",
+                            "上一章原文": enhanced_context["last_chapter_content"] if not getattr(self, 'compact_mode', False) else "",
+                            "风格参考": rag_references,
+                        }
+                    seg_resp = segment_stage.write(writer_agent, self._prepare_writer_inputs(writer_agent, seg_inputs, self.chapter_count + 1), ["段落", "计划", "临时设定"])
+                    seg_text = seg_resp["段落"]
+                    prev_draft = seg_text
+                    last_plan = seg_resp.get("计划", last_plan)
+                    last_setting = seg_resp.get("临时设定", last_setting)
+
+                    # 分段润色
+                    if getattr(self, 'compact_mode', False):
+                        emb_agent = getattr(self, f"novel_embellisher_compact_seg{seg_index}", self.novel_embellisher_compact)
+                        emb_inputs = {
+                            "大纲": self.getCurrentOutline(),
+                            "润色要求": self.embellishment_idea,
+                            "要润色的内容": seg_text,
+                            "前2章故事线": compact_prev_storyline,
+                            "后2章故事线（仅供参考，不可写入本章）": compact_next_storyline,
+                            "本章故事线": storyline_for_beginning,
+                            "当前分段": current_seg_text,
+                            "风格参考": rag_references,
+                        }
+                    else:
+                        emb_agent = getattr(self, f"novel_embellisher_seg{seg_index}", self.novel_embellisher)
+                        emb_inputs = {
+                            "大纲": self.getCurrentOutline(),
+                            "人物列表": self.character_list,
+                            "临时设定": last_setting,
+                            "计划": last_plan,
+                            "润色要求": self.embellishment_idea,
+                            "上文": self.getLastParagraph(),
+                            "要润色的内容": seg_text,
+                            "前五章总结": enhanced_context.get("prev_chapters_summary", "") if not getattr(self, 'compact_mode', False) else "",
+                            "后五章梗概（仅供参考，不可写入本章）": enhanced_context.get("next_chapters_outline", "") if not getattr(self, 'compact_mode', False) else "",
+                            "上一章原文": enhanced_context.get("last_chapter_content", "") if not getattr(self, 'compact_mode', False) else "",
+                            "本章故事线": storyline_for_beginning,
+                            "当前分段": current_seg_text,
+                        }
+                    # 润色交给流水线的润色阶段（上一段润色完成后开始，"上一段原文"为上一段的完整润色结果）
+                    segment_stage.submit(emb_agent, emb_inputs, seg_text, f"分段{seg_index}")
+
+                # 等待最后一段润色完成
+                parts = segment_stage.finish()
+            finally:
+                segment_stage.close()
 
             beginning = "\n\n".join(parts)
             self.writing_plan = last_plan
@@ -834,7 +1027,7 @@ class WritingMixin:
             if self._is_rag_enabled():
                 # 构建查询：关键元素 + 润色要求（精简版）
                 rag_query_emb = f"{self.last_rag_key_elements} {self.embellishment_idea}"
-                rag_refs_emb = self._get_rag_references(rag_query_emb, top_k=self.rag_top_k, for_embellishment=True)
+                rag_refs_emb = self._get_rag_references(rag_query_emb, top_k=self.rag_top_k, for_embellishment=True, stage="开头生成")
                 if rag_refs_emb:
                     emb_inputs["风格参考"] = rag_refs_emb
                     print(f"   📚 RAG(开头润色): 已注入风格参考 ({len(rag_refs_emb)}字符)")
@@ -961,46 +1154,54 @@ class WritingMixin:
         return last_paragraph
 
     def recordNovel(self):
-        record_content = ""
-        record_content += f"# 大纲\n\n{self.getCurrentOutline()}\n\n"
-        record_content += f"# 正文\n\n"
-        record_content += self.novel_content
-        record_content += f"# 记忆\n\n{self.writing_memory}\n\n"
-        record_content += f"# 全局设定\n\n{self.global_context}\n\n"
-        record_content += f"# 计划\n\n{self.writing_plan}\n\n"
-        record_content += f"# 临时设定\n\n{self.temp_setting}\n\n"
-
+        # 正文按章节块逐块写入，不再在内存中拼出整本书的副本
         with open("novel_record.md", "w", encoding="utf-8") as f:
-            f.write(record_content)
+            f.write(f"# 大纲\n\n{self.getCurrentOutline()}\n\n")
+            f.write(f"# 正文\n\n")
+            f.writelines(self._get_novel_store().snapshot())
+            f.write(f"# 记忆\n\n{self.writing_memory}\n\n")
+            f.write(f"# 全局设定\n\n{self.global_context}\n\n")
+            f.write(f"# 计划\n\n{self.writing_plan}\n\n")
+            f.write(f"# 临时设定\n\n{self.temp_setting}\n\n")
 
     def updateMemory(self):
         if (len(self.no_memory_paragraph)) > 2000:
-            resp = self.memory_maker.invoke(
-                inputs=self._reorder_inputs_for_cache({
-                    "前文记忆": self.writing_memory,
-                    "正文内容": self.no_memory_paragraph,
-                    "人物列表": self.character_list,
-                }),
-                output_keys=["新的记忆"],
+            self.writing_memory = self._compute_memory_update(
+                self.writing_memory, self.no_memory_paragraph, self.character_list
             )
-            
-            # 获取生成的新记忆
-            new_memory = resp["新的记忆"]
-            
-            # 检查记忆长度并进行保护性处理
-            if len(new_memory) > 5000:  # 如果超过5000字符
-                print(f"⚠️ 前文记忆生成过长({len(new_memory)}字符)，进行截断处理...")
-                # 截断到4800字符，保留一些缓冲空间
-                new_memory = new_memory[:4800]
-                # 确保不在句子中间截断，找到最后一个句号
-                last_period = new_memory.rfind('。')
-                if last_period > 3000:  # 确保截断点不会太短
-                    new_memory = new_memory[:last_period + 1]
-                print(f"📏 记忆已截断至{len(new_memory)}字符")
-            
-            self.writing_memory = new_memory
             self.no_memory_paragraph = ""
     
+    def _compute_memory_update(self, writing_memory, no_memory_paragraph, character_list, agent=None):
+        """调用记忆生成器生成新的前文记忆（只读输入，不修改状态，可在后台线程执行；agent 为后台副本）"""
+        resp = (agent or self.memory_maker).invoke(
+            inputs=self._build_memory_inputs(writing_memory, no_memory_paragraph, character_list),
+            output_keys=["新的记忆"],
+        )
+        
+        return self._clip_memory(resp["新的记忆"])
+    
+    def _build_memory_inputs(self, writing_memory, no_memory_paragraph, character_list) -> dict:
+        """构建记忆生成器的输入"""
+        return self._reorder_inputs_for_cache({
+            "前文记忆": writing_memory,
+            "正文内容": no_memory_paragraph,
+            "人物列表": character_list,
+        })
+    
+    def _clip_memory(self, new_memory):
+        """检查记忆长度并进行保护性处理（超过5000字符时在句号处截断）"""
+        if len(new_memory) > 5000:  # 如果超过5000字符
+            print(f"⚠️ 前文记忆生成过长({len(new_memory)}字符)，进行截断处理...")
+            # 截断到4800字符，保留一些缓冲空间
+            new_memory = new_memory[:4800]
+            # 确保不在句子中间截断，找到最后一个句号
+            last_period = new_memory.rfind('。')
+            if last_period > 3000:  # 确保截断点不会太短
+                new_memory = new_memory[:last_period + 1]
+            print(f"📏 记忆已截断至{len(new_memory)}字符")
+        
+        return new_memory
+    
     def updateGlobalContext(self):
         """更新全局设定追踪文档
         
@@ -1008,63 +1209,73 @@ class WritingMixin:
         追踪世界观、角色关系、时间线、伏笔执行、创作计划执行等。
         """
         try:
-            print("🌐 正在更新全局设定追踪...")
-            
-            # 获取本章故事线
-            current_storyline = ""
-            if self.enable_chapters and self.chapter_count > 0:
-                storyline_data = self.getCurrentChapterStoryline(self.chapter_count)
-                if storyline_data:
-                    current_storyline = str(storyline_data)
-            
-            # 获取最近生成的正文内容
-            chapter_content = self.paragraph_list[-1] if self.paragraph_list else ""
-            
-            # 调用全局设定追踪器
-            resp = self.global_context_updater.invoke(
-                inputs=self._reorder_inputs_for_cache({
-                    "当前全局设定": self.global_context if self.global_context else "（首次生成，暂无全局设定）",
-                    "本章正文": chapter_content,
-                    "本章故事线": current_storyline,
-                    "伏笔设定": getattr(self, 'foreshadowing', ''),
-                    "当前章节号": str(self.chapter_count),
-                    "前文记忆": self.writing_memory,
-                    "详细大纲": getattr(self, 'detailed_outline', '') or getattr(self, 'novel_outline', ''),
-                    "人物列表": getattr(self, 'character_list', ''),
-                }),
-                output_keys=["全局设定"],
-            )
-            
-            new_context = resp["全局设定"]
-            
-            self.global_context = new_context
-            print(f"✅ 全局设定已更新 ({len(self.global_context)}字符)")
-            
-            # 通知UI更新全局设定显示
-            self.log_message(f"🌐 全局设定已更新 ({len(self.global_context)}字符)")
-            
-            # 自动保存全局设定
+            new_context = self._compute_global_context_update(self._build_global_context_inputs())
+            self._apply_global_context_update(new_context)
+        except Exception as e:
+            print(f"⚠️ 全局设定更新失败: {e}")
+            # 不影响主流程，仅打印警告
+    
+    def _build_global_context_inputs(self) -> dict:
+        """构建全局设定追踪器的输入快照"""
+        # 获取本章故事线
+        current_storyline = ""
+        if self.enable_chapters and self.chapter_count > 0:
+            storyline_data = self.getCurrentChapterStoryline(self.chapter_count)
+            if storyline_data:
+                current_storyline = str(storyline_data)
+        
+        # 获取最近生成的正文内容
+        chapter_content = self.paragraph_list[-1] if self.paragraph_list else ""
+        
+        return self._reorder_inputs_for_cache({
+            "当前全局设定": self.global_context if self.global_context else "（首次生成，暂无全局设定）",
+            "本章正文": chapter_content,
+            "本章故事线": current_storyline,
+            "伏笔设定": getattr(self, 'foreshadowing', ''),
+            "当前章节号": str(self.chapter_count),
+            "前文记忆": self.writing_memory,
+            "详细大纲": getattr(self, 'detailed_outline', '') or getattr(self, 'novel_outline', ''),
+            "人物列表": getattr(self, 'character_list', ''),
+        })
+    
+    def _compute_global_context_update(self, inputs: dict, agent=None) -> str:
+        """调用全局设定追踪器（只读输入快照，可在后台线程执行；agent 为后台副本）"""
+        print("🌐 正在更新全局设定追踪...")
+        resp = (agent or self.global_context_updater).invoke(
+            inputs=inputs,
+            output_keys=["全局设定"],
+        )
+        return resp["全局设定"]
+    
+    def _apply_global_context_update(self, new_context: str, save: bool = True):
+        """写回全局设定并通知UI
+        
+        Args:
+            new_context: 新的全局设定
+            save: 是否立即自动保存（并发后处理会在文件写入线程中统一保存）
+        """
+        self.global_context = new_context
+        print(f"✅ 全局设定已更新 ({len(self.global_context)}字符)")
+        
+        # 通知UI更新全局设定显示
+        self.log_message(f"🌐 全局设定已更新 ({len(self.global_context)}字符)")
+        
+        # 自动保存全局设定
+        if save:
             try:
                 if hasattr(self, 'auto_save_manager'):
                     self.auto_save_manager.save_global_context(self.global_context)
             except Exception as save_err:
                 print(f"⚠️ 全局设定自动保存失败: {save_err}")
-                
-        except Exception as e:
-            print(f"⚠️ 全局设定更新失败: {e}")
-            # 不影响主流程，仅打印警告
     
-    def generateChapterSummary(self, chapter_content, chapter_number):
-        """生成章节总结"""
+    def generateChapterSummary(self, chapter_content, chapter_number, agent=None):
+        """生成章节总结（agent 为后台副本，默认使用 chapter_summary_generator）"""
         if not chapter_content or not chapter_number:
             print("❌ 缺少章节内容或章节号，无法生成章节总结")
             return None
         
         print(f"📋 正在生成第{chapter_number}章的剧情总结...")
         
-        # 获取原故事线（如果有）
-        original_storyline = self.getCurrentChapterStoryline(chapter_number)
-        
         # 添加重试机制处理章节总结生成错误
         retry_count = 0
         max_retries = 2
@@ -1076,13 +1287,8 @@ class WritingMixin:
                 if retry_count > 0:
                     print(f"🔄 第{retry_count + 1}次尝试生成第{chapter_number}章总结...")
                 
-                resp = self.chapter_summary_generator.invoke(
-                    inputs=self._reorder_inputs_for_cache({
-                        "章节内容": chapter_content,
-                        "章节号": str(chapter_number),
-                        "原故事线": str(original_storyline) if original_storyline else "无",
-                        "人物信息": self.character_list if self.character_list else "无"
-                    }),
+                resp = (agent or self.chapter_summary_generator).invoke(
+                    inputs=self._build_chapter_summary_inputs(chapter_content, chapter_number),
                     output_keys=["章节总结"]
                 )
                 
@@ -1106,19 +1312,31 @@ class WritingMixin:
             import json
             summary_data = json.loads(summary_str)
             
-            # 显示总结信息
-            print(f"✅ 章节总结生成完成")
-            print(f"📖 章节标题：{summary_data.get('title', '无')}")
-            print(f"📝 剧情概述：{summary_data.get('plot_summary', '无')}")
-            print(f"👥 主要角色：{', '.join(summary_data.get('main_characters', []))}")
-            print(f"🎯 关键事件：{len(summary_data.get('key_events', []))}个")
-            
+            self._print_chapter_summary(summary_data)
             return summary_data
             
         except json.JSONDecodeError:
             print(f"⚠️  总结格式非标准JSON，返回原始文本")
             return {"plot_summary": summary_str, "chapter_number": chapter_number}
     
+    def _build_chapter_summary_inputs(self, chapter_content, chapter_number) -> dict:
+        """构建章节总结生成器的输入（原故事线取自当前故事线）"""
+        original_storyline = self.getCurrentChapterStoryline(chapter_number)
+        return self._reorder_inputs_for_cache({
+            "章节内容": chapter_content,
+            "章节号": str(chapter_number),
+            "原故事线": str(original_storyline) if original_storyline else "无",
+            "人物信息": self.character_list if self.character_list else "无"
+        })
+    
+    def _print_chapter_summary(self, summary_data):
+        """显示章节总结信息"""
+        print(f"✅ 章节总结生成完成")
+        print(f"📖 章节标题：{summary_data.get('title', '无')}")
+        print(f"📝 剧情概述：{summary_data.get('plot_summary', '无')}")
+        print(f"👥 主要角色：{', '.join(summary_data.get('main_characters', []))}")
+        print(f"🎯 关键事件：{len(summary_data.get('key_events', []))}个")
+    
     def updateStorylineWithSummary(self, chapter_number, summary_data):
         """用章节总结更新故事线"""
         if not summary_data or not chapter_number:
@@ -1142,21 +1360,21 @@ class WritingMixin:
         
         # 查找对应章节
         chapter_found = False
-        for i, chapter in enumerate(self.storyline.get("chapters", [])):
-            if chapter.get("chapter_number") == chapter_number:
-                # 更新现有章节
-                self.storyline["chapters"][i] = {
-                    "chapter_number": chapter_number,
-                    "title": clean_title,
-                    "plot_summary": summary_data.get("plot_summary", ""),
-                    "main_characters": summary_data.get("main_characters", []),
-                    "key_events": summary_data.get("key_events", []),
-                    "plot_purpose": summary_data.get("plot_advancement", ""),
-                    "emotional_tone": summary_data.get("emotional_highlights", ""),
-                    "transition_to_next": summary_data.get("connection_points", "")
-                }
-                chapter_found = True
-                break
+        self.storyline.setdefault("chapters", [])
+        i = self._get_chapter_index().find_storyline_position(self.storyline, chapter_number)
+        if i is not None:
+            # 更新现有章节
+            self.storyline["chapters"][i] = {
+                "chapter_number": chapter_number,
+                "title": clean_title,
+                "plot_summary": summary_data.get("plot_summary", ""),
+                "main_characters": summary_data.get("main_characters", []),
+                "key_events": summary_data.get("key_events", []),
+                "plot_purpose": summary_data.get("plot_advancement", ""),
+                "emotional_tone": summary_data.get("emotional_highlights", ""),
+                "transition_to_next": summary_data.get("connection_points", "")
+            }
+            chapter_found = True
         
         if not chapter_found:
             # 添加新章节
@@ -1192,11 +1410,7 @@ class WritingMixin:
         prev_summaries = []
         for i in range(max(1, chapter_number - 5), chapter_number):
             if i > 0:
-                chapter_data = None
-                for ch in self.storyline.get("chapters", []):
-                    if ch.get("chapter_number") == i:
-                        chapter_data = ch
-                        break
+                chapter_data = self.get_storyline_chapter(i)
                         
                 if chapter_data:
                     summary = f"第{i}章：{chapter_data.get('plot_summary', '无梗概')}"
@@ -1208,11 +1422,7 @@ class WritingMixin:
         # 获取后5章的梗概
         next_outlines = []
         for i in range(chapter_number + 1, min(chapter_number + 6, self.target_chapter_count + 1)):
-            chapter_data = None
-            for ch in self.storyline.get("chapters", []):
-                if ch.get("chapter_number") == i:
-                    chapter_data = ch
-                    break
+            chapter_data = self.get_storyline_chapter(i)
                     
             if chapter_data:
                 outline = f"第{i}章：{chapter_data.get('plot_summary', '无梗概')}"
@@ -1223,12 +1433,8 @@ class WritingMixin:
             
         # 获取上一章原文
         if chapter_number > 1 and self.paragraph_list:
-            # 尝试找到上一章的内容
-            prev_chapter_content = ""
-            for paragraph in reversed(self.paragraph_list):
-                if f"第{chapter_number - 1}章" in paragraph:
-                    prev_chapter_content = paragraph
-                    break
+            # 通过章节索引定位上一章（按标题行解析，"第1章"不会误匹配"第11章"）
+            prev_chapter_content = self.get_chapter_paragraph(chapter_number - 1)
                     
             if prev_chapter_content:
                 context["last_chapter_content"] = prev_chapter_content
@@ -1250,7 +1456,7 @@ class WritingMixin:
             
         Returns:
             dict: 包含以下键的字典
-                - first_three_chapters_content: 前三章润色后正文（第N-4、N-3、N-2章，不含上一章N-1）
+                - first_three_chapters_content: 前三章润色后正文（第N-4、N-3、N-2章，不含上一章N-1；开启 story_recall 时为空）
                 - last_chapter_content: 上一章（第N-1章）的润色后正文
                 - chapter_summaries: 最近若干章的总结（最多max_summary_chapters章）
                 - prev_storyline: 前2章故事线（与精简模式一致）
@@ -1271,12 +1477,14 @@ class WritingMixin:
         prev_three_end = max(1, chapter_number - 1)    # 到N-2结束（不含N-1）
         
         prev_three_content = []
-        if prev_three_start < prev_three_end:
+        if getattr(self, 'story_recall', False):
+            # 开启前文检索时不整段发送前三章，由"相关前文片段"按本章故事线取回有关的段落
+            print("🔎 非精简模式：前文检索已开启，不发送前三章正文")
+        elif prev_three_start < prev_three_end:
             for i in range(prev_three_start, prev_three_end):
-                for paragraph in self.paragraph_list:
-                    if f"第{i}章" in paragraph:
-                        prev_three_content.append(paragraph)
-                        break
+                paragraph = self.get_chapter_paragraph(i)
+                if paragraph:
+                    prev_three_content.append(paragraph)
         if prev_three_content:
             context["first_three_chapters_content"] = "\n\n---\n\n".join(prev_three_content)
             chapter_nums = list(range(prev_three_start, prev_three_end))
@@ -1299,21 +1507,21 @@ class WritingMixin:
         
         # 3. 获取最近若干章的总结（限制最多max_summary_chapters章）
         # 计算总结范围：从 max(1, chapter_number - max_summary_chapters) 到 chapter_number - 1
-        summary_start = max(1, chapter_number - max_summary_chapters)
+        # 开启分层记忆时更早的章节由全书梗概/前卷梗概覆盖，只取最近几章与本卷已写章节
+        summary_start = self.get_story_memory_summary_start(chapter_number, max_summary_chapters)
         summary_end = chapter_number  # range不包含结束值
         
         summaries = []
         for i in range(summary_start, summary_end):
-            for ch in self.storyline.get("chapters", []):
-                if ch.get("chapter_number") == i:
-                    title = ch.get("title", "")
-                    plot_summary = ch.get("plot_summary", "无梗概")
-                    if title:
-                        summary = f"第{i}章《{title}》：{plot_summary}"
-                    else:
-                        summary = f"第{i}章：{plot_summary}"
-                    summaries.append(summary)
-                    break
+            ch = self.get_storyline_chapter(i)
+            if ch:
+                title = ch.get("title", "")
+                plot_summary = ch.get("plot_summary", "无梗概")
+                if title:
+                    summary = f"第{i}章《{title}》：{plot_summary}"
+                else:
+                    summary = f"第{i}章：{plot_summary}"
+                summaries.append(summary)
         if summaries:
             context["chapter_summaries"] = "\n".join(summaries)
             if summary_start > 1:
@@ -1486,11 +1694,17 @@ class WritingMixin:
         print("🔄 段落生成: 刷新ChatLLM配置...")
         self.refresh_chatllm()
         
+        # 本章统一使用同一份配置快照（Fish Audio模式、调试级别）
+        try:
+            from config.dynamic_config_manager import get_config_snapshot
+            config_snapshot = get_config_snapshot()
+        except Exception as e:
+            print(f"⚠️ 读取配置快照失败: {e}")
+            config_snapshot = None
+        
         # 刷新Fish Audio S2语气标记模式设置
         try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            self.fishaudio_mode = config_manager.get_fishaudio_mode()
+            self.fishaudio_mode = config_snapshot.fishaudio_mode if config_snapshot else self.fishaudio_mode
             if hasattr(self, 'updateEmbellishersForFishAudio'):
                 self.updateEmbellishersForFishAudio()
             print(f"🎙️ Fish Audio S2语气标记: {'已启用' if self.fishaudio_mode else '未启用'}")
@@ -1576,10 +1790,8 @@ class WritingMixin:
 
         # 调试信息：显示页面传入的写作要求，仅在调试级别>=2时显示
         try:
-            from config.dynamic_config_manager import get_config_manager
-            config_manager = get_config_manager()
-            debug_level = int(config_manager.get_debug_level())
-        except Exception:
+            debug_level = int(config_snapshot.debug_level) if config_snapshot else 1
+        except ValueError:
             debug_level = 1
 
         if debug_level >= 2:
@@ -1607,9 +1819,44 @@ class WritingMixin:
             print(error_msg)
             return error_msg
 
+    def _build_compact_writer_inputs(self, chapter_number, last_paragraph_excerpt, writing_plan, temp_setting) -> dict:
+        """构建精简模式正常章节的写作器输入
+        
+        Args:
+            chapter_number: 要生成的章节号
+            last_paragraph_excerpt: 上文结尾（最多2000字符）
+            writing_plan: 上一章写作器返回的计划
+            temp_setting: 上一章写作器返回的临时设定
+        """
+        compact_prev_storyline, compact_next_storyline = self.getCompactStorylines(chapter_number)
+        prev_ch_storyline = self.getCurrentChapterStoryline(chapter_number - 1)
+        prev_transition = ""
+        if isinstance(prev_ch_storyline, dict):
+            prev_transition = prev_ch_storyline.get("transition_to_next", "")
+        return {
+            "大纲": self.getCurrentOutline(),
+            "人物列表": self.character_list,
+            "写作要求": self.user_requirements,
+            "前文记忆": self.writing_memory,
+            "临时设定": temp_setting,
+            "计划": writing_plan,
+            "本章故事线": str(self.getCurrentChapterStoryline(chapter_number)),
+            "前2章故事线": compact_prev_storyline,
+            "后2章故事线": compact_next_storyline,
+            "上文结尾": last_paragraph_excerpt,
+            "前章过渡提示": prev_transition,
+        }
+
     def _generate_paragraph_internal(self):
         """内部段落生成方法，供重试机制调用"""
 
+        # 等待上一章后处理中本章提示词需要的字段（记忆/全局设定/故事线）
+        self.join_post_commit_before_next_chapter()
+
+        # 记录开始时的段落数，提交前校验，防止重复提交同一章
+        paragraph_count_at_start = len(self.paragraph_list)
+        speculative_resp = None
+
         # 计算即将生成的章节号（因为章节计数在生成后才增加）
         next_chapter_number = self.chapter_count + 1 if self.enable_chapters else self.chapter_count
 
@@ -1619,6 +1866,13 @@ class WritingMixin:
         
         # 锁定当前生成过程的精简模式状态，避免生成过程中因UI切换导致状态不一致
         is_compact_mode = getattr(self, 'compact_mode', False)
+
+        # 本章生成过程中统一使用同一份配置快照中的调试级别
+        try:
+            from config.dynamic_config_manager import get_config_snapshot
+            debug_level = int(get_config_snapshot().debug_level)
+        except Exception:
+            debug_level = 1
         
         if is_ending_phase and not is_final_chapter:
             # 结尾阶段但不是最终章
@@ -1679,13 +1933,6 @@ class WritingMixin:
                 }
             
             # 调试信息：显示即将发送给大模型的关键输入参数，根据调试级别控制详细程度
-            try:
-                from config.dynamic_config_manager import get_config_manager
-                config_manager = get_config_manager()
-                debug_level = int(config_manager.get_debug_level())
-            except Exception:
-                debug_level = 1
-            
             if debug_level >= 2:
                 print("🎯 关键输入参数检查（结尾阶段）:")
                 if is_compact_mode:
@@ -1772,13 +2019,6 @@ class WritingMixin:
                 }
             
             # 调试信息：显示即将发送给大模型的关键输入参数，根据调试级别控制详细程度
-            try:
-                from config.dynamic_config_manager import get_config_manager
-                config_manager = get_config_manager()
-                debug_level = int(config_manager.get_debug_level())
-            except Exception:
-                debug_level = 1
-            
             if debug_level >= 2:
                 print("🎯 关键输入参数检查（最终章）:")
                 if is_compact_mode:
@@ -1811,6 +2051,10 @@ class WritingMixin:
             print(f"   • 写作要求: {'✅' if self.user_requirements else '❌'}")
             print(f"   • 润色想法: {'✅' if self.embellishment_idea else '❌'}")
             
+            # 流水线模式：取用上一章润色期间预先起草的本章草稿
+            if is_compact_mode:
+                speculative_resp = self.take_speculative_draft(self.chapter_count + 1)
+            
             # 根据精简模式选择使用的writer
             # 注意：非精简模式现在也使用精简版生成器（相同提示词），区别在于上下文内容
             if is_compact_mode:
@@ -1824,14 +2068,6 @@ class WritingMixin:
             current_chapter_storyline = self.getCurrentChapterStoryline(self.chapter_count + 1)
             prev_storyline, next_storyline = self.getSurroundingStorylines(self.chapter_count + 1)
             
-            # 获取调试级别并根据级别显示不同详细程度的信息
-            try:
-                from config.dynamic_config_manager import get_config_manager
-                config_manager = get_config_manager()
-                debug_level = int(config_manager.get_debug_level())
-            except Exception:
-                debug_level = 1
-
             # 根据精简模式决定上下文信息获取和显示方式
             if is_compact_mode:
                 # 精简模式：获取精简版上下文信息
@@ -1920,25 +2156,12 @@ class WritingMixin:
                     mode_desc = {2: "2段合并", 3: "3段合并", 4: "4段合并"}
                     print(f"📦 长章节启用（{mode_desc.get(segment_count, '')}）：仅传递前2/后2章总结，不发送任何原文片段")
                 # 获取上文结尾（2000字符）和前章过渡提示
-                last_para_excerpt = self.getLastParagraph(max_length=2000)
-                prev_ch_storyline = self.getCurrentChapterStoryline(self.chapter_count)
-                prev_transition = ""
-                if isinstance(prev_ch_storyline, dict):
-                    prev_transition = prev_ch_storyline.get("transition_to_next", "")
-                # 使用前面已经获取的精简版故事线
-                inputs = {
-                    "大纲": self.getCurrentOutline(),
-                    "人物列表": self.character_list,
-                    "写作要求": self.user_requirements,
-                    "前文记忆": self.writing_memory,
-                    "临时设定": self.temp_setting,
-                    "计划": self.writing_plan,
-                    "本章故事线": str(current_chapter_storyline),
-                    "前2章故事线": compact_prev_storyline,
-                    "后2章故事线": compact_next_storyline,
-                    "上文结尾": last_para_excerpt,
-                    "前章过渡提示": prev_transition,
-                }
+                inputs = self._build_compact_writer_inputs(
+                    self.chapter_count + 1,
+                    last_paragraph_excerpt=self.getLastParagraph(max_length=2000),
+                    writing_plan=self.writing_plan,
+                    temp_setting=self.temp_setting,
+                )
             else:
                 # 非精简模式：使用与精简模式相同的输入结构，但添加前三章正文（不含上一章）
                 print("📦 使用非精简模式生成正文（前三章正文（不含上一章）+最近15章总结）...")
@@ -1991,9 +2214,8 @@ class WritingMixin:
                     inputs["基础大纲"] = self.novel_outline
                     print(f"📋 已加入基础大纲上下文")
             
-            # RAG 风格参考检索（正文生成阶段）
-            # RAG 风格参考检索（正文生成阶段）
-            if self._is_rag_enabled():
+            # RAG 风格参考检索（正文生成阶段，已有预起草草稿时跳过）
+            if self._is_rag_enabled() and speculative_resp is None:
                 # 构建检索查询：本章故事线 + 写作要求（精简版）
                 query_parts = []
                 if current_chapter_storyline:
@@ -2010,6 +2232,9 @@ class WritingMixin:
                     if rag_references:
                         inputs["风格参考"] = rag_references
 
+        # 未被本章取用的预起草草稿（结尾阶段、模式切换等）直接丢弃
+        self.discard_speculative_draft()
+
         # 分段生成模式：根据long_chapter_mode的值决定分段数量
         # 0=关闭，2=2段合并，3=3段合并，4=4段合并
         segment_count = getattr(self, 'long_chapter_mode', 0)
@@ -2021,7 +2246,6 @@ class WritingMixin:
         if segment_count > 0 and isinstance(story_segments, list) and len(story_segments) >= segment_count:
             print(f"🧩 分段生成模式：检测到{segment_count}个剧情分段，逐段生成...")
             skip_generic = True
-            parts = []
             last_plan = self.writing_plan
             last_setting = self.temp_setting
             # 预备上下文
@@ -2035,188 +2259,187 @@ class WritingMixin:
             if isinstance(prev_ch_storyline_seg, dict):
                 prev_transition = prev_ch_storyline_seg.get("transition_to_next", "")
             
-            for seg_index in range(1, segment_count + 1):
-                # 组装分段输入
-                segment = None
-                for seg in story_segments:
-                    if str(seg.get('index')) == str(seg_index):
-                        segment = seg
-                        break
-                segment = segment or story_segments[seg_index - 1]
-
-                # 当前分段与参考分段文本
-                current_seg_text = f"第{seg_index}段《{segment.get('segment_title','')}》\n{segment.get('segment_summary','')}"
-                refs = []
-                for j in range(1, segment_count + 1):
-                    if j == seg_index:
-                        continue
-                    sj = None
-                    for s in story_segments:
-                        if str(s.get('index')) == str(j):
-                            sj = s
+            # RAG: 各分段按自身梗概检索风格参考，一次健康检查、并发扇出；未命中时沿用本章参考
+            chapter_rag_references = rag_references if 'rag_references' in dir() and rag_references else ""
+            seg_style_references = [chapter_rag_references] * segment_count
+            if self._is_rag_enabled():
+                seg_queries = []
+                for seg_index in range(1, segment_count + 1):
+                    seg = next((s for s in story_segments if str(s.get('index')) == str(seg_index)), None)
+                    seg = seg or story_segments[seg_index - 1]
+                    seg_queries.append(f"{seg.get('segment_summary', '')} {self.user_requirements or ''}".strip())
+                seg_refs = self._get_rag_references_batch(seg_queries, top_k=self.rag_top_k, for_embellishment=False)
+                seg_style_references = [refs or chapter_rag_references for refs in seg_refs]
+            
+            segment_stage = self.start_segment_pipeline(self.chapter_count + 1, prev_max_chars=2000)
+            prev_draft = ""
+            try:
+                for seg_index in range(1, segment_count + 1):
+                    # 组装分段输入
+                    segment = None
+                    for seg in story_segments:
+                        if str(seg.get('index')) == str(seg_index):
+                            segment = seg
                             break
-                    if sj is None and j - 1 < len(story_segments):
-                        sj = story_segments[j - 1]
-                    if sj:
-                        refs.append(f"第{j}段《{sj.get('segment_title','')}》：{sj.get('segment_summary','')}")
-                refs_text = "\n".join(refs)
-
-                if is_compact_mode:
-                    if is_ending_phase or is_final_chapter:
-                        writer_agent = getattr(self, f"ending_writer_seg{seg_index}", self.ending_writer)
-                    else:
-                        writer_agent = getattr(self, f"novel_writer_compact_seg{seg_index}", self.novel_writer_compact)
-                    segment_count_val = getattr(self, 'long_chapter_mode', 0)
-                    if segment_count_val > 0:
-                        mode_desc = {2: "2段", 3: "3段", 4: "4段"}
-                        print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段{seg_index}）：仅用前2/后2章总结，不发送原文")
-                    seg_inputs = {
-                        "大纲": self.getCurrentOutline(),
-                        "人物列表": self.character_list,
-                        "写作要求": self.user_requirements,
-                        "风格参考": rag_references if 'rag_references' in dir() and rag_references else "",
-                        "前文记忆": self.writing_memory,
-                        "临时设定": self.temp_setting,
-                        "计划": self.writing_plan,
-                        "本章故事线": str(current_story),
-                        "本章分段（参考）": refs_text,
-                        "当前分段": current_seg_text,
-                        "前2章故事线": compact_prev_storyline,
-                        "后2章故事线": compact_next_storyline,
-                        "上文结尾": self.getLastParagraph(max_length=2000) if seg_index == 1 else "",
-                        "前章过渡提示": prev_transition if seg_index == 1 else "",
-                    }
-                else:
-                    # 非精简模式分段：使用精简模式agent，但添加前三章正文（不含上一章）
-                    if is_ending_phase or is_final_chapter:
-                        writer_agent = getattr(self, f"ending_writer_seg{seg_index}", self.ending_writer)
-                    else:
-                        writer_agent = getattr(self, f"novel_writer_compact_seg{seg_index}", self.novel_writer_compact)  # 使用精简模式agent
-                    # 获取非精简模式特有的上下文
-                    enhanced_context_v2 = self.getEnhancedContextWithFirstThreeChapters(self.chapter_count + 1)
-                    segment_count_val = getattr(self, 'long_chapter_mode', 0)
-                    if segment_count_val > 0:
-                        mode_desc = {2: "2段", 3: "3段", 4: "4段"}
-                        print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段{seg_index}）：传递前三章正文（不含上一章）+最近章节总结")
-                    seg_inputs = {
-                        "大纲": self.getCurrentOutline(),
-                        "写作要求": self.user_requirements,
-                        "风格参考": rag_references if 'rag_references' in dir() and rag_references else "",
-                        "前文记忆": self.writing_memory,
-                        "临时设定": self.temp_setting,
-                        "计划": self.writing_plan,
-                        "本章故事线": str(current_story),
-                        "本章分段（参考）": refs_text,
-                        "当前分段": current_seg_text,
-                        "前2章故事线": enhanced_context_v2["prev_storyline"],
-                        "后2章故事线": enhanced_context_v2["next_storyline"],
-                        # 非精简模式额外上下文
-                        "前三章正文（不含上一章）": enhanced_context_v2["first_three_chapters_content"],
-                        "上一章原文": enhanced_context_v2["last_chapter_content"],
-                        "最近章节总结": enhanced_context_v2["chapter_summaries"],
-                    }
-                # 写作
-                seg_resp = writer_agent.invoke(inputs=self._inject_global_context_to_inputs(self._inject_foreshadowing_to_inputs(seg_inputs)), output_keys=["段落", "计划", "临时设定"])
-                seg_text = seg_resp["段落"]
-                seg_key_elements = seg_resp.get("关键元素", "")
-                last_plan = seg_resp.get("计划", last_plan)
-                last_setting = seg_resp.get("临时设定", last_setting)
-
-                # 润色
-                if is_compact_mode:
-                    emb_agent = getattr(self, f"novel_embellisher_compact_seg{seg_index}", self.novel_embellisher_compact)
-                    segment_count_val = getattr(self, 'long_chapter_mode', 0)
-                    if segment_count_val > 0:
-                        mode_desc = {2: "2段", 3: "3段", 4: "4段"}
-                        print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段润色{seg_index}）：仅用前2/后2章总结，不发送原文")
-                    emb_inputs = {
-                        "大纲": self.getCurrentOutline(),
-                        "润色要求": self.embellishment_idea,
-                        "要润色的内容": seg_text,
-                        "前2章故事线": compact_prev_storyline,
-                        "后2章故事线": compact_next_storyline,
-                        "本章故事线": str(current_story),
-                        "当前分段": current_seg_text,
-                    }
-
-                    # RAG: (分段润色) 获取风格参考
-                    if self._is_rag_enabled():
-                        # 构建查询: 关键元素 + 润色要求（精简版）
-                        rag_query_emb = f"{seg_key_elements} {self.embellishment_idea}"
-                        rag_refs_emb = self._get_rag_references(rag_query_emb, top_k=self.rag_top_k, for_embellishment=True)
-                        if rag_refs_emb:
-                            emb_inputs["风格参考"] = rag_refs_emb
-                            print(f"   📚 RAG(润色): 已注入风格参考 ({len(rag_refs_emb)}字符)")
-                    # 为非首段添加上一段润色后的原文，确保段落衔接流畅
-                    if seg_index > 1 and len(parts) > 0:
-                        # 只取上一段的最后2000字符，避免传入过多内容
-                        prev_seg = parts[-1]
-                        if len(prev_seg) > 2000:
-                            prev_seg_excerpt = prev_seg[-2000:]
-                            emb_inputs["上一段原文"] = prev_seg_excerpt
-                            print(f"   📎 已添加上一段原文（截取2000/{len(prev_seg)}字符）以确保段落衔接")
+                    segment = segment or story_segments[seg_index - 1]
+
+                    # 当前分段与参考分段文本
+                    current_seg_text = f"第{seg_index}段《{segment.get('segment_title','')}》\n{segment.get('segment_summary','')}"
+                    refs = []
+                    for j in range(1, segment_count + 1):
+                        if j == seg_index:
+                            continue
+                        sj = None
+                        for s in story_segments:
+                            if str(s.get('index')) == str(j):
+                                sj = s
+                                break
+                        if sj is None and j - 1 < len(story_segments):
+                            sj = story_segments[j - 1]
+                        if sj:
+                            refs.append(f"第{j}段《{sj.get('segment_title','')}》：{sj.get('segment_summary','')}")
+                    refs_text = "\n".join(refs)
+
+                    if is_compact_mode:
+                        if is_ending_phase or is_final_chapter:
+                            writer_agent = getattr(self, f"ending_writer_seg{seg_index}", self.ending_writer)
                         else:
-                            emb_inputs["上一段原文"] = prev_seg
-                            print(f"   📎 已添加上一段原文({len(prev_seg)}字符)以确保段落衔接")
-                else:
-                    # 非精简模式分段润色：使用精简模式agent，但添加前三章正文（不含上一章）
-                    emb_agent = getattr(self, f"novel_embellisher_compact_seg{seg_index}", self.novel_embellisher_compact)  # 使用精简模式agent
-                    segment_count_val = getattr(self, 'long_chapter_mode', 0)
-                    if segment_count_val > 0:
-                        mode_desc = {2: "2段", 3: "3段", 4: "4段"}
-                        print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段润色{seg_index}）：传递前三章正文（不含上一章）+最近章节总结")
-                    emb_inputs = {
-                        "大纲": self.getCurrentOutline(),
-                        "润色要求": self.embellishment_idea,
-                        "要润色的内容": seg_text,
-                        "前2章故事线": enhanced_context_v2["prev_storyline"],
-                        "后2章故事线": enhanced_context_v2["next_storyline"],
-                        "本章故事线": str(current_story),
-                        "当前分段": current_seg_text,
-                        # 非精简模式额外上下文
-                        "前三章正文（不含上一章）": enhanced_context_v2["first_three_chapters_content"],
-                        "上一章原文": enhanced_context_v2["last_chapter_content"],
-                        "最近章节总结": enhanced_context_v2["chapter_summaries"],
-                    }
-
-                    # RAG: (分段润色) 获取风格参考
-                    if self._is_rag_enabled():
-                        # 构建查询: 关键元素 + 润色要求（精简版）
-                        rag_query_emb = f"{seg_key_elements} {self.embellishment_idea}"
-                        rag_refs_emb = self._get_rag_references(rag_query_emb, top_k=self.rag_top_k, for_embellishment=True)
-                        if rag_refs_emb:
-                            emb_inputs["风格参考"] = rag_refs_emb
-                            print(f"   📚 RAG(润色): 已注入风格参考 ({len(rag_refs_emb)}字符)")
-                    # 为非首段添加上一段润色后的原文
-                    if seg_index > 1 and len(parts) > 0:
-                        prev_seg = parts[-1]
-                        if len(prev_seg) > 2000:
-                            emb_inputs["上一段原文"] = prev_seg[-2000:]
-                            print(f"   📎 已添加上一段原文（截取2000/{len(prev_seg)}字符）以确保段落衔接")
+                            writer_agent = getattr(self, f"novel_writer_compact_seg{seg_index}", self.novel_writer_compact)
+                        segment_count_val = getattr(self, 'long_chapter_mode', 0)
+                        if segment_count_val > 0:
+                            mode_desc = {2: "2段", 3: "3段", 4: "4段"}
+                            print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段{seg_index}）：仅用前2/后2章总结，不发送原文")
+                        seg_inputs = {
+                            "大纲": self.getCurrentOutline(),
+                            "人物列表": self.character_list,
+                            "写作要求": self.user_requirements,
+                            "风格参考": seg_style_references[seg_index - 1],
+                            "前文记忆": self.writing_memory,
+                            "临时设定": self.temp_setting,
+                            "计划": self.writing_plan,
+                            "本章故事线": str(current_story),
+                            "本章分段（参考）": refs_text,
+                            "当前分段": current_seg_text,
+                            "前2章故事线": compact_prev_storyline,
+                            "后2章故事线": compact_next_storyline,
+                            "上文结尾": self.getLastParagraph(max_length=2000) if seg_index == 1 else prev_draft[-2000:],
+                            "前章过渡提示": prev_transition if seg_index == 1 else "",
+                        }
+                    else:
+                        # 非精简模式分段：使用精简模式agent，但添加前三章正文（不含上一章）
+                        if is_ending_phase or is_final_chapter:
+                            writer_agent = getattr(self, f"ending_writer_seg{seg_index}", self.ending_writer)
                         else:
-                            emb_inputs["上一段原文"] = prev_seg
-                            print(f"   📎 已添加上一段原文({len(prev_seg)}字符)以确保段落衔接")
-                # 🔧 修复：使用 _embellish_with_retry 替代直接 invoke，
-                # 保持与非分段模式一致的截断检测和自动回退逻辑，
-                # 避免 API 失败时抛出异常触发整章重试导致重复生成
-                final_seg = self._embellish_with_retry(
-                    embellisher=emb_agent,
-                    embellish_inputs=emb_inputs,
-                    original_content=seg_text,
-                    chapter_number=self.chapter_count + 1,
-                    context_label=f"分段{seg_index}润色",
-                )
-                parts.append(final_seg)
+                            writer_agent = getattr(self, f"novel_writer_compact_seg{seg_index}", self.novel_writer_compact)  # 使用精简模式agent
+                        # 获取非精简模式特有的上下文
+                        enhanced_context_v2 = self.getEnhancedContextWithFirstThreeChapters(self.chapter_count + 1)
+                        segment_count_val = getattr(self, 'long_chapter_mode', 0)
+                        if segment_count_val > 0:
+                            mode_desc = {2: "2段", 3: "3段", 4: "4段"}
+                            print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段{seg_index}）：传递前三章正文（不含上一章）+最近章节总结")
+                        seg_inputs = {
+                            "大纲": self.getCurrentOutline(),
+                            "写作要求": self.user_requirements,
+                            "风格参考": seg_style_references[seg_index - 1],
+                            "前文记忆": self.writing_memory,
+                            "临时设定": self.temp_setting,
+                            "计划": self.writing_plan,
+                            "本章故事线": str(current_story),
+                            "本章分段（参考）": refs_text,
+                            "当前分段": current_seg_text,
+                            "前2章故事线": enhanced_context_v2["prev_storyline"],
+                            "后2章故事线": enhanced_context_v2["next_storyline"],
+                            # 非精简模式额外上下文
+                            "前三章正文（不含上一章）": enhanced_context_v2["first_three_chapters_content"],
+                            "上一章原文": enhanced_context_v2["last_chapter_content"],
+                            "最近章节总结": enhanced_context_v2["chapter_summaries"],
+                            "上文结尾": prev_draft[-2000:],
+                        }
+                    # 写作（只依赖上一段的草稿，与上一段的润色并行）
+                    seg_resp = segment_stage.write(writer_agent, self._prepare_writer_inputs(writer_agent, seg_inputs, self.chapter_count + 1), ["段落", "计划", "临时设定"])
+                    seg_text = seg_resp["段落"]
+                    prev_draft = seg_text
+                    seg_key_elements = seg_resp.get("关键元素", "")
+                    last_plan = seg_resp.get("计划", last_plan)
+                    last_setting = seg_resp.get("临时设定", last_setting)
+
+                    # 润色
+                    if is_compact_mode:
+                        emb_agent = getattr(self, f"novel_embellisher_compact_seg{seg_index}", self.novel_embellisher_compact)
+                        segment_count_val = getattr(self, 'long_chapter_mode', 0)
+                        if segment_count_val > 0:
+                            mode_desc = {2: "2段", 3: "3段", 4: "4段"}
+                            print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段润色{seg_index}）：仅用前2/后2章总结，不发送原文")
+                        emb_inputs = {
+                            "大纲": self.getCurrentOutline(),
+                            "润色要求": self.embellishment_idea,
+                            "要润色的内容": seg_text,
+                            "前2章故事线": compact_prev_storyline,
+                            "后2章故事线": compact_next_storyline,
+                            "本章故事线": str(current_story),
+                            "当前分段": current_seg_text,
+                        }
+
+                        # RAG: (分段润色) 获取风格参考
+                        if self._is_rag_enabled():
+                            # 构建查询: 关键元素 + 润色要求（精简版）
+                            rag_query_emb = f"{seg_key_elements} {self.embellishment_idea}"
+                            rag_refs_emb = self._get_rag_references(rag_query_emb, top_k=self.rag_top_k, for_embellishment=True)
+                            if rag_refs_emb:
+                                emb_inputs["风格参考"] = rag_refs_emb
+                                print(f"   📚 RAG(润色): 已注入风格参考 ({len(rag_refs_emb)}字符)")
+                    else:
+                        # 非精简模式分段润色：使用精简模式agent，但添加前三章正文（不含上一章）
+                        emb_agent = getattr(self, f"novel_embellisher_compact_seg{seg_index}", self.novel_embellisher_compact)  # 使用精简模式agent
+                        segment_count_val = getattr(self, 'long_chapter_mode', 0)
+                        if segment_count_val > 0:
+                            mode_desc = {2: "2段", 3: "3段", 4: "4段"}
+                            print(f"📦 长章节启用（{mode_desc.get(segment_count_val, '')}分段润色{seg_index}）：传递前三章正文（不含上一章）+最近章节总结")
+                        emb_inputs = {
+                            "大纲": self.getCurrentOutline(),
+                            "润色要求": self.embellishment_idea,
+                            "要润色的内容": seg_text,
+                            "前2章故事线": enhanced_context_v2["prev_storyline"],
+                            "后2章故事线": enhanced_context_v2["next_storyline"],
+                            "本章故事线": str(current_story),
+                            "当前分段": current_seg_text,
+                            # 非精简模式额外上下文
+                            "前三章正文（不含上一章）": enhanced_context_v2["first_three_chapters_content"],
+                            "上一章原文": enhanced_context_v2["last_chapter_content"],
+                            "最近章节总结": enhanced_context_v2["chapter_summaries"],
+                        }
+
+                        # RAG: (分段润色) 获取风格参考
+                        if self._is_rag_enabled():
+                            # 构建查询: 关键元素 + 润色要求（精简版）
+                            rag_query_emb = f"{seg_key_elements} {self.embellishment_idea}"
+                            rag_refs_emb = self._get_rag_references(rag_query_emb, top_k=self.rag_top_k, for_embellishment=True)
+                            if rag_refs_emb:
+                                emb_inputs["风格参考"] = rag_refs_emb
+                                print(f"   📚 RAG(润色): 已注入风格参考 ({len(rag_refs_emb)}字符)")
+                    # 🔧 修复：使用 _embellish_with_retry 替代直接 invoke，
+                    # 保持与非分段模式一致的截断检测和自动回退逻辑，
+                    # 避免 API 失败时抛出异常触发整章重试导致重复生成
+                    # 润色交给流水线的润色阶段（上一段润色完成后开始，"上一段原文"只取最后2000字符）
+                    segment_stage.submit(emb_agent, emb_inputs, seg_text, f"分段{seg_index}润色")
+
+                # 等待最后一段润色完成
+                parts = segment_stage.finish()
+            finally:
+                segment_stage.close()
 
             # 合并分段
             next_paragraph = "\n\n".join(parts)
             next_writing_plan = last_plan
             next_temp_setting = last_setting
         else:
-            resp = writer.invoke(
-                inputs=self._inject_global_context_to_inputs(self._inject_foreshadowing_to_inputs(inputs)),
-                output_keys=["段落", "计划", "临时设定"],
-            )
+            if speculative_resp is not None and not skip_generic:
+                resp = speculative_resp
+            else:
+                resp = writer.invoke(
+                    inputs=self._prepare_writer_inputs(writer, inputs, self.chapter_count + 1),
+                    output_keys=["段落", "计划", "临时设定"],
+                )
             next_paragraph = resp["段落"]
             next_writing_plan = resp["计划"]
             next_temp_setting = resp["临时设定"]
@@ -2309,13 +2532,6 @@ class WritingMixin:
                         print(f"📚 RAG(润色): 已注入风格参考 ({len(rag_refs_emb)}字符)")
             
             # 调试信息：显示润色阶段的关键输入参数
-            try:
-                from config.dynamic_config_manager import get_config_manager
-                config_manager = get_config_manager()
-                debug_level = int(config_manager.get_debug_level())
-            except Exception:
-                debug_level = 1
-            
             print("🎨 润色阶段参数检查:")
             if debug_level >= 2:
                 # 详细模式：显示完整参数内容
@@ -2385,6 +2601,10 @@ class WritingMixin:
                 print("📦 使用精简版润色器（非精简模式：前三章正文（不含上一章）+章节总结）")
                 embellisher = self.novel_embellisher_compact  # 非精简模式也使用相同提示词
             
+            # 流水线模式：润色本章的同时在后台起草下一章
+            if self._can_pipeline_next_chapter(is_compact_mode, skip_generic, is_ending_phase, is_final_chapter):
+                self.launch_speculative_draft(next_paragraph, next_writing_plan, next_temp_setting)
+            
             next_paragraph = self._embellish_with_retry(
                 embellisher=embellisher,
                 embellish_inputs=embellish_inputs,
@@ -2434,7 +2654,22 @@ class WritingMixin:
             print("🛑 检测到停止信号，丢弃未完成的章节内容")
             raise InterruptedError("用户停止了生成")
         
+        # 🔒 提交前防重：本章生成期间 paragraph_list 不应被其他路径修改
+        if len(self.paragraph_list) != paragraph_count_at_start:
+            self.discard_speculative_draft()
+            raise RuntimeError(
+                f"第{new_chapter_count}章提交前段落数已变化（{paragraph_count_at_start} → {len(self.paragraph_list)}），放弃提交以避免重复章节"
+            )
+        if self.enable_chapters and self.paragraph_list:
+            from core.chapter_content_utils import split_paragraph_header, parse_chapter_title_line
+            last_header = parse_chapter_title_line(split_paragraph_header(self.paragraph_list[-1])[0])
+            if last_header and last_header[0] == new_chapter_count:
+                self.discard_speculative_draft()
+                print(f"⚠️ 第{new_chapter_count}章已存在（最后一章为第{last_header[0]}章），跳过重复提交")
+                return self.paragraph_list[-1]
+        
         self.paragraph_list.append(next_paragraph)
+        self._get_chapter_index().sync_paragraphs(self.paragraph_list)
         # 🔧 在内容实际提交后才更新 chapter_count（防止中断时计数不一致）
         self.chapter_count = new_chapter_count
         self.writing_plan = next_writing_plan
@@ -2450,36 +2685,24 @@ class WritingMixin:
             # 最终章不需要生成新记忆和章节总结，直接保存文件即可
             if is_final_chapter:
                 print(f"💾 最终章完成，直接保存文件（跳过记忆和总结生成）...")
+                # 先合并上一章可能仍在后台运行的记账任务
+                self.flush_post_commit_tasks()
                 self.updateNovelContent()
                 self.recordNovel()
                 self.saveToFile(save_metadata=True)
                 print(f"✅ 第{self.chapter_count}章（最终章）处理完成")
             else:
                 print(f"💾 更新记忆和保存文件...")
-                self.updateMemory()
-                self.updateGlobalContext()
                 self.updateNovelContent()
-                self.recordNovel()
-                # 在生成章节过程中保存元数据
-                self.saveToFile(save_metadata=True)
                 
-                # 生成章节总结并更新故事线
-                try:
-                    if self.enable_chapters and self.chapter_count > 0:
-                        # 获取章节标题（用于显示）
-                        current_storyline = self.getCurrentChapterStoryline(self.chapter_count)
-                        chapter_display_title = f"第{self.chapter_count}章"
-                        if current_storyline and isinstance(current_storyline, dict) and current_storyline.get("title"):
-                            story_title = current_storyline.get("title", "")
-                            chapter_display_title = f"第{self.chapter_count}章：{story_title}"
-                            
-                        print(f"📋 正在生成{chapter_display_title}的剧情总结...")
-                        summary_data = self.generateChapterSummary(next_paragraph, self.chapter_count)
-                        if summary_data:
-                            self.updateStorylineWithSummary(self.chapter_count, summary_data)
-                            print(f"✅ {chapter_display_title}的故事线已更新")
-                except Exception as e:
-                    print(f"⚠️ 章节总结/故事线更新失败（不影响正文生成）: {e}")
+                # 获取章节标题（用于显示）
+                chapter_display_title = f"第{self.chapter_count}章"
+                current_storyline = self.getCurrentChapterStoryline(self.chapter_count)
+                if current_storyline and isinstance(current_storyline, dict) and current_storyline.get("title"):
+                    chapter_display_title = f"第{self.chapter_count}章：{current_storyline.get('title', '')}"
+                
+                # 记忆、全局设定、章节总结并发执行，结果按固定顺序合并，文件在后台写入
+                self.dispatch_post_commit_tasks(self.chapter_count, next_paragraph, chapter_display_title)
                 
                 print(f"✅ 第{self.chapter_count}章处理完成")
         except Exception as post_commit_err:
@@ -2628,6 +2851,8 @@ class WritingMixin:
                         # 找到正确的插入位置（按章节号排序）
                         insert_pos = self._find_insert_position(ch_num)
                         self.paragraph_list.insert(insert_pos, new_paragraph)
+                        # 插入点之后的位置整体后移，从插入点起重建索引
+                        self._get_chapter_index().sync_paragraphs(self.paragraph_list)
                         
                         repaired_in_round.append(ch_num)
                         print(f"   ✅ 第{ch_num}章修复成功，插入位置: {insert_pos}")
@@ -2684,15 +2909,5 @@ class WritingMixin:
         Returns:
             int: 插入位置索引
         """
-        import re
-        
-        for idx, paragraph in enumerate(self.paragraph_list):
-            header = paragraph[:200] if len(paragraph) > 200 else paragraph
-            match = re.search(r'第(\d+)章', header)
-            if match:
-                existing_num = int(match.group(1))
-                if existing_num > target_chapter_num:
-                    return idx
-        
-        # 如果没有找到更大的章节号，插入到末尾
-        return len(self.paragraph_list)
+        # 第一个章节号更大的段落之前；没有更大的章节号则插入到末尾
+        return self._get_chapter_index().find_insert_position(self.paragraph_list, target_chapter_num)
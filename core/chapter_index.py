@@ -0,0 +1,168 @@
+"""
+章节索引 - 章节号到 paragraph_list 位置、章节号到故事线条目的映射
+
+此前上下文构建按章节号查找时：
+- 正文：遍历 paragraph_list 并用 f"第{i}章" in paragraph 做子串匹配，
+  代价为 O(章节数 × 正文长度)，且正文中回顾"第3章"的段落会被当成第3章
+  （修复缺失章节时列表里已有后续章节，倒序扫描会先命中这些回顾）
+- 故事线：每个章节号都线性遍历 storyline["chapters"]
+
+ChapterIndex 只解析每章标题行（严格格式，见 parse_chapter_title_line），
+随 paragraph_list 追加、修复插入和加载增量维护；故事线条目按位置索引，
+查找时校验章节号，列表被替换或条目被移动时自动重建。
+"""
+
+import threading
+
+from core.chapter_content_utils import parse_chapter_title_line
+
+
+HEADER_SCAN_CHARS = 300  # 只在段落开头这么多字符内寻找标题行
+
+
+def parse_paragraph_chapter_number(paragraph):
+    """解析段落标题行中的章节号，不是规范标题行时返回 None"""
+    if not paragraph:
+        return None
+    head = str(paragraph)[:HEADER_SCAN_CHARS].lstrip()
+    first_line = head.split("\n", 1)[0]
+    parsed = parse_chapter_title_line(first_line)
+    return parsed[0] if parsed else None
+
+
+class ChapterIndex:
+    """章节号索引（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 正文：paragraph_list 镜像
+        self._paragraph_list = None
+        self._sources = []          # 已索引的段落对象（按身份比较）
+        self._header_numbers = []   # 每个位置解析出的章节号（无标题时为 None）
+        self._by_header = {}        # 章节号 -> 位置（标题行解析，同号取第一个）
+        # 故事线：chapters 列表镜像
+        self._storyline_chapters = None
+        self._storyline_len = 0
+        self._storyline_positions = {}  # 章节号 -> 位置
+        self.stats = {"paragraph_rebuilds": 0, "storyline_rebuilds": 0, "storyline_fallback_scans": 0}
+
+    # ========== 正文索引 ==========
+
+    def sync_paragraphs(self, paragraph_list, force=False) -> int:
+        """与 paragraph_list 同步（追加只解析新段落，修改/插入从变化处重建）
+
+        Returns:
+            int: 第一个重新解析的位置
+        """
+        with self._lock:
+            if force or paragraph_list is not self._paragraph_list:
+                self._paragraph_list = paragraph_list
+                first_changed = 0
+            else:
+                first_changed = min(len(self._sources), len(paragraph_list))
+                for i in range(first_changed):
+                    if paragraph_list[i] is not self._sources[i]:
+                        first_changed = i
+                        break
+
+            if first_changed < len(self._sources):
+                del self._sources[first_changed:]
+                del self._header_numbers[first_changed:]
+                self._by_header = {
+                    num: pos for num, pos in self._by_header.items() if pos < first_changed
+                }
+                self.stats["paragraph_rebuilds"] += 1
+
+            for pos in range(first_changed, len(paragraph_list)):
+                paragraph = paragraph_list[pos]
+                number = parse_paragraph_chapter_number(paragraph)
+                self._sources.append(paragraph)
+                self._header_numbers.append(number)
+                if number is not None and number not in self._by_header:
+                    self._by_header[number] = pos
+            return first_changed
+
+    def _ensure_paragraphs(self, paragraph_list):
+        """查找前的快速校验：列表对象、长度和末尾元素都没变时直接使用索引"""
+        if (paragraph_list is self._paragraph_list
+                and len(paragraph_list) == len(self._sources)
+                and (not self._sources or paragraph_list[-1] is self._sources[-1])):
+            return
+        self.sync_paragraphs(paragraph_list)
+
+    def find_paragraph_position(self, paragraph_list, chapter_number):
+        """返回第 chapter_number 章在 paragraph_list 中的位置，找不到返回 None
+
+        优先使用标题行中的章节号；没有规范标题行的段落按位置（第 i+1 章）兜底。
+        """
+        with self._lock:
+            self._ensure_paragraphs(paragraph_list)
+            pos = self._by_header.get(chapter_number)
+            if pos is not None:
+                return pos
+            pos = chapter_number - 1
+            if 0 <= pos < len(self._header_numbers) and self._header_numbers[pos] is None:
+                return pos
+            return None
+
+    def get_paragraph(self, paragraph_list, chapter_number) -> str:
+        """返回第 chapter_number 章的正文，找不到返回空字符串"""
+        with self._lock:
+            pos = self.find_paragraph_position(paragraph_list, chapter_number)
+            return paragraph_list[pos] if pos is not None else ""
+
+    def find_insert_position(self, paragraph_list, chapter_number) -> int:
+        """第 chapter_number 章应插入的位置：第一个章节号更大的段落之前，否则末尾"""
+        with self._lock:
+            self._ensure_paragraphs(paragraph_list)
+            later = [pos for num, pos in self._by_header.items() if num > chapter_number]
+            return min(later) if later else len(paragraph_list)
+
+    # ========== 故事线索引 ==========
+
+    def _rebuild_storyline(self, chapters, start=0):
+        if start == 0:
+            self._storyline_positions = {}
+            self.stats["storyline_rebuilds"] += 1
+        for pos in range(start, len(chapters)):
+            chapter = chapters[pos]
+            if isinstance(chapter, dict):
+                number = chapter.get("chapter_number")
+                if number is not None and number not in self._storyline_positions:
+                    self._storyline_positions[number] = pos
+        self._storyline_chapters = chapters
+        self._storyline_len = len(chapters)
+
+    def get_storyline_chapter(self, storyline, chapter_number):
+        """返回第 chapter_number 章的故事线条目，找不到返回 None"""
+        chapters = storyline.get("chapters") if isinstance(storyline, dict) else None
+        if not chapters:
+            return None
+
+        with self._lock:
+            if chapters is not self._storyline_chapters or len(chapters) < self._storyline_len:
+                self._rebuild_storyline(chapters)
+            elif len(chapters) > self._storyline_len:
+                self._rebuild_storyline(chapters, start=self._storyline_len)
+
+            pos = self._storyline_positions.get(chapter_number)
+            if pos is not None and pos < len(chapters):
+                chapter = chapters[pos]
+                if isinstance(chapter, dict) and chapter.get("chapter_number") == chapter_number:
+                    return chapter
+
+            # 索引过期（条目被原地替换或移动）或章节确实不存在：线性查找一次并重建
+            self.stats["storyline_fallback_scans"] += 1
+            for chapter in chapters:
+                if isinstance(chapter, dict) and chapter.get("chapter_number") == chapter_number:
+                    self._rebuild_storyline(chapters)
+                    return chapter
+            return None
+
+    def find_storyline_position(self, storyline, chapter_number):
+        """返回第 chapter_number 章故事线条目在 chapters 列表中的位置，找不到返回 None"""
+        chapter = self.get_storyline_chapter(storyline, chapter_number)
+        if chapter is None:
+            return None
+        with self._lock:
+            return self._storyline_positions.get(chapter_number)
@@ -0,0 +1,173 @@
+"""
+上下文装配 - 按 token 预算裁剪正文/润色请求的输入字段
+
+非精简模式的输入包含前三章正文、上一章原文、最多15章总结、详细/基础大纲、全局设定、伏笔设定和 RAG 参考，
+没有整体上限，章节越多请求越大，直到变慢或触发 TokenLimitError。
+assemble_context 在输入超出预算时，按字段的价值从低到高依次裁剪，直到放得下：
+- 每个字段有价值权重与裁剪方式；权重相同时先裁剪更大的字段（单位 token 的价值更低）
+- 裁剪方式按字段内容选择：章节正文先去掉最早的整章（其梗概仍在最近章节总结中），
+  总结类去掉最早的条目，检索片段去掉排在后面的整个片段，上文类保留结尾，大纲/设定类保留开头，
+  与详细大纲重复的基础大纲直接删除
+- 要润色的内容、当前分段、本章故事线、写作/润色要求等字段从不裁剪
+- 未超出预算时原样返回输入，不做任何复制
+
+静态字段（大纲、人物列表）权重最高、最后才裁剪；预算不变时裁剪结果也不变，不会破坏提示词前缀缓存。
+token 数使用 core.agents.token_estimator 的快速估算（长文本按内容缓存）。
+"""
+
+from core.agents.token_estimator import estimate_tokens
+
+
+CHAPTER_SEPARATOR = "\n\n---\n\n"   # getEnhancedContextWithFirstThreeChapters 拼接章节正文的分隔符
+FIELD_OVERHEAD_TOKENS = 4            # 每个字段的 "# 键\n" 标题与空行
+PASSAGE_SEPARATOR = "\n\n【"         # 相关前文片段的片段分隔（每个片段以"【第N章·类型】"开头，片段内可能有空行）
+ELLIPSIS = "……"
+
+# 从不裁剪的字段（本次请求的任务本身）
+PROTECTED_FIELDS = {
+    "要润色的内容", "要润色的结尾内容", "要润色的开头内容",
+    "当前分段", "本章故事线", "当前章节", "是否最终章",
+    "写作要求", "润色要求", "润色想法", "用户要求",
+}
+
+# 字段: (价值权重, 裁剪方式, 最少保留字符数)；权重越低越先裁剪
+FIELD_POLICIES = {
+    "基础大纲": (1, "drop", 0),
+    "风格参考": (2, "lines_head", 0),
+    "前三章正文（不含上一章）": (3, "chapters", 0),
+    "相关前文片段": (3, "passages", 0),
+    "最近章节总结": (4, "lines_tail", 300),
+    "前卷梗概": (4, "lines_tail", 300),
+    "全书梗概": (5, "head", 800),
+    "详细大纲": (4, "head", 2000),
+    "本章分段（参考）": (5, "head", 300),
+    "前2章故事线": (5, "head", 300),
+    "后2章故事线": (5, "head", 300),
+    "全局设定": (5, "head", 800),
+    "伏笔设定": (5, "head", 500),
+    "上一章原文": (6, "tail", 1500),
+    "上文内容": (6, "tail", 1500),
+    "上文结尾": (7, "tail", 1000),
+    "上一段原文": (7, "tail", 1000),
+    "前章过渡提示": (7, "head", 200),
+    "前文记忆": (7, "head", 1000),
+    "临时设定": (7, "head", 500),
+    "计划": (8, "head", 500),
+    "人物列表": (8, "head", 1500),
+    "大纲": (9, "head", 2000),
+}
+DEFAULT_POLICY = (5, "head", 500)
+
+
+def field_tokens(key: str, value: str) -> int:
+    """字段在智能体输入中占用的 token 数（含标题）"""
+    return estimate_tokens(value) + FIELD_OVERHEAD_TOKENS if value else 0
+
+
+def _keep_head(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    newline = cut.rfind("\n")
+    if newline > limit * 0.8:
+        cut = cut[:newline]
+    return cut + ELLIPSIS
+
+
+def _keep_tail(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    cut = text[-limit:]
+    newline = cut.find("\n")
+    if 0 <= newline < limit * 0.2:
+        cut = cut[newline + 1:]
+    return ELLIPSIS + cut
+
+
+def _drop_blocks(text: str, limit: int, separator: str, from_start: bool) -> tuple:
+    """按分隔符整块删除直到不超过 limit，返回 (文本, 删除块数)"""
+    blocks = text.split(separator)
+    dropped = 0
+    while len(blocks) > 1 and len(separator.join(blocks)) > limit:
+        blocks.pop(0 if from_start else -1)
+        dropped += 1
+    return separator.join(blocks), dropped
+
+
+def _reduce(text: str, mode: str, limit: int) -> tuple:
+    """把 text 裁剪到约 limit 字符，返回 (新文本, 操作说明)"""
+    if mode == "drop" or limit <= 0:
+        return "", "删除"
+    if mode == "head":
+        return _keep_head(text, limit), f"保留开头{limit}字"
+    if mode == "tail":
+        return _keep_tail(text, limit), f"保留结尾{limit}字"
+
+    if mode == "chapters":
+        reduced, dropped = _drop_blocks(text, limit, CHAPTER_SEPARATOR, from_start=True)
+        note = f"去掉最早{dropped}章" if dropped else ""
+        if len(reduced) > limit:
+            reduced = _keep_tail(reduced, limit)
+            note = f"{note}，" if note else ""
+            note += f"保留结尾{limit}字"
+        return reduced, note
+    if mode == "passages":
+        # 检索片段按相关度排列：去掉排在后面的整个片段，放不下一个完整片段时整段删除（不留半个片段）
+        reduced, dropped = _drop_blocks(text, limit, PASSAGE_SEPARATOR, from_start=False)
+        if len(reduced) > limit:
+            return "", "删除"
+        return reduced, f"去掉末尾{dropped}个片段" if dropped else ""
+    # lines_tail：去掉最早的条目（章节总结），lines_head：去掉排在后面的条目（检索结果）
+    from_start = mode == "lines_tail"
+    reduced, dropped = _drop_blocks(text, limit, "\n", from_start=from_start)
+    note = f"去掉{'最早' if from_start else '末尾'}{dropped}条" if dropped else ""
+    if len(reduced) > limit:
+        reduced = _keep_tail(reduced, limit) if from_start else _keep_head(reduced, limit)
+        note = f"{note}，" if note else ""
+        note += f"保留{'结尾' if from_start else '开头'}{limit}字"
+    return reduced, note
+
+
+def assemble_context(inputs: dict, budget_tokens: int) -> tuple:
+    """
+    按 token 预算装配输入字段
+
+    Args:
+        inputs: 智能体输入（字段顺序保持不变）
+        budget_tokens: 输入字段可用的 token 数（已扣除系统提示词），<=0 表示不限制
+
+    Returns:
+        tuple: (输入字典, 裁剪记录列表, 裁剪前 token 数)；
+               未超出预算时返回原字典与空列表，裁剪记录为 (字段, 裁剪前tokens, 裁剪后tokens, 说明)
+    """
+    sizes = {key: field_tokens(key, value) for key, value in inputs.items() if isinstance(value, str)}
+    total = sum(sizes.values())
+    if budget_tokens <= 0 or total <= budget_tokens:
+        return inputs, [], total
+
+    candidates = [key for key, size in sizes.items() if size and key not in PROTECTED_FIELDS]
+    candidates.sort(key=lambda key: (FIELD_POLICIES.get(key, DEFAULT_POLICY)[0], -sizes[key]))
+
+    assembled = dict(inputs)
+    trims = []
+    excess = total - budget_tokens
+    for key in candidates:
+        if excess <= 0:
+            break
+        _, mode, min_chars = FIELD_POLICIES.get(key, DEFAULT_POLICY)
+        text = assembled[key]
+        before = sizes[key]
+        if mode != "drop" and len(text) <= min_chars:
+            continue
+        # 按该字段自身的字符/token 比例换算需要保留的字符数
+        target_tokens = max(0, before - FIELD_OVERHEAD_TOKENS - excess)
+        limit = max(min_chars, int(len(text) * target_tokens / max(1, before - FIELD_OVERHEAD_TOKENS)))
+        reduced, note = _reduce(text, mode, limit)
+        after = field_tokens(key, reduced)
+        if after >= before:
+            continue
+        assembled[key] = reduced
+        excess -= before - after
+        trims.append((key, before, after, note))
+
+    return assembled, trims, total
@@ -0,0 +1,194 @@
+"""
+分块并行润色 - 在场景/段落边界把一章正文切成 K 块并发润色，再按顺序拼接并去除交界处的重复
+
+整章一次润色时，两万字的章节常常超出模型的输出长度上限而被截断，_embellish_with_retry
+最多整章重跑三次，之后回退到未润色的原文；润色耗时也是整章输出的时间。分块模式下：
+- split_chunks() 优先在场景分隔行（***、———、◇◇◇ 等）处切分，其次在空行、换行处，
+  最后才在句末标点处，使各块长度尽量接近 总长/K；分隔行与空白原样保留在块之间
+- 每块的润色输入 = 原润色输入（大纲、故事线等共享上下文，前缀缓存可复用）
+  + 本块原文 + 前一块末尾 / 后一块开头的一小段原文（衔接窗口，只作参考、不输出）
+- 每块单独走截断检测、断点续写与重试，只有失败的块重试或回退到原文
+- stitch_chunks() 按原顺序拼接；模型有时会把衔接窗口也润色输出，拼接时去掉块开头与上一块结尾
+  重复的段落、以及块结尾复述下一块开头的段落（按段落相似度判断）
+润色耗时约等于最慢一块的耗时，而不是整章的耗时。
+"""
+
+import re
+from difflib import SequenceMatcher
+
+from core.embellish_truncation_detector import VALID_ENDING_PUNCTUATION
+
+
+MIN_CHUNK_CHARS = 1500          # 每块的最小长度（更短的块省不了多少时间，交界却更多）
+CONTEXT_CHARS = 300             # 衔接窗口长度（前一块末尾 / 后一块开头）
+SEAM_PARAGRAPHS = 3             # 与上一块润色结果比较时检查的结尾段落数
+SEAM_SIMILARITY = 0.7           # 段落相似度阈值（匹配字数 / 较短段落的字数）
+MIN_SEAM_PARAGRAPH_CHARS = 8    # 短于此长度的段落（"嗯。"之类）不做去重
+
+# 切分点优先级：场景分隔行 < 空行 < 换行 < 句末标点
+TIER_SCENE, TIER_BLANK_LINE, TIER_NEWLINE, TIER_SENTENCE = range(4)
+
+_SCENE_BREAK_RE = re.compile(r"\s*\n[ \t]*(?:[*＊·•◆◇○●※~～\-—=][ \t]*){3,}(?=\n)\s*")
+_WHITESPACE_RE = re.compile(r"[ \t]*\n\s*")
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？…])(?![”’」』）)\n])")
+_CLOSING_MARKS = "”’」』）)"
+
+
+def plan_chunk_count(text_length: int, requested: int, min_chars: int) -> int:
+    """计算分块数：未开启（requested<=1）或正文短于 min_chars 时为1，且每块不短于 MIN_CHUNK_CHARS"""
+    try:
+        requested = int(requested or 1)
+    except (ValueError, TypeError):
+        requested = 1
+    if requested <= 1 or text_length < max(min_chars or 0, 2 * MIN_CHUNK_CHARS):
+        return 1
+    return max(1, min(requested, text_length // MIN_CHUNK_CHARS))
+
+
+def _boundaries(text: str) -> list:
+    """所有候选切分点 [(分隔开始, 分隔结束, 优先级)]，text[开始:结束] 为块之间保留的分隔"""
+    spans = {}
+    for match in _SENTENCE_END_RE.finditer(text):
+        spans[match.start()] = (match.start(), match.end(), TIER_SENTENCE)
+    for match in _WHITESPACE_RE.finditer(text):
+        tier = TIER_BLANK_LINE if match.group().count("\n") >= 2 else TIER_NEWLINE
+        spans[match.start()] = (match.start(), match.end(), tier)
+    for match in _SCENE_BREAK_RE.finditer(text):
+        spans[match.start()] = (match.start(), match.end(), TIER_SCENE)
+    return sorted(spans.values())
+
+
+def split_chunks(text: str, count: int) -> tuple:
+    """在场景/段落边界把正文切成约 count 块
+
+    每个切分点在理想位置（总长的 i/count）前后 1/4 块长的范围内选优先级最高、距离最近的边界；
+    范围内没有边界时取最近的边界，仍没有则少切一块。
+
+    Returns:
+        tuple: (块列表, 分隔列表)，分隔列表比块列表少一项，"".join 交替拼接即为原文（去掉首尾空白）
+    """
+    text = (text or "").strip()
+    if count <= 1 or not text:
+        return ([text] if text else []), []
+    boundaries = _boundaries(text)
+    target = len(text) / count
+    tolerance = target / 4
+    chunks, separators = [], []
+    chunk_start = 0
+    for i in range(1, count):
+        ideal = target * i
+        candidates = [(start, end, tier) for start, end, tier in boundaries
+                      if start > chunk_start and end < len(text)]
+        if not candidates:
+            break
+        nearby = [c for c in candidates if abs(c[0] - ideal) <= tolerance]
+        if nearby:
+            start, end, _ = min(nearby, key=lambda c: (c[2], abs(c[0] - ideal)))
+        else:
+            start, end, _ = min(candidates, key=lambda c: abs(c[0] - ideal))
+        chunks.append(text[chunk_start:start])
+        separators.append(text[start:end])
+        chunk_start = end
+    chunks.append(text[chunk_start:])
+    return chunks, separators
+
+
+def _sentence_ends(text: str) -> list:
+    """完整句子/行的结束位置（句末标点后紧跟的后引号、括号算在句子内）"""
+    return [pos for pos, char in enumerate(text)
+            if (char == "\n" or char in VALID_ENDING_PUNCTUATION)
+            and (pos + 1 == len(text) or text[pos + 1] not in _CLOSING_MARKS)]
+
+
+def chunk_context(chunks: list, index: int, chars: int = CONTEXT_CHARS) -> tuple:
+    """第 index 块的衔接窗口：(前一块末尾约 chars 字, 后一块开头约 chars 字)，都从完整句子处截取"""
+    before = after = ""
+    if index > 0:
+        tail = chunks[index - 1][-chars:]
+        if len(chunks[index - 1]) > chars:
+            ends = [pos for pos in _sentence_ends(tail) if pos < len(tail) - 1]
+            tail = tail[ends[0] + 1:] if ends else tail
+        before = tail.strip()
+    if index + 1 < len(chunks):
+        head = chunks[index + 1][:chars]
+        if len(chunks[index + 1]) > chars:
+            ends = _sentence_ends(head)
+            head = head[:ends[-1] + 1] if ends else head
+        after = head.strip()
+    return before, after
+
+
+def _paragraphs(text: str) -> list:
+    return [line.strip() for line in (text or "").split("\n") if line.strip()]
+
+
+def _similar(a: str, b: str) -> bool:
+    """两个段落是否为同一段（其中一段是另一段的原文或润色版本）"""
+    if min(len(a), len(b)) < MIN_SEAM_PARAGRAPH_CHARS:
+        return False
+    if a == b:
+        return True
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    shorter = min(len(a), len(b))
+    if shorter / max(len(a), len(b)) < SEAM_SIMILARITY / 2:
+        return False
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    return matched / shorter >= SEAM_SIMILARITY
+
+
+def _drop_lines(text: str, count: int, from_end: bool) -> str:
+    """去掉开头（或结尾）的 count 个非空行，其余内容保持原样"""
+    lines = text.split("\n")
+    indexes = [i for i, line in enumerate(lines) if line.strip()]
+    if from_end:
+        return "\n".join(lines[:indexes[-count]]).rstrip()
+    return "\n".join(lines[indexes[count - 1] + 1:]).lstrip()
+
+
+def _echo_length(paragraphs: list, references: list, leading: bool) -> int:
+    """paragraphs 开头（leading）逐段重复 references 结尾的段落数，或 paragraphs 结尾逐段重复 references 开头的段落数
+
+    只认按原顺序一一对应的重复（复述衔接窗口的典型形式），至少保留一段。
+    """
+    for count in range(min(len(paragraphs) - 1, len(references)), 0, -1):
+        if leading:
+            pairs = zip(paragraphs[:count], references[-count:])
+        else:
+            pairs = zip(paragraphs[-count:], references[:count])
+        if all(_similar(a, b) for a, b in pairs):
+            return count
+    return 0
+
+
+def stitch_chunks(parts: list, separators: list, contexts: list) -> tuple:
+    """按原顺序拼接各块的润色结果，去除交界处重复输出的衔接内容
+
+    Args:
+        parts: 各块的润色结果
+        separators: split_chunks() 返回的块间分隔
+        contexts: 各块的衔接窗口 [(前一块末尾, 后一块开头), ...]（chunk_context() 的返回值）
+
+    Returns:
+        tuple: (拼接后的正文, 去掉的重复段落数)
+    """
+    parts = [(part or "").strip() for part in parts]
+    removed = 0
+    for i in range(1, len(parts)):
+        # 上一块结尾把下一块开头（衔接窗口）也写了出来
+        echoes = _echo_length(_paragraphs(parts[i - 1]), _paragraphs(contexts[i - 1][1]), leading=False)
+        if echoes:
+            parts[i - 1] = _drop_lines(parts[i - 1], echoes, from_end=True)
+            removed += echoes
+        # 本块开头重写了上一块结尾（与上一块的润色结果或衔接窗口原文重复）
+        paragraphs = _paragraphs(parts[i])
+        echoes = max(_echo_length(paragraphs, _paragraphs(parts[i - 1])[-SEAM_PARAGRAPHS:], leading=True),
+                     _echo_length(paragraphs, _paragraphs(contexts[i][0]), leading=True))
+        if echoes:
+            parts[i] = _drop_lines(parts[i], echoes, from_end=False)
+            removed += echoes
+    pieces = []
+    for i, part in enumerate(parts):
+        pieces.append(part)
+        if i < len(separators):
+            pieces.append(separators[i])
+    return "".join(pieces), removed
@@ -25,6 +25,7 @@ from core.storyline_chapter_utils import (
     dedupe_chapters_by_number,
     normalize_chapter_title,
 )
+from providers.stream_protocol import StreamAccumulator
 
 
 class EnhancedStorylineGenerator(StorylineErrorHandlerMixin, StorylineTruncationMixin):
@@ -34,6 +35,7 @@ class EnhancedStorylineGenerator(StorylineErrorHandlerMixin, StorylineTruncation
         self.chatLLM = chatLLM
         self.aign_instance = aign_instance  # 用于更新实时数据流窗口
         self.max_retries = 2
+        self.max_resumes = 2  # 章节不全时最多续写的次数
         self.provider_name = self._detect_provider()
         self._batch_start_chapter: Optional[int] = None
         self._batch_end_chapter: Optional[int] = None
@@ -554,54 +556,12 @@ class EnhancedStorylineGenerator(StorylineErrorHandlerMixin, StorylineTruncation
                     retry_hint = f"\n\n**注意：请确保使用Markdown格式输出，每章必须以 ## 第X章：标题 开头。确保生成所有要求的章节。**"
                     current_messages[-1]["content"] += retry_hint
 
-                response = self.chatLLM(
+                current_temperature = max(0.3, temperature - retry * 0.1)
+                response = self._collect_response(self.chatLLM(
                     messages=current_messages,
-                    temperature=max(0.3, temperature - retry * 0.1),
+                    temperature=current_temperature,
                     stream=True
-                )
-                
-                # 处理流式响应
-                if hasattr(response, '__next__'):
-                    print(f"🔧 故事线生成: 检测到流式响应，开始接收数据...\n")
-                    final_result = None
-                    accumulated_content = ""
-                    accumulated_reasoning = ""
-                    chunk_count = 0
-                    last_content_length = 0
-                    last_reasoning_length = 0
-                    
-                    for chunk in response:
-                        chunk_count += 1
-                        final_result = chunk
-                        
-                        if chunk and 'reasoning_content' in chunk and chunk['reasoning_content']:
-                            current_reasoning = chunk['reasoning_content']
-                            new_reasoning = current_reasoning[last_reasoning_length:]
-                            if new_reasoning:
-                                print(new_reasoning, end='', flush=True)
-                                if self.aign_instance and hasattr(self.aign_instance, 'update_stream_progress'):
-                                    self.aign_instance.update_stream_progress(new_reasoning, is_reasoning=True)
-                            accumulated_reasoning = current_reasoning
-                            last_reasoning_length = len(current_reasoning)
-                        
-                        if chunk and 'content' in chunk:
-                            current_content = chunk['content']
-                            new_content = current_content[last_content_length:]
-                            if new_content:
-                                print(new_content, end='', flush=True)
-                                if self.aign_instance and hasattr(self.aign_instance, 'update_stream_progress'):
-                                    self.aign_instance.update_stream_progress(new_content, is_reasoning=False)
-                            accumulated_content = current_content
-                            last_content_length = len(current_content)
-                    
-                    if accumulated_reasoning:
-                        print(f"\n\n🧠 思考过程总长度: {len(accumulated_reasoning)} 字符")
-                    print(f"✅ 流式接收完成: {len(accumulated_content)} 字符, {chunk_count} 个数据块")
-                    
-                    response = {
-                        "content": accumulated_content,
-                        "total_tokens": final_result.get("total_tokens", 0) if final_result else 0
-                    }
+                ))
                 
                 self._log_token_usage(f"Markdown方法(第{retry+1}次尝试)", current_messages, response)
 
@@ -614,6 +574,14 @@ class EnhancedStorylineGenerator(StorylineErrorHandlerMixin, StorylineTruncation
 
                     # 尝试Markdown解析
                     data = parse_storyline_markdown(content)
+                    
+                    # 🧩 章节不全（输出在中途被截断）：保留已完成的章节，从断点续写缺失的章节
+                    expected_count = self._extract_chapter_count_from_messages(messages)
+                    if data and self._storyline_incomplete(data, expected_count, require_segments, segment_count):
+                        content, data = self._resume_truncated_storyline(
+                            current_messages, content, data, expected_count, current_temperature,
+                            require_segments, segment_count
+                        )
                     if data and self._validate_storyline_structure(data):
                         print(f"✅ Markdown解析成功，第{retry+1}次尝试")
                         expected_count = self._extract_chapter_count_from_messages(messages)
@@ -663,6 +631,126 @@ class EnhancedStorylineGenerator(StorylineErrorHandlerMixin, StorylineTruncation
             print(f"❌ Markdown生成方法调用失败: {e}")
             return None, f"markdown_generation_error: {e}"
 
+    def _collect_response(self, response) -> Dict[str, Any]:
+        """接收流式响应（同步显示到实时数据流窗口），返回 {"content", "total_tokens"}；非流式响应原样返回"""
+        if not hasattr(response, '__next__'):
+            return response
+        
+        print(f"🔧 故事线生成: 检测到流式响应，开始接收数据...\n")
+        stream_accumulator = StreamAccumulator()
+        
+        for chunk in response:
+            new_content, new_reasoning = stream_accumulator.feed(chunk)
+            
+            if new_reasoning:
+                print(new_reasoning, end='', flush=True)
+                if self.aign_instance and hasattr(self.aign_instance, 'update_stream_progress'):
+                    self.aign_instance.update_stream_progress(new_reasoning, is_reasoning=True)
+            
+            if new_content:
+                print(new_content, end='', flush=True)
+                if self.aign_instance and hasattr(self.aign_instance, 'update_stream_progress'):
+                    self.aign_instance.update_stream_progress(new_content, is_reasoning=False)
+        
+        final_result = stream_accumulator.result()
+        if stream_accumulator.reasoning_length:
+            print(f"\n\n🧠 思考过程总长度: {stream_accumulator.reasoning_length} 字符")
+        print(f"✅ 流式接收完成: {len(final_result['content'])} 字符, {stream_accumulator.chunk_count} 个数据块")
+        
+        return {
+            "content": final_result["content"],
+            "total_tokens": final_result.get("total_tokens", 0)
+        }
+    
+    def _storyline_incomplete(
+        self,
+        data: Dict[str, Any],
+        expected_count: int,
+        require_segments: bool = True,
+        segment_count: int = 4,
+    ) -> str:
+        """故事线是否像在中途被截断：章节数不足，或最后一章缺少分段/衔接下章，返回原因（完整时返回空字符串）"""
+        chapters = data.get("chapters") or []
+        if len(chapters) < expected_count:
+            return f"只有{len(chapters)}/{expected_count}章"
+        last = chapters[-1]
+        if require_segments and len(last.get("plot_segments") or []) < segment_count:
+            return f"第{last.get('chapter_number')}章只有{len(last.get('plot_segments') or [])}/{segment_count}个分段"
+        if not require_segments and not last.get("transition_to_next"):
+            return f"第{last.get('chapter_number')}章缺少衔接下章"
+        return ""
+    
+    def _storyline_resume_point(self, content: str) -> Tuple[str, int]:
+        """续写起点：丢弃最后一章（可能写到一半），返回 (已完成章节的前缀, 续写的起始章节号)
+        
+        少于两个章节标题或前缀过短时返回 ("", 0)，此时续写省不了多少，直接重新生成。
+        """
+        headers = list(re.finditer(r'^##\s*第\s*(\d+)\s*章', content, re.MULTILINE))
+        if len(headers) < 2:
+            return "", 0
+        prefix = content[:headers[-1].start()]
+        from core.agents.continuation import MIN_PREFIX_CHARS
+        if len(prefix.strip()) < MIN_PREFIX_CHARS:
+            return "", 0
+        return prefix, int(headers[-1].group(1))
+    
+    def _resume_truncated_storyline(
+        self,
+        messages: List[Dict[str, str]],
+        content: str,
+        data: Dict[str, Any],
+        expected_count: int,
+        temperature: float,
+        require_segments: bool = True,
+        segment_count: int = 4,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """故事线章节不全时从断点续写缺失的章节，返回拼接后的 (内容, 解析结果)；续写没有进展时返回原结果"""
+        from core.agents import continuation
+        from core.storyline_markdown_parser import parse_storyline_markdown
+        
+        try:
+            from config.dynamic_config_manager import get_config_snapshot
+            if not get_config_snapshot().resume_partial:
+                return content, data
+        except Exception:
+            pass
+        
+        for attempt in range(1, self.max_resumes + 1):
+            reason = self._storyline_incomplete(data, expected_count, require_segments, segment_count)
+            prefix, next_chapter = self._storyline_resume_point(content)
+            if not reason or not prefix:
+                break
+            chapter_count = len(data.get("chapters", []))
+            print(f"\n🧩 故事线不完整（{reason}），保留已完成的章节，从第{next_chapter}章续写（第{attempt}次）...")
+            resume_messages = continuation.build_messages(
+                messages, prefix,
+                hint=f"从“## 第{next_chapter}章”开始继续输出剩余的章节，已输出的章节不要重复"
+            )
+            try:
+                response = self._collect_response(self.chatLLM(
+                    messages=resume_messages,
+                    temperature=temperature,
+                    stream=True
+                ))
+            except Exception as e:
+                print(f"⚠️ 故事线续写失败: {e}")
+                break
+            self._log_token_usage(f"Markdown续写(第{attempt}次)", resume_messages, response)
+            
+            resumed_text = response.get("content", "")
+            stitched = continuation.stitch(prefix, resumed_text)
+            resumed_data = parse_storyline_markdown(stitched) if resumed_text else None
+            if not resumed_data or len(resumed_data.get("chapters", [])) < chapter_count:
+                print(f"⚠️ 故事线续写没有新增章节，保留原结果")
+                break
+            
+            continuation.get_resume_stats().record("故事线", kept_chars=len(prefix), new_chars=len(resumed_text))
+            content, data = stitched, resumed_data
+            print(f"✅ 故事线续写完成: {len(data['chapters'])}/{expected_count}章（保留已生成 {len(prefix)}字，"
+                  f"续写 {len(resumed_text)}字）")
+        
+        return content, data
+    
     def _enhance_json_prompt(self, messages: List[Dict[str, str]], require_segments: bool = True, segment_count: int = 4) -> List[Dict[str, str]]:
         """增强提示词以提高JSON格式正确率
         
@@ -0,0 +1,169 @@
+"""
+分层记忆 - 章节总结逐级汇总为卷梗概和全书梗概，使长篇小说的上下文大小不随章节数增长
+
+writing_memory 是一段上限约4800字的整体记忆，非精简模式的"最近章节总结"只覆盖最近15章，
+写到几百章时早期剧情要么丢失、要么只能把更多总结塞进提示词。分层记忆分三级：
+- 章节：故事线中每章的 plot_summary（章节总结写回故事线后即为实际剧情）
+- 卷：每 arc_chapters 章（chapters_per_plot × 若干个剧情单元）汇总为一段卷梗概，整卷写完才生成
+- 全书：超出最近 recent_arcs 卷的旧卷依次并入全书梗概，每次只并入一卷（增量压缩）
+写第 N 章时的上下文 = 全书梗概 + 最近几卷的卷梗概 + 最近 K 章与本卷已写章节的总结，
+每一级都有长度上限，与已写章节数无关。
+
+本模块只负责布局、失效检测与上下文拼装，不调用模型：pending_work() 列出需要生成的卷梗概和
+需要并入全书梗概的卷，由 AIGN 依次执行后调用 set_arc() / fold_arc() 写回。
+每卷记录其章节总结的指纹，章节被重写、总结变化或卷长度设置变化时对应的层级失效，
+在下一次需要上下文时重新生成（存档中的数据因此可以按需重建）。
+"""
+
+import hashlib
+
+
+DEFAULT_RECENT_ARCS = 2          # 以卷梗概形式保留的最近卷数，更早的卷并入全书梗概
+ARC_SUMMARY_MAX_CHARS = 1200     # 卷梗概长度上限
+SYNOPSIS_MAX_CHARS = 4000        # 全书梗概长度上限
+
+
+def _fingerprint(texts) -> str:
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def clip_text(text: str, limit: int) -> str:
+    """超过 limit 时截到 limit 以内最后一个句号处（找不到合适的句号时直接截断）"""
+    text = (text or "").strip()
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    last_period = cut.rfind("。")
+    return cut[:last_period + 1] if last_period > limit * 0.6 else cut
+
+
+class HierarchicalMemory:
+    """章节 → 卷 → 全书三级记忆的状态（可序列化到存档）"""
+
+    def __init__(self, arc_chapters: int, recent_arcs: int = DEFAULT_RECENT_ARCS):
+        self.arc_chapters = max(1, int(arc_chapters))
+        self.recent_arcs = max(0, int(recent_arcs))
+        self.arcs = {}            # 卷号 -> {"start", "end", "summary", "fingerprint"}
+        self.synopsis = ""        # 全书梗概，覆盖第 1..folded_arcs 卷
+        self.folded_arcs = 0
+        self.folded_fingerprints = []   # 已并入全书梗概的各卷指纹（按卷号顺序）
+
+    # ---------- 布局 ----------
+
+    def arc_range(self, arc_index: int) -> tuple:
+        """第 arc_index 卷（从1开始）覆盖的章节范围 (起始章, 结束章)"""
+        return (arc_index - 1) * self.arc_chapters + 1, arc_index * self.arc_chapters
+
+    def closed_arcs(self, chapter_number: int) -> int:
+        """写第 chapter_number 章时已经写完的整卷数"""
+        return max(0, chapter_number - 1) // self.arc_chapters
+
+    def arc_fingerprint(self, arc_index: int, chapter_summaries: dict) -> str:
+        start, end = self.arc_range(arc_index)
+        return _fingerprint(chapter_summaries.get(i, "") for i in range(start, end + 1))
+
+    # ---------- 失效检测与待办 ----------
+
+    def invalidate(self, chapter_summaries: dict, chapter_number: int) -> list:
+        """丢弃与当前章节总结不一致的卷梗概与全书梗概，返回失效的卷号"""
+        stale = []
+        closed = self.closed_arcs(chapter_number)
+        for arc_index in sorted(self.arcs):
+            entry = self.arcs[arc_index]
+            if arc_index > closed or entry.get("fingerprint") != self.arc_fingerprint(arc_index, chapter_summaries):
+                stale.append(arc_index)
+                del self.arcs[arc_index]
+        # 全书梗概只能整体重建：任一已并入的卷变化（或已并入的卷超出已写范围）都要从头并入
+        folded_valid = self.folded_arcs <= closed and all(
+            fingerprint == self.arc_fingerprint(arc_index, chapter_summaries)
+            for arc_index, fingerprint in enumerate(self.folded_fingerprints, start=1)
+        )
+        if not folded_valid:
+            stale.extend(i for i in range(1, self.folded_arcs + 1) if i not in stale)
+            self.synopsis = ""
+            self.folded_arcs = 0
+            self.folded_fingerprints = []
+        return sorted(stale)
+
+    def pending_work(self, chapter_number: int) -> list:
+        """写第 chapter_number 章之前需要完成的压缩步骤（按执行顺序）
+
+        Returns:
+            list: [("fold", 卷号) | ("arc", 卷号), ...]；"fold" 把该卷并入全书梗概，
+                  "arc" 为该卷生成卷梗概（只为保留在最近 recent_arcs 卷中的卷生成）
+        """
+        closed = self.closed_arcs(chapter_number)
+        fold_target = max(0, closed - self.recent_arcs)
+        work = [("fold", arc_index) for arc_index in range(self.folded_arcs + 1, fold_target + 1)]
+        work += [("arc", arc_index) for arc_index in range(fold_target + 1, closed + 1) if arc_index not in self.arcs]
+        return work
+
+    # ---------- 写回 ----------
+
+    def set_arc(self, arc_index: int, summary: str, fingerprint: str):
+        start, end = self.arc_range(arc_index)
+        self.arcs[arc_index] = {
+            "start": start,
+            "end": end,
+            "summary": clip_text(summary, ARC_SUMMARY_MAX_CHARS),
+            "fingerprint": fingerprint,
+        }
+
+    def fold_arc(self, arc_index: int, synopsis: str, fingerprint: str):
+        """第 arc_index 卷已并入全书梗概（必须按卷号顺序调用）"""
+        if arc_index != self.folded_arcs + 1:
+            raise ValueError(f"第{arc_index}卷并入顺序错误（已并入{self.folded_arcs}卷）")
+        self.synopsis = clip_text(synopsis, SYNOPSIS_MAX_CHARS)
+        self.folded_arcs = arc_index
+        self.folded_fingerprints.append(fingerprint)
+
+    # ---------- 上下文 ----------
+
+    def recent_arc_summaries(self, chapter_number: int) -> str:
+        """最近几卷（尚未并入全书梗概的已写完整卷）的卷梗概"""
+        lines = []
+        for arc_index in range(self.folded_arcs + 1, self.closed_arcs(chapter_number) + 1):
+            entry = self.arcs.get(arc_index)
+            if entry and entry["summary"]:
+                lines.append(f"第{arc_index}卷（第{entry['start']}-{entry['end']}章）：{entry['summary']}")
+        return "\n".join(lines)
+
+    def summary_start(self, chapter_number: int, recent_chapters: int) -> int:
+        """章节总结的起始章：最近 recent_chapters 章，且至少覆盖本卷已写的章节"""
+        open_arc_start = self.closed_arcs(chapter_number) * self.arc_chapters + 1
+        return max(1, min(chapter_number - recent_chapters, open_arc_start))
+
+    # ---------- 序列化 ----------
+
+    def to_dict(self) -> dict:
+        return {
+            "arc_chapters": self.arc_chapters,
+            "recent_arcs": self.recent_arcs,
+            "arcs": [dict(entry, index=arc_index) for arc_index, entry in sorted(self.arcs.items())],
+            "synopsis": self.synopsis,
+            "folded_arcs": self.folded_arcs,
+            "folded_fingerprints": list(self.folded_fingerprints),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, arc_chapters: int, recent_arcs: int = DEFAULT_RECENT_ARCS) -> "HierarchicalMemory":
+        """从存档恢复；卷长度与当前设置不同时返回空记忆（按需重建）"""
+        memory = cls(arc_chapters, recent_arcs)
+        if not isinstance(data, dict) or data.get("arc_chapters") != memory.arc_chapters:
+            return memory
+        for entry in data.get("arcs", []):
+            try:
+                arc_index = int(entry["index"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            memory.arcs[arc_index] = {key: entry.get(key, "") for key in ("start", "end", "summary", "fingerprint")}
+        fingerprints = list(data.get("folded_fingerprints", []))
+        if int(data.get("folded_arcs", 0) or 0) == len(fingerprints):
+            memory.synopsis = data.get("synopsis", "")
+            memory.folded_arcs = len(fingerprints)
+            memory.folded_fingerprints = fingerprints
+        return memory
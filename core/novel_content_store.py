@@ -0,0 +1,253 @@
+"""
+小说正文存储 - 按章节索引的追加式正文模型
+
+此前每写完一章都会：
+- updateNovelContent() 从 paragraph_list 重新拼接整本书
+- recordNovel() 再拼接一份整本书的副本写入 novel_record.md
+- saveToFile() 整本重写输出文件（Fish Audio 模式下写两份，并对全文做正则清理）
+300万字的小说在一次运行中会累积出 GB 级的内存拷贝和磁盘写入。
+
+NovelContentStore 与 paragraph_list 一一对应地保存每章的文本块和字符偏移，
+只在确实需要整本字符串时才拼接（并缓存到下一次修改）。
+AppendOnlyTextFile 记录输出文件中每章结束的字节偏移，新章节以追加方式写入，
+追加前用文件大小和最后一章的摘要校验文件未被外部修改，否则回退为整本重写。
+"""
+
+import hashlib
+import os
+import threading
+
+
+CHAPTER_SEPARATOR = "\n\n"
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class NovelContentStore:
+    """按章节索引的正文存储（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sources = []      # 与 paragraph_list 对应的原始段落对象，用于检测修改
+        self._chunks = []       # 每章的文本块（段落 + 分隔符）
+        self._offsets = [0]     # 每章起始字符偏移，_offsets[i + 1] 为第 i 块结束位置
+        self._joined = None     # 拼接缓存
+        self._text_override = None  # 外部直接赋值的整本文本（如加载存档）
+        self.stats = {"appended": 0, "rebuilt": 0, "joins": 0}
+
+    def sync(self, paragraph_list) -> int:
+        """与 paragraph_list 同步，只处理新增或被修改的章节
+
+        Returns:
+            int: 第一个发生变化的章节下标（无变化时等于章节数）
+        """
+        with self._lock:
+            self._text_override = None
+            old_count = len(self._sources)
+            new_count = len(paragraph_list)
+
+            first_changed = min(old_count, new_count)
+            for i in range(first_changed):
+                paragraph = paragraph_list[i]
+                if paragraph is self._sources[i]:
+                    continue
+                if paragraph != self._sources[i]:
+                    first_changed = i
+                    break
+                # 内容相同但对象不同（如重新加载），记住新对象，下次只需比较身份
+                self._sources[i] = paragraph
+
+            if first_changed == old_count == new_count:
+                return first_changed
+
+            if first_changed < old_count:
+                # 已有章节被替换/删除/插入（如缺失章节修复），从该处截断后重建
+                del self._sources[first_changed:]
+                del self._chunks[first_changed:]
+                del self._offsets[first_changed + 1:]
+                self.stats["rebuilt"] += 1
+
+            for paragraph in paragraph_list[first_changed:]:
+                chunk = f"{paragraph}{CHAPTER_SEPARATOR}"
+                self._sources.append(paragraph)
+                self._chunks.append(chunk)
+                self._offsets.append(self._offsets[-1] + len(chunk))
+                self.stats["appended"] += 1
+
+            self._joined = None
+            return first_changed
+
+    def set_text(self, text: str):
+        """直接设置整本文本（与章节不对应，直到下一次 sync）"""
+        with self._lock:
+            self._text_override = text or ""
+            self._joined = None
+
+    @property
+    def text(self) -> str:
+        """整本正文（懒拼接，修改前重复读取不会再次拷贝）"""
+        with self._lock:
+            if self._text_override is not None:
+                return self._text_override
+            if self._joined is None:
+                self._joined = "".join(self._chunks)
+                self.stats["joins"] += 1
+            return self._joined
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._text_override is not None:
+                return len(self._text_override)
+            return self._offsets[-1]
+
+    @property
+    def chapter_count(self) -> int:
+        with self._lock:
+            return len(self._chunks)
+
+    def chapter_offset(self, index: int) -> tuple:
+        """第 index 块在整本正文中的字符范围 (start, end)"""
+        with self._lock:
+            return self._offsets[index], self._offsets[index + 1]
+
+    def snapshot(self) -> list:
+        """章节文本块的快照（列表浅拷贝，供后台写入线程使用）
+
+        外部直接赋值过整本文本时返回单个块，由写入方整本重写。
+        """
+        with self._lock:
+            if self._text_override is not None:
+                return [self._text_override]
+            return list(self._chunks)
+
+
+class AppendOnlyTextFile:
+    """追加式输出文件：记录每章结束的字节偏移，新章节追加写入"""
+
+    def __init__(self, path: str, transform=None):
+        """
+        Args:
+            path: 输出文件路径
+            transform: 写入前对每章文本块的变换（如清理 Fish Audio 标记）
+        """
+        self.path = path
+        self.transform = transform
+        self._lock = threading.Lock()
+        self._header = None
+        self._written = []       # 已写入的原始文本块（按身份比较）
+        self._end_offsets = []   # 每章结束的字节偏移（含文件头）
+        self._header_size = 0
+        self._last_digest = ""   # 最后一章写入字节的摘要
+        self.stats = {"appends": 0, "rewrites": 0, "bytes_written": 0}
+
+    @property
+    def chapter_count(self) -> int:
+        """已写入的章节块数"""
+        return len(self._written)
+
+    def write(self, header: str, chunks: list) -> str:
+        """写入正文：能追加则追加，否则整本重写
+
+        Returns:
+            str: "append" / "rewrite" / "unchanged"
+        """
+        with self._lock:
+            reason = self._append_blocker(header, chunks)
+            if reason is None:
+                new_chunks = chunks[len(self._written):]
+                if not new_chunks:
+                    return "unchanged"
+                with open(self.path, "ab") as f:
+                    self._write_chunks(f, new_chunks)
+                self.stats["appends"] += 1
+                return "append"
+
+            if self._written:
+                print(f"📝 输出文件需要整本重写（{reason}）: {os.path.basename(self.path)}")
+            self._rewrite(header, chunks)
+            return "rewrite"
+
+    def reset(self):
+        """清空写入记录，下一次写入时整本重写"""
+        with self._lock:
+            self._header = None
+            self._written = []
+            self._end_offsets = []
+            self._header_size = 0
+            self._last_digest = ""
+
+    def _append_blocker(self, header: str, chunks: list):
+        """返回不能追加的原因；可以追加时返回 None"""
+        if header != self._header:
+            return "文件头已变化" if self._header is not None else "首次写入"
+        if len(chunks) < len(self._written):
+            return "章节数减少"
+        for written, chunk in zip(self._written, chunks):
+            if written is not chunk:
+                return "已有章节被修改"
+        return self.verify(full=False)
+
+    def verify(self, full: bool = False):
+        """按章节偏移校验文件
+
+        Args:
+            full: True 时逐章校验每一章的字节范围，否则只校验文件大小和最后一章
+
+        Returns:
+            str | None: 校验失败原因；通过时返回 None
+        """
+        expected_size = self._end_offsets[-1] if self._end_offsets else self._header_size
+        try:
+            actual_size = os.path.getsize(self.path)
+        except OSError:
+            return "文件不存在"
+        if actual_size != expected_size:
+            return f"文件大小不符（期望{expected_size}字节，实际{actual_size}字节）"
+        if not self._end_offsets:
+            return None
+
+        with open(self.path, "rb") as f:
+            if full:
+                start = self._header_size
+                for index, (end, chunk) in enumerate(zip(self._end_offsets, self._written)):
+                    f.seek(start)
+                    if f.read(end - start) != self._encode(chunk):
+                        return f"第{index + 1}块内容与偏移不符"
+                    start = end
+                return None
+            start = self._end_offsets[-2] if len(self._end_offsets) > 1 else self._header_size
+            f.seek(start)
+            if _digest(f.read(self._end_offsets[-1] - start)) != self._last_digest:
+                return "最后一章内容与偏移不符"
+        return None
+
+    def _encode(self, chunk: str) -> bytes:
+        if self.transform is not None:
+            chunk = self.transform(chunk)
+        return chunk.encode("utf-8")
+
+    def _write_chunks(self, f, chunks):
+        offset = self._end_offsets[-1] if self._end_offsets else self._header_size
+        for chunk in chunks:
+            data = self._encode(chunk)
+            f.write(data)
+            offset += len(data)
+            self._written.append(chunk)
+            self._end_offsets.append(offset)
+            self._last_digest = _digest(data)
+            self.stats["bytes_written"] += len(data)
+
+    def _rewrite(self, header: str, chunks: list):
+        self._written = []
+        self._end_offsets = []
+        self._last_digest = ""
+        header_bytes = (header or "").encode("utf-8")
+        self._header = header
+        self._header_size = len(header_bytes)
+        with open(self.path, "wb") as f:
+            f.write(header_bytes)
+            self.stats["bytes_written"] += len(header_bytes)
+            self._write_chunks(f, chunks)
+        self.stats["rewrites"] += 1
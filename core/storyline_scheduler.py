@@ -0,0 +1,113 @@
+"""
+故事线批次并发调度 - 批次规划、剧情阶段锚点、交界缝合（并发上限见 providers.concurrency）
+
+串行生成时每批只能等上一批完成后才能开始（依赖上一批最后5章作为前置故事线），
+500章的长篇需要50-100次串行长输出调用。并发模式下：
+- 第一批之外的每批以详细大纲 + 动态剧情结构（dynamic_plot_structure）中本批所处阶段作为锚点，
+  不等待前一批（提示词与线程调度无关，每次运行相同）
+- 全部完成后按批次顺序合并，再对每个交界做一次廉价的串行缝合，修正 transition_to_next
+"""
+
+import re
+
+
+# 缝合时每侧参考的章节数
+STITCH_CONTEXT_CHAPTERS = 2
+
+
+def plan_storyline_batches(target_chapters: int, chapters_per_batch: int) -> list:
+    """把目标章节数切分为批次
+
+    Returns:
+        list: [(start_chapter, end_chapter), ...]
+    """
+    chapters_per_batch = max(1, int(chapters_per_batch or 1))
+    return [
+        (start, min(start + chapters_per_batch - 1, target_chapters))
+        for start in range(1, target_chapters + 1, chapters_per_batch)
+    ]
+
+
+def _parse_stage_range(stage: dict):
+    """解析阶段的章节范围（"第a-b章"）"""
+    match = re.search(r'第(\d+)-(\d+)章', stage.get("range", ""))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def build_batch_plot_anchor(plot_structure: dict, start_chapter: int, end_chapter: int) -> str:
+    """生成本批次在动态剧情结构中的阶段锚点文本
+
+    Args:
+        plot_structure: generate_plot_structure() 的返回值
+        start_chapter: 批次起始章节
+        end_chapter: 批次结束章节
+
+    Returns:
+        str: 锚点描述，无法匹配阶段时返回空字符串
+    """
+    if not plot_structure or not plot_structure.get("stages"):
+        return ""
+
+    lines = []
+    previous_stage = None
+    for stage in plot_structure["stages"]:
+        stage_range = _parse_stage_range(stage)
+        if not stage_range:
+            continue
+        stage_start, stage_end = stage_range
+        if stage_end < start_chapter:
+            previous_stage = stage
+            continue
+        if stage_start > end_chapter:
+            break
+        overlap_start = max(stage_start, start_chapter)
+        overlap_end = min(stage_end, end_chapter)
+        position = ""
+        if overlap_start == stage_start:
+            position = "（阶段开端）"
+        elif overlap_end == stage_end:
+            position = "（阶段收尾）"
+        lines.append(f"- 第{overlap_start}-{overlap_end}章属于「{stage['name']}」{stage['range']}{position}：{stage['purpose']}")
+
+    if not lines:
+        return ""
+    if previous_stage and start_chapter > 1:
+        lines.insert(0, f"- 上一阶段「{previous_stage['name']}」{previous_stage['range']}：{previous_stage['purpose']}")
+    return "\n".join(lines)
+
+
+def format_stitch_chapters(chapters: list, include_continuation: bool) -> str:
+    """格式化缝合提示词中的章节信息"""
+    lines = []
+    for chapter in chapters:
+        lines.append(f"## 第{chapter.get('chapter_number', '?')}章：{chapter.get('title', '')}")
+        if include_continuation and chapter.get("continuation_from_prev"):
+            lines.append(f"**承接上章：** {chapter['continuation_from_prev']}")
+        if chapter.get("time_anchor"):
+            lines.append(f"**时间节点：** {chapter['time_anchor']}")
+        lines.append(f"**剧情梗概：** {chapter.get('plot_summary', '')}")
+        if not include_continuation and chapter.get("transition_to_next"):
+            lines.append(f"**衔接下章：** {chapter['transition_to_next']}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def parse_stitch_response(text: str) -> dict:
+    """解析缝合结果
+
+    Returns:
+        dict: 可能包含 transition_to_next / continuation_from_prev
+    """
+    result = {}
+    if not text:
+        return result
+    fields = {"transition_to_next": "衔接下章", "continuation_from_prev": "承接上章"}
+    for key, label in fields.items():
+        match = re.search(rf'\**{label}[：:]\**\s*(.+?)(?=\n\s*\**(?:衔接下章|承接上章)[：:]|\Z)', text, re.DOTALL)
+        if match:
+            value = match.group(1).strip().strip("*").strip()
+            if value:
+                result[key] = value
+    return result
@@ -0,0 +1,315 @@
+"""
+生成过程追踪 - 以 span 记录一章的时间都花在了哪里
+
+span 覆盖：智能体调用（agent.query，含重试）、单次 LLM 请求（llm.request）、RAG 检索、
+章节后处理任务与汇合等待、存档写入，外层由 autoGenerate 的 chapter span 包住。
+- llm.request 记录首 token 延迟（TTFT）、数据块间隔、思考/正文的字符数与 tokens/s
+- 每个 span 结束时写入内存统计；开启 trace_export 时同时追加到滚动的 JSONL 文件
+- chapter span 把直接子 span 的耗时按阶段累加，剩余时间按各阶段每章耗时的分布估算，
+  不再用（含准备阶段的）总耗时除以章节数
+
+span 的父子关系按线程维护（线程本地栈），线程池中的后处理任务是独立的顶层 span。
+"""
+
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+
+DEFAULT_TRACE_PATH = os.path.join("output", "traces", "spans.jsonl")
+TRACE_MAX_BYTES = 20 * 1024 * 1024   # 单个 JSONL 文件上限，超过后滚动
+TRACE_BACKUP_COUNT = 5               # 保留的历史文件数
+RECENT_SPANS = 500                   # 每种 span 保留的最近耗时数
+RECENT_REQUESTS = 200                # 保留的最近 LLM 请求指标数
+RECENT_CHAPTERS = 30                 # 估算剩余时间使用的最近章节数
+
+CHAPTER_SPAN = "chapter"
+LLM_REQUEST_SPAN = "llm.request"
+AGENT_QUERY_SPAN = "agent.query"
+
+
+def percentile(values, fraction: float) -> float:
+    """线性插值分位数，空序列返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class Span:
+    """一段被追踪的操作"""
+
+    __slots__ = ("name", "span_id", "parent", "thread", "start", "wall_start", "end", "attrs", "stages", "children")
+
+    def __init__(self, name: str, span_id: int, parent, attrs: dict):
+        self.name = name
+        self.span_id = span_id
+        self.parent = parent
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.end = None
+        self.attrs = attrs
+        self.stages = {}      # 直接子 span 按阶段累加的耗时（秒）
+        self.children = 0
+
+    def set(self, **attrs):
+        """补充属性（结束前调用才会写入导出记录）"""
+        self.attrs.update(attrs)
+
+    @property
+    def stage(self) -> str:
+        """在父 span 中归入的阶段名"""
+        return self.attrs.get("stage") or self.attrs.get("agent") or self.name
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_record(self, trace_id: str) -> dict:
+        record = {
+            "trace": trace_id,
+            "span": self.span_id,
+            "parent": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "ts": round(self.wall_start, 3),
+            "duration_ms": round(self.duration * 1000, 1),
+            "thread": self.thread,
+        }
+        if self.stages:
+            record["stages_ms"] = {k: round(v * 1000, 1) for k, v in self.stages.items()}
+        record.update(self.attrs)
+        return record
+
+
+class _SpanContext:
+    def __init__(self, tracer, name, attrs):
+        self._tracer = tracer
+        self._name = name
+        self._attrs = attrs
+        self.span = None
+
+    def __enter__(self) -> Span:
+        self.span = self._tracer.start_span(self._name, **self._attrs)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.span.set(error=f"{exc_type.__name__}: {exc}"[:200])
+        self._tracer.end_span(self.span)
+        return False
+
+
+class Tracer:
+    """span 追踪器（线程安全）"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._writer = None
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.reset()
+
+    def reset(self):
+        """清空内存统计并开始新的 trace（autoGenerate 开始时调用）"""
+        with self._lock:
+            self.trace_id = uuid.uuid4().hex[:12]
+            self._durations = {}
+            self._errors = {}
+            self._requests = deque(maxlen=RECENT_REQUESTS)
+            self._chapters = deque(maxlen=RECENT_CHAPTERS)
+            self._retries = 0
+
+    def set_export(self, path: str = None):
+        """设置 JSONL 导出文件，path 为 None 时关闭导出"""
+        self._writer = get_span_writer(path) if path else None
+
+    @property
+    def exporting(self) -> bool:
+        return self._writer is not None
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_span(self):
+        """当前线程最内层的未结束 span"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def span(self, name: str, **attrs) -> _SpanContext:
+        """以 with 语句追踪一段操作，异常会记录到 error 属性并继续抛出"""
+        return _SpanContext(self, name, attrs)
+
+    def start_span(self, name: str, **attrs) -> Span:
+        """开始 span（需与 end_span 成对调用，跨越较长代码块时使用）"""
+        stack = self._stack()
+        span = Span(name, next(self._ids), stack[-1] if stack else None, attrs)
+        stack.append(span)
+        return span
+
+    def end_span(self, span: Span):
+        """结束 span：出栈、计入父 span 的阶段耗时和内存统计，按需导出"""
+        if span is None or span.end is not None:
+            return
+        span.end = time.perf_counter()
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+        duration = span.duration
+        parent = span.parent
+        if parent is not None and parent.end is None:
+            parent.children += 1
+            parent.stages[span.stage] = parent.stages.get(span.stage, 0.0) + duration
+
+        with self._lock:
+            self._durations.setdefault(span.name, deque(maxlen=RECENT_SPANS)).append(duration)
+            if "error" in span.attrs:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            if span.name == LLM_REQUEST_SPAN:
+                self._requests.append(dict(span.attrs))
+            elif span.name == AGENT_QUERY_SPAN:
+                self._retries += span.attrs.get("retries", 0)
+            elif span.name == CHAPTER_SPAN and "error" not in span.attrs:
+                stages = dict(span.stages)
+                stages["其他"] = max(0.0, duration - sum(stages.values()))
+                self._chapters.append({"duration": duration, "stages": stages})
+
+        writer = self._writer
+        if writer is not None:
+            try:
+                writer.info(json.dumps(span.to_record(self.trace_id), ensure_ascii=False, default=str))
+            except Exception as e:
+                print(f"⚠️ 写入追踪记录失败: {e}")
+
+    # ========== 统计与估算 ==========
+
+    def stage_distribution(self) -> dict:
+        """最近章节中各阶段每章耗时的 p50 / p90（秒），按 p50 降序"""
+        with self._lock:
+            chapters = list(self._chapters)
+        names = {name for chapter in chapters for name in chapter["stages"]}
+        distribution = {}
+        for name in names:
+            values = [chapter["stages"].get(name, 0.0) for chapter in chapters]
+            distribution[name] = {"p50": percentile(values, 0.5), "p90": percentile(values, 0.9)}
+        return dict(sorted(distribution.items(), key=lambda item: -item[1]["p50"]))
+
+    def estimate_remaining(self, remaining_chapters: int):
+        """按各阶段每章耗时分布估算剩余时间
+
+        逐阶段取中位数再求和，个别章节某一阶段的重试或卡顿不会拉高整体估计；
+        保守值取各阶段的 p90 之和。
+
+        Returns:
+            tuple: (预计秒数, 保守秒数)，还没有完成的章节时返回 None
+        """
+        distribution = self.stage_distribution()
+        if not distribution or remaining_chapters <= 0:
+            return None
+        expected = sum(stage["p50"] for stage in distribution.values())
+        pessimistic = sum(stage["p90"] for stage in distribution.values())
+        return expected * remaining_chapters, pessimistic * remaining_chapters
+
+    def request_summary(self) -> dict:
+        """最近 LLM 请求的 TTFT、间隔和吞吐量汇总"""
+        with self._lock:
+            requests = [r for r in self._requests if not r.get("cache_hit")]
+            retries = self._retries
+            errors = sum(self._errors.values())
+
+        def values(key):
+            return [r[key] for r in requests if r.get(key)]
+
+        return {
+            "requests": len(requests),
+            "retries": retries,
+            "errors": errors,
+            "ttft_p50": percentile(values("ttft_ms"), 0.5),
+            "ttft_p95": percentile(values("ttft_ms"), 0.95),
+            "gap_p95": percentile(values("gap_p95_ms"), 0.95),
+            "gap_max": max(values("gap_max_ms"), default=0.0),
+            "content_tps": percentile(values("content_tps"), 0.5),
+            "reasoning_tps": percentile(values("reasoning_tps"), 0.5),
+        }
+
+    def span_summary(self) -> dict:
+        """各类 span 的次数与耗时分位数（秒）"""
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations.items()}
+            errors = dict(self._errors)
+        return {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+                "errors": errors.get(name, 0),
+            }
+            for name, values in durations.items()
+        }
+
+
+class _SpanFormatter(logging.Formatter):
+    def format(self, record):
+        return record.getMessage()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_span_writer(path: str = DEFAULT_TRACE_PATH) -> logging.Logger:
+    """获取写入指定 JSONL 文件的滚动日志器（按文件路径复用）"""
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            directory = os.path.dirname(key)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                key, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT, encoding="utf-8", delay=True
+            )
+            handler.setFormatter(_SpanFormatter())
+            writer = logging.getLogger(f"aign.trace.{len(_writers)}")
+            writer.setLevel(logging.INFO)
+            writer.propagate = False
+            writer.addHandler(handler)
+            _writers[key] = writer
+        return writer
+
+
+def reset_span_writers():
+    """关闭所有 JSONL 导出文件"""
+    with _writers_lock:
+        for writer in _writers.values():
+            for handler in list(writer.handlers):
+                handler.close()
+                writer.removeHandler(handler)
+        _writers.clear()
+
+
+_default_tracer = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """获取进程级追踪器（未关联 AIGN 实例的智能体使用）"""
+    global _default_tracer
+    if _default_tracer is None:
+        with _default_tracer_lock:
+            if _default_tracer is None:
+                _default_tracer = Tracer()
+    return _default_tracer
@@ -27,6 +27,8 @@ from prompts.common.memory_prompt import memory_maker_prompt
 from prompts.common.detailed_outline_prompt import detailed_outline_generator_prompt
 from prompts.common.foreshadowing_prompt import foreshadowing_generator_prompt
 from prompts.common.global_context_prompt import global_context_updater_prompt
+from prompts.common.chapter_digest_prompt import chapter_digest_prompt
+from prompts.common.story_memory_prompt import story_memory_compressor_prompt
 
 # ================================
 # 标准模式提示词
@@ -91,6 +93,8 @@ __all__ = [
     'detailed_outline_generator_prompt',
     'foreshadowing_generator_prompt',
     'global_context_updater_prompt',
+    'chapter_digest_prompt',
+    'story_memory_compressor_prompt',
     
     # 标准模式（原有独立提示词）
     'novel_beginning_writer_prompt',
@@ -0,0 +1,321 @@
+"""
+提供商客户端注册表 - 复用HTTP连接池与ChatLLM闭包
+
+此前每次 get_chatllm_instance() / get_chatllm() 都会新建一个 OpenAI 客户端，
+而 refresh_chatllm、自动生成每5章的刷新、故事线批次、TTS标记都会触发它，
+导致 keep-alive 连接和 TLS 会话被反复丢弃。
+
+注册表按 (提供商, base_url, api_key, 模型, 思考参数) 为每个配置键维护：
+- 一个带连接池的 httpx.Client（同一配置键下所有Agent共享）
+- 一组已构建的 chatLLM 闭包（系统提示词等不同则分别缓存，但共享同一个连接池）
+
+只有当 update_provider_config_full 真正改变了配置键、或重新加载配置文件后某个条目不再对应任何
+提供商配置时，才会使旧条目失效。被淘汰的 httpx 客户端不会立即关闭（Agent 可能仍持有旧的闭包、
+仍有流式请求在使用），而是在该条目构建的所有闭包都被回收后关闭；进程退出时统一关闭剩余客户端。
+"""
+
+import atexit
+import hashlib
+import json
+import threading
+import time
+import weakref
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+# 使用 httpx 连接池的提供商（OpenAI兼容接口 + Anthropic SDK）
+POOLED_PROVIDERS = {
+    "deepseek", "lmstudio", "openrouter", "claude", "grok", "fireworks",
+    "lambda", "lambda2", "lambda3", "siliconflow", "nvidia", "omlx", "zenmux",
+}
+
+# 连接池参数：小说生成通常只有少量并发请求，但单个流式请求可能持续数分钟
+POOL_MAX_CONNECTIONS = 20
+POOL_MAX_KEEPALIVE = 10
+POOL_KEEPALIVE_EXPIRY = 120.0
+DEFAULT_TIMEOUT = 1800.0  # 30分钟超时，与各提供商保持一致
+MAX_CLOSURES_PER_ENTRY = 8  # 每个配置键最多缓存的闭包数（系统提示词频繁修改时淘汰最旧的）
+
+
+def make_client_key(provider: str, base_url=None, api_key=None, model_name=None,
+                    thinking_enabled=None, reasoning_effort=None, zenmux_provider=None) -> tuple:
+    """构建客户端注册表的配置键
+
+    api_key 只保存摘要，避免明文密钥出现在统计和日志中。
+    """
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return (
+        provider or "",
+        base_url or "",
+        key_digest,
+        model_name or "",
+        thinking_enabled,
+        reasoning_effort or "",
+        zenmux_provider or "",
+    )
+
+
+def make_client_key_from_config(provider: str, config) -> tuple:
+    """从 ProviderConfig（或同结构的字典）构建配置键"""
+    if isinstance(config, dict):
+        get = config.get
+    else:
+        def get(name, default=None):
+            return getattr(config, name, default)
+    return make_client_key(
+        provider,
+        base_url=get("base_url"),
+        api_key=get("api_key"),
+        model_name=get("model_name"),
+        thinking_enabled=get("thinking_enabled"),
+        reasoning_effort=get("reasoning_effort"),
+        zenmux_provider=get("zenmux_provider"),
+    )
+
+
+def make_closure_signature(**kwargs) -> str:
+    """构建闭包签名：配置键之外、但会被固化进 chatLLM 闭包的参数（系统提示词、路由等）"""
+    return json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class _ClientEntry:
+    """单个配置键的缓存条目"""
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.http_client = None
+        self.closures = {}
+        self.created_at = time.time()
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        # 见过的底层网络流（弱引用：连接关闭、流对象回收后自动移除，不会因 id() 复用误判为复用连接）
+        self._seen_streams = weakref.WeakSet()
+        # 本条目构建过的所有闭包（包括已从 closures 中淘汰但仍被 Agent 持有的）
+        self._chatllms = weakref.WeakSet()
+
+
+class ProviderClientRegistry:
+    """提供商客户端注册表（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._retired_clients = []
+        self.stats = {
+            "http_clients_created": 0,
+            "http_client_reuses": 0,
+            "chatllm_built": 0,
+            "chatllm_reuses": 0,
+            "invalidations": 0,
+            "requests": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "http_clients_closed": 0,
+        }
+
+    def get_chatllm(self, provider: str, key: tuple, signature: str, builder):
+        """获取（或构建）chatLLM闭包
+
+        Args:
+            provider: 提供商名称
+            key: make_client_key() 生成的配置键
+            signature: make_closure_signature() 生成的闭包签名
+            builder: 构建函数 builder(http_client) -> chatLLM
+
+        Returns:
+            Callable: chatLLM函数
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _ClientEntry(key)
+                self._entries[key] = entry
+
+            chatllm = entry.closures.get(signature)
+            if chatllm is not None:
+                self.stats["chatllm_reuses"] += 1
+                return chatllm
+
+            http_client = None
+            if provider in POOLED_PROVIDERS:
+                http_client = self._get_http_client(entry)
+
+            chatllm = builder(http_client)
+            if http_client is not None:
+                try:
+                    entry._chatllms.add(chatllm)
+                except TypeError:
+                    entry._untracked = True  # 无法弱引用的闭包：客户端只在进程退出时关闭
+            if len(entry.closures) >= MAX_CLOSURES_PER_ENTRY:
+                entry.closures.pop(next(iter(entry.closures)))
+            entry.closures[signature] = chatllm
+            self.stats["chatllm_built"] += 1
+            return chatllm
+
+    def _get_http_client(self, entry: _ClientEntry):
+        """获取条目的共享 httpx 客户端，不存在时创建（调用方需持有锁）"""
+        if entry.http_client is not None:
+            self.stats["http_client_reuses"] += 1
+            return entry.http_client
+        if httpx is None:
+            return None
+
+        entry.http_client = httpx.Client(
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+            follow_redirects=True,
+            event_hooks={"response": [self._make_response_hook(entry)]},
+        )
+        self.stats["http_clients_created"] += 1
+        return entry.http_client
+
+    def _make_response_hook(self, entry: _ClientEntry):
+        """统计连接复用：同一个底层网络流再次出现即视为复用了 keep-alive 连接"""
+        def on_response(response):
+            stream = response.extensions.get("network_stream")
+            with self._lock:
+                entry.requests += 1
+                self.stats["requests"] += 1
+                if stream is None:
+                    return
+                try:
+                    reused = stream in entry._seen_streams
+                    if not reused:
+                        entry._seen_streams.add(stream)
+                except TypeError:
+                    reused = False  # 不支持弱引用的网络流：无法判断复用，按新连接计
+                if reused:
+                    entry.reused_connections += 1
+                    self.stats["reused_connections"] += 1
+                else:
+                    entry.new_connections += 1
+                    self.stats["new_connections"] += 1
+        return on_response
+
+    def invalidate(self, key: tuple) -> bool:
+        """使某个配置键的缓存失效
+
+        Returns:
+            bool: 是否确实移除了条目
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            if entry.http_client is not None:
+                self._retire_client(entry)
+            self.stats["invalidations"] += 1
+            return True
+
+    def retain(self, live_keys) -> int:
+        """淘汰不在 live_keys 中的条目（重新加载配置文件后调用），返回淘汰的条目数"""
+        live_keys = set(live_keys)
+        with self._lock:
+            stale = [key for key in self._entries if key not in live_keys]
+            return sum(1 for key in stale if self.invalidate(key))
+
+    def _retire_client(self, entry: _ClientEntry):
+        """淘汰条目的 httpx 客户端：该条目构建的闭包全部被回收后关闭（调用方需持有锁）"""
+        client = entry.http_client
+        chatllms = list(entry._chatllms)
+        entry.closures.clear()
+        if getattr(entry, '_untracked', False):
+            self._retired_clients.append(client)
+            return
+        if not chatllms:
+            self._close_client(client)
+            return
+        remaining = [len(chatllms)]
+
+        def release():
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    self._close_client(client)
+        for chatllm in chatllms:
+            weakref.finalize(chatllm, release)
+
+    def _close_client(self, client):
+        try:
+            client.close()
+        except Exception:
+            pass
+        self.stats["http_clients_closed"] += 1
+
+    def get_stats(self) -> dict:
+        """获取注册表统计（总计 + 每个配置键）"""
+        with self._lock:
+            stats = dict(self.stats)
+            connections = stats["new_connections"] + stats["reused_connections"]
+            stats["connection_reuse_rate"] = (
+                stats["reused_connections"] / connections if connections else 0.0
+            )
+            stats["active_entries"] = len(self._entries)
+            stats["entries"] = [
+                {
+                    "provider": entry.key[0],
+                    "base_url": entry.key[1],
+                    "model": entry.key[3],
+                    "closures": len(entry.closures),
+                    "requests": entry.requests,
+                    "new_connections": entry.new_connections,
+                    "reused_connections": entry.reused_connections,
+                }
+                for entry in self._entries.values()
+            ]
+            return stats
+
+    def get_stats_display(self) -> str:
+        """生成连接复用统计显示文本，没有请求时返回空字符串"""
+        stats = self.get_stats()
+        if stats["requests"] == 0 and stats["chatllm_reuses"] == 0:
+            return ""
+        lines = []
+        lines.append("")
+        lines.append("🔌 提供商连接复用统计:")
+        lines.append(f"  • HTTP请求: {stats['requests']} 次")
+        lines.append(f"  • 新建连接: {stats['new_connections']} / 复用连接: {stats['reused_connections']} "
+                     f"({stats['connection_reuse_rate'] * 100:.1f}%)")
+        lines.append(f"  • 连接池: 创建 {stats['http_clients_created']} 个 / 复用 {stats['http_client_reuses']} 次")
+        lines.append(f"  • ChatLLM闭包: 构建 {stats['chatllm_built']} 个 / 复用 {stats['chatllm_reuses']} 次")
+        if stats["invalidations"]:
+            lines.append(f"  • 配置变更失效: {stats['invalidations']} 次（已关闭旧连接池 {stats['http_clients_closed']} 个）")
+        return "\n".join(lines)
+
+    def close_all(self):
+        """关闭所有 httpx 客户端（进程退出时调用）"""
+        with self._lock:
+            clients = [entry.http_client for entry in self._entries.values() if entry.http_client is not None]
+            clients.extend(self._retired_clients)
+            self._entries.clear()
+            self._retired_clients = []
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+# 全局注册表实例
+_client_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ProviderClientRegistry:
+    """获取全局提供商客户端注册表（单例模式）"""
+    global _client_registry
+    if _client_registry is None:
+        with _registry_lock:
+            if _client_registry is None:  # 双重检查
+                _client_registry = ProviderClientRegistry()
+                atexit.register(_client_registry.close_all)
+    return _client_registry
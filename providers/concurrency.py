@@ -0,0 +1,53 @@
+"""
+提供商并发上限 - 同一提供商同时在途的请求数
+
+故事线批次并发、分块并行润色、分段流水线（润色与写作重叠）和卡顿对冲都会向当前提供商
+同时发出多个请求。本地推理服务（LM Studio、oMLX）单卡排队，并发没有收益，反而拖慢前台请求；
+云端提供商按各自的限流给出保守的默认上限，可用 AIGN.provider_concurrency 按提供商覆盖。
+"""
+
+
+# 每个提供商允许的最大并发请求数
+PROVIDER_CONCURRENCY = {
+    "lmstudio": 1,
+    "omlx": 1,
+    "deepseek": 4,
+    "openrouter": 4,
+    "siliconflow": 3,
+    "fireworks": 4,
+    "grok": 3,
+    "claude": 3,
+    "gemini": 3,
+    "nvidia": 2,
+    "zenmux": 3,
+    "lambda": 2,
+    "lambda2": 2,
+    "lambda3": 2,
+    "ali": 3,
+    "fake": 4,
+}
+DEFAULT_PROVIDER_CONCURRENCY = 2
+
+
+def get_provider_concurrency_limit(provider: str, requested: int, overrides: dict = None) -> int:
+    """计算向某个提供商同时发出请求的实际并发度
+
+    Args:
+        provider: 提供商名称
+        requested: 调用方希望的并发度（<=1 表示串行）
+        overrides: 按提供商覆盖默认上限的字典（AIGN.provider_concurrency）
+
+    Returns:
+        int: 实际并发度（至少为1）
+    """
+    try:
+        requested = int(requested or 1)
+    except (ValueError, TypeError):
+        requested = 1
+    if requested <= 1:
+        return 1
+    limits = dict(PROVIDER_CONCURRENCY)
+    if overrides:
+        limits.update(overrides)
+    provider_limit = limits.get((provider or "").lower(), DEFAULT_PROVIDER_CONCURRENCY)
+    return max(1, min(requested, int(provider_limit)))
@@ -0,0 +1,239 @@
+"""
+流式输出协议 - 提供商生成器与调用方之间的增量（delta）约定
+
+旧协议中，每个 respGenerator() 每次都 yield 截至当前累积的完整 content /
+reasoning_content，调用方再用 ``chunk['content'][len(accumulated):]`` 切出新增部分。
+对一个 2 万字的章节，这意味着每个数据块都要复制、切片整段文本，总开销为 O(n²)。
+
+新协议：
+- 增量事件：``{"type": "delta", "delta": "新增正文", "reasoning_delta": "新增思考内容"}``
+- 汇总事件（流结束时恰好一个）：``{"type": "final", "total_tokens": ..., <其他usage字段>}``
+  如果提供商在流结束后对正文做了二次处理（如解析 <think> 标签、Harmony 格式），
+  可在汇总事件中附带 ``content`` / ``reasoning_content`` 作为最终权威文本。
+- 重置事件：``{"type": "reset"}``，之前的增量作废，之后的事件从头开始
+  （对冲请求胜出时由 core.agents.stream_hedging 发出，提供商不会产生）
+
+调用方统一使用 StreamAccumulator 拼接文本：增量写入列表，仅在需要完整文本时 join 一次。
+StreamAccumulator 同时兼容旧的"累积全文"格式，便于第三方/占位 chatLLM 继续工作。
+"""
+
+STREAM_DELTA = "delta"
+STREAM_FINAL = "final"
+STREAM_RESET = "reset"
+
+
+def delta_event(content: str = "", reasoning_content: str = "") -> dict:
+    """构建增量事件
+
+    Args:
+        content: 本次新增的正文
+        reasoning_content: 本次新增的思考内容
+
+    Returns:
+        dict: 增量事件
+    """
+    return {"type": STREAM_DELTA, "delta": content or "", "reasoning_delta": reasoning_content or ""}
+
+
+def final_event(total_tokens=None, **extra) -> dict:
+    """构建流结束时的汇总事件
+
+    Args:
+        total_tokens: API返回的总Token数（没有则为None）
+        **extra: 其他usage字段（prompt_tokens、completion_tokens、缓存命中等），
+                 或提供商二次处理后的 content / reasoning_content
+
+    Returns:
+        dict: 汇总事件
+    """
+    event = {"type": STREAM_FINAL, "total_tokens": total_tokens}
+    event.update(extra)
+    return event
+
+
+def reset_event() -> dict:
+    """构建重置事件：调用方丢弃已累积的文本，之后的增量属于另一个响应"""
+    return {"type": STREAM_RESET}
+
+
+def estimate_word_tokens(char_parts: list) -> int:
+    """对没有返回usage的提供商，按单词数粗略估算Token（仅在流结束时调用一次）"""
+    return int(len("".join(char_parts).split()) * 1.3)
+
+
+class ThinkTagSplitter:
+    """增量拆分 <think>...</think> 标签
+
+    本地模型（LM Studio / oMLX）常把思维链混在正文里。旧实现每个数据块都对累积全文
+    跑一次正则，这里只处理新增文本，并缓存可能被截断在数据块边界上的半个标签。
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self._buffer = ""
+        self.in_think = False
+        self._content_started = False
+        self.reasoning_length = 0
+
+    def feed(self, text: str) -> tuple:
+        """输入新增文本，返回 (正文增量, 思考增量)"""
+        buf = self._buffer + (text or "")
+        content_out = []
+        reasoning_out = []
+        while buf:
+            tag = self.CLOSE_TAG if self.in_think else self.OPEN_TAG
+            idx = buf.find(tag)
+            if idx >= 0:
+                (reasoning_out if self.in_think else content_out).append(buf[:idx])
+                if self.in_think:
+                    reasoning_out.append("\n")
+                buf = buf[idx + len(tag):]
+                self.in_think = not self.in_think
+                continue
+            # 保留可能是标签前缀的尾部，等下一个数据块再判断
+            keep = 0
+            for size in range(min(len(tag) - 1, len(buf)), 0, -1):
+                if tag.startswith(buf[-size:]):
+                    keep = size
+                    break
+            emit = buf[:len(buf) - keep]
+            (reasoning_out if self.in_think else content_out).append(emit)
+            buf = buf[len(buf) - keep:]
+            break
+        self._buffer = buf
+        return self._finish(content_out, reasoning_out)
+
+    def flush(self) -> tuple:
+        """流结束时输出缓存中剩余的文本"""
+        buf, self._buffer = self._buffer, ""
+        if self.in_think:
+            return self._finish([], [buf])
+        return self._finish([buf], [])
+
+    def _finish(self, content_out: list, reasoning_out: list) -> tuple:
+        content = "".join(content_out)
+        if not self._content_started:
+            # 与旧实现的 strip() 保持一致：去掉正文开头的空白
+            content = content.lstrip()
+            if content:
+                self._content_started = True
+        reasoning = "".join(reasoning_out)
+        self.reasoning_length += len(reasoning)
+        return content, reasoning
+
+
+class StreamAccumulator:
+    """流式响应累积器
+
+    用法::
+
+        acc = StreamAccumulator()
+        for chunk in resp:
+            content_delta, reasoning_delta = acc.feed(chunk)
+            ...
+        result = acc.result()   # {"content", "reasoning_content", "total_tokens", ...}
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """丢弃已累积的全部内容（重置事件）"""
+        self._content_parts = []
+        self._reasoning_parts = []
+        self._content_cache = None
+        self._reasoning_cache = None
+        self.content_length = 0
+        self.reasoning_length = 0
+        self.chunk_count = 0
+        self.final = None  # 汇总事件（或旧协议的最后一个chunk）
+
+    def feed(self, chunk) -> tuple:
+        """接收一个数据块，返回 (新增正文, 新增思考内容)"""
+        if not chunk:
+            return "", ""
+        self.chunk_count += 1
+
+        chunk_type = chunk.get("type") if isinstance(chunk, dict) else None
+        if chunk_type == STREAM_DELTA:
+            return self._append(chunk.get("delta", ""), chunk.get("reasoning_delta", ""))
+        if chunk_type == STREAM_FINAL:
+            self.final = chunk
+            return "", ""
+        if chunk_type == STREAM_RESET:
+            self.reset()
+            return "", ""
+
+        # 旧协议：chunk 中是截至当前的完整累积文本
+        self.final = chunk
+        content = chunk.get("content") or ""
+        reasoning = chunk.get("reasoning_content") or ""
+        new_content = content[self.content_length:] if len(content) > self.content_length else ""
+        new_reasoning = reasoning[self.reasoning_length:] if len(reasoning) > self.reasoning_length else ""
+        return self._append(new_content, new_reasoning)
+
+    def _append(self, content_delta: str, reasoning_delta: str) -> tuple:
+        if content_delta:
+            self._content_parts.append(content_delta)
+            self.content_length += len(content_delta)
+            self._content_cache = None
+        if reasoning_delta:
+            self._reasoning_parts.append(reasoning_delta)
+            self.reasoning_length += len(reasoning_delta)
+            self._reasoning_cache = None
+        return content_delta or "", reasoning_delta or ""
+
+    @property
+    def content(self) -> str:
+        """完整正文（按需 join，结果缓存到下一次追加为止）"""
+        if self._content_cache is None:
+            self._content_cache = "".join(self._content_parts)
+            self._content_parts = [self._content_cache] if self._content_cache else []
+        return self._content_cache
+
+    @property
+    def reasoning_content(self) -> str:
+        """完整思考内容"""
+        if self._reasoning_cache is None:
+            self._reasoning_cache = "".join(self._reasoning_parts)
+            self._reasoning_parts = [self._reasoning_cache] if self._reasoning_cache else []
+        return self._reasoning_cache
+
+    def tail(self, length: int) -> str:
+        """返回正文末尾 length 个字符，不拼接整段文本"""
+        if length <= 0:
+            return ""
+        pieces = []
+        collected = 0
+        for part in reversed(self._content_parts):
+            pieces.append(part)
+            collected += len(part)
+            if collected >= length:
+                break
+        return "".join(reversed(pieces))[-length:]
+
+    def result(self) -> dict:
+        """构建与旧协议最终 chunk 相同结构的结果字典"""
+        final = dict(self.final) if self.final else {}
+        final.pop("type", None)
+        final.pop("delta", None)
+        final.pop("reasoning_delta", None)
+        if not final.get("content"):
+            final["content"] = self.content
+        if not final.get("reasoning_content"):
+            final["reasoning_content"] = self.reasoning_content
+        if final.get("total_tokens") is None:
+            final["total_tokens"] = 0
+        return final
+
+
+def collect_stream(resp) -> dict:
+    """将流式/非流式响应统一收集为结果字典（供不需要实时显示的调用方使用）"""
+    if isinstance(resp, dict):
+        return resp
+    accumulator = StreamAccumulator()
+    for chunk in resp:
+        accumulator.feed(chunk)
+    return accumulator.result()
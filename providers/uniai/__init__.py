@@ -20,3 +20,4 @@ from .siliconflowAI import siliconflowChatLLM
 from .nvidiaAI import nvidiaChatLLM
 from .omlxAI import omlxChatLLM
 from .zenmuxAI import zenmuxChatLLM
+from .fakeAI import fakeChatLLM
@@ -4,6 +4,8 @@ from http import HTTPStatus
 
 import dashscope
 
+from providers.stream_protocol import delta_event, final_event
+
 
 def aliChatLLM(model_name, api_key=None, system_prompt=""):
     """
@@ -72,21 +74,19 @@ def aliChatLLM(model_name, api_key=None, system_prompt=""):
                 top_p=top_p,
                 result_format="message",
                 stream=True,
-                output_in_full=True,  # get streaming output incrementally
+                incremental_output=True,  # 只返回增量文本，避免重复传输全文
                 timeout=1800,  # 30分钟超时
             )
 
             def respGenerator():
-                last_content = ""
+                total_tokens = None
                 for response in responses:
                     if response.status_code == HTTPStatus.OK:
-                        current_content = response.output.choices[0]["message"]["content"]
-                        last_content = current_content
-                        yield {
-                            "content": current_content,
-                            "total_tokens": response.usage.input_tokens
-                            + response.usage.output_tokens,
-                        }
+                        # incremental_output=True 时每个响应只携带本次新增的文本
+                        new_content = response.output.choices[0]["message"]["content"]
+                        total_tokens = response.usage.input_tokens + response.usage.output_tokens
+                        if new_content:
+                            yield delta_event(new_content)
                     else:
                         error_info = (
                             "Request id: %s, Status code: %s, error code: %s, error message: %s"
@@ -99,6 +99,8 @@ def aliChatLLM(model_name, api_key=None, system_prompt=""):
                         )
                         raise ValueError(f"Error in response: {error_info}")
 
+                yield final_event(total_tokens)
+
             return respGenerator()
         
     return chatLLM
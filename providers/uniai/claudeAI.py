@@ -2,7 +2,9 @@ import os
 import anthropic
 from typing import List, Dict, Generator, Union
 
-def claudeChatLLM(model_name="claude-3-sonnet-20240229", api_key=None, system_prompt=""):
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
+
+def claudeChatLLM(model_name="claude-3-sonnet-20240229", api_key=None, system_prompt="", http_client=None):
     """
     Anthropic Claude AI Chat LLM
     
@@ -15,7 +17,7 @@ def claudeChatLLM(model_name="claude-3-sonnet-20240229", api_key=None, system_pr
     api_key = os.environ.get("ANTHROPIC_API_KEY", api_key)
     
     # 初始化Anthropic客户端
-    client = anthropic.Anthropic(api_key=api_key, timeout=1800.0)  # 30分钟超时
+    client = anthropic.Anthropic(api_key=api_key, timeout=1800.0, http_client=http_client)  # 30分钟超时
 
     def chatLLM(
         messages: List[Dict[str, str]],
@@ -73,19 +75,16 @@ def claudeChatLLM(model_name="claude-3-sonnet-20240229", api_key=None, system_pr
                 params["stream"] = True
                 
                 def respGenerator():
-                    content = ""
-                    total_tokens = 0
+                    parts = []
                     
                     with client.messages.stream(**params) as stream:
                         for text in stream.text_stream:
-                            content += text
-                            # 估算token数量
-                            total_tokens = len(content.split()) * 1.3
-                            
-                            yield {
-                                "content": content,
-                                "total_tokens": int(total_tokens),
-                            }
+                            if text:
+                                parts.append(text)
+                                yield delta_event(text)
+                    
+                    # 估算token数量（流结束时计算一次）
+                    yield final_event(estimate_word_tokens(parts))
                 
                 return respGenerator()
                 
@@ -2,8 +2,22 @@ import os
 
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event
 
-def deepseekChatLLM(model_name="deepseek-chat", api_key=None, system_prompt=""):
+
+def _usage_fields(usage) -> dict:
+    """提取usage中的Token统计（含上下文硬盘缓存的命中/未命中Token数）"""
+    if not usage:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, 'prompt_tokens', 0) or 0,
+        "completion_tokens": getattr(usage, 'completion_tokens', 0) or 0,
+        "prompt_cache_hit_tokens": getattr(usage, 'prompt_cache_hit_tokens', 0) or 0,
+        "prompt_cache_miss_tokens": getattr(usage, 'prompt_cache_miss_tokens', 0) or 0,
+    }
+
+
+def deepseekChatLLM(model_name="deepseek-chat", api_key=None, system_prompt="", http_client=None):
     """
     DeepSeek API 调用封装
     
@@ -18,7 +32,7 @@ def deepseekChatLLM(model_name="deepseek-chat", api_key=None, system_prompt=""):
     - 1.5: 创意类写作/诗歌创作
     """
     api_key = os.environ.get("DEEPSEEK_AI_API_KEY", api_key)
-    client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com", timeout=1800.0)  # 30分钟超时
+    client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com", timeout=1800.0, http_client=http_client)  # 30分钟超时
 
     def chatLLM(
         messages: list,
@@ -59,6 +73,7 @@ def deepseekChatLLM(model_name="deepseek-chat", api_key=None, system_prompt=""):
             return {
                 "content": response.choices[0].message.content,
                 "total_tokens": response.usage.total_tokens,
+                **_usage_fields(response.usage),
             }
         else:
             responses = client.chat.completions.create(
@@ -68,41 +83,32 @@ def deepseekChatLLM(model_name="deepseek-chat", api_key=None, system_prompt=""):
                 top_p=top_p,
                 max_tokens=max_tokens,
                 stream=True,
+                stream_options={"include_usage": True},
             )
 
             def respGenerator():
-                content = ""
-                reasoning_content = ""  # 用于累积思考内容
+                reasoning_length = 0  # 用于统计思考内容长度
+                total_tokens = None
+                usage_fields = {}
                 for response in responses:
                     # 处理思考内容（reasoning_content，用于deepseek-reasoner模型）
-                    delta = response.choices[0].delta
-                    if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                        new_reasoning = delta.reasoning_content
-                        reasoning_content += new_reasoning
-                        yield {
-                            "content": content,
-                            "reasoning_content": reasoning_content,
-                            "total_tokens": None,
-                        }
-                    
+                    delta = response.choices[0].delta if response.choices else None
+                    new_reasoning = getattr(delta, 'reasoning_content', None) if delta else None
                     # 处理流式输出，delta.content 可能为 None
-                    delta_content = delta.content
-                    if delta_content:
-                        content += delta_content
+                    delta_content = delta.content if delta else None
+                    if new_reasoning or delta_content:
+                        reasoning_length += len(new_reasoning or "")
+                        yield delta_event(delta_content or "", new_reasoning or "")
 
                     # 最后一个 chunk 会包含 usage 信息
-                    total_tokens = None
                     if hasattr(response, 'usage') and response.usage:
                         total_tokens = response.usage.total_tokens
+                        usage_fields = _usage_fields(response.usage)
+
+                if reasoning_length:
+                    print(f"\n🧠 思考过程总长度: {reasoning_length} 字符")
 
-                    yield {
-                        "content": content,
-                        "reasoning_content": reasoning_content,
-                        "total_tokens": total_tokens,
-                    }
-                
-                if reasoning_content:
-                    print(f"\n🧠 思考过程总长度: {len(reasoning_content)} 字符")
+                yield final_event(total_tokens, **usage_fields)
 
             return respGenerator()
 
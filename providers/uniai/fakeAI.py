@@ -0,0 +1,457 @@
+"""
+离线假提供商 - 不访问网络，按提示词格式返回确定性的合成输出
+
+用于在没有真实 API 的情况下测量 autoGenerate 的编排开销（scripts/benchmark_autogenerate.py），
+也可以在配置页面选择 "fake" 提供商离线走通整条生成流程。输出格式按请求自动识别：
+- 故事线请求（"请为第X章到第Y章生成详细的故事线"）：## 第N章：标题 Markdown，长章节模式带 ### 分段
+- 章节标题批量请求（"待命名章节"）：## 第N章：标题
+- 提示词 ## Outputs 段落中声明 JSON 代码块的：对应键的 JSON
+- 声明 # key ... # END 的：逐个 # key 段落，并附带提示词要求的 ===XXX_COMPLETE=== 完成标记
+- 声明 **字段：** 的：逐个字段
+- 其他（智能体初始化握手等）："明白了"
+
+同一组消息总是得到同一段文本（按消息内容播种），失败/截断/重复循环注入按 seed 顺序决定。
+重复循环注入：正文写到一半后陷入短语循环，一直重复到 max_tokens（模拟模型复读），
+stats["streamed_chars"] 记录调用方实际接收的字符数（提前断开连接时小于 output_chars）。
+卡顿注入：流式输出到中途停顿 stall_seconds 秒（模拟连接未断但不再出数据），用于测试卡顿检测与对冲请求。
+输出长度上限：max_output_chars 模拟模型的最大输出长度，超出的响应在上限处截断（与章节长度 prose_chars、
+润色扩写倍数 embellish_ratio 配合，测试长章节润色被截断的情况）。
+续写请求（core.agents.continuation 追加的 assistant 前缀 + 续写指令）：返回原请求完整文本中前缀之后的部分，
+约一半的续写会先重写前缀的最后一句（模拟模型的常见行为，由拼接时的重叠去除处理）。
+与 DeepSeek 一样在 usage 中报告 prompt_cache_hit_tokens / prompt_cache_miss_tokens：
+命中数为与最近请求的最长公共前缀（按 64 字的存储单元向下取整，1 字 ≈ 1 Token）。
+可选参数通过 base_url 查询串配置，例如：
+    fake://local?ttft_ms=300&tokens_per_second=60&failure_rate=0.02&truncation_rate=0.02&loop_rate=0.01&seed=7
+    fake://local?stall_rate=0.1&stall_seconds=30
+    fake://local?prose_chars=7000&embellish_ratio=1.3&max_output_chars=8000
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlparse
+
+from providers.stream_protocol import delta_event, final_event
+
+
+DEFAULT_BASE_URL = "fake://local"
+PROSE_CHARS = 2400        # 正文/开头/润色类输出的默认长度
+NOTE_CHARS = 400          # 计划、记忆、总结等辅助输出的默认长度
+STREAM_CHUNK_CHARS = 16   # 流式输出每个增量事件的字符数
+PREFIX_CACHE_UNIT = 64    # 模拟前缀缓存的存储单元（字符）
+PREFIX_CACHE_ENTRIES = 256  # 模拟前缀缓存保留的最近请求数
+LOOP_DEFAULT_CHARS = 40000  # 未给出 max_tokens 时重复循环注入的总长度
+STALL_DEFAULT_SECONDS = 30.0  # 卡顿注入的默认停顿时长
+
+PROSE_KEYS = {"段落", "开头", "润色内容", "润色结果", "正文"}
+LONG_NOTE_KEYS = {"大纲", "详细大纲", "人物列表", "全局设定", "新的记忆", "伏笔与反转设定"}
+
+_SUBJECTS = ["少年", "老者", "她", "他", "师兄", "掌柜", "侍女", "将军", "书生", "少女", "黑衣人", "城主", "药师", "船夫", "猎户", "琴师"]
+_ACTIONS = ["推开木门", "握紧剑柄", "低声叹息", "望向远山", "收起书信", "点燃油灯", "拨动琴弦", "踏上石阶",
+            "翻开旧卷", "递过茶盏", "按住伤口", "抬手示意", "转身离去", "停下脚步", "摊开地图", "拂去尘土"]
+_SCENES = ["雨夜的客栈里", "晨雾弥漫的渡口", "喧闹的集市旁", "荒废的古庙中", "月色下的城墙上", "竹林深处",
+           "药铺后院", "山道拐角处", "灯火通明的大堂", "寂静的书房里", "河畔柳荫下", "风雪中的驿站"]
+_FEELINGS = ["心中一紧", "神色平静", "眼底闪过一丝犹豫", "嘴角微微上扬", "呼吸渐渐急促", "眉头紧锁", "沉默良久",
+             "语气里带着笑意", "手指轻轻发颤", "目光坚定"]
+_DIALOGUES = ["“你来得正好。”", "“此事不必再提。”", "“天亮之前必须赶到。”", "“我早就猜到了。”",
+              "“把东西交出来。”", "“再等一等。”", "“这条路不好走。”", "“你终于肯说实话了。”"]
+_PLACES = ["渡口", "古庙", "城墙", "竹林", "药铺", "驿站", "书房", "集市", "山道", "客栈", "河畔", "大堂"]
+_EVENTS = ["夜谈", "惊变", "重逢", "对峙", "密信", "追踪", "试剑", "别离", "疑云", "援手", "旧约", "风波"]
+_TONES = ["紧张", "温情", "压抑", "悬疑", "释然", "激昂"]
+_LOOPS = ["他笑了笑，", "不不不", "我不知道。", "对对对，", "哈哈", "走吧走吧", "她点了点头。"]
+
+_STORYLINE_RE = re.compile(r"请为第(\d+)章到第(\d+)章生成详细的故事线")
+_SEGMENT_RE = re.compile(r"每一章都必须包含(\d+)个分段")
+_TITLE_BATCH_RE = re.compile(r"^- 第(\d+)章", re.MULTILINE)
+_COMPLETE_MARKER_RE = re.compile(r"===[A-Z_]+_COMPLETE===")
+_JSON_BLOCK_RE = re.compile(r"```json\s*(\{.*?\})\s*```", re.DOTALL)
+_JSON_KEY_RE = re.compile(r'"([A-Za-z_][A-Za-z0-9_]*)"\s*:')
+_JSON_FIELD_RE = re.compile(r'"([A-Za-z_][A-Za-z0-9_]*)"\s*:\s*(\S)')
+_SECTION_MARKER_RE = re.compile(r"^===([^=\s]+)===$", re.MULTILINE)
+_BOLD_FIELD_RE = re.compile(r"^\*\*([^*：:]+)[：:]\*\*", re.MULTILINE)
+_CONTINUE_MARK = "你的上一条回复在中途被截断了"   # core.agents.continuation.CONTINUE_PROMPT 的开头
+_SENTENCE_ENDS = "。！？…”\n"
+
+
+def parse_fake_options(base_url: str = None) -> dict:
+    """从 base_url 查询串解析假提供商参数（未给出的项使用默认值）"""
+    options = {"ttft": 0.0, "tokens_per_second": 0.0, "failure_rate": 0.0, "truncation_rate": 0.0,
+               "loop_rate": 0.0, "stall_rate": 0.0, "stall_seconds": STALL_DEFAULT_SECONDS,
+               "prose_chars": PROSE_CHARS, "embellish_ratio": 1.0, "max_output_chars": 0, "seed": 0}
+    if not base_url:
+        return options
+    query = parse_qs(urlparse(base_url).query)
+
+    def value(name, cast, default):
+        try:
+            return cast(query[name][0]) if name in query else default
+        except (TypeError, ValueError):
+            print(f"⚠️ 假提供商参数 {name} 无效: {query[name][0]}，使用默认值 {default}")
+            return default
+
+    options["ttft"] = value("ttft_ms", float, 0.0) / 1000
+    options["tokens_per_second"] = value("tokens_per_second", float, 0.0)
+    options["failure_rate"] = value("failure_rate", float, 0.0)
+    options["truncation_rate"] = value("truncation_rate", float, 0.0)
+    options["loop_rate"] = value("loop_rate", float, 0.0)
+    options["stall_rate"] = value("stall_rate", float, 0.0)
+    options["stall_seconds"] = value("stall_seconds", float, STALL_DEFAULT_SECONDS)
+    options["prose_chars"] = value("prose_chars", int, PROSE_CHARS)
+    options["embellish_ratio"] = value("embellish_ratio", float, 1.0)
+    options["max_output_chars"] = value("max_output_chars", int, 0)
+    options["seed"] = value("seed", int, 0)
+    return options
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    """最长公共前缀长度（二分查找，比较在 C 层完成）"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+# ========== 合成文本 ==========
+
+def _sentence(rng: random.Random) -> str:
+    if rng.random() < 0.3:
+        return f"{rng.choice(_SUBJECTS)}{rng.choice(_FEELINGS)}，开口道：{rng.choice(_DIALOGUES)}"
+    return f"{rng.choice(_SCENES)}，{rng.choice(_SUBJECTS)}{rng.choice(_ACTIONS)}，{rng.choice(_FEELINGS)}。"
+
+
+def _prose(rng: random.Random, chars: int) -> str:
+    """生成约 chars 字、以句末标点结尾的段落文本"""
+    paragraphs = []
+    length = 0
+    while length < chars:
+        paragraph = "".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return "\n\n".join(paragraphs)
+
+
+def _title(rng: random.Random) -> str:
+    return f"{rng.choice(_PLACES)}{rng.choice(_EVENTS)}"
+
+
+def _names(rng: random.Random, count: int) -> list:
+    return rng.sample(["林远", "苏晚", "沈默", "顾青", "陆离", "江月", "秦川", "许念"], count)
+
+
+def _storyline(rng: random.Random, start: int, end: int, segments: int) -> str:
+    """按故事线提示词示例格式生成 Markdown"""
+    lines = ["# 故事线", ""]
+    for number in range(start, end + 1):
+        lines += [
+            f"## 第{number}章：{_title(rng)}", "",
+            f"**承接上章：** {'本章为开篇' if number == 1 else _sentence(rng)}", "",
+            f"**时间节点：** 第{number}日{rng.choice(['清晨', '正午', '黄昏', '深夜'])}", "",
+            f"**剧情梗概：** {''.join(_sentence(rng) for _ in range(4))}", "",
+            f"**主要人物：** {'、'.join(_names(rng, 2))}", "",
+            f"**本章前置条件：** {_sentence(rng)}", "",
+            "**关键事件：**",
+            f"- {_sentence(rng)}",
+            f"- {_sentence(rng)}", "",
+            f"**剧情目的：** {_sentence(rng)}", "",
+            f"**情感基调：** {rng.choice(_TONES)}", "",
+            f"**衔接下章：** {_sentence(rng)}", "",
+        ]
+        for index in range(1, segments + 1):
+            lines += [
+                f"### 分段{index}：{_title(rng)}",
+                _sentence(rng),
+                f"- {_sentence(rng)}",
+                f"**场景与时间：** {rng.choice(_SCENES)}",
+                f"**分段作用：** {_sentence(rng)}",
+            ]
+            if index < segments:
+                lines += [f"**衔接：** {_sentence(rng)}", ""]
+            else:
+                lines += [f"**本章结束状态：** {_sentence(rng)}", f"**过渡到下章：** {_sentence(rng)}", ""]
+    return "\n".join(lines)
+
+
+def _section_body(key: str, rng: random.Random, request: str, prose_chars: int = PROSE_CHARS,
+                  embellish_ratio: float = 1.0) -> str:
+    if key in ("润色内容", "润色结果"):
+        # 润色输出为原文长度的 embellish_ratio 倍（默认与原文相当，避免触发截断检测的长度比率判断）
+        original = _input_section(request, "要润色的内容")
+        return _prose(rng, int(len(original) * embellish_ratio) if original else prose_chars)
+    if key in PROSE_KEYS:
+        return _prose(rng, prose_chars)
+    if key == "标题":
+        return _title(rng) + rng.choice(["录", "记", "传", "行"])
+    return _prose(rng, NOTE_CHARS * (2 if key in LONG_NOTE_KEYS else 1))
+
+
+def _input_section(request: str, key: str) -> str:
+    """取 invoke() 构建的 "# key\\n内容" 输入中某一项的内容"""
+    marker = f"# {key}\n"
+    start = request.find(marker)
+    if start < 0:
+        return ""
+    start += len(marker)
+    end = request.find("\n# ", start)
+    return request[start:end if end >= 0 else len(request)].strip()
+
+
+def _outputs_section(instructions: str) -> str:
+    """提示词的 ## Outputs 部分
+
+    声明了 # key 的读到 # END 的下一行为止（其间可能嵌套记忆、全局设定的 ## 分区标题，
+    以及紧跟的完成标记）；没有 # key 的读到下一个二级标题为止。
+    """
+    start = instructions.find("## Outputs")
+    if start < 0:
+        return ""
+    lines = []
+    has_keys = ended = False
+    for line in instructions[start:].split("\n")[1:]:
+        if ended:
+            if _COMPLETE_MARKER_RE.fullmatch(line.strip()):
+                lines.append(line)
+            break
+        if line.startswith("## ") and not has_keys:
+            break
+        if line.strip() == "```" and not has_keys and _SECTION_MARKER_RE.search("\n".join(lines)):
+            break
+        lines.append(line)
+        has_keys = has_keys or (line.startswith("# ") and line.strip() != "# END")
+        ended = has_keys and line.strip() == "# END"
+    return "\n".join(lines)
+
+
+def _json_section(key: str, outputs: str, rng: random.Random):
+    """# key 下给出的是 JSON 模板时按字段类型生成 JSON 对象，否则返回 None"""
+    body = outputs.split(f"# {key}\n", 1)[-1].split("\n# ", 1)[0].strip()
+    if not body.startswith("{"):
+        return None
+    values = {}
+    for field, first in _JSON_FIELD_RE.findall(body):
+        if first == "[":
+            values[field] = [_sentence(rng) for _ in range(3)]
+        elif first == '"':
+            values[field] = _title(rng) if field == "title" else _prose(rng, NOTE_CHARS if "summary" in field else 60)
+        else:
+            values[field] = 1
+    return json.dumps(values, ensure_ascii=False, indent=2)
+
+
+def _split_resume_request(messages: list):
+    """续写请求返回 (原请求消息, 已生成的前缀)，否则返回 None"""
+    if len(messages) < 3 or messages[-2].get("role") != "assistant":
+        return None
+    if _CONTINUE_MARK not in str(messages[-1].get("content") or ""):
+        return None
+    return messages[:-2], str(messages[-2].get("content") or "")
+
+
+def _continuation_text(full: str, prefix: str, rng: random.Random) -> str:
+    """完整文本中前缀之后的部分；按 rng 决定是否先重写前缀的最后一句"""
+    if full.startswith(prefix):
+        resume_at = len(prefix)
+    else:
+        anchor = prefix.rstrip()[-40:]
+        found = full.find(anchor) if anchor else -1
+        resume_at = found + len(anchor) if found >= 0 else 0
+    if resume_at and rng.random() < 0.5:
+        sentence_end = len(full[:resume_at].rstrip(_SENTENCE_ENDS))
+        sentence_start = max(full.rfind(end, 0, sentence_end) for end in _SENTENCE_ENDS) + 1
+        resume_at = sentence_start if resume_at - sentence_start <= 200 else resume_at
+    return full[resume_at:]
+
+
+def render_response(messages: list, rng: random.Random, prose_chars: int = PROSE_CHARS,
+                    embellish_ratio: float = 1.0) -> str:
+    """按请求格式生成完整响应文本（prose_chars 为正文类输出的长度，embellish_ratio 为润色输出相对原文的长度倍数）"""
+    contents = [str(m.get("content") or "") for m in messages]
+    everything = "\n".join(contents)
+    request = contents[-1] if contents else ""
+    instructions = "\n".join(contents[:-1]) if len(contents) > 1 else request
+
+    match = _STORYLINE_RE.search(everything)
+    if match:
+        segment_match = _SEGMENT_RE.search(everything)
+        return _storyline(rng, int(match.group(1)), int(match.group(2)), int(segment_match.group(1)) if segment_match else 0)
+
+    if "待命名章节" in request:
+        return "\n".join(f"## 第{n}章：{_title(rng)}" for n in _TITLE_BATCH_RE.findall(request))
+
+    outputs = _outputs_section(instructions)
+    if not outputs:
+        return "明白了"
+
+    json_match = _JSON_BLOCK_RE.search(outputs)
+    if json_match:
+        keys = _JSON_KEY_RE.findall(json_match.group(1))
+        values = {key: (_title(rng) if key == "title" else _sentence(rng)) for key in keys}
+        return json.dumps(values, ensure_ascii=False, indent=2)
+
+    keys = [line[2:].strip() for line in outputs.split("\n")
+            if line.startswith("# ") and line[2:].strip() and line[2:].strip() != "END"]
+    if keys:
+        keys = list(dict.fromkeys(keys))
+        markers = list(dict.fromkeys(_COMPLETE_MARKER_RE.findall(outputs)))
+        if "===润色结果===" in instructions and keys == ["润色内容"]:
+            parts = [f"===润色结果===\n{_section_body('润色结果', rng, request, prose_chars, embellish_ratio)}\n===END==="]
+        else:
+            parts = [f"# {key}\n{_json_section(key, outputs, rng) or _section_body(key, rng, request, prose_chars, embellish_ratio)}\n"
+                     for key in keys] + ["# END"]
+        return "\n".join(parts + markers)
+
+    sections = [name for name in dict.fromkeys(_SECTION_MARKER_RE.findall(outputs))
+                if name != "END" and not name.endswith("_COMPLETE")]
+    if sections:
+        markers = list(dict.fromkeys(_COMPLETE_MARKER_RE.findall(outputs)))
+        parts = [f"==={name}===\n{_section_body(name, rng, request, prose_chars, embellish_ratio)}\n===END===" for name in sections]
+        return "\n".join(parts + markers)
+
+    fields = list(dict.fromkeys(_BOLD_FIELD_RE.findall(outputs)))
+    if fields:
+        return "\n".join(f"**{field}：** {_sentence(rng)}" for field in fields)
+    return "明白了"
+
+
+def fakeChatLLM(model_name="fake-novelist", api_key=None, system_prompt="", base_url=None,
+                ttft=None, tokens_per_second=None, failure_rate=None, truncation_rate=None, loop_rate=None,
+                stall_rate=None, stall_seconds=None, prose_chars=None, embellish_ratio=None, max_output_chars=None,
+                seed=None):
+    """
+    离线假提供商
+
+    Args:
+        model_name: 模型名（只用于显示）
+        base_url: fake://local?ttft_ms=...&tokens_per_second=...&failure_rate=...&truncation_rate=...&loop_rate=...
+                  &stall_rate=...&stall_seconds=...&prose_chars=...&embellish_ratio=...&max_output_chars=...&seed=...
+        ttft: 首字延迟（秒），覆盖 base_url 中的值
+        tokens_per_second: 输出速度（按 1 字 ≈ 1 Token 计），0 表示不限速
+        failure_rate: 请求失败（抛出 ConnectionError）的概率
+        truncation_rate: 响应在中途被截断（丢失结束标记）的概率
+        loop_rate: 响应在中途陷入重复循环、一直输出到 max_tokens 的概率
+        stall_rate: 流式响应在中途停顿 stall_seconds 秒的概率（不影响其他注入的随机序列）
+        stall_seconds: 卡顿注入的停顿时长（秒）
+        prose_chars: 正文/开头类输出的长度（字，默认 PROSE_CHARS）
+        embellish_ratio: 润色输出相对原文的长度倍数（默认 1.0）
+        max_output_chars: 单次响应的输出长度上限（字），超出部分被截断（计入 truncations），0 表示不限
+        seed: 失败/截断注入与文本生成的随机种子
+
+    返回的 chatLLM 带有 stats 属性：calls / failures / truncations / loops / stalls / resumes / output_chars / streamed_chars /
+    busy_seconds（在提供商内部花费的时间，含模拟延迟，不含调用方处理流式数据的时间）。
+    """
+    options = parse_fake_options(base_url)
+    for name, value in (("ttft", ttft), ("tokens_per_second", tokens_per_second), ("failure_rate", failure_rate),
+                        ("truncation_rate", truncation_rate), ("loop_rate", loop_rate), ("stall_rate", stall_rate),
+                        ("stall_seconds", stall_seconds), ("prose_chars", prose_chars), ("embellish_ratio", embellish_ratio),
+                        ("max_output_chars", max_output_chars), ("seed", seed)):
+        if value is not None:
+            options[name] = value
+    injection_rng = random.Random(options["seed"])
+    lock = threading.Lock()
+    stats = {"calls": 0, "failures": 0, "truncations": 0, "loops": 0, "stalls": 0, "resumes": 0, "output_chars": 0,
+             "streamed_chars": 0, "busy_seconds": 0.0}
+    prefix_cache = deque(maxlen=PREFIX_CACHE_ENTRIES)
+
+    def lookup_prefix(prompt: str) -> int:
+        with lock:
+            previous = list(prefix_cache)
+            prefix_cache.append(prompt)
+        longest = max((_common_prefix_length(prompt, p) for p in previous), default=0)
+        return longest // PREFIX_CACHE_UNIT * PREFIX_CACHE_UNIT
+
+    def record(**deltas):
+        with lock:
+            for name, delta in deltas.items():
+                stats[name] += delta
+
+    def chatLLM(
+        messages: list,
+        temperature=None,
+        top_p=None,
+        max_tokens=None,
+        stream=False,
+        **kwargs,
+    ) -> dict:
+        started = time.perf_counter()
+        if system_prompt and not any(msg.get("role") == "system" for msg in messages):
+            messages = [{"role": "system", "content": system_prompt}] + messages
+        with lock:
+            fail = injection_rng.random() < options["failure_rate"]
+            truncate = injection_rng.random() < options["truncation_rate"]
+            loop = injection_rng.random() < options["loop_rate"]
+            # 只在启用时抽取，保持未启用卡顿注入时其他注入的随机序列不变
+            stall = options["stall_rate"] > 0 and injection_rng.random() < options["stall_rate"]
+        if fail:
+            record(calls=1, failures=1, busy_seconds=time.perf_counter() - started)
+            raise ConnectionError("fake provider: 注入的请求失败")
+
+        resume = _split_resume_request(messages)
+        if resume:
+            # 续写：按原请求生成同一段完整文本，返回前缀之后的部分
+            original, prefix = resume
+            digest = hashlib.sha1(json.dumps(original, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+            full = render_response(original, random.Random(f"{options['seed']}:{digest}"),
+                                   options["prose_chars"], options["embellish_ratio"])
+            content = _continuation_text(full, prefix, random.Random(f"resume:{digest}:{len(prefix)}"))
+            digest = f"{digest}:resume:{len(prefix)}"
+        else:
+            digest = hashlib.sha1(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+            content = render_response(messages, random.Random(f"{options['seed']}:{digest}"),
+                                   options["prose_chars"], options["embellish_ratio"])
+        looped = False
+        if truncate and len(content) > 20:
+            content = content[:int(len(content) * (0.3 + 0.6 * random.Random(digest).random()))]
+        elif loop and len(content) > 20:
+            looped = True
+            loop_rng = random.Random(digest)
+            unit = loop_rng.choice(_LOOPS)
+            content = content[:int(len(content) * (0.3 + 0.4 * loop_rng.random()))]
+            content += unit * max(1, ((max_tokens or LOOP_DEFAULT_CHARS) - len(content)) // len(unit))
+        if not looped and 0 < options["max_output_chars"] < len(content):
+            # 超出输出长度上限：与真实提供商达到 max_tokens 一样在中途截断
+            truncate = True
+            content = content[:options["max_output_chars"]]
+        prompt = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in messages)
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages)
+        cache_hit = min(lookup_prefix(prompt), prompt_tokens)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                 "prompt_cache_hit_tokens": cache_hit, "prompt_cache_miss_tokens": prompt_tokens - cache_hit}
+        total_tokens = prompt_tokens + len(content)
+        speed = options["tokens_per_second"]
+        record(calls=1, truncations=int(truncate), loops=int(looped), resumes=int(bool(resume)), output_chars=len(content))
+
+        if not stream:
+            time.sleep(options["ttft"] + (len(content) / speed if speed > 0 else 0))
+            record(streamed_chars=len(content), busy_seconds=time.perf_counter() - started)
+            return {"content": content, "total_tokens": total_tokens, **usage}
+
+        stall_at = int(len(content) * random.Random(f"stall:{digest}").random()) if stall else -1
+
+        def respGenerator():
+            resumed = started
+            if options["ttft"]:
+                time.sleep(options["ttft"])
+            for start in range(0, len(content), STREAM_CHUNK_CHARS):
+                piece = content[start:start + STREAM_CHUNK_CHARS]
+                if speed > 0:
+                    time.sleep(len(piece) / speed)
+                if start <= stall_at < start + STREAM_CHUNK_CHARS:
+                    record(stalls=1)
+                    time.sleep(options["stall_seconds"])
+                record(streamed_chars=len(piece), busy_seconds=time.perf_counter() - resumed)
+                yield delta_event(piece)
+                resumed = time.perf_counter()
+            record(busy_seconds=time.perf_counter() - resumed)
+            yield final_event(total_tokens, **usage)
+
+        return respGenerator()
+
+    chatLLM.stats = stats
+    return chatLLM
@@ -2,8 +2,10 @@ import os
 
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event
 
-def fireworksChatLLM(model_name="accounts/fireworks/models/deepseek-v3-0324", api_key=None, system_prompt=""):
+
+def fireworksChatLLM(model_name="accounts/fireworks/models/deepseek-v3-0324", api_key=None, system_prompt="", http_client=None):
     """
     Fireworks AI Chat LLM using OpenAI 1.x SDK
     
@@ -16,7 +18,8 @@ def fireworksChatLLM(model_name="accounts/fireworks/models/deepseek-v3-0324", ap
     client = OpenAI(
         api_key=api_key, 
         base_url="https://api.fireworks.ai/inference/v1",
-        timeout=1800.0  # 30分钟超时
+        timeout=1800.0,  # 30分钟超时
+        http_client=http_client,  # 共享连接池（由客户端注册表提供）
     )
 
     def chatLLM(
@@ -62,21 +65,16 @@ def fireworksChatLLM(model_name="accounts/fireworks/models/deepseek-v3-0324", ap
             )
 
             def respGenerator():
-                content = ""
                 total_tokens = None
                 for response in responses:
                     if response.choices and response.choices[0].delta.content:
-                        delta = response.choices[0].delta.content
-                        content += delta
+                        yield delta_event(response.choices[0].delta.content)
 
                     # Fireworks may provide usage in the final chunk
                     if hasattr(response, 'usage') and response.usage:
                         total_tokens = response.usage.total_tokens
 
-                    yield {
-                        "content": content,
-                        "total_tokens": total_tokens,
-                    }
+                yield final_event(total_tokens)
 
             return respGenerator()
 
@@ -2,6 +2,8 @@ import os
 import google.generativeai as genai
 from typing import List, Dict, Generator, Union
 
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
+
 def geminiChatLLM(model_name="gemini-pro", api_key=None, system_prompt=""):
     """
     Google Gemini AI Chat LLM
@@ -96,7 +98,7 @@ def geminiChatLLM(model_name="gemini-pro", api_key=None, system_prompt=""):
             else:
                 # 流式响应
                 def respGenerator():
-                    content = ""
+                    parts = []
                     
                     if len(gemini_messages) == 1:
                         # 单条消息
@@ -116,13 +118,10 @@ def geminiChatLLM(model_name="gemini-pro", api_key=None, system_prompt=""):
                     
                     for chunk in response_stream:
                         if chunk.text:
-                            content += chunk.text
-                            total_tokens = len(content.split()) * 1.3  # 粗略估算
-                            
-                            yield {
-                                "content": content,
-                                "total_tokens": int(total_tokens),
-                            }
+                            parts.append(chunk.text)
+                            yield delta_event(chunk.text)
+                    
+                    yield final_event(estimate_word_tokens(parts))  # 粗略估算
                 
                 return respGenerator()
                 
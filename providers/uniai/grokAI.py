@@ -1,8 +1,10 @@
 import os
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
 
-def grokChatLLM(model_name="grok-3", api_key=None, system_prompt="", base_url=None):
+
+def grokChatLLM(model_name="grok-3", api_key=None, system_prompt="", base_url=None, http_client=None):
     """
     Grok AI Chat LLM
     
@@ -26,6 +28,7 @@ def grokChatLLM(model_name="grok-3", api_key=None, system_prompt="", base_url=No
         api_key=api_key,
         base_url=actual_base_url,
         timeout=1800.0,  # 30分钟超时
+        http_client=http_client,  # 共享连接池（由客户端注册表提供）
     )
 
     def chatLLM(
@@ -74,21 +77,16 @@ def grokChatLLM(model_name="grok-3", api_key=None, system_prompt="", base_url=No
                 responses = client.chat.completions.create(**params)
 
                 def respGenerator():
-                    content = ""
-                    total_tokens = 0
+                    parts = []
                     
                     for response in responses:
                         if response.choices and response.choices[0].delta.content:
                             delta = response.choices[0].delta.content
-                            content += delta
-                            
-                            # 估算token数量
-                            total_tokens = len(content.split()) * 1.3
-                            
-                            yield {
-                                "content": content,
-                                "total_tokens": int(total_tokens),
-                            }
+                            parts.append(delta)
+                            yield delta_event(delta)
+                    
+                    # 估算token数量（流结束时计算一次）
+                    yield final_event(estimate_word_tokens(parts))
 
                 return respGenerator()
                 
@@ -3,8 +3,10 @@ import time
 import httpx
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
 
-def lambdaChatLLM(model_name="llama-4-maverick-17b-128e-instruct-fp8", api_key=None, system_prompt="", base_url=None):
+
+def lambdaChatLLM(model_name="llama-4-maverick-17b-128e-instruct-fp8", api_key=None, system_prompt="", base_url=None, http_client=None):
     """
     Lambda AI Chat LLM using OpenAI-compatible API
     
@@ -50,6 +52,7 @@ def lambdaChatLLM(model_name="llama-4-maverick-17b-128e-instruct-fp8", api_key=N
         api_key=api_key,
         base_url=actual_base_url,
         timeout=custom_timeout,  # 使用详细的httpx超时配置
+        http_client=http_client,  # 共享连接池（由客户端注册表提供）
     )
 
     def chatLLM(
@@ -149,8 +152,8 @@ def lambdaChatLLM(model_name="llama-4-maverick-17b-128e-instruct-fp8", api_key=N
                 responses = client.chat.completions.create(**params)
 
                 def respGenerator():
-                    content = ""
-                    total_tokens = 0
+                    content_parts = []
+                    content_length = 0
                     last_progress_time = time.time()
                     last_content_length = 0
                     chunk_count = 0
@@ -161,36 +164,34 @@ def lambdaChatLLM(model_name="llama-4-maverick-17b-128e-instruct-fp8", api_key=N
                         
                         if response.choices and response.choices[0].delta.content:
                             delta = response.choices[0].delta.content
-                            content += delta
-                            
-                            # 估算token数量
-                            total_tokens = len(content.split()) * 1.3
+                            content_parts.append(delta)
+                            content_length += len(delta)
                             
                             # 每30秒或每增加1000字符时输出进度日志
                             elapsed_since_progress = current_time - last_progress_time
-                            content_increase = len(content) - last_content_length
+                            content_increase = content_length - last_content_length
                             
                             if elapsed_since_progress >= 30 or content_increase >= 1000:
                                 total_elapsed = current_time - stream_start_time
-                                print(f"\n⏳ Lambda 流式生成进度: {len(content)} 字符, "
+                                print(f"\n⏳ Lambda 流式生成进度: {content_length} 字符, "
                                       f"{chunk_count} 个数据块, 已耗时 {total_elapsed:.1f} 秒")
                                 last_progress_time = current_time
-                                last_content_length = len(content)
+                                last_content_length = content_length
                             
-                            yield {
-                                "content": content,
-                                "total_tokens": int(total_tokens),
-                            }
+                            yield delta_event(delta)
                     
                     # 流式生成完成日志
                     total_elapsed = time.time() - stream_start_time
                     elapsed_minutes = total_elapsed / 60
                     if elapsed_minutes > 1:
                         print(f"✅ Lambda 流式生成完成: 总耗时 {elapsed_minutes:.1f} 分钟, "
-                              f"最终长度 {len(content)} 字符, {chunk_count} 个数据块")
+                              f"最终长度 {content_length} 字符, {chunk_count} 个数据块")
                     else:
                         print(f"✅ Lambda 流式生成完成: 总耗时 {total_elapsed:.1f} 秒, "
-                              f"最终长度 {len(content)} 字符, {chunk_count} 个数据块")
+                              f"最终长度 {content_length} 字符, {chunk_count} 个数据块")
+
+                    # 估算token数量（流结束时计算一次）
+                    yield final_event(estimate_word_tokens(content_parts))
 
                 return respGenerator()
                 
@@ -3,6 +3,8 @@ import re
 
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event, ThinkTagSplitter
+
 
 def _is_gpt_oss_model(model_name: str) -> bool:
     """检查是否为gpt-oss模型"""
@@ -135,7 +137,7 @@ def _parse_harmony_response(raw_response: str) -> str:
     return raw_response
 
 
-def lmstudioChatLLM(model_name="local-model", base_url=None, api_key=None, system_prompt=""):
+def lmstudioChatLLM(model_name="local-model", base_url=None, api_key=None, system_prompt="", http_client=None):
     """
     LM Studio API 接口（标准模型使用 Chat Completions，gpt-oss模型使用 Completions + Harmony 格式）
 
@@ -148,7 +150,7 @@ def lmstudioChatLLM(model_name="local-model", base_url=None, api_key=None, syste
     base_url = base_url or os.environ.get("LM_STUDIO_BASE_URL", "http://localhost:1234/v1")
     api_key = api_key or os.environ.get("LM_STUDIO_API_KEY", "lm-studio")
 
-    client = OpenAI(api_key=api_key, base_url=base_url, timeout=1800.0)  # 30分钟超时
+    client = OpenAI(api_key=api_key, base_url=base_url, timeout=1800.0, http_client=http_client)  # 30分钟超时
 
     def _build_chat_messages(messages: list) -> list:
         """构建标准 Chat Completions 的 messages 数组"""
@@ -229,7 +231,10 @@ def lmstudioChatLLM(model_name="local-model", base_url=None, api_key=None, syste
                     responses = client.completions.create(**stream_params)
 
                     def respGenerator():
-                        raw_content = ""
+                        # Harmony 格式只能在完整响应上解析 final channel，
+                        # 流式阶段把原始增量作为思考内容展示，结束时再给出解析后的正文
+                        raw_parts = []
+                        total_tokens = 0
                         for response in responses:
                             delta_text = ""
                             try:
@@ -237,19 +242,18 @@ def lmstudioChatLLM(model_name="local-model", base_url=None, api_key=None, syste
                             except Exception:
                                 delta_text = ""
                             if delta_text:
-                                raw_content += delta_text
-
-                            parsed_content = _parse_harmony_response(raw_content)
-                            content = parsed_content if parsed_content != raw_content else raw_content
+                                raw_parts.append(delta_text)
+                                yield delta_event(reasoning_content=delta_text)
 
-                            total_tokens = 0
                             if hasattr(response, "usage") and response.usage:
                                 total_tokens = getattr(response.usage, "total_tokens", 0) or 0
 
-                            yield {
-                                "content": content,
-                                "total_tokens": total_tokens,
-                            }
+                        raw_content = "".join(raw_parts)
+                        yield final_event(
+                            total_tokens,
+                            content=_parse_harmony_response(raw_content),
+                            reasoning_content=raw_content,
+                        )
 
                     return respGenerator()
 
@@ -323,9 +327,10 @@ def lmstudioChatLLM(model_name="local-model", base_url=None, api_key=None, syste
                     responses = client.chat.completions.create(**stream_params)
 
                     def respGenerator():
-                        full_content = ""
-                        reasoning_content = ""
-                        in_think_block = False
+                        # 实时解析 <think> 标签：只处理新增文本，从中分离思维链和正文
+                        splitter = ThinkTagSplitter()
+                        reasoning_length = 0
+                        total_tokens = 0
                         for chunk in responses:
                             delta_content = ""
                             try:
@@ -334,59 +339,28 @@ def lmstudioChatLLM(model_name="local-model", base_url=None, api_key=None, syste
                                 
                                 # 也检查 delta.reasoning_content（某些LM Studio版本可能支持）
                                 if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                                    reasoning_content += delta.reasoning_content
-                                    yield {
-                                        "content": full_content,
-                                        "reasoning_content": reasoning_content,
-                                        "total_tokens": 0,
-                                    }
+                                    reasoning_length += len(delta.reasoning_content)
+                                    yield delta_event(reasoning_content=delta.reasoning_content)
                             except Exception:
                                 delta_content = ""
                             if delta_content:
-                                full_content += delta_content
-
-                            # 实时解析 <think> 标签：从累积内容中分离思维链和正文
-                            parsed_reasoning = ""
-                            parsed_content = full_content
-                            
-                            # 检查是否包含 <think> 标签
-                            if "<think>" in full_content:
-                                # 提取已完成的 <think>...</think> 块
-                                import re
-                                think_pattern = re.compile(r'<think>(.*?)</think>', re.DOTALL)
-                                think_matches = think_pattern.findall(full_content)
-                                if think_matches:
-                                    parsed_reasoning = "\n".join(think_matches)
-                                    # 从内容中移除 <think>...</think> 块
-                                    parsed_content = think_pattern.sub('', full_content).strip()
-                                elif full_content.count("<think>") > full_content.count("</think>"):
-                                    # <think> 标签未关闭，说明还在思考中
-                                    think_start = full_content.index("<think>") + len("<think>")
-                                    parsed_reasoning = full_content[think_start:]
-                                    parsed_content = full_content[:full_content.index("<think>")].strip()
-
-                            # 合并 delta.reasoning_content 和 <think> 标签中的内容
-                            combined_reasoning = reasoning_content
-                            if parsed_reasoning:
-                                if combined_reasoning:
-                                    combined_reasoning += "\n" + parsed_reasoning
-                                else:
-                                    combined_reasoning = parsed_reasoning
+                                new_content, new_reasoning = splitter.feed(delta_content)
+                                if new_content or new_reasoning:
+                                    yield delta_event(new_content, new_reasoning)
 
-                            total_tokens = 0
                             if hasattr(chunk, "usage") and chunk.usage:
                                 total_tokens = getattr(chunk.usage, "total_tokens", 0) or 0
 
-                            yield {
-                                "content": parsed_content,
-                                "reasoning_content": combined_reasoning,
-                                "total_tokens": total_tokens,
-                            }
+                        new_content, new_reasoning = splitter.flush()
+                        if new_content or new_reasoning:
+                            yield delta_event(new_content, new_reasoning)
                         
-                        if reasoning_content or parsed_reasoning:
-                            total_reasoning_len = len(reasoning_content) + len(parsed_reasoning if 'parsed_reasoning' in dir() else '')
+                        total_reasoning_len = reasoning_length + splitter.reasoning_length
+                        if total_reasoning_len:
                             print(f"\n🧠 思考过程总长度: {total_reasoning_len} 字符")
 
+                        yield final_event(total_tokens)
+
                     return respGenerator()
 
             except Exception as e:
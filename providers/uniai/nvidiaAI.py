@@ -3,8 +3,10 @@ import time
 import httpx
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
 
-def nvidiaChatLLM(model_name="deepseek-ai/deepseek-v3.2", api_key=None, system_prompt="", base_url=None, thinking_enabled=False):
+
+def nvidiaChatLLM(model_name="deepseek-ai/deepseek-v3.2", api_key=None, system_prompt="", base_url=None, thinking_enabled=False, http_client=None):
     """
     NVIDIA AI Chat LLM using OpenAI-compatible API
     
@@ -42,6 +44,7 @@ def nvidiaChatLLM(model_name="deepseek-ai/deepseek-v3.2", api_key=None, system_p
         api_key=api_key,
         base_url=actual_base_url,
         timeout=custom_timeout,  # 使用详细的httpx超时配置
+        http_client=http_client,  # 共享连接池（由客户端注册表提供）
     )
 
     def chatLLM(
@@ -181,9 +184,9 @@ def nvidiaChatLLM(model_name="deepseek-ai/deepseek-v3.2", api_key=None, system_p
                 responses = client.chat.completions.create(**params)
 
                 def respGenerator():
-                    content = ""
-                    reasoning_content = ""
-                    total_tokens = 0
+                    content_parts = []
+                    content_length = 0
+                    reasoning_length = 0
                     last_progress_time = time.time()
                     last_content_length = 0
                     chunk_count = 0
@@ -201,59 +204,45 @@ def nvidiaChatLLM(model_name="deepseek-ai/deepseek-v3.2", api_key=None, system_p
                         if thinking_enabled:
                             reasoning = getattr(response.choices[0].delta, "reasoning_content", None)
                             if reasoning:
-                                reasoning_content += reasoning
+                                reasoning_length += len(reasoning)
                                 # 实时yield思考内容（由aign_agents.py负责打印到console）
-                                yield {
-                                    "content": content,
-                                    "total_tokens": int(total_tokens),
-                                    "reasoning_content": reasoning_content,
-                                }
+                                yield delta_event(reasoning_content=reasoning)
                         
                         # 处理常规content
                         if response.choices and response.choices[0].delta.content is not None:
                             delta = response.choices[0].delta.content
-                            content += delta
-                            
-                            # 估算token数量
-                            total_tokens = len(content.split()) * 1.3
+                            content_parts.append(delta)
+                            content_length += len(delta)
                             
                             # 每30秒或每增加1000字符时输出进度日志
                             elapsed_since_progress = current_time - last_progress_time
-                            content_increase = len(content) - last_content_length
+                            content_increase = content_length - last_content_length
                             
                             if elapsed_since_progress >= 30 or content_increase >= 1000:
                                 total_elapsed = current_time - stream_start_time
-                                print(f"\n⏳ NVIDIA 流式生成进度: {len(content)} 字符, "
+                                print(f"\n⏳ NVIDIA 流式生成进度: {content_length} 字符, "
                                       f"{chunk_count} 个数据块, 已耗时 {total_elapsed:.1f} 秒")
                                 last_progress_time = current_time
-                                last_content_length = len(content)
+                                last_content_length = content_length
                             
-                            yield {
-                                "content": content,
-                                "total_tokens": int(total_tokens),
-                                "reasoning_content": reasoning_content,  # 包含思考过程
-                            }
+                            if delta:
+                                yield delta_event(delta)
                     
                     # 流式生成完成日志
                     total_elapsed = time.time() - stream_start_time
                     elapsed_minutes = total_elapsed / 60
                     if elapsed_minutes > 1:
                         print(f"\n✅ NVIDIA 流式生成完成: 总耗时 {elapsed_minutes:.1f} 分钟, "
-                              f"最终长度 {len(content)} 字符, {chunk_count} 个数据块")
+                              f"最终长度 {content_length} 字符, {chunk_count} 个数据块")
                     else:
                         print(f"\n✅ NVIDIA 流式生成完成: 总耗时 {total_elapsed:.1f} 秒, "
-                              f"最终长度 {len(content)} 字符, {chunk_count} 个数据块")
+                              f"最终长度 {content_length} 字符, {chunk_count} 个数据块")
                     
-                    if reasoning_content:
-                        print(f"🧠 思考过程总长度: {len(reasoning_content)} 字符")
+                    if reasoning_length:
+                        print(f"🧠 思考过程总长度: {reasoning_length} 字符")
                     
-                    # 重要：在流结束后yield最终的完整结果
-                    # 这确保调用方能获取到完整的内容，即使最后一个chunk没有包含所有信息
-                    yield {
-                        "content": content,
-                        "total_tokens": int(total_tokens),
-                        "reasoning_content": reasoning_content,
-                    }
+                    # 重要：在流结束后yield汇总事件，调用方据此确认流已完整结束
+                    yield final_event(estimate_word_tokens(content_parts))
 
                 return respGenerator()
                 
@@ -2,8 +2,10 @@ import os
 
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event, ThinkTagSplitter
 
-def omlxChatLLM(model_name="local-model", base_url=None, api_key=None, system_prompt=""):
+
+def omlxChatLLM(model_name="local-model", base_url=None, api_key=None, system_prompt="", http_client=None):
     """
     oMLX API 接口（使用标准 OpenAI 兼容的 Chat Completions 端点）
 
@@ -19,7 +21,7 @@ def omlxChatLLM(model_name="local-model", base_url=None, api_key=None, system_pr
     base_url = base_url or os.environ.get("OMLX_BASE_URL", "http://localhost:8000/v1")
     api_key = api_key or os.environ.get("OMLX_API_KEY", "omlx")
 
-    client = OpenAI(api_key=api_key, base_url=base_url, timeout=1800.0)  # 30分钟超时
+    client = OpenAI(api_key=api_key, base_url=base_url, timeout=1800.0, http_client=http_client)  # 30分钟超时
 
     def _build_chat_messages(messages: list) -> list:
         """构建标准 Chat Completions 的 messages 数组"""
@@ -100,8 +102,10 @@ def omlxChatLLM(model_name="local-model", base_url=None, api_key=None, system_pr
         # 流式生成器必须在 try/except 之外定义和返回，
         # 否则 Python 3.12+ 会因为 except-as-e 变量作用域问题报错
         def respGenerator():
-            full_content = ""
-            reasoning_content = ""  # 用于累积思考内容（来自 delta.reasoning_content）
+            # 实时解析 <think> 标签：只处理新增文本
+            splitter = ThinkTagSplitter()
+            reasoning_length = 0  # 用于统计思考内容长度（来自 delta.reasoning_content）
+            total_tokens = 0
             for chunk in responses:
                 delta_content = ""
                 try:
@@ -110,54 +114,26 @@ def omlxChatLLM(model_name="local-model", base_url=None, api_key=None, system_pr
                     
                     # 处理思考内容（reasoning_content）
                     if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                        new_reasoning = delta.reasoning_content
-                        reasoning_content += new_reasoning
-                        yield {
-                            "content": full_content,
-                            "reasoning_content": reasoning_content,
-                            "total_tokens": 0,
-                        }
+                        reasoning_length += len(delta.reasoning_content)
+                        yield delta_event(reasoning_content=delta.reasoning_content)
                 except Exception:
                     delta_content = ""
                 if delta_content:
-                    full_content += delta_content
+                    new_content, new_reasoning = splitter.feed(delta_content)
+                    if new_content or new_reasoning:
+                        yield delta_event(new_content, new_reasoning)
 
-                # 实时解析 <think> 标签
-                parsed_reasoning = ""
-                parsed_content = full_content
-                
-                if "<think>" in full_content:
-                    import re
-                    think_pattern = re.compile(r'<think>(.*?)</think>', re.DOTALL)
-                    think_matches = think_pattern.findall(full_content)
-                    if think_matches:
-                        parsed_reasoning = "\n".join(think_matches)
-                        parsed_content = think_pattern.sub('', full_content).strip()
-                    elif full_content.count("<think>") > full_content.count("</think>"):
-                        think_start = full_content.index("<think>") + len("<think>")
-                        parsed_reasoning = full_content[think_start:]
-                        parsed_content = full_content[:full_content.index("<think>")].strip()
-
-                # 合并 reasoning_content 和 <think> 标签
-                combined_reasoning = reasoning_content
-                if parsed_reasoning:
-                    if combined_reasoning:
-                        combined_reasoning += "\n" + parsed_reasoning
-                    else:
-                        combined_reasoning = parsed_reasoning
-
-                total_tokens = 0
                 if hasattr(chunk, "usage") and chunk.usage:
                     total_tokens = getattr(chunk.usage, "total_tokens", 0) or 0
 
-                yield {
-                    "content": parsed_content,
-                    "reasoning_content": combined_reasoning,
-                    "total_tokens": total_tokens,
-                }
+            new_content, new_reasoning = splitter.flush()
+            if new_content or new_reasoning:
+                yield delta_event(new_content, new_reasoning)
             
-            if reasoning_content or parsed_reasoning:
-                print(f"\n🧠 思考过程总长度: {len(reasoning_content) + len(parsed_reasoning)} 字符")
+            if reasoning_length or splitter.reasoning_length:
+                print(f"\n🧠 思考过程总长度: {reasoning_length + splitter.reasoning_length} 字符")
+
+            yield final_event(total_tokens)
 
         return respGenerator()
 
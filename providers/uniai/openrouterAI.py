@@ -1,7 +1,9 @@
 import os
 from openai import OpenAI
 
-def openrouterChatLLM(model_name="openai/gpt-4", api_key=None, system_prompt="", base_url=None, provider_routing=None):
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
+
+def openrouterChatLLM(model_name="openai/gpt-4", api_key=None, system_prompt="", base_url=None, provider_routing=None, http_client=None):
     """
     OpenRouter AI Chat LLM with Provider Routing Support
     
@@ -34,6 +36,7 @@ def openrouterChatLLM(model_name="openai/gpt-4", api_key=None, system_prompt="",
         api_key=api_key,
         base_url=actual_base_url,
         timeout=1800.0,  # 30分钟超时
+        http_client=http_client,  # 共享连接池（由客户端注册表提供）
         default_headers={
             "HTTP-Referer": "https://github.com/cjyyx/AI_Gen_Novel",  # 可选，用于跟踪
             "X-Title": "AI Novel Generator",  # 可选，应用名称
@@ -132,39 +135,30 @@ def openrouterChatLLM(model_name="openai/gpt-4", api_key=None, system_prompt="",
                 responses = client.chat.completions.create(**params)
 
                 def respGenerator():
-                    content = ""
-                    reasoning_content = ""  # 用于累积思考内容
-                    total_tokens = 0
+                    content_parts = []
+                    reasoning_length = 0  # 用于统计思考内容长度
                     
                     for response in responses:
                         if response.choices:
                             delta = response.choices[0].delta
                             
                             # 处理思考内容（reasoning_content）
-                            if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                                new_reasoning = delta.reasoning_content
-                                reasoning_content += new_reasoning
-                                yield {
-                                    "content": content,
-                                    "reasoning_content": reasoning_content,
-                                    "total_tokens": int(total_tokens),
-                                }
+                            new_reasoning = getattr(delta, 'reasoning_content', None) or ""
+                            reasoning_length += len(new_reasoning)
                             
                             # 处理正文内容
-                            if delta.content:
-                                content += delta.content
-                                
-                                # OpenRouter可能不提供流式的token统计，所以我们估算
-                                total_tokens = len(content.split()) * 1.3
-                                
-                                yield {
-                                    "content": content,
-                                    "reasoning_content": reasoning_content,
-                                    "total_tokens": int(total_tokens),
-                                }
+                            new_content = delta.content or ""
+                            if new_content:
+                                content_parts.append(new_content)
+                            
+                            if new_reasoning or new_content:
+                                yield delta_event(new_content, new_reasoning)
                     
-                    if reasoning_content:
-                        print(f"\n🧠 思考过程总长度: {len(reasoning_content)} 字符")
+                    if reasoning_length:
+                        print(f"\n🧠 思考过程总长度: {reasoning_length} 字符")
+
+                    # OpenRouter可能不提供流式的token统计，所以我们估算
+                    yield final_event(estimate_word_tokens(content_parts))
 
                 return respGenerator()
                 
@@ -1,8 +1,10 @@
 import os
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
 
-def siliconflowChatLLM(model_name="deepseek-ai/DeepSeek-V3", api_key=None, system_prompt="", base_url=None, thinking_enabled=False):
+
+def siliconflowChatLLM(model_name="deepseek-ai/DeepSeek-V3", api_key=None, system_prompt="", base_url=None, thinking_enabled=False, http_client=None):
     """
     SiliconFlow AI Chat LLM using OpenAI-compatible API
     
@@ -35,6 +37,7 @@ def siliconflowChatLLM(model_name="deepseek-ai/DeepSeek-V3", api_key=None, syste
         api_key=api_key,
         base_url=actual_base_url,
         timeout=1800.0,  # 30分钟超时
+        http_client=http_client,  # 共享连接池（由客户端注册表提供）
     )
 
     def chatLLM(
@@ -207,9 +210,7 @@ def siliconflowChatLLM(model_name="deepseek-ai/DeepSeek-V3", api_key=None, syste
                 responses = client.chat.completions.create(**params)
 
                 def respGenerator():
-                    content = ""
-                    reasoning_content = ""  # 用于累积思考内容
-                    total_tokens = 0
+                    content_parts = []
                     final_usage = None
                     
                     for response in responses:
@@ -221,43 +222,27 @@ def siliconflowChatLLM(model_name="deepseek-ai/DeepSeek-V3", api_key=None, syste
                             delta = response.choices[0].delta
                             
                             # 处理思考内容（reasoning_content）
-                            if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                                new_reasoning = delta.reasoning_content
-                                reasoning_content += new_reasoning
-                                # 实时yield思考内容（由aign_agents.py负责打印到console）
-                                yield {
-                                    "content": content,
-                                    "reasoning_content": reasoning_content,
-                                    "total_tokens": int(total_tokens),
-                                }
+                            new_reasoning = getattr(delta, 'reasoning_content', None) or ""
                             
                             # 处理正文内容
-                            if hasattr(delta, 'content') and delta.content:
-                                new_content = delta.content
-                                content += new_content
-                                
-                                # 估算token数量（在最终usage返回前使用估算值）
-                                total_tokens = len(content.split()) * 1.3
-                                
-                                yield {
-                                    "content": content,
-                                    "reasoning_content": reasoning_content,
-                                    "total_tokens": int(total_tokens),
-                                }
+                            new_content = getattr(delta, 'content', None) or ""
+                            if new_content:
+                                content_parts.append(new_content)
+                            
+                            # 实时yield增量内容（由aign_agents.py负责打印到console）
+                            if new_reasoning or new_content:
+                                yield delta_event(new_content, new_reasoning)
                     
                     # 流结束后，如果有usage信息，显示详细统计
                     if final_usage:
                         _log_siliconflow_token_usage(final_usage)
                         usage_dict = _extract_usage_dict(final_usage)
-                        
-                        # 生成最终的包含详细Token信息的结果
-                        final_result = {
-                            "content": content,
-                            "reasoning_content": reasoning_content,
-                            "total_tokens": final_usage.total_tokens if final_usage else int(total_tokens),
-                        }
-                        final_result.update(usage_dict)
-                        yield final_result
+                        usage_dict["total_tokens"] = final_usage.total_tokens
+                        # 生成最终的包含详细Token信息的汇总事件
+                        yield final_event(**usage_dict)
+                    else:
+                        # 估算token数量（没有usage返回时使用估算值）
+                        yield final_event(estimate_word_tokens(content_parts))
 
                 return respGenerator()
                 
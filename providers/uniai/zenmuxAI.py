@@ -3,8 +3,10 @@ import time
 import httpx
 from openai import OpenAI
 
+from providers.stream_protocol import delta_event, final_event, estimate_word_tokens
 
-def zenmuxChatLLM(model_name="deepseek/deepseek-v4-flash", api_key=None, system_prompt="", base_url=None, reasoning_effort="high", zenmux_provider=""):
+
+def zenmuxChatLLM(model_name="deepseek/deepseek-v4-flash", api_key=None, system_prompt="", base_url=None, reasoning_effort="high", zenmux_provider="", http_client=None):
     """
     ZenMux Chat LLM - 独立的 ZenMux API 提供商
     
@@ -51,6 +53,7 @@ def zenmuxChatLLM(model_name="deepseek/deepseek-v4-flash", api_key=None, system_
         api_key=api_key,
         base_url=actual_base_url,
         timeout=custom_timeout,
+        http_client=http_client,  # 共享连接池（由客户端注册表提供）
     )
 
     def chatLLM(
@@ -185,9 +188,9 @@ def zenmuxChatLLM(model_name="deepseek/deepseek-v4-flash", api_key=None, system_
                 responses = client.chat.completions.create(**params)
 
                 def respGenerator():
-                    content = ""
-                    reasoning_content = ""
-                    total_tokens = 0
+                    content_parts = []
+                    content_length = 0
+                    reasoning_length = 0
                     last_progress_time = time.time()
                     last_content_length = 0
                     chunk_count = 0
@@ -200,49 +203,42 @@ def zenmuxChatLLM(model_name="deepseek/deepseek-v4-flash", api_key=None, system_
                             delta = response.choices[0].delta
                             
                             # 处理思考内容（reasoning_content）
-                            if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                                new_reasoning = delta.reasoning_content
-                                reasoning_content += new_reasoning
-                                yield {
-                                    "content": content,
-                                    "reasoning_content": reasoning_content,
-                                    "total_tokens": 0,
-                                }
+                            new_reasoning = getattr(delta, 'reasoning_content', None) or ""
+                            reasoning_length += len(new_reasoning)
                             
                             # 处理正文内容
-                            if delta.content:
-                                content += delta.content
-                                
-                                total_tokens = len(content.split()) * 1.3
+                            new_content = delta.content or ""
+                            if new_content:
+                                content_parts.append(new_content)
+                                content_length += len(new_content)
                                 
                                 elapsed_since_progress = current_time - last_progress_time
-                                content_increase = len(content) - last_content_length
+                                content_increase = content_length - last_content_length
                                 
                                 if elapsed_since_progress >= 30 or content_increase >= 1000:
                                     total_elapsed = current_time - stream_start_time
-                                    print(f"\n⏳ ZenMux 流式生成进度: {len(content)} 字符, "
+                                    print(f"\n⏳ ZenMux 流式生成进度: {content_length} 字符, "
                                           f"{chunk_count} 个数据块, 已耗时 {total_elapsed:.1f} 秒")
                                     last_progress_time = current_time
-                                    last_content_length = len(content)
-                                
-                                yield {
-                                    "content": content,
-                                    "reasoning_content": reasoning_content,
-                                    "total_tokens": int(total_tokens),
-                                }
+                                    last_content_length = content_length
+                            
+                            if new_reasoning or new_content:
+                                yield delta_event(new_content, new_reasoning)
                     
                     # 流式生成完成日志
                     total_elapsed = time.time() - stream_start_time
                     elapsed_minutes = total_elapsed / 60
                     if elapsed_minutes > 1:
                         print(f"\n✅ ZenMux 流式生成完成: 总耗时 {elapsed_minutes:.1f} 分钟, "
-                              f"最终长度 {len(content)} 字符, {chunk_count} 个数据块")
+                              f"最终长度 {content_length} 字符, {chunk_count} 个数据块")
                     else:
                         print(f"\n✅ ZenMux 流式生成完成: 总耗时 {total_elapsed:.1f} 秒, "
-                              f"最终长度 {len(content)} 字符, {chunk_count} 个数据块")
+                              f"最终长度 {content_length} 字符, {chunk_count} 个数据块")
                     
-                    if reasoning_content:
-                        print(f"🧠 思考过程总长度: {len(reasoning_content)} 字符")
+                    if reasoning_length:
+                        print(f"🧠 思考过程总长度: {reasoning_length} 字符")
+
+                    yield final_event(estimate_word_tokens(content_parts))
 
                 return respGenerator()
                 
@@ -2,6 +2,8 @@ import os
 
 from zhipuai import ZhipuAI
 
+from providers.stream_protocol import delta_event, final_event
+
 
 def zhipuChatLLM(model_name, api_key=None, system_prompt=""):
     """
@@ -54,21 +56,16 @@ def zhipuChatLLM(model_name, api_key=None, system_prompt=""):
             )
 
             def respGenerator():
-                content = ""
+                total_tokens = None
                 for response in responses:
                     delta = response.choices[0].delta.content
                     if delta:
-                        content += delta
+                        yield delta_event(delta)
 
                     if response.usage:
                         total_tokens = response.usage.total_tokens
-                    else:
-                        total_tokens = None
 
-                    yield {
-                        "content": content,
-                        "total_tokens": total_tokens,
-                    }
+                yield final_event(total_tokens)
 
             return respGenerator()
 
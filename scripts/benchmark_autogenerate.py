@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+autoGenerate 端到端吞吐基准测试（离线假提供商）
+
+把当前提供商切换为 fake（providers/uniai/fakeAI.py），在临时目录里从大纲开始完整跑一遍
+autoGenerate：详细大纲 → 人物列表 → 故事线 → 开头 → 逐章正文/润色/记忆 → 保存 → EPUB。
+假提供商的首字延迟和输出速度可调（默认 0，即只剩编排开销），每个组合报告：
+- 每章编排开销 = 章节墙钟时间 − 假提供商内部耗时（平均 / p50 / p95 / 最大，前10%与后10%章节对比）
+- 内存增长（RSS）
+- 文件 I/O 量（/proc/self/io 的 rchar/wchar，以及输出目录大小）
+终端输出在运行期间被丢弃（--verbose 保留），避免打印内容计入 I/O。
+
+用法:
+    python -m scripts.benchmark_autogenerate [--chapters 50 200 1000] [--modes compact standard long]
+        [--segments 4] [--ttft-ms 0] [--tokens-per-second 0] [--failure-rate 0] [--truncation-rate 0]
+        [--loop-rate 0] [--seed 0] [--json results.json] [--verbose] [--keep]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_local_rag import dir_size
+
+
+MODES = ("compact", "standard", "long")
+POLL_INTERVAL = 0.005
+
+NOVEL_IDEA = "没落镖局的少年押送一封密信穿越七座城池，途中卷入江湖各派对一件古物的争夺"
+NOVEL_OUTLINE = (
+    "少年林远接手父亲留下的镖局，第一单生意是护送一封来历不明的密信。"
+    "途中结识药师苏晚与游侠沈默，三人在渡口、古庙、边城接连遭遇伏击，"
+    "逐渐发现密信与二十年前的一桩灭门旧案有关。各派势力轮番登场，"
+    "林远在押镖途中成长，最终揭开旧案真相，在京城与幕后之人对峙。"
+)
+
+
+class _NullWriter:
+    """丢弃写入的内容（不经过系统调用，不计入 wchar）"""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _rss_bytes() -> int:
+    """当前进程常驻内存，Linux 读 /proc，其他平台退回 ru_maxrss（峰值）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _io_counters():
+    """(rchar, wchar)，不支持的平台返回 None"""
+    try:
+        counters = {}
+        with open("/proc/self/io") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                counters[name.strip()] = int(value)
+        return counters["rchar"], counters["wchar"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def fake_base_url(args, run_id: str) -> str:
+    """run 参数只用于区分客户端注册表中的条目，使每次运行拿到统计清零的新闭包"""
+    return (
+        f"fake://local?ttft_ms={args.ttft_ms:g}&tokens_per_second={args.tokens_per_second:g}"
+        f"&failure_rate={args.failure_rate:g}&truncation_rate={args.truncation_rate:g}&loop_rate={args.loop_rate:g}"
+        f"&seed={args.seed}&run={run_id}"
+    )
+
+
+def run_novel(mode: str, chapters: int, args, work_dir: str) -> dict:
+    """在 work_dir 中完整生成一部 chapters 章的小说，返回测量结果"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+
+    config_manager = get_config_manager()
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=fake_base_url(args, f"{mode}-{chapters}-{time.time_ns()}"),
+    )
+    config_manager.set_current_provider("fake")
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"基准测试-{mode}-{chapters}章"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = mode == "compact"
+    aign.long_chapter_mode = args.segments if mode == "long" else 0
+
+    io_start = _io_counters()
+    rss_start = _rss_bytes()
+    start = time.perf_counter()
+    thread = aign.autoGenerate(chapters)
+
+    # 轮询章节计数：记录每次前进时的墙钟时间、假提供商内部耗时、RSS、I/O
+    samples = []
+    last_count = aign.chapter_count
+    while thread.is_alive():
+        count = aign.chapter_count
+        if count != last_count:
+            samples.append((count, time.perf_counter(), aign.chatLLM.stats["busy_seconds"], _rss_bytes(), _io_counters()))
+            last_count = count
+        time.sleep(POLL_INTERVAL)
+    thread.join()
+    total_time = time.perf_counter() - start
+    io_end = _io_counters()
+    stats = dict(aign.chatLLM.stats)
+
+    # 第一个样本（开头写完，chapter_count=1）之前是准备阶段
+    overheads = []
+    setup_time = samples[0][1] - start if samples else total_time
+    for (count0, t0, busy0, _, _), (count1, t1, busy1, _, _) in zip(samples, samples[1:]):
+        advanced = count1 - count0
+        if advanced <= 0:
+            continue
+        per_chapter = ((t1 - t0) - (busy1 - busy0)) / advanced
+        overheads.extend([per_chapter] * advanced)
+
+    decile = max(1, len(overheads) // 10)
+    result = {
+        "mode": mode,
+        "target_chapters": chapters,
+        "completed_chapters": len(aign.paragraph_list),
+        "total_seconds": total_time,
+        "setup_seconds": setup_time,
+        "llm_calls": stats["calls"],
+        "llm_seconds": stats["busy_seconds"],
+        "injected_failures": stats["failures"],
+        "injected_truncations": stats["truncations"],
+        "injected_loops": stats["loops"],
+        "output_chars": stats["output_chars"],
+        "streamed_chars": stats["streamed_chars"],
+        "overhead_ms": {
+            "mean": sum(overheads) / len(overheads) * 1000 if overheads else 0.0,
+            "p50": _percentile(overheads, 0.5) * 1000,
+            "p95": _percentile(overheads, 0.95) * 1000,
+            "max": max(overheads) * 1000 if overheads else 0.0,
+            "first_10pct": sum(overheads[:decile]) / decile * 1000 if overheads else 0.0,
+            "last_10pct": sum(overheads[-decile:]) / decile * 1000 if overheads else 0.0,
+        },
+        "rss_start_mb": rss_start / 1024 / 1024,
+        "rss_after_setup_mb": samples[0][3] / 1024 / 1024 if samples else rss_start / 1024 / 1024,
+        "rss_end_mb": _rss_bytes() / 1024 / 1024,
+        "output_mb": dir_size(os.path.join(work_dir, "output")) / 1024 / 1024 if os.path.isdir(os.path.join(work_dir, "output")) else 0.0,
+    }
+    if io_start and io_end:
+        result["read_mb"] = (io_end[0] - io_start[0]) / 1024 / 1024
+        result["write_mb"] = (io_end[1] - io_start[1]) / 1024 / 1024
+        if samples and samples[0][4] and samples[-1][4] and len(samples) > 1:
+            chapters_written = samples[-1][0] - samples[0][0]
+            result["write_kb_per_chapter"] = (samples[-1][4][1] - samples[0][4][1]) / 1024 / max(1, chapters_written)
+    return result
+
+
+def print_result(result: dict):
+    overhead = result["overhead_ms"]
+    growth = overhead["last_10pct"] / overhead["first_10pct"] if overhead["first_10pct"] else 0.0
+    written = max(1, result["completed_chapters"] - 1)
+    rss_growth = result["rss_end_mb"] - result["rss_after_setup_mb"]
+    print(f"📊 {result['mode']} / {result['target_chapters']}章: 完成 {result['completed_chapters']}章，"
+          f"总耗时 {result['total_seconds']:.1f} s（准备阶段 {result['setup_seconds']:.1f} s）")
+    print(f"   LLM: {result['llm_calls']} 次调用，提供商内部 {result['llm_seconds']:.1f} s"
+          f"（注入失败 {result['injected_failures']}，注入截断 {result['injected_truncations']}，注入循环 {result['injected_loops']}）")
+    if result["injected_loops"]:
+        print(f"   重复循环: 提供商生成 {result['output_chars']:,} 字，实际接收 {result['streamed_chars']:,} 字"
+              f"（提前断开少接收 {result['output_chars'] - result['streamed_chars']:,} 字）")
+    print(f"   每章编排开销: 平均 {overhead['mean']:.1f} ms / p50 {overhead['p50']:.1f} / p95 {overhead['p95']:.1f} / 最大 {overhead['max']:.1f}")
+    print(f"   开销趋势: 前10%章节 {overhead['first_10pct']:.1f} ms → 后10%章节 {overhead['last_10pct']:.1f} ms（×{growth:.2f}）")
+    print(f"   内存: RSS {result['rss_start_mb']:.0f} → {result['rss_after_setup_mb']:.0f}（准备后）→ {result['rss_end_mb']:.0f} MB"
+          f"（逐章阶段 {rss_growth:+.1f} MB，每章 {rss_growth * 1024 / written:+.1f} KB）")
+    if "write_mb" in result:
+        per_chapter = f"，每章写入 {result['write_kb_per_chapter']:.0f} KB" if "write_kb_per_chapter" in result else ""
+        print(f"   文件 I/O: 读取 {result['read_mb']:.1f} MB，写入 {result['write_mb']:.1f} MB{per_chapter}，输出目录 {result['output_mb']:.1f} MB")
+    else:
+        print(f"   文件 I/O: 输出目录 {result['output_mb']:.1f} MB（当前平台不支持 /proc/self/io）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="autoGenerate 端到端吞吐基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, nargs="+", default=[50], help="目标章节数，可给多个（如 50 200 1000，默认50）")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="生成模式（默认全部）")
+    parser.add_argument("--segments", type=int, default=4, choices=[2, 3, 4], help="长章节模式的分段数（默认4）")
+    parser.add_argument("--ttft-ms", type=float, default=0, help="假提供商首字延迟（毫秒，默认0）")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="假提供商输出速度（0=不限速）")
+    parser.add_argument("--failure-rate", type=float, default=0, help="请求失败注入概率（默认0）")
+    parser.add_argument("--truncation-rate", type=float, default=0, help="响应截断注入概率（默认0）")
+    parser.add_argument("--loop-rate", type=float, default=0, help="重复循环注入概率（默认0）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子（默认0）")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件，便于比较不同版本")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（输出文件、存档）")
+    args = parser.parse_args(argv)
+
+    original_cwd = os.getcwd()
+    json_path = os.path.abspath(args.json) if args.json else None
+    root_dir = tempfile.mkdtemp(prefix="autogen_bench_")
+    results = []
+    ok = True
+    try:
+        for chapters in args.chapters:
+            for mode in args.modes:
+                # 输出目录、runtime_config.json、存档都写在各自的临时目录里
+                work_dir = os.path.join(root_dir, f"{mode}_{chapters}")
+                os.makedirs(work_dir)
+                os.chdir(work_dir)
+                print(f"🚀 {mode} / {chapters}章 生成中...", flush=True)
+                output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+                with output:
+                    result = run_novel(mode, chapters, args, work_dir)
+                os.chdir(original_cwd)
+                print_result(result)
+                results.append(result)
+                ok &= result["completed_chapters"] >= chapters
+    finally:
+        os.chdir(original_cwd)
+        if args.keep:
+            print(f"📁 临时目录已保留: {root_dir}")
+        else:
+            shutil.rmtree(root_dir, ignore_errors=True)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已写入 {json_path}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
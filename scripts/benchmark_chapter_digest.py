@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+章节摘要合并基准测试（离线假提供商）
+
+每章完成后的记账（前文记忆、全局设定、章节总结）原本是三次请求，各自发送一遍本章正文和人物列表、大纲等输入。
+对每种方式完整跑一遍 autoGenerate，比较请求数、发送的 Token（token_accumulation_stats）与耗时：
+- separate  三个智能体分别请求（chapter_digest=False）
+- digest    合并为一次章节摘要请求（chapter_digest=True），解析失败的部分回退到单独请求
+
+用法:
+    python -m scripts.benchmark_chapter_digest [--chapters 4] [--mode compact|standard]
+        [--strategies separate digest] [--tokens-per-second 3000] [--seed 0] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+
+
+STRATEGIES = ("separate", "digest")
+
+# 记账请求所属的统计类别（全局设定追踪器与章节总结生成器计入"其他"）
+BOOKKEEPING_CATEGORIES = ("记忆生成", "章节摘要", "其他")
+
+
+def run_novel(strategy: str, args) -> dict:
+    """用指定的记账方式生成一部小说，返回耗时、请求数与发送 Token 统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+
+    config_manager = get_config_manager()
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=f"fake://local?tokens_per_second={args.tokens_per_second:g}&seed={args.seed}&run={strategy}-{time.time_ns()}",
+    )
+    config_manager.set_current_provider("fake")
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"章节摘要基准-{strategy}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = args.mode == "compact"
+    aign.chapter_digest = strategy == "digest"
+
+    start = time.perf_counter()
+    aign.autoGenerate(args.chapters).join()
+    elapsed = time.perf_counter() - start
+
+    sent = aign.token_accumulation_stats["sent"]
+    return {
+        "chapters": aign.chapter_count,
+        "seconds": elapsed,
+        "calls": aign.chatLLM.stats["calls"],
+        "sent_tokens": sum(entry["tokens"] for entry in sent.values()),
+        "bookkeeping_tokens": sum(sent[category]["tokens"] for category in BOOKKEEPING_CATEGORIES),
+        "digest_stats": dict(aign.chapter_digest_stats),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="章节摘要合并基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, default=4, help="生成章节数（默认4）")
+    parser.add_argument("--mode", choices=("compact", "standard"), default="compact", help="生成模式（默认compact）")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES),
+                        help="比较的记账方式（默认全部）")
+    parser.add_argument("--tokens-per-second", type=float, default=3000, help="假提供商输出速度（默认3000）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="chapter_digest_bench_")
+    original_cwd = os.getcwd()
+    results = {}
+    try:
+        for strategy in args.strategies:
+            work_dir = os.path.join(root, strategy)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 {args.mode} / {args.chapters}章 / 记账方式 {strategy} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[strategy] = run_novel(strategy, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"📊 章节摘要合并（{args.mode}，{args.chapters}章）")
+    for strategy, result in results.items():
+        line = (f"   {strategy:8s} 总耗时 {result['seconds']:6.1f} s，请求 {result['calls']} 次，"
+                f"发送 {result['sent_tokens']:,} tokens（记账 {result['bookkeeping_tokens']:,}）")
+        digest_stats = result["digest_stats"]
+        if digest_stats["chapters"]:
+            line += (f"，摘要 {digest_stats['chapters']} 章，回退 {digest_stats['fallbacks']} 项，"
+                     f"估算节省 {digest_stats['saved_tokens']:,} tokens")
+        print(line)
+    if "separate" in results and "digest" in results:
+        saved = results["separate"]["bookkeeping_tokens"] - results["digest"]["bookkeeping_tokens"]
+        print(f"💰 记账发送 Token 减少 {saved:,}（{saved / max(results['separate']['bookkeeping_tokens'], 1):.0%}）")
+    complete = all(result["chapters"] >= args.chapters for result in results.values())
+    if not complete:
+        print("❌ 有运行未生成全部章节")
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+章节索引基准测试
+
+在一部合成的长篇小说（默认1000章，每章约3000字，正文中会回顾前文章节）上，
+为每一章构建一次上下文（前5章总结、后5章梗概、上一章原文、前三章正文、最近15章总结），
+分别走：
+- 旧路径：f"第{i}章" in paragraph 子串扫描 paragraph_list + 线性遍历 storyline["chapters"]
+- 新路径：ChapterIndex（标题行解析 + 章节号索引）
+
+用法:
+    python -m scripts.benchmark_chapter_index [--chapters 1000] [--chapter-chars 3000] [--mention-rate 0.3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chapter_index import ChapterIndex
+
+
+FILLER = "夜色如墨，山风卷过古道，他握紧手中的长剑，心中却比任何时候都要平静。"
+
+
+def build_synthetic_novel(chapters: int, chapter_chars: int, mention_rate: float, seed: int = 42):
+    """生成确定性的合成小说：正文按章节存储，部分章节在正文中回顾更早的章节"""
+    rng = random.Random(seed)
+    paragraph_list = []
+    storyline = {"chapters": []}
+    body_repeat = max(1, chapter_chars // len(FILLER))
+    for n in range(1, chapters + 1):
+        body = FILLER * body_repeat
+        if n > 1 and rng.random() < mention_rate:
+            # 回顾前文，例如"他想起第3章里…"，子串匹配会把它当成第3章
+            earlier = rng.randint(1, n - 1)
+            body += f"\n他想起第{earlier}章里那场大雨。"
+        paragraph_list.append(f"第{n}章：标题{n}\n\n{body}")
+        storyline["chapters"].append({
+            "chapter_number": n,
+            "title": f"标题{n}",
+            "plot_summary": f"第{n}章梗概",
+        })
+    # 故事线条目顺序被打乱（合并、修复后常见），线性查找需要更多比较
+    rng.shuffle(storyline["chapters"])
+    return paragraph_list, storyline
+
+
+def legacy_storyline_lookup(storyline, number):
+    for ch in storyline.get("chapters", []):
+        if ch.get("chapter_number") == number:
+            return ch
+    return None
+
+
+def legacy_context(paragraph_list, storyline, chapter_number, target):
+    """旧 getEnhancedContext + getEnhancedContextWithFirstThreeChapters 的查找逻辑"""
+    parts = []
+    for i in range(max(1, chapter_number - 5), chapter_number):
+        ch = legacy_storyline_lookup(storyline, i)
+        if ch:
+            parts.append(ch["plot_summary"])
+    for i in range(chapter_number + 1, min(chapter_number + 6, target + 1)):
+        ch = legacy_storyline_lookup(storyline, i)
+        if ch:
+            parts.append(ch["plot_summary"])
+
+    last_chapter = ""
+    if chapter_number > 1:
+        for paragraph in reversed(paragraph_list):
+            if f"第{chapter_number - 1}章" in paragraph:
+                last_chapter = paragraph
+                break
+
+    prev_three = []
+    for i in range(max(1, chapter_number - 4), max(1, chapter_number - 1)):
+        for paragraph in paragraph_list:
+            if f"第{i}章" in paragraph:
+                prev_three.append(paragraph)
+                break
+
+    for i in range(max(1, chapter_number - 15), chapter_number):
+        ch = legacy_storyline_lookup(storyline, i)
+        if ch:
+            parts.append(ch["plot_summary"])
+    return last_chapter, prev_three, parts
+
+
+def indexed_context(index, paragraph_list, storyline, chapter_number, target):
+    """使用 ChapterIndex 的查找逻辑"""
+    parts = []
+    for i in range(max(1, chapter_number - 5), chapter_number):
+        ch = index.get_storyline_chapter(storyline, i)
+        if ch:
+            parts.append(ch["plot_summary"])
+    for i in range(chapter_number + 1, min(chapter_number + 6, target + 1)):
+        ch = index.get_storyline_chapter(storyline, i)
+        if ch:
+            parts.append(ch["plot_summary"])
+
+    last_chapter = index.get_paragraph(paragraph_list, chapter_number - 1) if chapter_number > 1 else ""
+
+    prev_three = []
+    for i in range(max(1, chapter_number - 4), max(1, chapter_number - 1)):
+        paragraph = index.get_paragraph(paragraph_list, i)
+        if paragraph:
+            prev_three.append(paragraph)
+
+    for i in range(max(1, chapter_number - 15), chapter_number):
+        ch = index.get_storyline_chapter(storyline, i)
+        if ch:
+            parts.append(ch["plot_summary"])
+    return last_chapter, prev_three, parts
+
+
+def run_generation(paragraph_list, storyline, builder):
+    """模拟逐章生成：第N章构建上下文时 paragraph_list 只包含前 N-1 章"""
+    target = len(paragraph_list)
+    committed = []
+    results = []
+    start = time.perf_counter()
+    for n in range(1, target + 1):
+        results.append(builder(committed, storyline, n, target))
+        committed.append(paragraph_list[n - 1])
+    return time.perf_counter() - start, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="章节索引基准测试（子串扫描 vs 章节号索引）")
+    parser.add_argument("--chapters", type=int, default=1000, help="合成小说的章节数（默认1000）")
+    parser.add_argument("--chapter-chars", type=int, default=3000, help="每章大约的字符数（默认3000）")
+    parser.add_argument("--mention-rate", type=float, default=0.3, help="正文回顾前文章节的比例（默认0.3）")
+    args = parser.parse_args(argv)
+
+    paragraph_list, storyline = build_synthetic_novel(args.chapters, args.chapter_chars, args.mention_rate)
+    total_chars = sum(len(p) for p in paragraph_list)
+
+    legacy_time, legacy_results = run_generation(paragraph_list, storyline, legacy_context)
+    index = ChapterIndex()
+    indexed_time, indexed_results = run_generation(
+        paragraph_list, storyline,
+        lambda committed, sl, n, target: indexed_context(index, committed, sl, n, target),
+    )
+
+    # 正确性：上一章原文必须以"第N-1章："开头
+    legacy_wrong = sum(
+        1 for n, (last, _, _) in enumerate(legacy_results, 1)
+        if n > 1 and not last.startswith(f"第{n - 1}章：")
+    )
+    indexed_wrong = sum(
+        1 for n, (last, _, _) in enumerate(indexed_results, 1)
+        if n > 1 and not last.startswith(f"第{n - 1}章：")
+    )
+    summaries_match = all(a[2] == b[2] for a, b in zip(legacy_results, indexed_results))
+
+    # 修复场景：列表中已有全部章节（重新生成缺失章节时），倒序子串扫描会命中后文的回顾
+    repair_legacy_wrong = 0
+    repair_indexed_wrong = 0
+    for n in range(1, args.chapters + 1):
+        legacy_hit = next((p for p in reversed(paragraph_list) if f"第{n}章" in p), "")
+        if not legacy_hit.startswith(f"第{n}章："):
+            repair_legacy_wrong += 1
+        if not index.get_paragraph(paragraph_list, n).startswith(f"第{n}章："):
+            repair_indexed_wrong += 1
+    indexed_wrong += repair_indexed_wrong
+
+    print(f"📊 章节索引基准测试（{args.chapters}章，共{total_chars}字符，回顾前文比例{args.mention_rate:.0%}）")
+    print(f"   旧路径（子串扫描 + 线性查找）: {legacy_time * 1000:.1f} ms")
+    print(f"   新路径（章节号索引）:          {indexed_time * 1000:.1f} ms")
+    if indexed_time > 0:
+        print(f"   加速比: {legacy_time / indexed_time:.1f}x")
+    print(f"   逐章生成时上一章原文取错: 旧路径 {legacy_wrong} 次 / 新路径 {indexed_wrong - repair_indexed_wrong} 次")
+    print(f"   修复场景章节原文取错: 旧路径 {repair_legacy_wrong} 次 / 新路径 {repair_indexed_wrong} 次")
+    print(f"   故事线总结一致: {'是' if summaries_match else '否'}")
+    print(f"   索引统计: {index.stats}")
+    return 0 if indexed_wrong == 0 and summaries_match else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
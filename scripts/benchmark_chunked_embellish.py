@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分块并行润色基准测试（离线假提供商）
+
+假提供商按 --prose-chars 生成长章节草稿，润色输出为原文的 --embellish-ratio 倍，单次响应超过
+--max-output-chars 时在上限处截断（模拟模型的最大输出长度），并按 --truncation-rate 随机截断。对每种润色方式完整跑一遍 autoGenerate，
+比较总耗时、请求数、注入的截断次数与润色回退原文的情况：
+- whole    整章一次润色（embellish_chunks=1），截断后整章续写/重试
+- chunked  分块并行润色（embellish_chunks=--chunks），每块单独检测截断、只重试失败的块
+
+用法:
+    python -m scripts.benchmark_chunked_embellish [--chapters 3] [--mode compact|standard]
+        [--strategies whole chunked] [--chunks 4] [--chunk-min-chars 5000] [--prose-chars 6000]
+        [--embellish-ratio 1.5] [--max-output-chars 8000]
+        [--truncation-rate 0.1] [--no-resume] [--tokens-per-second 3000] [--seed 0] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+
+
+STRATEGIES = ("whole", "chunked")
+
+
+def run_novel(strategy: str, args) -> dict:
+    """用指定的润色方式生成一部小说，返回耗时、请求数与分块润色统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+
+    config_manager = get_config_manager()
+    config_manager.set_resume_partial(not args.no_resume)
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=(f"fake://local?tokens_per_second={args.tokens_per_second:g}&prose_chars={args.prose_chars}"
+                  f"&embellish_ratio={args.embellish_ratio:g}&max_output_chars={args.max_output_chars}&truncation_rate={args.truncation_rate:g}"
+                  f"&seed={args.seed}&run={strategy}-{time.time_ns()}"),
+    )
+    config_manager.set_current_provider("fake")
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"分块润色基准-{strategy}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = args.mode == "compact"
+    aign.embellish_chunks = args.chunks if strategy == "chunked" else 1
+    aign.embellish_chunk_min_chars = args.chunk_min_chars
+
+    start = time.perf_counter()
+    aign.autoGenerate(args.chapters).join()
+    elapsed = time.perf_counter() - start
+
+    stats = aign.chatLLM.stats
+    return {
+        "chapters": aign.chapter_count,
+        "seconds": elapsed,
+        "calls": stats["calls"],
+        "truncations": stats["truncations"],
+        "output_chars": stats["output_chars"],
+        "chunk_stats": dict(aign.embellish_chunk_stats),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分块并行润色基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, default=3, help="生成章节数（默认3）")
+    parser.add_argument("--mode", choices=("compact", "standard"), default="compact", help="生成模式（默认compact）")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES),
+                        help="比较的润色方式（默认全部）")
+    parser.add_argument("--chunks", type=int, default=4, help="chunked 的分块数（默认4）")
+    parser.add_argument("--chunk-min-chars", type=int, default=5000, help="正文达到此长度才分块（默认5000）")
+    parser.add_argument("--prose-chars", type=int, default=6000, help="每章草稿长度（默认6000字）")
+    parser.add_argument("--embellish-ratio", type=float, default=1.5, help="润色输出相对原文的长度倍数（默认1.5）")
+    parser.add_argument("--max-output-chars", type=int, default=8000, help="单次响应的输出上限（默认8000字，0=不限）")
+    parser.add_argument("--truncation-rate", type=float, default=0.1, help="响应被随机截断的概率（默认0.1）")
+    parser.add_argument("--no-resume", action="store_true", help="关闭断点续写（截断后从头重试）")
+    parser.add_argument("--tokens-per-second", type=float, default=3000, help="假提供商输出速度（默认3000）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="chunked_embellish_bench_")
+    original_cwd = os.getcwd()
+    results = {}
+    try:
+        for strategy in args.strategies:
+            work_dir = os.path.join(root, strategy)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 {args.mode} / {args.chapters}章 / 润色方式 {strategy} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[strategy] = run_novel(strategy, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"📊 分块并行润色（{args.mode}，{args.chapters}章，草稿 {args.prose_chars} 字，润色扩写 {args.embellish_ratio:g} 倍，输出上限 {args.max_output_chars} 字，"
+          f"截断概率 {args.truncation_rate:g}，断点续写{'关闭' if args.no_resume else '开启'}）")
+    for strategy, result in results.items():
+        line = (f"   {strategy:7s} 总耗时 {result['seconds']:6.1f} s，请求 {result['calls']} 次，"
+                f"截断 {result['truncations']} 次，提供商输出 {result['output_chars']:,} 字")
+        chunk_stats = result["chunk_stats"]
+        if chunk_stats["chapters"]:
+            line += (f"，分块 {chunk_stats['chunks']} 块（回退原文 {chunk_stats['fallbacks']}，交界去重 {chunk_stats['seams']}），"
+                     f"润色墙钟 {chunk_stats['wall_seconds']:.1f} s / 串行 {chunk_stats['serial_seconds']:.1f} s")
+        print(line)
+    if "whole" in results and "chunked" in results:
+        saved = results["whole"]["seconds"] - results["chunked"]["seconds"]
+        print(f"⏱️ 分块润色节省 {saved:.1f} s（{saved / max(results['whole']['seconds'], 1e-6):.0%}）")
+    complete = all(result["chapters"] >= args.chapters for result in results.values())
+    if not complete:
+        print("❌ 有运行未生成全部章节")
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
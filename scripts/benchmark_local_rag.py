@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地 RAG 索引基准测试
+
+在临时目录生成合成参考文本（或使用 --source 指定真实目录），测量：
+- 全量构建耗时、索引大小
+- 冷加载（mmap）耗时
+- 单次检索延迟 p50 / p95（正文生成阶段典型查询：故事线梗概 + 写作要求）
+- 增量添加一批新文件的耗时，以及新片段能被检索到
+安装了 NumPy 时同时比较向量化与纯 Python 打分的结果一致性和耗时。
+
+用法:
+    python -m scripts.benchmark_local_rag [--files 200] [--chars-per-file 20000] [--queries 200] [--source DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import local_rag_index
+from utils.local_rag_index import LocalRAGIndex
+
+
+PHRASES = [
+    "月光洒落在青石板上", "他握紧手中的长剑", "远处传来阵阵钟声", "少女低头浅笑", "山风卷起满地落叶",
+    "城门缓缓打开", "茶香在屋内弥漫", "雨水顺着屋檐滴落", "老人叹了口气", "剑光一闪而过",
+    "夜色中灯火摇曳", "她的眼眶微微泛红", "马蹄声由远及近", "众人面面相觑", "殿内一片死寂",
+    "春风拂过湖面", "少年咬紧牙关", "雪花纷纷扬扬", "他心中一震", "窗外的竹影摇晃",
+]
+TYPES = ["scene", "dialogue", "emotion", "action"]
+
+
+def generate_corpus(source_dir: str, files: int, chars_per_file: int, seed: int = 11, prefix: str = "book"):
+    rng = random.Random(seed)
+    for i in range(files):
+        doc_type = TYPES[i % len(TYPES)]
+        os.makedirs(os.path.join(source_dir, doc_type), exist_ok=True)
+        paragraphs = []
+        length = 0
+        while length < chars_per_file:
+            paragraph = "，".join(rng.choice(PHRASES) for _ in range(rng.randint(3, 8))) + "。"
+            paragraphs.append(paragraph)
+            length += len(paragraph)
+        with open(os.path.join(source_dir, doc_type, f"{prefix}_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paragraphs))
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def time_queries(index: LocalRAGIndex, queries: list, top_k: int = 10):
+    timings = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, top_k=top_k, min_similarity=0.3))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return p50, p95, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 RAG 索引基准测试（BM25 + mmap）")
+    parser.add_argument("--files", type=int, default=200, help="合成参考文本文件数（默认200）")
+    parser.add_argument("--chars-per-file", type=int, default=20000, help="每个文件的字符数（默认20000）")
+    parser.add_argument("--queries", type=int, default=200, help="检索次数（默认200）")
+    parser.add_argument("--source", default=None, help="使用真实参考文本目录代替合成语料")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="local_rag_bench_")
+    ok = True
+    try:
+        source_dir = args.source or os.path.join(work_dir, "source")
+        if not args.source:
+            generate_corpus(source_dir, args.files, args.chars_per_file)
+        index_dir = os.path.join(work_dir, "index")
+
+        start = time.perf_counter()
+        index = LocalRAGIndex.build(source_dir, index_dir)
+        build_time = time.perf_counter() - start
+        stats = index.get_stats()
+        index.close()
+
+        start = time.perf_counter()
+        index = LocalRAGIndex(index_dir)
+        load_time = time.perf_counter() - start
+
+        rng = random.Random(5)
+        queries = [
+            "".join(rng.choice(PHRASES) for _ in range(3)) + " 文笔细腻，注重环境描写与人物情绪"
+            for _ in range(args.queries)
+        ]
+        p50, p95, results = time_queries(index, queries)
+        hit_rate = sum(1 for r in results if r) / len(results)
+
+        print(f"📊 本地 RAG 索引（{stats['total_documents']}个片段，索引 {dir_size(index_dir) / 1024 / 1024:.1f} MB，NumPy: {'是' if stats['numpy'] else '否'}）")
+        print(f"   全量构建: {build_time:.2f} s")
+        print(f"   冷加载:   {load_time * 1000:.1f} ms")
+        print(f"   检索延迟: p50 {p50 * 1000:.2f} ms / p95 {p95 * 1000:.2f} ms（命中率 {hit_rate:.0%}）")
+
+        if local_rag_index.np is not None:
+            numpy_module = local_rag_index.np
+            local_rag_index.np = None
+            try:
+                pure_index = LocalRAGIndex(index_dir)
+                pure_p50, pure_p95, pure_results = time_queries(pure_index, queries)
+                pure_index.close()
+            finally:
+                local_rag_index.np = numpy_module
+            same = all(
+                [(r["content"], round(r["similarity"], 3)) for r in a] == [(r["content"], round(r["similarity"], 3)) for r in b]
+                for a, b in zip(results, pure_results)
+            )
+            ok &= same
+            print(f"   纯 Python 打分: p50 {pure_p50 * 1000:.2f} ms / p95 {pure_p95 * 1000:.2f} ms，结果一致: {'是' if same else '否'}")
+
+        # 增量添加：只写新段，已索引文件跳过
+        if not args.source:
+            generate_corpus(source_dir, 10, args.chars_per_file, seed=99, prefix="added")
+            with open(os.path.join(source_dir, "scene", "added_marker.txt"), "w", encoding="utf-8") as f:
+                f.write("青铜巨鼎在地宫深处嗡鸣，符文一圈圈亮起。")
+            start = time.perf_counter()
+            added = index.add_directory(source_dir)
+            add_time = time.perf_counter() - start
+            found = index.search("青铜巨鼎地宫符文", top_k=1, min_similarity=0.3)
+            ok &= bool(found) and "青铜巨鼎" in found[0]["content"]
+            print(f"   增量添加: {added}个片段，{add_time * 1000:.0f} ms，段数 {index.get_stats()['segments']}，新片段可检索: {'是' if found else '否'}")
+        index.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
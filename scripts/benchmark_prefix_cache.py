@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+提示词前缀缓存基准测试（离线假提供商）
+
+假提供商按与最近请求的最长公共前缀报告 prompt_cache_hit_tokens（与 DeepSeek 上下文缓存相同的字段），
+对每种前缀缓存规划模式完整跑一遍 autoGenerate，比较：
+- 提供商报告的缓存命中率（命中 Token / 输入 Token）
+- 按 DeepSeek 计价比例（缓存命中输入价格为未命中的 1/10）估算的输入费用
+- 规划器检测到的前缀失效次数，以及失效最多的智能体（off 模式不计算指纹，失效次数为 0）
+
+off 即规划器引入前的行为（输入按调用方顺序拼接，"当前全局设定"排在大纲之前），作为基线。
+默认在章节之间模拟实际使用中会让前缀失效的变化（--steady 关闭）：
+- 大纲在详细大纲与基础大纲之间切换（奇数章用详细大纲）
+- 写作要求每 3 章清空一次（空字段不会发送，其后的字段整体前移）
+- 提供商系统提示词每 4 章发送一次
+
+用法:
+    python -m scripts.benchmark_prefix_cache [--chapters 20] [--mode compact|standard|long]
+        [--planner-modes off warn fix] [--segments 4] [--steady] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+
+
+HIT_PRICE_RATIO = 0.1   # 缓存命中的输入价格 / 未命中的输入价格
+USER_REQUIREMENTS = "节奏紧凑，对话自然"
+PROVIDER_SYSTEM_PROMPT = "你是一位资深网络小说作家，输出简体中文，不使用 Markdown 标题。"
+
+
+def run_novel(planner_mode: str, args) -> dict:
+    """用指定的前缀缓存规划模式生成一部小说，返回缓存统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+
+    config_manager = get_config_manager()
+    config_manager.set_prefix_cache_mode(planner_mode)
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=f"fake://local?seed={args.seed}&run={planner_mode}-{time.time_ns()}",
+    )
+    config_manager.set_current_provider("fake")
+
+    class VaryingAIGN(AIGN):
+        """每章开始前（WebUI 实时设置刷新点）施加会让前缀失效的变化"""
+
+        def _refresh_webui_settings(self):
+            chapter = self.chapter_count + 1
+            self.use_detailed_outline = chapter % 2 == 1
+            self.user_requirements = "" if chapter % 3 == 0 else USER_REQUIREMENTS
+            config_manager.update_provider_config(
+                "fake", api_key="fake", model_name="fake-novelist",
+                system_prompt=PROVIDER_SYSTEM_PROMPT if chapter % 4 == 0 else "",
+            )
+            super()._refresh_webui_settings()
+
+    aign_class = AIGN if args.steady else VaryingAIGN
+    aign = aign_class(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"前缀缓存基准-{planner_mode}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = USER_REQUIREMENTS
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = args.mode == "compact"
+    aign.long_chapter_mode = args.segments if args.mode == "long" else 0
+
+    try:
+        aign.autoGenerate(args.chapters).join()
+    finally:
+        config_manager.update_provider_config("fake", api_key="fake", model_name="fake-novelist", system_prompt="")
+
+    cache_stats = aign.siliconflow_cache_stats
+    hit = cache_stats.get("total_prompt_cache_hit", 0)
+    miss = cache_stats.get("total_prompt_cache_miss", 0)
+    worst = sorted(aign.prefix_planner.stats().items(), key=lambda item: -item[1]["invalidations"])[:3]
+    return {
+        "chapters": aign.chapter_count,
+        "hit_tokens": hit,
+        "prompt_tokens": hit + miss,
+        "hit_rate": hit / (hit + miss) if hit + miss else 0.0,
+        "relative_cost": (hit * HIT_PRICE_RATIO + miss) / (hit + miss) if hit + miss else 1.0,
+        "invalidations": aign.prefix_planner.totals()["invalidations"],
+        "worst_agents": [(name, stats["invalidations"]) for name, stats in worst if stats["invalidations"]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="提示词前缀缓存基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, default=20, help="生成章节数（默认20）")
+    parser.add_argument("--mode", choices=("compact", "standard", "long"), default="standard", help="生成模式（默认standard）")
+    parser.add_argument("--planner-modes", nargs="+", choices=("off", "warn", "fix"), default=["off", "fix"],
+                        help="比较的前缀缓存规划模式（默认 off fix）")
+    parser.add_argument("--segments", type=int, default=4, help="long 模式的每章分段数（默认4）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子")
+    parser.add_argument("--steady", action="store_true", help="不模拟章节间的大纲/写作要求/系统提示词变化")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="prefix_cache_bench_")
+    original_cwd = os.getcwd()
+    results = {}
+    try:
+        for planner_mode in args.planner_modes:
+            work_dir = os.path.join(root, planner_mode)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 {args.mode} / {args.chapters}章 / 规划模式 {planner_mode} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[planner_mode] = run_novel(planner_mode, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    scenario = "无章节间变化" if args.steady else "大纲切换/写作要求清空/系统提示词时有时无"
+    print(f"📊 提示词前缀缓存（{args.mode}，{args.chapters}章，{scenario}，命中输入按 {HIT_PRICE_RATIO:g} 倍计价）")
+    for planner_mode, result in results.items():
+        print(f"   {planner_mode:5s} 命中率 {result['hit_rate'] * 100:5.1f}%"
+              f"（{result['hit_tokens']:,} / {result['prompt_tokens']:,} tokens），"
+              f"相对输入费用 {result['relative_cost'] * 100:5.1f}%，检测到前缀失效 {result['invalidations']} 次")
+        if result["worst_agents"]:
+            print(f"         失效最多: {', '.join(f'{name}×{count}' for name, count in result['worst_agents'])}")
+    complete = all(result["chapters"] >= args.chapters for result in results.values())
+    if not complete:
+        print("❌ 有运行未生成全部章节")
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
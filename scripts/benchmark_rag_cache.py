@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+RAG 检索缓存基准测试
+
+模拟长章节生成时的查询模式（正文分段检索 + 分段润色 + 整章润色，润色查询 = 关键元素 + 润色要求），
+检索后端为临时构建的本地 BM25 索引，后端调用额外加上固定延迟模拟网络往返。比较：
+- 无缓存：每个查询都请求后端
+- 两级缓存：内存 LRU + 磁盘层；再用新的缓存对象（模拟重启）重放一遍，验证磁盘层命中
+并检查缓存命中返回的结果与直接检索一致（近似命中除外）。
+
+用法:
+    python -m scripts.benchmark_rag_cache [--chapters 10] [--segments 4] [--latency-ms 40]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_local_rag import PHRASES, generate_corpus
+from utils.local_rag_index import LocalRAGIndex
+from utils.rag_cache import RAGRetrievalCache
+
+
+EMBELLISHMENT_IDEA = "文笔细腻，注重环境描写与人物情绪，对话简洁有力，避免重复用词"
+
+
+class SlowBackend:
+    """在本地索引外加固定延迟，模拟 HTTP 服务往返"""
+
+    def __init__(self, index: LocalRAGIndex, latency: float):
+        self.index = index
+        self.latency = latency
+        self.calls = 0
+        self.cache_namespace = index.cache_namespace
+
+    def search_many(self, queries, top_k=10, min_similarity=0.3):
+        self.calls += len(queries)
+        time.sleep(self.latency)
+        return self.index.search_many(queries, top_k, min_similarity)
+
+
+def chapter_queries(chapters: int, segments: int) -> list:
+    """按 _generate_paragraph_internal 的调用顺序生成每章的查询批次"""
+    rng = random.Random(17)
+    batches = []
+    for _ in range(chapters):
+        key_elements = "【场景描写】" + "，".join(rng.choice(PHRASES) for _ in range(4))
+        seg_outlines = ["，".join(rng.choice(PHRASES) for _ in range(3)) for _ in range(segments)]
+        batches.append(seg_outlines)                                                # 正文分段检索
+        for seg in seg_outlines:
+            batches.append([f"{key_elements} {EMBELLISHMENT_IDEA}"])                # 分段润色
+        batches.append([f"{key_elements}  {EMBELLISHMENT_IDEA}"])                   # 整章润色（空白不同）
+    return batches
+
+
+def run(backend: SlowBackend, batches: list, cache: RAGRetrievalCache = None):
+    results = []
+    start = time.perf_counter()
+    for queries in batches:
+        if cache is None:
+            results.extend(backend.search_many(queries))
+            continue
+        cached = [cache.get(backend.cache_namespace, q, 10, 0.3) for q in queries]
+        missing = list(dict.fromkeys(q for q, c in zip(queries, cached) if c is None))
+        fetched = dict(zip(missing, backend.search_many(missing))) if missing else {}
+        for q, r in fetched.items():
+            cache.put(backend.cache_namespace, q, 10, 0.3, r)
+        results.extend(c if c is not None else fetched[q] for q, c in zip(queries, cached))
+    return time.perf_counter() - start, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG 检索缓存基准测试（内存 LRU + 磁盘层）")
+    parser.add_argument("--chapters", type=int, default=10, help="模拟章节数（默认10）")
+    parser.add_argument("--segments", type=int, default=4, help="每章分段数（默认4）")
+    parser.add_argument("--latency-ms", type=float, default=40, help="模拟的后端往返延迟（毫秒，默认40）")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="rag_cache_bench_")
+    ok = True
+    try:
+        source_dir = os.path.join(work_dir, "source")
+        generate_corpus(source_dir, 20, 5000)
+        index = LocalRAGIndex.build(source_dir, os.path.join(work_dir, "index"))
+        backend = SlowBackend(index, args.latency_ms / 1000)
+        batches = chapter_queries(args.chapters, args.segments)
+        total_queries = sum(len(b) for b in batches)
+
+        plain_time, plain_results = run(backend, batches)
+        plain_calls, backend.calls = backend.calls, 0
+
+        cache_dir = os.path.join(work_dir, "cache")
+        cache = RAGRetrievalCache(cache_dir=cache_dir, fuzzy_threshold=None)
+        cached_time, cached_results = run(backend, batches, cache)
+        cached_calls, backend.calls = backend.calls, 0
+        same = cached_results == plain_results
+        ok &= same
+
+        restarted = RAGRetrievalCache(cache_dir=cache_dir, fuzzy_threshold=None)
+        restart_time, restart_results = run(backend, batches, restarted)
+        ok &= restart_results == plain_results and backend.calls == 0
+
+        print(f"📊 RAG 检索缓存（{args.chapters}章 × {args.segments}段，{total_queries}个查询，后端延迟{args.latency_ms:.0f}ms）")
+        print(f"   无缓存:       {plain_time * 1000:.0f} ms（后端查询 {plain_calls} 次）")
+        print(f"   两级缓存:     {cached_time * 1000:.0f} ms（后端查询 {cached_calls} 次，{cache.hit_counts()}）")
+        print(f"   重启后磁盘层: {restart_time * 1000:.0f} ms（后端查询 {backend.calls} 次，{restarted.hit_counts()}）")
+        print(f"   结果一致: {'是' if same else '否'}")
+
+        # 近似命中：关键元素只差一个短语时复用结果
+        fuzzy = RAGRetrievalCache(fuzzy_threshold=0.9)
+        base = "，".join(PHRASES[:12]) + " " + EMBELLISHMENT_IDEA
+        fuzzy.put(backend.cache_namespace, base, 10, 0.3, index.search(base))
+        near = base.replace(PHRASES[3], PHRASES[4], 1)
+        far = "，".join(PHRASES[8:14]) + " " + EMBELLISHMENT_IDEA
+        near_hit = fuzzy.get(backend.cache_namespace, near, 10, 0.3) is not None
+        far_hit = fuzzy.get(backend.cache_namespace, far, 10, 0.3) is not None
+        ok &= near_hit and not far_hit
+        print(f"🔍 近似命中（Jaccard ≥ 0.9）: 相近查询 {'命中' if near_hit else '未命中'}，不同查询 {'命中' if far_hit else '未命中'}")
+        index.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
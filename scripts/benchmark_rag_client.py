@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+RAG 客户端基准测试（本地桩服务）
+
+启动一个模拟 Style-RAG 接口（/stats、/search）的本地 HTTP 服务，每个请求带固定延迟，比较：
+- 旧路径：每次检索新建客户端，先请求 /stats 健康检查，再用裸 requests.post 检索（串行）
+- 新路径：共享客户端（连接池 + 健康缓存），一章的分段查询通过 search_many 并发扇出
+并验证熔断：服务停止后连续失败达到阈值即跳过检索，不再逐次等待超时。
+
+用法:
+    python -m scripts.benchmark_rag_client [--chapters 5] [--segments 4] [--latency-ms 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from utils import rag_client
+from utils.rag_client import RAGClient
+
+
+class StubRAGHandler(BaseHTTPRequestHandler):
+    """模拟 Style-RAG 服务"""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+    counts = {"stats": 0, "search": 0}
+    counts_lock = threading.Lock()
+
+    def _send_json(self, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.counts_lock:
+            self.counts["stats"] += 1
+        time.sleep(self.latency)
+        self._send_json({"total_documents": 100})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+        with self.counts_lock:
+            self.counts["search"] += 1
+        time.sleep(self.latency)
+        self._send_json([
+            {"content": f"参考片段：{query[:20]}", "similarity": 0.8, "metadata": {"type": "scene"}}
+        ])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency: float):
+    StubRAGHandler.latency = latency
+    StubRAGHandler.counts = {"stats": 0, "search": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRAGHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def legacy_search(base_url: str, query: str):
+    """旧 _get_rag_references 的请求模式：每次新建客户端 + /stats + 裸 requests.post"""
+    base_url = base_url.rstrip("/")
+    if requests.get(f"{base_url}/stats", timeout=10).status_code != 200:
+        return []
+    response = requests.post(
+        f"{base_url}/search",
+        json={"query": query, "top_k": 10, "min_similarity": 0.3},
+        timeout=30,
+    )
+    return response.json()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG 客户端基准测试（本地桩服务）")
+    parser.add_argument("--chapters", type=int, default=5, help="模拟章节数（默认5）")
+    parser.add_argument("--segments", type=int, default=4, help="每章分段数（默认4）")
+    parser.add_argument("--latency-ms", type=float, default=50, help="桩服务每个请求的延迟（毫秒，默认50）")
+    args = parser.parse_args(argv)
+
+    server, base_url = start_stub_server(args.latency_ms / 1000)
+    queries = [
+        [f"第{ch}章第{seg}段梗概" for seg in range(1, args.segments + 1)]
+        for ch in range(1, args.chapters + 1)
+    ]
+    ok = True
+
+    try:
+        # 旧路径：串行，每个查询一次 /stats + 一次 /search
+        start = time.perf_counter()
+        legacy_results = [legacy_search(base_url, q) for chapter in queries for q in chapter]
+        legacy_time = time.perf_counter() - start
+        legacy_counts = dict(StubRAGHandler.counts)
+
+        # 新路径：共享客户端，每章一次 search_many
+        StubRAGHandler.counts = {"stats": 0, "search": 0}
+        rag_client.reset_rag_clients()
+        client = rag_client.get_rag_client(base_url)
+        start = time.perf_counter()
+        pooled_results = []
+        for chapter in queries:
+            if client.is_available():
+                pooled_results.extend(client.search_many(chapter))
+        pooled_time = time.perf_counter() - start
+        pooled_counts = dict(StubRAGHandler.counts)
+
+        same = [r[0]["content"] for r in legacy_results] == [r[0]["content"] for r in pooled_results]
+        ok &= same and pooled_counts["stats"] <= 1
+
+        print(f"📊 RAG 客户端基准测试（{args.chapters}章 × {args.segments}段，服务延迟{args.latency_ms:.0f}ms）")
+        print(f"   旧路径: {legacy_time * 1000:.0f} ms（/stats {legacy_counts['stats']}次，/search {legacy_counts['search']}次）")
+        print(f"   新路径: {pooled_time * 1000:.0f} ms（/stats {pooled_counts['stats']}次，/search {pooled_counts['search']}次）")
+        if pooled_time > 0:
+            print(f"   加速比: {legacy_time / pooled_time:.1f}x")
+        print(f"   结果一致: {'是' if same else '否'}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # 熔断：服务停止后，连续失败达到阈值即跳过
+    breaker = RAGClient(base_url, timeout=2)
+    for _ in range(rag_client.FAILURE_THRESHOLD):
+        breaker.search("服务已停止")
+    start = time.perf_counter()
+    skipped = breaker.search("服务已停止") == [] and not breaker.is_available()
+    skip_time = time.perf_counter() - start
+    ok &= skipped and breaker.circuit_open() and breaker.stats["circuit_skips"] >= 2
+    print(f"🔌 熔断: {'已打开' if breaker.circuit_open() else '未打开'}，熔断期间检索+健康检查耗时 {skip_time * 1000:.2f} ms，统计 {breaker.stats}")
+    breaker.close()
+    rag_client.reset_rag_clients()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
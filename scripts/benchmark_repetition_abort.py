@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+流式重复检测基准测试
+
+把陷入重复循环的响应按流式数据块喂给 StreamingRepetitionDetector，与"整段接收完再检测"比较：
+- 提前断开时已接收的 token 数，以及整段接收会多付的 token 数
+- 按给定输出速度换算的等待时间
+- 检测器每字符的 CPU 开销，以及在正常正文上是否误判
+
+样本：
+- 默认使用内置的典型循环（正常正文写到一半后陷入短语/片段复读，一直输出到 max_tokens），
+  其中包括周期超过 15 字的整句复读——现有阈值对它不触发，两种检测方式结果相同
+- --samples 指定目录时读取其中的 *.txt（录制的真实响应，每个文件一条）
+
+用法:
+    python -m scripts.benchmark_repetition_abort [--max-tokens 40000] [--tokens-per-second 40]
+        [--chunk-chars 16] [--samples recorded_dir] [--seed 0]
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# (名称, 循环单元)：正文写到一半后一直重复该单元
+BUILTIN_LOOPS = [
+    ("叠字", "哈"),
+    ("短语", "不不不"),
+    ("口头禅", "他笑了笑，"),
+    ("短句", "我不知道。"),
+    ("对话", "“走吧。”“好。”"),
+    ("长句（周期>15字）", "她抬头望向窗外，雨还在下，灯火一盏盏熄灭。"),
+]
+
+
+def builtin_samples(max_chars: int, seed: int) -> list:
+    from providers.uniai.fakeAI import _prose
+
+    rng = random.Random(seed)
+    samples = []
+    for name, unit in BUILTIN_LOOPS:
+        prefix = _prose(rng, rng.randint(1500, 6000))
+        samples.append((name, prefix + unit * max(1, (max_chars - len(prefix)) // len(unit))))
+    return samples
+
+
+def recorded_samples(directory: str) -> list:
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            samples.append((os.path.basename(path), f.read()))
+    return samples
+
+
+def stream_detect(text: str, chunk_chars: int, find_start):
+    """按数据块喂给流式检测器，返回 (检测结果或 None, 检测耗时秒)"""
+    from core.agents.repetition_detector import StreamingRepetitionDetector
+
+    detector = StreamingRepetitionDetector(find_start)
+    start = time.perf_counter()
+    result = None
+    for offset in range(0, len(text), chunk_chars):
+        result = detector.feed(text[offset:offset + chunk_chars])
+        if result:
+            break
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="流式重复检测基准测试")
+    parser.add_argument("--max-tokens", type=int, default=40000, help="循环样本输出到的长度（按 1 字 ≈ 1 token，默认40000）")
+    parser.add_argument("--tokens-per-second", type=float, default=40, help="换算等待时间用的输出速度（默认40）")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="每个流式数据块的字符数（默认16）")
+    parser.add_argument("--samples", default=None, help="录制响应目录（*.txt），不给出时使用内置样本")
+    parser.add_argument("--seed", type=int, default=0, help="内置样本随机种子")
+    args = parser.parse_args(argv)
+
+    from core.agents.base_agent import MarkdownAgent
+    from core.agents.token_estimator import estimate_tokens
+    from providers.uniai.fakeAI import _prose
+
+    # 只借用检测方法，不需要 chatLLM
+    agent = MarkdownAgent.__new__(MarkdownAgent)
+    samples = recorded_samples(args.samples) if args.samples else builtin_samples(args.max_tokens, args.seed)
+    if not samples:
+        print(f"❌ 没有找到样本: {args.samples}")
+        return 1
+
+    print(f"🔁 重复循环样本 {len(samples)} 条（数据块 {args.chunk_chars} 字，输出速度 {args.tokens_per_second:g} tokens/s）")
+    total_full = total_streamed = 0
+    consistent = True
+    for name, text in samples:
+        result, _ = stream_detect(text, args.chunk_chars, agent._find_repetition_start)
+        post_hoc = agent.detect_repetition_loop(text)
+        full_tokens = estimate_tokens(text)
+        if result:
+            streamed_tokens = estimate_tokens(text[:result["aborted_at"]])
+            saved = full_tokens - streamed_tokens
+            print(f"   • {name}: 第{result['aborted_at']:,}字断开（正常内容 {result['clean_end_pos']:,}字），"
+                  f"接收 {streamed_tokens:,} / {full_tokens:,} tokens，节省 {saved:,} tokens"
+                  f"、{saved / args.tokens_per_second:.0f} s")
+        else:
+            streamed_tokens = full_tokens
+            print(f"   • {name}: 未检测到（整段检测: {'检测到' if post_hoc['is_repetitive'] else '未检测到'}），"
+                  f"接收 {full_tokens:,} tokens")
+        if bool(result) != post_hoc["is_repetitive"]:
+            consistent = False
+            print(f"     ⚠️ 与整段检测结果不一致")
+        total_full += full_tokens
+        total_streamed += streamed_tokens
+
+    saved = total_full - total_streamed
+    print(f"📊 合计: 整段接收 {total_full:,} tokens，流式断开 {total_streamed:,} tokens，"
+          f"节省 {saved:,} tokens（{saved / max(1, total_full) * 100:.1f}%）、约 {saved / args.tokens_per_second / 60:.1f} 分钟")
+
+    # 正常正文：不应误判，并测量每字符开销
+    rng = random.Random(args.seed + 1)
+    chapters = [_prose(rng, 20000) for _ in range(5)]
+    false_positives = 0
+    elapsed = 0.0
+    for chapter in chapters:
+        result, seconds = stream_detect(chapter, args.chunk_chars, agent._find_repetition_start)
+        false_positives += int(bool(result))
+        elapsed += seconds
+    chars = sum(len(chapter) for chapter in chapters)
+    print(f"📏 正常正文 {len(chapters)} 章 / {chars:,} 字: 误判 {false_positives} 次，"
+          f"检测开销 {elapsed / chars * 1e6:.2f} µs/字（每章 {elapsed / len(chapters) * 1000:.1f} ms）")
+
+    return 0 if consistent and not false_positives else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
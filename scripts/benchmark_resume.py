@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+断点续写基准测试（离线假提供商）
+
+假提供商按 --truncation-rate 把响应截断在中途（润色缺少完成标识、故事线少了后面几章），
+按 --stall-rate 让流式输出中途卡住（卡顿判定后断开、不对冲，交给 Retryer 重试）。
+对每种处理方式完整跑一遍 autoGenerate，比较请求数、提供商输出的总字数（≈ 输出 token 费用）与耗时：
+- clean    不注入故障，作为基线
+- restart  关闭断点续写（resume_partial=False），截断/中断后从头重新生成
+- resume   开启断点续写，保留已生成的有效前缀，只请求缺失的尾部
+各次运行注入的故障次数不同，比较"相对基线多输出的字数 / 注入故障次数"，即每次故障的恢复成本。
+
+用法:
+    python -m scripts.benchmark_resume [--chapters 3] [--mode compact|standard|long]
+        [--strategies clean restart resume] [--truncation-rate 0.15] [--stall-rate 0.05] [--stall-seconds 8]
+        [--stall-timeout 2] [--tokens-per-second 3000] [--seed 0] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+
+
+# 处理方式: (是否注入故障, 是否开启断点续写)
+STRATEGIES = {
+    "clean": (False, False),
+    "restart": (True, False),
+    "resume": (True, True),
+}
+
+
+def run_novel(strategy: str, args) -> dict:
+    """用指定的处理方式生成一部小说，返回耗时、请求数与续写统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+    from core.agents.continuation import get_resume_stats
+
+    inject, resume = STRATEGIES[strategy]
+    config_manager = get_config_manager()
+    config_manager.set_resume_partial(resume)
+    config_manager.set_stall_config(timeout=args.stall_timeout, min_tps=0, hedge_provider="off")
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=(f"fake://local?tokens_per_second={args.tokens_per_second:g}"
+                  f"&truncation_rate={args.truncation_rate if inject else 0:g}"
+                  f"&stall_rate={args.stall_rate if inject else 0:g}"
+                  f"&stall_seconds={args.stall_seconds:g}&seed={args.seed}&run={strategy}-{time.time_ns()}"),
+    )
+    config_manager.set_current_provider("fake")
+    get_resume_stats().reset()
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"续写基准-{strategy}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = args.mode == "compact"
+    aign.long_chapter_mode = args.segments if args.mode == "long" else 0
+
+    start = time.perf_counter()
+    aign.autoGenerate(args.chapters).join()
+    elapsed = time.perf_counter() - start
+
+    stats = aign.chatLLM.stats
+    resume_stats = get_resume_stats().get_stats()
+    return {
+        "chapters": aign.chapter_count,
+        "seconds": elapsed,
+        "calls": stats["calls"],
+        "output_chars": stats["output_chars"],
+        "streamed_chars": stats["streamed_chars"],
+        "truncations": stats["truncations"],
+        "stalls": stats["stalls"],
+        "resumes": sum(entry["resumes"] for entry in resume_stats.values()),
+        "kept_chars": sum(entry["kept_chars"] for entry in resume_stats.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="断点续写基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, default=3, help="生成章节数（默认3）")
+    parser.add_argument("--mode", choices=("compact", "standard", "long"), default="compact", help="生成模式（默认compact）")
+    parser.add_argument("--strategies", nargs="+", choices=tuple(STRATEGIES), default=list(STRATEGIES),
+                        help="比较的处理方式（默认全部）")
+    parser.add_argument("--segments", type=int, default=4, help="long 模式的每章分段数（默认4）")
+    parser.add_argument("--truncation-rate", type=float, default=0.15, help="响应被截断的概率（默认0.15）")
+    parser.add_argument("--stall-rate", type=float, default=0.05, help="流式响应中途卡顿的概率（默认0.05）")
+    parser.add_argument("--stall-seconds", type=float, default=8, help="每次卡顿的停顿时长（默认8秒）")
+    parser.add_argument("--stall-timeout", type=float, default=2, help="卡顿判定时间（默认2秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=3000, help="假提供商输出速度（默认3000）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="resume_bench_")
+    original_cwd = os.getcwd()
+    results = {}
+    try:
+        for strategy in args.strategies:
+            work_dir = os.path.join(root, strategy)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 {args.mode} / {args.chapters}章 / {strategy} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[strategy] = run_novel(strategy, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"📊 断点续写（{args.mode}，{args.chapters}章，截断概率 {args.truncation_rate:g}，卡顿概率 {args.stall_rate:g}）")
+    for strategy, result in results.items():
+        print(f"   {strategy:7s} 总耗时 {result['seconds']:6.1f} s，请求 {result['calls']} 次，"
+              f"提供商输出 {result['output_chars']:,} 字（实际接收 {result['streamed_chars']:,} 字），"
+              f"注入截断 {result['truncations']} 次 / 卡顿 {result['stalls']} 次，"
+              f"续写 {result['resumes']} 次（保留已生成 {result['kept_chars']:,} 字）")
+    if "clean" in results:
+        baseline = results["clean"]["output_chars"]
+        for strategy in ("restart", "resume"):
+            if strategy in results:
+                result = results[strategy]
+                faults = result["truncations"] + result["stalls"]
+                extra = result["output_chars"] - baseline
+                print(f"💰 {strategy:7s} 相对基线多输出 {extra:,} 字，每次故障 {extra / max(1, faults):,.0f} 字")
+    complete = all(result["chapters"] >= args.chapters for result in results.values())
+    if not complete:
+        print("❌ 有运行未生成全部章节")
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分段流水线基准测试（离线假提供商）
+
+长章节模式下每章分 --segments 段生成。对每种方式完整跑一遍 autoGenerate，比较总耗时与请求数：
+- serial     写第k段 → 润色第k段 → 写第k+1段（pipeline_segments=False）
+- pipelined  主线程写第k+1段的同时后台润色第k段（pipeline_segments=True），润色仍按分段顺序串行
+
+用法:
+    python -m scripts.benchmark_segment_pipeline [--chapters 3] [--mode compact|standard]
+        [--strategies serial pipelined] [--segments 4] [--tokens-per-second 3000] [--seed 0] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+
+
+STRATEGIES = ("serial", "pipelined")
+
+
+def run_novel(strategy: str, args) -> dict:
+    """用指定的分段生成方式生成一部小说，返回耗时、请求数与分段流水线统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+
+    config_manager = get_config_manager()
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=f"fake://local?tokens_per_second={args.tokens_per_second:g}&seed={args.seed}&run={strategy}-{time.time_ns()}",
+    )
+    config_manager.set_current_provider("fake")
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"分段流水线基准-{strategy}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = args.mode == "compact"
+    aign.long_chapter_mode = args.segments
+    aign.pipeline_segments = strategy == "pipelined"
+
+    start = time.perf_counter()
+    aign.autoGenerate(args.chapters).join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "chapters": aign.chapter_count,
+        "seconds": elapsed,
+        "calls": aign.chatLLM.stats["calls"],
+        "segment_stats": dict(aign.segment_pipeline_stats),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分段流水线基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, default=3, help="生成章节数（默认3）")
+    parser.add_argument("--mode", choices=("compact", "standard"), default="compact", help="生成模式（默认compact）")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES),
+                        help="比较的分段生成方式（默认全部）")
+    parser.add_argument("--segments", type=int, default=4, help="每章分段数（默认4）")
+    parser.add_argument("--tokens-per-second", type=float, default=3000, help="假提供商输出速度（默认3000）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="segment_pipeline_bench_")
+    original_cwd = os.getcwd()
+    results = {}
+    try:
+        for strategy in args.strategies:
+            work_dir = os.path.join(root, strategy)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 {args.mode} / {args.chapters}章 / 每章{args.segments}段 / {strategy} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[strategy] = run_novel(strategy, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"📊 分段流水线（{args.mode}，{args.chapters}章，每章{args.segments}段）")
+    for strategy, result in results.items():
+        line = f"   {strategy:9s} 总耗时 {result['seconds']:6.1f} s，请求 {result['calls']} 次"
+        segment_stats = result["segment_stats"]
+        if segment_stats["chapters"]:
+            line += (f"，流水线 {segment_stats['chapters']} 章 {segment_stats['segments']} 段，"
+                     f"写作与润色重叠 {segment_stats['saved_seconds']:.1f} s")
+        print(line)
+    if "serial" in results and "pipelined" in results:
+        saved = results["serial"]["seconds"] - results["pipelined"]["seconds"]
+        print(f"⏱️ 分段流水线节省 {saved:.1f} s（{saved / max(results['serial']['seconds'], 1e-6):.0%}）")
+    complete = all(result["chapters"] >= args.chapters for result in results.values())
+    if not complete:
+        print("❌ 有运行未生成全部章节")
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
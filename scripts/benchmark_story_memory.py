@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分层记忆基准测试（离线假提供商）
+
+非精简模式下写作器的回顾上下文是"前文记忆"+"最近章节总结"（最多15章），更早的剧情不在提示词里。
+对每种方式完整跑一遍 autoGenerate，记录每次正文写作请求的回顾字段大小与最早回顾到的章节：
+- flat          原有方式（hierarchical_memory=False）
+- hierarchical  分层记忆：章节总结 → 卷梗概 → 全书梗概（hierarchical_memory=True）
+比较最后几章的回顾 token（应保持平稳）与覆盖范围（分层记忆应始终从第1章开始）。
+
+用法:
+    python -m scripts.benchmark_story_memory [--chapters 40] [--strategies flat hierarchical]
+        [--chapters-per-plot 2] [--arc-plots 2] [--recent-arcs 2] [--recent-chapters 5]
+        [--tail 5] [--tokens-per-second 0] [--seed 0] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+
+
+STRATEGIES = ("flat", "hierarchical")
+RECAP_FIELDS = ("前文记忆", "最近章节总结", "前卷梗概", "全书梗概")
+_CHAPTER_RE = re.compile(r"第(\d+)")
+
+
+def _earliest_chapter(inputs: dict):
+    """写作器输入中回顾到的最早章节（有全书梗概时为第1章）"""
+    if inputs.get("全书梗概"):
+        return 1
+    numbers = [int(n) for key in ("前卷梗概", "最近章节总结") for n in _CHAPTER_RE.findall(inputs.get(key) or "")[:1]]
+    return min(numbers) if numbers else None
+
+
+def run_novel(strategy: str, args) -> dict:
+    """用指定的记忆方式生成一部小说，返回每次正文写作请求的回顾上下文统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+    from core.agents.token_estimator import estimate_tokens
+
+    config_manager = get_config_manager()
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=f"fake://local?tokens_per_second={args.tokens_per_second:g}&seed={args.seed}&run={strategy}-{time.time_ns()}",
+    )
+    config_manager.set_current_provider("fake")
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"分层记忆基准-{strategy}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = False
+    aign.chapters_per_plot = args.chapters_per_plot
+    aign.hierarchical_memory = strategy == "hierarchical"
+    aign.memory_arc_plots = args.arc_plots
+    aign.memory_recent_arcs = args.recent_arcs
+    aign.memory_recent_chapters = args.recent_chapters
+
+    # 记录每次正文写作请求的回顾字段（只读输入，不改变请求；结尾章由 ending_writer 生成，不含回顾字段）
+    calls = []
+    for agent in (aign.novel_writer_compact, aign.novel_writer):
+        def recording_invoke(inputs, output_keys, resume_from="", _invoke=agent.invoke):
+            calls.append({
+                "chapter": aign.chapter_count + 1,
+                "recap_tokens": sum(estimate_tokens(inputs.get(key) or "") for key in RECAP_FIELDS),
+                "input_tokens": sum(estimate_tokens(value) for value in inputs.values() if isinstance(value, str)),
+                "earliest": _earliest_chapter(inputs),
+            })
+            return _invoke(inputs=inputs, output_keys=output_keys, resume_from=resume_from)
+        agent.invoke = recording_invoke
+
+    start = time.perf_counter()
+    aign.autoGenerate(args.chapters).join()
+    elapsed = time.perf_counter() - start
+
+    memory = aign._get_story_memory()
+    return {
+        "chapters": aign.chapter_count,
+        "seconds": elapsed,
+        "calls": calls,
+        "provider_calls": aign.chatLLM.stats["calls"],
+        "memory_tokens": aign.token_accumulation_stats["sent"]["记忆生成"]["tokens"],
+        "arcs": len([entry for entry in memory.arcs.values() if entry["summary"]]) if aign.hierarchical_memory else 0,
+        "folded": memory.folded_arcs if aign.hierarchical_memory else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分层记忆基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, default=40, help="生成章节数（默认40）")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES),
+                        help="比较的记忆方式（默认全部）")
+    parser.add_argument("--chapters-per-plot", type=int, default=2, help="每个剧情单元的章节数（默认2）")
+    parser.add_argument("--arc-plots", type=int, default=2, help="每卷包含的剧情单元数（默认2，即每卷4章）")
+    parser.add_argument("--recent-arcs", type=int, default=2, help="以卷梗概形式保留的最近卷数（默认2）")
+    parser.add_argument("--recent-chapters", type=int, default=5, help="保留章节总结的最近章数（默认5）")
+    parser.add_argument("--tail", type=int, default=5, help="统计最后多少次写作请求（默认5）")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="假提供商输出速度（默认0=不限速）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="story_memory_bench_")
+    original_cwd = os.getcwd()
+    results = {}
+    try:
+        for strategy in args.strategies:
+            work_dir = os.path.join(root, strategy)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 standard / {args.chapters}章 / 记忆方式 {strategy} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[strategy] = run_novel(strategy, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"📊 分层记忆（standard，{args.chapters}章，每卷{args.chapters_per_plot * args.arc_plots}章，统计最后{args.tail}次写作请求）")
+    for strategy, result in results.items():
+        tail = result["calls"][-args.tail:] or [{"recap_tokens": 0, "input_tokens": 0, "earliest": None, "chapter": 0}]
+        recap = sum(call["recap_tokens"] for call in tail) / len(tail)
+        total = sum(call["input_tokens"] for call in tail) / len(tail)
+        peak = max((call["recap_tokens"] for call in result["calls"]), default=0)
+        earliest = [call["earliest"] for call in tail if call["earliest"] is not None]
+        line = (f"   {strategy:12s} 总耗时 {result['seconds']:6.1f} s，请求 {result['provider_calls']} 次，"
+                f"回顾上下文 平均 {recap:,.0f} / 峰值 {peak:,} tokens（输入共 {total:,.0f}），"
+                f"最早回顾到第{max(earliest) if earliest else '-'}章（第{tail[-1]['chapter']}章时），"
+                f"记忆类请求发送 {result['memory_tokens']:,} tokens")
+        if result["arcs"] or result["folded"]:
+            line += f"，卷梗概 {result['arcs']} 卷，已并入全书梗概 {result['folded']} 卷"
+        print(line)
+    complete = all(result["chapters"] >= args.chapters for result in results.values())
+    if not complete:
+        print("❌ 有运行未生成全部章节")
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
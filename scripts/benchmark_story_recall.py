@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+前文检索基准测试
+
+1. 规模测试（不调用模型）：逐章写入 --scale-chapters 章合成正文与故事线，测量每章索引增量更新耗时
+   与检索延迟；第 --plant-chapter 章埋入独有的人物和物品，最后一章的故事线再次提到它们，
+   检查检索能否从几百章之前取回该章。
+2. 端到端（离线假提供商，非精简模式）：对每种方式完整跑一遍 autoGenerate，记录每次正文写作请求中
+   整段前文上下文（前三章正文 / 相关前文片段）与全部输入的 token：
+   - verbatim  原有方式：整段发送前三章正文（story_recall=False）
+   - recall    前文检索：按本章故事线取回相关片段（story_recall=True）
+
+用法:
+    python -m scripts.benchmark_story_recall [--scale-chapters 300] [--plant-chapter 40]
+        [--chapters 30] [--strategies verbatim recall] [--top-k 4] [--tail 5]
+        [--tokens-per-second 0] [--seed 0] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.aign_story_recall import StoryRecallMixin
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+from scripts.benchmark_local_rag import PHRASES
+
+
+STRATEGIES = ("verbatim", "recall")
+BULK_FIELDS = ("前三章正文（不含上一章）", "相关前文片段")
+NAMES = ["林渊", "苏清瑶", "赵铁山", "白若溪", "韩九"]
+PLANTED_CHARACTER = "慕容雪"
+PLANTED_ITEM = "青冥玉佩"
+
+
+class _ScaleNovel(StoryRecallMixin):
+    """规模测试用的最小小说状态（只提供前文检索需要的正文与故事线）"""
+
+    def __init__(self, index_dir, top_k):
+        self.current_output_file = os.path.join(index_dir, "scale.txt")
+        self.story_recall = True
+        self.story_recall_top_k = top_k
+        self.story_recall_max_chars = 2400
+        self.story_recall_skip_recent = 3
+        self.story_recall_stats = {"updates": 0, "update_ms": 0.0, "max_update_ms": 0.0,
+                                   "searches": 0, "search_ms": 0.0, "passages": 0}
+        self.paragraphs = []
+        self.storyline = {}
+
+    def get_chapter_paragraph(self, chapter_number):
+        return self.paragraphs[chapter_number - 1] if 0 < chapter_number <= len(self.paragraphs) else ""
+
+    def get_storyline_chapter(self, chapter_number):
+        return self.storyline.get(chapter_number)
+
+
+def _synthetic_chapter(rng, chapter_number, planted):
+    paragraphs = []
+    for _ in range(12):
+        phrases = [rng.choice(PHRASES) for _ in range(rng.randint(4, 8))]
+        phrases.insert(rng.randint(0, len(phrases)), rng.choice(NAMES))
+        paragraphs.append("，".join(phrases) + "。")
+    if planted:
+        paragraphs.insert(5, f"{PLANTED_CHARACTER}从袖中取出{PLANTED_ITEM}，郑重地交到林渊手里，叮嘱他来日去北境雪原寻找玉佩的另一半。")
+    summary = "，".join(rng.choice(PHRASES) for _ in range(6))
+    if planted:
+        summary += f"，{PLANTED_CHARACTER}将{PLANTED_ITEM}托付给林渊"
+    return "\n\n".join(paragraphs), {
+        "chapter_number": chapter_number,
+        "title": f"第{chapter_number}章",
+        "plot_summary": summary,
+        "main_characters": rng.sample(NAMES, 2) + ([PLANTED_CHARACTER] if planted else []),
+    }
+
+
+def run_scale(args, root) -> dict:
+    """逐章写入合成章节，返回索引更新/检索耗时与埋点召回结果"""
+    novel = _ScaleNovel(os.path.join(root, "scale"), args.top_k)
+    rng = random.Random(args.seed)
+    update_ms = []
+    search_ms = []
+    for chapter_number in range(1, args.scale_chapters + 1):
+        content, storyline = _synthetic_chapter(rng, chapter_number, chapter_number == args.plant_chapter)
+        novel.paragraphs.append(content)
+        novel.storyline[chapter_number] = storyline
+        start = time.perf_counter()
+        novel.sync_story_index(chapter_number + 1)
+        update_ms.append((time.perf_counter() - start) * 1000)
+
+    final = args.scale_chapters + 1
+    novel.storyline[final] = {
+        "title": "雪原重逢",
+        "plot_summary": f"林渊带着{PLANTED_ITEM}来到北境雪原，再次遇见{PLANTED_CHARACTER}",
+        "main_characters": ["林渊", PLANTED_CHARACTER],
+    }
+    recall = ""
+    for _ in range(args.queries):
+        novel._story_recall_cache = {}
+        start = time.perf_counter()
+        recall = novel.get_story_recall_context(final)
+        search_ms.append((time.perf_counter() - start) * 1000)
+    index = novel._get_story_index()
+    stats = index.get_stats()
+    index.close()
+    update_ms.sort()
+    search_ms.sort()
+    return {
+        "update_avg": sum(update_ms) / len(update_ms),
+        "update_p95": update_ms[int(len(update_ms) * 0.95) - 1],
+        "update_max": update_ms[-1],
+        "search_p50": search_ms[len(search_ms) // 2],
+        "search_p95": search_ms[max(0, int(len(search_ms) * 0.95) - 1)],
+        "documents": stats["total_documents"],
+        "segments": stats["segments"],
+        "numpy": stats["numpy"],
+        "planted_hit": f"【第{args.plant_chapter}章·" in recall,
+    }
+
+
+def run_novel(strategy: str, args) -> dict:
+    """用指定方式生成一部小说，返回每次正文写作请求的前文上下文统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+    from core.agents.token_estimator import estimate_tokens
+
+    config_manager = get_config_manager()
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=f"fake://local?tokens_per_second={args.tokens_per_second:g}&seed={args.seed}&run={strategy}-{time.time_ns()}",
+    )
+    config_manager.set_current_provider("fake")
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"前文检索基准-{strategy}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = False
+    aign.story_recall = strategy == "recall"
+    aign.story_recall_top_k = args.top_k
+
+    # 记录每次正文写作请求的输入（只读，不改变请求；结尾章由 ending_writer 生成）
+    calls = []
+    agent = aign.novel_writer_compact
+
+    def recording_invoke(inputs, output_keys, resume_from="", _invoke=agent.invoke):
+        calls.append({
+            "bulk_tokens": sum(estimate_tokens(inputs.get(key) or "") for key in BULK_FIELDS),
+            "input_tokens": sum(estimate_tokens(value) for value in inputs.values() if isinstance(value, str)),
+        })
+        return _invoke(inputs=inputs, output_keys=output_keys, resume_from=resume_from)
+    agent.invoke = recording_invoke
+
+    start = time.perf_counter()
+    aign.autoGenerate(args.chapters).join()
+    elapsed = time.perf_counter() - start
+    if aign._story_index is not None:
+        aign._story_index.close()
+
+    return {
+        "chapters": aign.chapter_count,
+        "seconds": elapsed,
+        "calls": calls,
+        "writer_tokens": aign.token_accumulation_stats["sent"]["正文生成"]["tokens"],
+        "recall_stats": dict(aign.story_recall_stats),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="前文检索基准测试")
+    parser.add_argument("--scale-chapters", type=int, default=300, help="规模测试的章节数（默认300，0=跳过）")
+    parser.add_argument("--plant-chapter", type=int, default=40, help="埋入独有人物/物品的章节（默认40）")
+    parser.add_argument("--queries", type=int, default=50, help="规模测试的检索次数（默认50）")
+    parser.add_argument("--chapters", type=int, default=30, help="端到端生成章节数（默认30，0=跳过）")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES),
+                        help="端到端比较的方式（默认全部）")
+    parser.add_argument("--top-k", type=int, default=4, help="每章注入的片段数（默认4）")
+    parser.add_argument("--tail", type=int, default=5, help="统计最后多少次写作请求（默认5）")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="假提供商输出速度（默认0=不限速）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="story_recall_bench_")
+    original_cwd = os.getcwd()
+    ok = True
+    try:
+        if args.scale_chapters > 0:
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                scale = run_scale(args, root)
+            print(f"📊 索引规模测试（{args.scale_chapters}章，{scale['documents']}个片段，{scale['segments']}段，"
+                  f"NumPy {'是' if scale['numpy'] else '否'}）")
+            print(f"   每章增量更新 平均 {scale['update_avg']:.1f} ms / p95 {scale['update_p95']:.1f} ms / "
+                  f"最大 {scale['update_max']:.1f} ms（含重建）")
+            print(f"   检索 p50 {scale['search_p50']:.1f} ms / p95 {scale['search_p95']:.1f} ms")
+            print(f"   第{args.scale_chapters + 1}章取回第{args.plant_chapter}章埋下的{PLANTED_ITEM}: "
+                  f"{'✅ 是' if scale['planted_hit'] else '❌ 否'}")
+            ok = ok and scale["planted_hit"]
+
+        results = {}
+        for strategy in args.strategies if args.chapters > 0 else []:
+            work_dir = os.path.join(root, strategy)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 standard / {args.chapters}章 / {strategy} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[strategy] = run_novel(strategy, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    if results:
+        print(f"📊 前文上下文（standard，{args.chapters}章，统计最后{args.tail}次写作请求）")
+    for strategy, result in results.items():
+        tail = result["calls"][-args.tail:] or [{"bulk_tokens": 0, "input_tokens": 0}]
+        bulk = sum(call["bulk_tokens"] for call in tail) / len(tail)
+        total = sum(call["input_tokens"] for call in tail) / len(tail)
+        line = (f"   {strategy:9s} 总耗时 {result['seconds']:6.1f} s，整段前文 平均 {bulk:,.0f} tokens，"
+                f"输入共 {total:,.0f} tokens，正文生成累计发送 {result['writer_tokens']:,} tokens")
+        stats = result["recall_stats"]
+        if stats["searches"]:
+            line += (f"，检索 {stats['searches']}次 平均 {stats['search_ms'] / stats['searches']:.1f} ms，"
+                     f"索引更新平均 {stats['update_ms'] / max(stats['updates'], 1):.1f} ms")
+        print(line)
+        ok = ok and result["chapters"] >= args.chapters
+    if not ok:
+        print("❌ 埋点未被取回或有运行未生成全部章节")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
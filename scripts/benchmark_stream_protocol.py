@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+流式协议微基准测试
+
+回放一段约 3 万 token 的流式响应（思维链 + 正文），分别走：
+- 旧路径：提供商每次 yield 累积全文，调用方按 len(accumulated) 切片取增量
+- 新路径：提供商只 yield 增量 + 一个汇总事件，调用方用 StreamAccumulator 拼接
+
+用法:
+    python -m scripts.benchmark_stream_protocol [--tokens 30000] [--repeat 5] [--record stream.jsonl]
+
+--record 指定一份录制文件（每行一个 {"delta": "...", "reasoning_delta": "..."}）时，
+使用录制内容回放；否则生成确定性的合成流。
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers.stream_protocol import StreamAccumulator, delta_event, final_event
+
+
+SAMPLE_TEXT = (
+    "夜色如墨，山风卷过古道，他握紧手中的长剑，心中却比任何时候都要平静。"
+    "远处的灯火忽明忽暗，仿佛在诉说一个被遗忘已久的秘密。"
+)
+
+
+def build_synthetic_stream(total_tokens: int, seed: int = 42) -> list:
+    """生成确定性的合成流：约 15% 思维链，85% 正文，每个数据块 1-3 个token"""
+    rng = random.Random(seed)
+    events = []
+    produced = 0
+    reasoning_budget = int(total_tokens * 0.15)
+    while produced < total_tokens:
+        size = rng.randint(1, 3)
+        start = rng.randint(0, len(SAMPLE_TEXT) - size)
+        piece = SAMPLE_TEXT[start:start + size]
+        if produced < reasoning_budget:
+            events.append(("", piece))
+        else:
+            events.append((piece, ""))
+        produced += size
+    return events
+
+
+def load_recorded_stream(path: str) -> list:
+    """加载录制的增量流（JSONL）"""
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            events.append((item.get("delta", ""), item.get("reasoning_delta", "")))
+    return events
+
+
+def legacy_provider(events):
+    """旧协议提供商：每次 yield 累积全文"""
+    content = ""
+    reasoning_content = ""
+    for content_delta, reasoning_delta in events:
+        if reasoning_delta:
+            reasoning_content += reasoning_delta
+            yield {"content": content, "reasoning_content": reasoning_content, "total_tokens": None}
+        if content_delta:
+            content += content_delta
+        yield {"content": content, "reasoning_content": reasoning_content, "total_tokens": None}
+
+
+def legacy_estimating_provider(events):
+    """旧协议提供商（OpenRouter/ZenMux/NVIDIA等）：每个数据块都对全文 split() 估算token"""
+    content = ""
+    reasoning_content = ""
+    for content_delta, reasoning_delta in events:
+        if reasoning_delta:
+            reasoning_content += reasoning_delta
+            yield {"content": content, "reasoning_content": reasoning_content, "total_tokens": 0}
+        if content_delta:
+            content += content_delta
+            total_tokens = len(content.split()) * 1.3
+            yield {"content": content, "reasoning_content": reasoning_content, "total_tokens": int(total_tokens)}
+
+
+def legacy_consumer(stream):
+    """旧的 MarkdownAgent._do_query 消费逻辑"""
+    accumulated_content = ""
+    accumulated_reasoning = ""
+    sink = 0
+    for chunk in stream:
+        if chunk and chunk.get("reasoning_content"):
+            new_reasoning = chunk["reasoning_content"][len(accumulated_reasoning):]
+            if new_reasoning:
+                accumulated_reasoning = chunk["reasoning_content"]
+                sink += len(new_reasoning)
+        if chunk and "content" in chunk:
+            new_content = chunk["content"][len(accumulated_content):]
+            accumulated_content = chunk["content"]
+            sink += len(new_content)
+    return accumulated_content, accumulated_reasoning, sink
+
+
+def delta_provider(events):
+    """新协议提供商：只 yield 增量，最后 yield 汇总事件"""
+    for content_delta, reasoning_delta in events:
+        yield delta_event(content_delta, reasoning_delta)
+    yield final_event(len(events))
+
+
+def delta_consumer(stream):
+    """新的 MarkdownAgent._do_query 消费逻辑"""
+    accumulator = StreamAccumulator()
+    sink = 0
+    for chunk in stream:
+        new_content, new_reasoning = accumulator.feed(chunk)
+        sink += len(new_content) + len(new_reasoning)
+    result = accumulator.result()
+    return result["content"], result["reasoning_content"], sink
+
+
+def _time_path(provider, consumer, events, repeat):
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = consumer(provider(events))
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="流式协议微基准测试（旧累积协议 vs 增量协议）")
+    parser.add_argument("--tokens", type=int, default=30000, help="合成流的token数（默认30000）")
+    parser.add_argument("--repeat", type=int, default=5, help="每条路径重复次数，取最好成绩")
+    parser.add_argument("--record", default="", help="录制的增量流JSONL文件")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        events = load_recorded_stream(args.record)
+        source = f"录制文件 {args.record}"
+    else:
+        events = build_synthetic_stream(args.tokens)
+        source = f"合成流 {args.tokens} tokens"
+
+    legacy_time, legacy_out = _time_path(legacy_provider, legacy_consumer, events, args.repeat)
+    estimating_time, _ = _time_path(legacy_estimating_provider, legacy_consumer, events, 1)
+    delta_time, delta_out = _time_path(delta_provider, delta_consumer, events, args.repeat)
+
+    if legacy_out[:2] != delta_out[:2]:
+        print("❌ 两条路径输出不一致！")
+        return 1
+
+    print(f"📊 流式协议基准测试（{source}，{len(events)} 个数据块）")
+    print(f"   正文 {len(delta_out[0])} 字符 / 思维链 {len(delta_out[1])} 字符")
+    print(f"   旧协议（累积全文 + 切片）: {legacy_time * 1000:.1f} ms")
+    print(f"   旧协议 + 每块估算token:    {estimating_time * 1000:.1f} ms")
+    print(f"   新协议（增量 + 累积器）:   {delta_time * 1000:.1f} ms")
+    if delta_time > 0:
+        print(f"   加速比: {legacy_time / delta_time:.1f}x（不含逐块估算） / "
+              f"{estimating_time / delta_time:.1f}x（含逐块估算）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+流式卡顿与对冲请求基准测试（离线假提供商）
+
+假提供商按 --stall-rate 在流式输出中途停顿 --stall-seconds 秒（连接不断、不再出数据），
+对每种处理方式完整跑一遍 autoGenerate，比较总耗时与额外请求数：
+- wait   不检测卡顿（stall_timeout=0），等停顿结束（真实提供商上可能要等到 30 分钟的客户端超时）
+- retry  检测到卡顿后断开，交给 Retryer 从头重试（hedge_provider=off）
+- hedge  检测到卡顿后向同一提供商发出对冲请求，保留先完成的一个（hedge_provider=same）
+
+用法:
+    python -m scripts.benchmark_stream_stall [--chapters 3] [--mode compact|standard|long]
+        [--strategies wait retry hedge] [--stall-rate 0.2] [--stall-seconds 8] [--stall-timeout 2]
+        [--tokens-per-second 3000] [--seed 0] [--verbose]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.benchmark_autogenerate import NOVEL_IDEA, NOVEL_OUTLINE, _NullWriter
+
+
+STRATEGIES = {
+    "wait": (0, "off"),
+    "retry": (None, "off"),
+    "hedge": (None, "same"),
+}
+
+
+def run_novel(strategy: str, args) -> dict:
+    """用指定的卡顿处理方式生成一部小说，返回耗时与卡顿统计"""
+    from AIGN import AIGN
+    from config.config_manager import get_chatllm
+    from config.dynamic_config_manager import get_config_manager
+    from core.agents.stream_hedging import get_stall_stats
+
+    timeout, hedge_provider = STRATEGIES[strategy]
+    config_manager = get_config_manager()
+    config_manager.set_stall_config(timeout=args.stall_timeout if timeout is None else timeout,
+                                    min_tps=0, hedge_provider=hedge_provider)
+    config_manager.update_provider_config(
+        "fake", api_key="fake", model_name="fake-novelist",
+        base_url=(f"fake://local?tokens_per_second={args.tokens_per_second:g}&stall_rate={args.stall_rate:g}"
+                  f"&stall_seconds={args.stall_seconds:g}&seed={args.seed}&run={strategy}-{time.time_ns()}"),
+    )
+    config_manager.set_current_provider("fake")
+    get_stall_stats().reset()
+
+    aign = AIGN(get_chatllm(allow_incomplete=False, include_system_prompt=False))
+    aign.novel_title = f"卡顿基准-{strategy}"
+    aign.user_idea = NOVEL_IDEA
+    aign.novel_outline = NOVEL_OUTLINE
+    aign.user_requirements = "节奏紧凑，对话自然"
+    aign.embellishment_idea = "文笔细腻，注重环境描写与人物情绪"
+    aign.compact_mode = args.mode == "compact"
+    aign.long_chapter_mode = args.segments if args.mode == "long" else 0
+
+    start = time.perf_counter()
+    aign.autoGenerate(args.chapters).join()
+    elapsed = time.perf_counter() - start
+
+    stall_stats = get_stall_stats().get_stats().get("fake", {})
+    return {
+        "chapters": aign.chapter_count,
+        "seconds": elapsed,
+        "calls": aign.chatLLM.stats["calls"],
+        "injected_stalls": aign.chatLLM.stats["stalls"],
+        "detected": stall_stats.get("stalls", 0),
+        "hedges": stall_stats.get("hedges", 0),
+        "hedge_wins": stall_stats.get("hedge_wins", 0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="流式卡顿与对冲请求基准测试（离线假提供商）")
+    parser.add_argument("--chapters", type=int, default=3, help="生成章节数（默认3）")
+    parser.add_argument("--mode", choices=("compact", "standard", "long"), default="compact", help="生成模式（默认compact）")
+    parser.add_argument("--strategies", nargs="+", choices=tuple(STRATEGIES), default=list(STRATEGIES),
+                        help="比较的卡顿处理方式（默认全部）")
+    parser.add_argument("--segments", type=int, default=4, help="long 模式的每章分段数（默认4）")
+    parser.add_argument("--stall-rate", type=float, default=0.2, help="流式响应中途卡顿的概率（默认0.2）")
+    parser.add_argument("--stall-seconds", type=float, default=8, help="每次卡顿的停顿时长（默认8秒）")
+    parser.add_argument("--stall-timeout", type=float, default=2, help="retry/hedge 的卡顿判定时间（默认2秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=3000, help="假提供商输出速度（默认3000）")
+    parser.add_argument("--seed", type=int, default=0, help="假提供商随机种子")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程的终端输出")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="stream_stall_bench_")
+    original_cwd = os.getcwd()
+    results = {}
+    try:
+        for strategy in args.strategies:
+            work_dir = os.path.join(root, strategy)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+            print(f"🚀 {args.mode} / {args.chapters}章 / 卡顿处理 {strategy} 生成中...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(_NullWriter())
+            with output:
+                results[strategy] = run_novel(strategy, args)
+            os.chdir(original_cwd)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"📊 流式卡顿（{args.mode}，{args.chapters}章，卡顿概率 {args.stall_rate:g}，每次 {args.stall_seconds:g} 秒，"
+          f"判定时间 {args.stall_timeout:g} 秒）")
+    for strategy, result in results.items():
+        print(f"   {strategy:5s} 总耗时 {result['seconds']:6.1f} s，请求 {result['calls']} 次，"
+              f"注入卡顿 {result['injected_stalls']} 次，检测到 {result['detected']} 次，"
+              f"对冲 {result['hedges']} 次（对冲胜出 {result['hedge_wins']}）")
+    complete = all(result["chapters"] >= args.chapters for result in results.values())
+    if not complete:
+        print("❌ 有运行未生成全部章节")
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Token 估算器基准测试
+
+1. 等价性：在随机文本（含中文区间边界、易经卦象、全角符号、emoji、代理字符）上
+   比较批量估算与原逐字符循环的结果，必须逐条相同
+2. 单次估算：多 MB 文本上逐字符循环 vs 批量分类
+3. 请求模拟：模拟 _do_query 每次请求的计数（完整提示词、各输入字段、系统提示词），
+   系统提示词/大纲/人物列表稳定，只有本章内容变化
+
+用法:
+    python -m scripts.benchmark_token_estimator [--requests 50] [--outline-chars 200000] [--samples 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.agents import token_estimator
+from core.agents.token_estimator import estimate_tokens, estimate_joined_tokens
+
+
+def legacy_count_tokens(text: str) -> int:
+    """原 MarkdownAgent.count_tokens 的逐字符实现（对照基准）"""
+    if not text:
+        return 0
+    chinese_chars = 0
+    ascii_chars = 0
+    other_chars = 0
+    for ch in text:
+        if '\u4e00' <= ch <= '\u9fff' or '\u3400' <= ch <= '\u4dbf':
+            chinese_chars += 1
+        elif ord(ch) < 128:
+            ascii_chars += 1
+        else:
+            other_chars += 1
+    tokens = chinese_chars * 0.7 + ascii_chars * 0.25 + other_chars * 1.0
+    return max(1, int(tokens))
+
+
+# 覆盖各分类边界的字符
+EDGE_CHARS = [
+    "\x00", "\x7f", "\x80", "\xff", "\u0100", "\u33ff", "\u3400", "\u4dbf", "\u4dc0", "\u4dff",
+    "\u4e00", "\u9fff", "\ua000", "\u3001", "\uff0c", "\u300c", "\ud7ff", "\ue000", "\uffff",
+    "\U0001f600", "\U00020000", "\ud800", "\udfff",
+]
+SAMPLE_TEXT = "夜色如墨，山风卷过古道。He held the sword tightly.「你好」——① ＡＢ\n"
+
+
+def random_text(rng: random.Random) -> str:
+    length = rng.choice([0, 1, 2, 5, 50, 600, 3000])
+    pieces = []
+    for _ in range(length):
+        roll = rng.random()
+        if roll < 0.15:
+            pieces.append(rng.choice(EDGE_CHARS))
+        elif roll < 0.6:
+            pieces.append(chr(rng.randint(0x4E00, 0x9FFF)))
+        elif roll < 0.9:
+            pieces.append(chr(rng.randint(0x20, 0x7E)))
+        else:
+            pieces.append(chr(rng.randint(0x80, 0xFFFF)))
+    return "".join(pieces)
+
+
+def check_equivalence(samples: int) -> int:
+    """返回不一致的样本数"""
+    rng = random.Random(7)
+    mismatches = 0
+    for _ in range(samples):
+        parts = [random_text(rng) for _ in range(rng.randint(1, 4))]
+        text = "\n".join(parts)
+        if estimate_tokens(text) != legacy_count_tokens(text):
+            mismatches += 1
+        if estimate_joined_tokens(parts) != legacy_count_tokens(text):
+            mismatches += 1
+    return mismatches
+
+
+def time_call(func, *args, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def simulate_requests(count_text, count_joined, requests: int, sys_prompt: str, outline: str, characters: str):
+    """模拟 _do_query 中每次请求的计数调用"""
+    rng = random.Random(3)
+    start = time.perf_counter()
+    for i in range(requests):
+        dynamic = SAMPLE_TEXT * rng.randint(50, 150) + str(i)
+        user_input = f"## 大纲：\n{outline}\n## 人物列表：\n{characters}\n## 上一章原文：\n{dynamic}"
+        messages = [sys_prompt, "明白了。", user_input]
+        count_joined(messages)          # 发送统计
+        count_text(user_input)          # 调试：用户输入
+        count_joined(messages)          # 调试：完整提示词
+        count_text(sys_prompt)          # 调试：系统提示词
+        for part in (outline, characters, dynamic):  # 调试：各输入字段
+            count_text(part)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Token 估算器基准测试（逐字符循环 vs 批量分类 + 缓存）")
+    parser.add_argument("--requests", type=int, default=50, help="模拟的请求数（默认50）")
+    parser.add_argument("--outline-chars", type=int, default=200000, help="模拟大纲的字符数（默认200000）")
+    parser.add_argument("--samples", type=int, default=2000, help="等价性检查的随机样本数（默认2000）")
+    args = parser.parse_args(argv)
+
+    mismatches = check_equivalence(args.samples)
+    print(f"🔍 等价性检查: {args.samples} 组随机文本，不一致 {mismatches} 处")
+
+    big_text = (SAMPLE_TEXT * (3_000_000 // len(SAMPLE_TEXT)))
+    legacy_single = time_call(legacy_count_tokens, big_text)
+    token_estimator.clear_cache()
+    fast_single = time_call(token_estimator._classify, big_text, repeat=5)
+    print(f"📊 单次估算（{len(big_text)}字符，无缓存）")
+    print(f"   逐字符循环: {legacy_single * 1000:.1f} ms")
+    print(f"   批量分类:   {fast_single * 1000:.1f} ms（{legacy_single / max(fast_single, 1e-9):.1f}x）")
+
+    sys_prompt = SAMPLE_TEXT * 60
+    outline = (SAMPLE_TEXT * (args.outline_chars // len(SAMPLE_TEXT) + 1))[:args.outline_chars]
+    characters = (SAMPLE_TEXT * 400)[::-1]
+
+    def legacy_joined(messages):
+        return legacy_count_tokens("\n".join(messages))
+
+    legacy_total = simulate_requests(legacy_count_tokens, legacy_joined, args.requests, sys_prompt, outline, characters)
+    token_estimator.clear_cache()
+    token_estimator.cache_stats.update(hits=0, misses=0)
+    fast_total = simulate_requests(estimate_tokens, estimate_joined_tokens, args.requests, sys_prompt, outline, characters)
+    print(f"📊 请求模拟（{args.requests}次请求，大纲{len(outline)}字符）")
+    print(f"   逐字符循环:        {legacy_total * 1000:.1f} ms")
+    print(f"   批量分类 + 缓存:   {fast_total * 1000:.1f} ms（{legacy_total / max(fast_total, 1e-9):.1f}x）")
+    print(f"   缓存命中: {token_estimator.cache_stats['hits']} / 未命中: {token_estimator.cache_stats['misses']}")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
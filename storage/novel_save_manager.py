@@ -264,7 +264,9 @@ class NovelSaveManager:
             "writing_memory": getattr(aign, 'writing_memory', ""),
             "writing_plan": getattr(aign, 'writing_plan', ""),
             "temp_setting": getattr(aign, 'temp_setting', ""),
-            "current_output_file": getattr(aign, 'current_output_file', "")
+            "current_output_file": getattr(aign, 'current_output_file', ""),
+            "llm_cache_session": getattr(aign, 'llm_cache_session', ""),
+            "story_memory": aign.get_story_memory_data() if hasattr(aign, 'get_story_memory_data') else {}
         }
     
     # ========== 私有方法：数据恢复 ==========
@@ -346,6 +348,14 @@ class NovelSaveManager:
         aign.writing_plan = progress.get("writing_plan", "")
         aign.temp_setting = progress.get("temp_setting", "")
         aign.current_output_file = progress.get("current_output_file", "")
+        # 沿用存档时的响应缓存会话，中途恢复时可复用已付费的响应
+        if progress.get("llm_cache_session"):
+            aign.llm_cache_session = progress["llm_cache_session"]
+        # 分层记忆只恢复数据，首次需要上下文时再校验并补齐
+        if hasattr(aign, 'load_story_memory_data'):
+            aign.load_story_memory_data(progress.get("story_memory", {}))
+        if hasattr(aign, 'rebuild_chapter_index'):
+            aign.rebuild_chapter_index()
         
         print(f"✅ 生成进度已恢复:")
         print(f"   • 章节: {aign.chapter_count}章")
@@ -20,6 +20,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional, Callable, Generator
 
 from prompts.AIGN_FishAudio_Prompt import FISHAUDIO_ADDON_INSTRUCTIONS
+from providers.stream_protocol import collect_stream
 
 
 # ============================================================
@@ -149,12 +150,8 @@ class EpubFishAudioTagger:
 
         response = ""
         if hasattr(llm_response, '__iter__') and not isinstance(llm_response, (str, dict)):
-            # 流式响应
-            for chunk in llm_response:
-                if isinstance(chunk, dict):
-                    response = chunk.get("content", "")
-                else:
-                    response = str(chunk)
+            # 流式响应：按增量协议累积
+            response = collect_stream(llm_response).get("content", "")
         elif isinstance(llm_response, dict):
             response = llm_response.get("content", "")
         else:
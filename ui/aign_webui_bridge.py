@@ -8,6 +8,7 @@ AIGN WebUI Bridge Module
 - 进度更新
 """
 
+import threading
 import time
 from datetime import datetime
 
@@ -37,6 +38,7 @@ class WebUIBridge:
         self.max_log_entries = 100
         
         # 流式输出跟踪
+        self._stream_content_lock = threading.Lock()
         self.current_stream_chars = 0
         self.current_stream_operation = ""
         self.stream_start_time = 0
@@ -47,6 +49,22 @@ class WebUIBridge:
         if not hasattr(parent_aign, 'global_status_history'):
             parent_aign.global_status_history = []
     
+    @property
+    def current_stream_content(self):
+        """当前流式输出内容（增量片段列表，读取时拼接一次；拼接与追加在同一把锁下进行）"""
+        with self._stream_content_lock:
+            parts = self.__dict__.get('_stream_content_parts')
+            if not parts:
+                return ""
+            if len(parts) > 1:
+                parts[:] = ["".join(parts)]
+            return parts[0]
+
+    @current_stream_content.setter
+    def current_stream_content(self, value):
+        with self._stream_content_lock:
+            self._stream_content_parts = [value] if value else []
+
     def log_message(self, message):
         """
         添加日志消息到缓冲区
@@ -104,16 +122,18 @@ class WebUIBridge:
         self.log_message(f"🔄 开始{operation_name}...")
         print(f"🔧 流式模式: 已清空流式输出窗口，开始显示 {operation_name} 的实时进度")
     
-    def update_stream_progress(self, new_content):
+    def update_stream_progress(self, new_content, is_reasoning=False):
         """
         更新流式输出进度
         
         Args:
-            new_content: 新增的内容
+            new_content: 新增的内容（增量）
+            is_reasoning: 是否为思维链内容
         """
         if new_content:
             self.current_stream_chars += len(new_content)
-            self.current_stream_content += new_content
+            with self._stream_content_lock:
+                self.__dict__.setdefault('_stream_content_parts', []).append(new_content)
             # 静默更新字符计数，不输出进度日志
     
     def end_stream_tracking(self, final_content=""):
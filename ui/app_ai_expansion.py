@@ -11,6 +11,7 @@ app_ai_expansion.py - AI扩展功能模块
 """
 
 from config.config_manager import get_chatllm
+from providers.stream_protocol import StreamAccumulator
 from prompts.AIGN_Requirements_Expansion_Prompt import (
     get_writing_requirements_expansion_prompt,
     get_embellishment_requirements_expansion_prompt
@@ -45,35 +46,32 @@ def _stream_chatllm_with_console(chatllm, messages, temperature, label=""):
         
         # 检查是否为生成器（流式响应）
         if hasattr(response, '__next__'):
-            accumulated_content = ""
-            accumulated_reasoning = ""
+            stream_accumulator = StreamAccumulator()
             reasoning_displayed = False
+            separator_printed = False
             for chunk in response:
+                new_content, new_reasoning = stream_accumulator.feed(chunk)
                 # 处理思维链内容（reasoning_content）
-                if chunk and 'reasoning_content' in chunk and chunk['reasoning_content']:
-                    new_reasoning = chunk['reasoning_content'][len(accumulated_reasoning):]
-                    if new_reasoning:
-                        if not reasoning_displayed:
-                            print(f"\n🧠 思维链：", end='', flush=True)
-                            reasoning_displayed = True
-                        accumulated_reasoning = chunk['reasoning_content']
-                        print(new_reasoning, end='', flush=True)
+                if new_reasoning:
+                    if not reasoning_displayed:
+                        print(f"\n🧠 思维链：", end='', flush=True)
+                        reasoning_displayed = True
+                    print(new_reasoning, end='', flush=True)
                 
                 # 处理正文内容
-                if chunk and 'content' in chunk:
-                    new_content = chunk['content'][len(accumulated_content):]
-                    accumulated_content = chunk['content']
-                    if new_content:
-                        # 如果之前在输出思维链，先换行分隔
-                        if reasoning_displayed and accumulated_reasoning:
-                            print(f"\n{'─'*40}")
-                            print(f"📝 正文输出：")
-                            accumulated_reasoning = ""  # 防止重复分隔
-                        print(new_content, end='', flush=True)
+                if new_content:
+                    # 如果之前在输出思维链，先换行分隔
+                    if reasoning_displayed and not separator_printed:
+                        print(f"\n{'─'*40}")
+                        print(f"📝 正文输出：")
+                        separator_printed = True  # 防止重复分隔
+                    print(new_content, end='', flush=True)
             
+            final_result = stream_accumulator.result()
+            accumulated_content = final_result["content"]
             print()  # 换行
             if reasoning_displayed:
-                print(f"🧠 思维链总长度: {len(accumulated_reasoning)} 字符")
+                print(f"🧠 思维链总长度: {stream_accumulator.reasoning_length} 字符")
             if label:
                 print(f"{'='*50}")
                 print(f"✅ {label} - 完成 ({len(accumulated_content)}字符)")
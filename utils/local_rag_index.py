@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地 RAG 索引 - 进程内 BM25 检索，作为外部 Style-RAG HTTP 服务的替代后端
+
+与 RAGClient 提供相同的 search / search_many / search_by_scene / format_references / is_available 接口，
+通过配置 rag_backend=local + rag_local_index_dir 启用，检索不经过网络，服务不可用时也能工作。
+
+索引结构（目录）：
+    manifest.json            段列表、已索引的源文件及其版本、过期片段数
+    seg_000001/              每次构建/增量添加生成一个只读段
+        docs.jsonl           片段内容与元数据（每行一条）
+        doc_offsets.bin      docs.jsonl 中每条的字节偏移（int64）
+        doc_lens.bin         每条的词元数（int32）
+        terms.json           词元 -> [倒排起始位置, 文档数]
+        postings_docs.bin    倒排表：段内文档号（int32）
+        postings_tf.bin      倒排表：词频（int32）
+
+- 中文按字符二元组（bigram）切分，英文/数字按单词切分
+- .bin 文件通过 mmap 只读映射，多个进程/多次加载共享页缓存
+- 安装了 NumPy 时按词项向量化累加 BM25 分数，否则使用纯 Python 累加
+- 增量添加只写新段，不改动已有段；compact() 可合并为单段
+- 源文件修改后重新索引时，旧版本片段按 (来源, 版本) 在检索时过滤（墓碑），过期片段过多时自动合并并丢弃
+
+命令行：
+    python -m utils.local_rag_index build <源文本目录> <索引目录>
+    python -m utils.local_rag_index add <源文本目录> <索引目录>
+    python -m utils.local_rag_index search <索引目录> <查询> [--top-k 5]
+"""
+
+import argparse
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+INDEX_FORMAT_VERSION = 1
+TOKENIZER_NAME = "cjk-bigram-v1"
+BM25_K1 = 1.5
+BM25_B = 0.75
+CHUNK_CHARS = 400        # 片段目标长度
+CHUNK_MAX_CHARS = 800    # 单个段落超过此长度时强制切分
+SOURCE_EXTENSIONS = (".txt", ".md")
+STALE_COMPACT_RATIO = 0.2  # 过期片段占比超过此值时，增量添加后自动合并（丢弃过期片段）
+
+_TOKEN_RE = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]+|[a-z0-9]+')
+
+
+def tokenize(text: str) -> list:
+    """切分词元：中文连续段取字符二元组（单字段保留单字），英文/数字取单词"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if run[0].isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def split_into_chunks(text: str, chunk_chars: int = CHUNK_CHARS, max_chars: int = CHUNK_MAX_CHARS) -> list:
+    """按段落把长文本切成检索片段"""
+    chunks = []
+    current = []
+    current_len = 0
+    for paragraph in re.split(r'\n\s*\n|\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > max_chars:
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and current_len + len(paragraph) > chunk_chars:
+            chunks.append("\n".join(current))
+            current, current_len = [], 0
+        current.append(paragraph)
+        current_len += len(paragraph)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _read_text(path: str) -> str:
+    for encoding in ("utf-8", "gb18030"):
+        try:
+            with open(path, "r", encoding=encoding) as f:
+                return f.read()
+        except UnicodeDecodeError:
+            continue
+    return ""
+
+
+def iter_source_documents(source_dir: str, skip_sources: dict = None):
+    """遍历源文本目录，产出 (相对路径, 文件签名, [(片段, 元数据), ...])
+
+    子目录名作为片段类型（format_references 中显示），根目录下的文件类型为 local。
+    元数据中的 version 为文件签名，文件修改后旧版本的片段在检索时被过滤。
+    """
+    skip_sources = skip_sources or {}
+    for root, _, files in sorted(os.walk(source_dir)):
+        for name in sorted(files):
+            if not name.lower().endswith(SOURCE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, source_dir)
+            stat = os.stat(path)
+            signature = f"{stat.st_size}:{int(stat.st_mtime)}"
+            if skip_sources.get(rel_path) == signature:
+                continue
+            doc_type = os.path.basename(root) if os.path.abspath(root) != os.path.abspath(source_dir) else "local"
+            docs = [
+                (chunk, {"source": rel_path, "type": doc_type, "chunk": i, "version": signature})
+                for i, chunk in enumerate(split_into_chunks(_read_text(path)))
+            ]
+            yield rel_path, signature, docs
+
+
+class _Segment:
+    """只读索引段（mmap 映射）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = json.load(f)
+        self._files = []
+        self._maps = []
+        self.doc_offsets = self._map("doc_offsets.bin", "q")
+        self.doc_lens = self._map("doc_lens.bin", "i")
+        self.postings_docs = self._map("postings_docs.bin", "i")
+        self.postings_tf = self._map("postings_tf.bin", "i")
+        self.doc_count = len(self.doc_lens)
+        self.total_len = sum(self.doc_lens) if np is None else int(self.doc_lens.sum())
+        self._docs_file = open(os.path.join(path, "docs.jsonl"), "rb")
+        self._docs_lock = threading.Lock()
+        self._norm = None
+
+    def _map(self, name: str, typecode: str):
+        path = os.path.join(self.path, name)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=typecode) if np is not None else memoryview(array(typecode))
+        f = open(path, "rb")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append(f)
+        self._maps.append(mapped)
+        if np is not None:
+            return np.frombuffer(mapped, dtype=np.dtype(typecode))
+        return memoryview(mapped).cast(typecode)
+
+    def prepare(self, avgdl: float):
+        """按全局平均长度预计算 BM25 长度归一项 k1 * (1 - b + b * dl / avgdl)"""
+        if np is not None:
+            self._norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens.astype(np.float64) / avgdl)
+        else:
+            self._norm = [BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl) for dl in self.doc_lens]
+
+    def score(self, term_weights: dict, min_score: float = 0.0, limit: int = None) -> list:
+        """计算段内文档得分
+
+        Args:
+            term_weights: {词元: idf}
+            min_score: 分数下限（低于此值的文档不返回）
+            limit: 最多返回的文档数（按分数取前 N），None 表示不限
+
+        Returns:
+            list: [(段内文档号, 分数), ...]
+        """
+        if np is not None:
+            scores = None
+            for term, idf in term_weights.items():
+                entry = self.terms.get(term)
+                if not entry:
+                    continue
+                start, count = entry
+                docs = self.postings_docs[start:start + count]
+                tf = self.postings_tf[start:start + count].astype(np.float64)
+                if scores is None:
+                    scores = np.zeros(self.doc_count, dtype=np.float64)
+                # 同一词项的倒排表内文档号唯一，可直接花式索引累加
+                scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+            if scores is None:
+                return []
+            hits = np.flatnonzero((scores > 0) & (scores >= min_score))
+            if limit is not None and len(hits) > limit:
+                # 保留与第 limit 名同分的文档，由调用方按 (分数, 段, 文档号) 统一决定名次
+                cutoff = scores[hits[np.argpartition(-scores[hits], limit - 1)[limit - 1]]]
+                hits = hits[scores[hits] >= cutoff]
+            return list(zip(hits.tolist(), scores[hits].tolist()))
+
+        scores = {}
+        norm = self._norm
+        for term, idf in term_weights.items():
+            entry = self.terms.get(term)
+            if not entry:
+                continue
+            start, count = entry
+            docs = self.postings_docs[start:start + count]
+            tfs = self.postings_tf[start:start + count]
+            for doc, tf in zip(docs, tfs):
+                # 运算顺序与向量化路径相同，保证两条路径的浮点结果逐位一致
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm[doc])
+        hits = [(doc, score) for doc, score in scores.items() if score > 0 and score >= min_score]
+        if limit is not None and len(hits) > limit:
+            cutoff = heapq.nlargest(limit, (score for _, score in hits))[-1]
+            hits = [(doc, score) for doc, score in hits if score >= cutoff]
+        return hits
+
+    def get_document(self, doc_id: int) -> dict:
+        start = int(self.doc_offsets[doc_id])
+        end = int(self.doc_offsets[doc_id + 1]) if doc_id + 1 < self.doc_count else None
+        with self._docs_lock:
+            self._docs_file.seek(start)
+            data = self._docs_file.read(end - start) if end is not None else self._docs_file.readline()
+        return json.loads(data.decode("utf-8"))
+
+    def close(self):
+        self.doc_offsets = self.doc_lens = self.postings_docs = self.postings_tf = None
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # 仍有视图引用时由 GC 释放
+        for f in self._files:
+            f.close()
+        self._docs_file.close()
+
+
+def _write_segment(path: str, documents: list):
+    """把 [(内容, 元数据), ...] 写成一个索引段"""
+    os.makedirs(path, exist_ok=True)
+    postings = {}
+    doc_lens = array("i")
+    doc_offsets = array("q")
+    offset = 0
+    with open(os.path.join(path, "docs.jsonl"), "wb") as f:
+        for doc_id, (content, metadata) in enumerate(documents):
+            counts = Counter(tokenize(content))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+            line = (json.dumps({"content": content, "metadata": metadata}, ensure_ascii=False) + "\n").encode("utf-8")
+            doc_offsets.append(offset)
+            f.write(line)
+            offset += len(line)
+
+    terms = {}
+    postings_docs = array("i")
+    postings_tf = array("i")
+    for term, entries in postings.items():
+        terms[term] = [len(postings_docs), len(entries)]
+        for doc_id, tf in entries:
+            postings_docs.append(doc_id)
+            postings_tf.append(tf)
+
+    for name, data in (("doc_offsets.bin", doc_offsets), ("doc_lens.bin", doc_lens),
+                       ("postings_docs.bin", postings_docs), ("postings_tf.bin", postings_tf)):
+        with open(os.path.join(path, name), "wb") as f:
+            data.tofile(f)
+    with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False, separators=(",", ":"))
+
+
+class LocalRAGIndex:
+    """本地 BM25 索引（线程安全，接口与 RAGClient 一致）"""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._lock = threading.RLock()
+        self._segments = []
+        self._manifest = {"version": INDEX_FORMAT_VERSION, "tokenizer": TOKENIZER_NAME,
+                          "segments": [], "sources": {}}
+        self._doc_count = 0
+        self._avgdl = 1.0
+        self.stats = {"searches": 0}
+        self.reload()
+
+    # ========== 加载 / 写入 ==========
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.index_dir, "manifest.json")
+
+    def reload(self):
+        """从磁盘重新加载索引（索引目录不存在时为空索引）"""
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+                if self._manifest.get("tokenizer") != TOKENIZER_NAME:
+                    raise ValueError(f"索引分词方式 {self._manifest.get('tokenizer')} 与当前版本不兼容，请重新构建")
+                self._segments = [
+                    _Segment(os.path.join(self.index_dir, name)) for name in self._manifest.get("segments", [])
+                ]
+            self._refresh_global_stats()
+
+    def _refresh_global_stats(self):
+        self._doc_count = sum(seg.doc_count for seg in self._segments)
+        total_len = sum(seg.total_len for seg in self._segments)
+        self._avgdl = (total_len / self._doc_count) if self._doc_count else 1.0
+        for segment in self._segments:
+            segment.prepare(self._avgdl)
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _next_segment_name(self) -> str:
+        numbers = [int(name.split("_")[1]) for name in self._manifest.get("segments", [])]
+        return f"seg_{(max(numbers) + 1 if numbers else 1):06d}"
+
+    def add_documents(self, documents: list, sources: dict = None) -> int:
+        """增量添加片段（写入一个新段）
+
+        Args:
+            documents: [(内容, 元数据), ...]
+            sources: 本次索引的源文件签名 {相对路径: 签名}，用于下次增量时跳过
+
+        Returns:
+            int: 添加的片段数
+        """
+        documents = [(content, metadata or {}) for content, metadata in documents if content and content.strip()]
+        with self._lock:
+            if documents:
+                os.makedirs(self.index_dir, exist_ok=True)
+                name = self._next_segment_name()
+                _write_segment(os.path.join(self.index_dir, name), documents)
+                self._manifest.setdefault("segments", []).append(name)
+                self._segments.append(_Segment(os.path.join(self.index_dir, name)))
+            if sources:
+                self._manifest.setdefault("sources", {}).update(sources)
+            if documents or sources:
+                os.makedirs(self.index_dir, exist_ok=True)
+                self._save_manifest()
+                self._refresh_global_stats()
+        return len(documents)
+
+    def add_directory(self, source_dir: str) -> int:
+        """索引目录中新增或修改过的文本文件（已索引且未变化的文件跳过）"""
+        with self._lock:
+            known = dict(self._manifest.get("sources", {}))
+        documents = []
+        sources = {}
+        changed = list(iter_source_documents(source_dir, skip_sources=known))
+        for rel_path, signature, docs in changed:
+            documents.extend(docs)
+            sources[rel_path] = signature
+        with self._lock:
+            manifest_sources = self._manifest.setdefault("source_chunks", {})
+            for rel_path in sources:
+                if rel_path in known:
+                    stale = manifest_sources.get(rel_path, 0)
+                    self._manifest["stale_docs"] = self._manifest.get("stale_docs", 0) + stale
+                    print(f"♻️ {rel_path} 已修改，{stale}个旧片段已标记为过期")
+            for rel_path, _, docs in changed:
+                manifest_sources[rel_path] = len(docs)
+            added = self.add_documents(documents, sources)
+            if self._manifest.get("stale_docs", 0) > STALE_COMPACT_RATIO * max(self._doc_count, 1):
+                self.compact()
+        return added
+
+    def _is_stale(self, metadata: dict, sources: dict) -> bool:
+        """片段是否来自已被修改的源文件的旧版本（没有版本信息的片段不过滤）"""
+        version = metadata.get("version")
+        return bool(version) and sources.get(metadata.get("source")) != version
+
+    def compact(self):
+        """合并所有段为单段（同时丢弃过期片段）"""
+        with self._lock:
+            if len(self._segments) <= 1 and not self._manifest.get("stale_docs"):
+                return
+            sources = self._manifest.get("sources", {})
+            documents = []
+            for segment in self._segments:
+                for doc_id in range(segment.doc_count):
+                    doc = segment.get_document(doc_id)
+                    if not self._is_stale(doc.get("metadata", {}), sources):
+                        documents.append((doc["content"], doc.get("metadata", {})))
+            old_names = list(self._manifest["segments"])
+            name = self._next_segment_name()
+            _write_segment(os.path.join(self.index_dir, name), documents)
+            self._manifest["segments"] = [name]
+            self._manifest["stale_docs"] = 0
+            self._save_manifest()
+            self.reload()
+            import shutil
+            for old in old_names:
+                shutil.rmtree(os.path.join(self.index_dir, old), ignore_errors=True)
+
+    @classmethod
+    def build(cls, source_dir: str, index_dir: str) -> "LocalRAGIndex":
+        """从源文本目录全量构建索引（覆盖已有索引）"""
+        import shutil
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+        index = cls(index_dir)
+        index.add_directory(source_dir)
+        return index
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+
+    # ========== 检索（与 RAGClient 接口一致） ==========
+
+    @property
+    def doc_count(self) -> int:
+        return self._doc_count
+
+    @property
+    def cache_namespace(self) -> str:
+        """检索缓存中区分后端的标识（段列表变化后旧缓存自然失效）"""
+        with self._lock:
+            segments = ",".join(self._manifest.get("segments", []))
+        return f"local:{os.path.abspath(self.index_dir)}:{segments}"
+
+    def is_available(self, max_retries: int = 0) -> bool:
+        """本地索引非空即可用"""
+        return self._doc_count > 0
+
+    def search(self, query: str, top_k: int = 10, min_similarity: float = 0.3, doc_type: str = None) -> list:
+        """
+        BM25 检索
+
+        相似度 = BM25 分数 / 查询的理论最大分数（每个查询词项 idf * (k1 + 1) 之和），落在 [0, 1)，
+        与 HTTP 服务的 min_similarity 阈值语义相近。
+
+        Returns:
+            检索结果列表，每项包含 content, metadata, similarity
+        """
+        self.stats["searches"] += 1
+        with self._lock:
+            segments = list(self._segments)
+            doc_count = self._doc_count
+            has_stale = bool(self._manifest.get("stale_docs"))
+            sources = dict(self._manifest.get("sources", {})) if has_stale else {}
+        if not query or not doc_count:
+            return []
+
+        query_terms = set(tokenize(query))
+        term_weights = {}
+        for term in query_terms:
+            df = sum(seg.terms[term][1] for seg in segments if term in seg.terms)
+            if df:
+                term_weights[term] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        max_score = sum(idf * (BM25_K1 + 1) for idf in term_weights.values())
+        if not max_score:
+            return []
+
+        # 按类型过滤或存在过期片段时无法预知需要多少候选，不限制每段返回数
+        limit = None if doc_type or has_stale else top_k
+        candidates = []
+        for seg_index, segment in enumerate(segments):
+            for doc_id, score in segment.score(term_weights, min_similarity * max_score, limit):
+                candidates.append((score / max_score, seg_index, doc_id))
+        candidates.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+        results = []
+        for similarity, seg_index, doc_id in candidates:
+            doc = segments[seg_index].get_document(doc_id)
+            if doc_type and doc.get("metadata", {}).get("type") != doc_type:
+                continue
+            if has_stale and self._is_stale(doc.get("metadata", {}), sources):
+                continue
+            results.append({"content": doc["content"], "metadata": doc.get("metadata", {}),
+                            "similarity": round(similarity, 4)})
+            if len(results) >= top_k:
+                break
+        return results
+
+    def search_many(self, queries: list, top_k: int = 10, min_similarity: float = 0.3) -> list:
+        """批量检索（进程内检索足够快，按顺序执行）"""
+        cache = {}
+        results = []
+        for query in queries:
+            if query and query not in cache:
+                cache[query] = self.search(query, top_k, min_similarity)
+            results.append(cache.get(query, []))
+        return results
+
+    def search_by_scene(self, scene_description: str, emotion: str = None, writing_type: str = None, top_k: int = 5) -> list:
+        """按场景检索：情感标签并入查询，写作类型按片段类型过滤"""
+        query = " ".join(part for part in (scene_description, emotion) if part)
+        return self.search(query, top_k=top_k, min_similarity=0.0, doc_type=writing_type)
+
+    def get_sources(self) -> dict:
+        """已索引的来源 {名称: 签名}"""
+        with self._lock:
+            return dict(self._manifest.get("sources", {}))
+
+    def get_stats(self) -> dict:
+        """索引统计信息"""
+        return {
+            "backend": "local",
+            "total_documents": self._doc_count,
+            "segments": len(self._segments),
+            "sources": len(self._manifest.get("sources", {})),
+            "stale_documents": self._manifest.get("stale_docs", 0),
+            "avg_doc_tokens": round(self._avgdl, 1),
+            "numpy": np is not None,
+        }
+
+    def format_references(self, results: list, max_length: int = 3000) -> str:
+        """格式化检索结果为提示词格式（与 HTTP 客户端相同）"""
+        from utils.rag_client import format_references
+        return format_references(results, max_length)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_rag_index(index_dir: str) -> LocalRAGIndex:
+    """获取指定目录的共享本地索引（同一目录只加载一次）"""
+    key = os.path.abspath(index_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = LocalRAGIndex(key)
+            _indexes[key] = index
+        return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 RAG 索引（BM25）构建与检索")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("build", "全量构建索引"), ("add", "增量添加新文件")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("source_dir", help="参考文本目录（.txt / .md，子目录名作为片段类型）")
+        p.add_argument("index_dir", help="索引目录")
+    p = sub.add_parser("compact", help="合并索引段")
+    p.add_argument("index_dir")
+    p = sub.add_parser("search", help="检索")
+    p.add_argument("index_dir")
+    p.add_argument("query")
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--min-similarity", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    import time
+    start = time.perf_counter()
+    if args.command == "build":
+        index = LocalRAGIndex.build(args.source_dir, args.index_dir)
+        print(f"✅ 索引构建完成: {index.get_stats()}，耗时 {time.perf_counter() - start:.2f}s")
+    elif args.command == "add":
+        index = LocalRAGIndex(args.index_dir)
+        added = index.add_directory(args.source_dir)
+        print(f"✅ 新增 {added} 个片段: {index.get_stats()}，耗时 {time.perf_counter() - start:.2f}s")
+    elif args.command == "compact":
+        index = LocalRAGIndex(args.index_dir)
+        index.compact()
+        print(f"✅ 索引已合并: {index.get_stats()}")
+    else:
+        index = LocalRAGIndex(args.index_dir)
+        results = index.search(args.query, top_k=args.top_k, min_similarity=args.min_similarity)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"🔍 检索到 {len(results)} 条结果（{elapsed:.1f} ms，含加载）")
+        for i, result in enumerate(results, 1):
+            print(f"  {i}. [{result['similarity']:.2f}] {result['metadata'].get('source', '')}: {result['content'][:60]}")
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
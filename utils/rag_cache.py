@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+RAG 检索结果缓存 - 位于 RAGClient / LocalRAGIndex 的 search 之前
+
+同一章内，正文生成、分段润色、整章润色的查询都由 last_rag_key_elements 与同一个
+embellishment_idea 拼成，跨章时润色要求部分也不变，大量查询完全相同或几乎相同。
+
+两级缓存：
+- 内存：LRU + TTL，容量有上限
+- 磁盘（可选，配置 rag_cache_dir）：每条一个 JSON 文件，TTL 过期与数量上限定期清理，
+  重启后仍可命中
+键 = 后端标识 + 规范化查询（NFKC、小写、合并空白）+ top_k + min_similarity。
+精确未命中时，在内存中查找同后端、同参数且字符二元组 Jaccard 相似度不低于阈值的查询，
+复用其结果（近似命中）。空结果可能来自请求失败，不缓存。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+MEMORY_MAX_ENTRIES = 512       # 内存缓存条数上限
+DISK_MAX_ENTRIES = 5000        # 磁盘缓存文件数上限
+TTL_SECONDS = 6 * 3600         # 缓存有效期
+FUZZY_THRESHOLD = 0.9          # 近似命中的 Jaccard 阈值，设为 None 关闭
+DISK_PRUNE_INTERVAL = 64       # 每写入多少条清理一次磁盘缓存
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询：全角转半角（NFKC）、小写、合并空白"""
+    query = unicodedata.normalize("NFKC", query or "").lower()
+    return _WHITESPACE_RE.sub(" ", query).strip()
+
+
+def query_shingles(normalized_query: str) -> frozenset:
+    """去掉空白后的字符二元组集合"""
+    text = normalized_query.replace(" ", "")
+    if len(text) < 2:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
+
+class _Entry:
+    __slots__ = ("group", "shingles", "results", "expires_at")
+
+    def __init__(self, group, shingles, results, expires_at):
+        self.group = group
+        self.shingles = shingles
+        self.results = results
+        self.expires_at = expires_at
+
+
+class RAGRetrievalCache:
+    """RAG 检索结果两级缓存（线程安全）"""
+
+    def __init__(
+        self,
+        cache_dir: str = None,
+        max_entries: int = MEMORY_MAX_ENTRIES,
+        ttl_seconds: float = TTL_SECONDS,
+        disk_max_entries: int = DISK_MAX_ENTRIES,
+        fuzzy_threshold: Optional[float] = FUZZY_THRESHOLD,
+    ):
+        """
+        Args:
+            cache_dir: 磁盘缓存目录，None 或空字符串表示只用内存
+            max_entries: 内存缓存条数上限
+            ttl_seconds: 缓存有效期（秒）
+            disk_max_entries: 磁盘缓存文件数上限
+            fuzzy_threshold: 近似命中的 Jaccard 阈值，None 表示只做精确匹配
+        """
+        self.cache_dir = cache_dir or None
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = max(1, disk_max_entries)
+        self.fuzzy_threshold = fuzzy_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "fuzzy_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _group(namespace: str, top_k: int, min_similarity: float) -> str:
+        return f"{namespace}|{top_k}|{min_similarity:g}"
+
+    @staticmethod
+    def _key(group: str, normalized_query: str) -> str:
+        return hashlib.sha1(f"{group}|{normalized_query}".encode("utf-8")).hexdigest()
+
+    # ========== 查询 ==========
+
+    def get(self, namespace: str, query: str, top_k: int, min_similarity: float) -> Optional[List[Dict]]:
+        """
+        查找缓存的检索结果
+
+        Returns:
+            命中时返回结果列表，未命中返回 None
+        """
+        normalized = normalize_query(query)
+        group = self._group(namespace, top_k, min_similarity)
+        key = self._key(group, normalized)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry.results
+                del self._entries[key]
+
+        results = self._read_disk(key, now)
+        if results is not None:
+            with self._lock:
+                self._remember(key, _Entry(group, query_shingles(normalized), results, now + self.ttl_seconds))
+                self.stats["disk_hits"] += 1
+            return results
+
+        if self.fuzzy_threshold is not None:
+            results = self._fuzzy_lookup(group, query_shingles(normalized), now)
+            if results is not None:
+                return results
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def _fuzzy_lookup(self, group: str, shingles: frozenset, now: float) -> Optional[List[Dict]]:
+        """在内存中查找同组、字符二元组 Jaccard 相似度最高且不低于阈值的条目"""
+        if not shingles:
+            return None
+        threshold = self.fuzzy_threshold
+        size = len(shingles)
+        best_key, best_score = None, threshold
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry.group != group or entry.expires_at <= now:
+                    continue
+                other_size = len(entry.shingles)
+                # Jaccard <= 短集合大小 / 长集合大小，长度相差过大直接跳过
+                if min(size, other_size) < threshold * max(size, other_size):
+                    continue
+                intersection = len(shingles & entry.shingles)
+                score = intersection / (size + other_size - intersection)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.stats["fuzzy_hits"] += 1
+            return self._entries[best_key].results
+
+    # ========== 写入 ==========
+
+    def put(self, namespace: str, query: str, top_k: int, min_similarity: float, results: List[Dict]):
+        """写入检索结果（空结果不缓存）"""
+        if not results:
+            return
+        normalized = normalize_query(query)
+        group = self._group(namespace, top_k, min_similarity)
+        key = self._key(group, normalized)
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, _Entry(group, query_shingles(normalized), results, expires_at))
+        self._write_disk(key, {
+            "namespace": namespace,
+            "query": normalized,
+            "top_k": top_k,
+            "min_similarity": min_similarity,
+            "expires_at": expires_at,
+            "results": results,
+        })
+
+    def _remember(self, key: str, entry: _Entry):
+        """写入内存 LRU（调用方持有锁）"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ========== 磁盘层 ==========
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[List[Dict]]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️ RAG 缓存文件损坏，已忽略: {path} ({e})")
+            return None
+        if data.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data.get("results")
+
+    def _write_disk(self, key: str, data: dict):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ RAG 缓存写入失败: {e}")
+            return
+        with self._lock:
+            self._disk_writes += 1
+            should_prune = self._disk_writes % DISK_PRUNE_INTERVAL == 0
+        if should_prune:
+            self.prune_disk()
+
+    def prune_disk(self) -> int:
+        """删除过期文件，并按修改时间淘汰超出数量上限的最旧文件，返回删除数"""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        expire_before = time.time() - self.ttl_seconds
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        files.sort()
+        excess = len(files) - self.disk_max_entries
+        removed = 0
+        for index, (mtime, path) in enumerate(files):
+            if index >= excess and mtime > expire_before:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    # ========== 管理 ==========
+
+    def clear(self, disk: bool = False):
+        """清空内存缓存，disk=True 时同时删除磁盘缓存文件"""
+        with self._lock:
+            self._entries.clear()
+        if disk and self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    def hit_counts(self) -> Dict[str, int]:
+        """返回 {hits, misses, fuzzy_hits, disk_hits}"""
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "hits": stats["memory_hits"] + stats["disk_hits"] + stats["fuzzy_hits"],
+            "misses": stats["misses"],
+            "fuzzy_hits": stats["fuzzy_hits"],
+            "disk_hits": stats["disk_hits"],
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_rag_cache(cache_dir: str = None) -> RAGRetrievalCache:
+    """获取共享的检索缓存（按磁盘目录区分，空目录为纯内存缓存）"""
+    key = os.path.abspath(cache_dir) if cache_dir else ""
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = RAGRetrievalCache(cache_dir=key or None)
+            _caches[key] = cache
+        return cache
+
+
+def reset_rag_caches():
+    """清空所有共享检索缓存的内存层"""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.clear()
+        _caches.clear()
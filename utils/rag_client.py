@@ -10,26 +10,84 @@ RAG 客户端模块 - 封装与 RAG API 服务的通信
 3. 从正文提炼关键剧情和修辞手法
 
 所有操作都包含错误处理，确保 RAG 服务问题不会打断文章生成流程。
+
+客户端通过 get_rag_client() 按服务地址长期复用：
+- requests.Session + 连接池，避免每次检索重新建立连接
+- 健康状态缓存（TTL）：检索成功即视为健康，TTL 内不再请求 /stats
+- 熔断：连续失败达到阈值后在冷却期内直接跳过 RAG，冷却结束后只探测一次
+- search_many()：一章的多个查询并发扇出，一次等待全部返回
 """
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Optional
 
 
+HEALTH_TTL_SECONDS = 60.0        # 健康状态缓存时间
+FAILURE_THRESHOLD = 3            # 连续失败多少次后熔断
+CIRCUIT_COOLDOWN_SECONDS = 30.0  # 熔断冷却时间
+POOL_SIZE = 8                    # 连接池大小（同时也是 search_many 的最大并发数）
+
+
 class RAGClient:
-    """RAG HTTP 客户端"""
+    """RAG HTTP 客户端（线程安全，建议通过 get_rag_client() 复用）"""
     
-    def __init__(self, base_url: str, timeout: int = 30):
+    def __init__(self, base_url: str, timeout: int = 30, pool_size: int = POOL_SIZE):
         """
         初始化 RAG 客户端
         
         Args:
             base_url: RAG API 服务地址，如 http://192.168.1.211:8086/
             timeout: 请求超时时间（秒），默认 30 秒
+            pool_size: 连接池大小
         """
         # 确保 base_url 不以 / 结尾
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
+        self.pool_size = max(1, pool_size)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # 健康状态与熔断
+        self._state_lock = threading.Lock()
+        self._healthy_until = 0.0
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
+        self.stats = {"searches": 0, "health_probes": 0, "circuit_skips": 0, "failures": 0}
+    
+    @property
+    def cache_namespace(self) -> str:
+        """检索缓存中区分后端的标识"""
+        return f"http:{self.base_url}"
+    
+    # ========== 健康状态 / 熔断 ==========
+    
+    def _record_success(self):
+        with self._state_lock:
+            self._consecutive_failures = 0
+            self._circuit_open_until = 0.0
+            self._healthy_until = time.monotonic() + HEALTH_TTL_SECONDS
+    
+    def _record_failure(self, open_circuit: bool = False):
+        with self._state_lock:
+            self._consecutive_failures += 1
+            self._healthy_until = 0.0
+            self.stats["failures"] += 1
+            if open_circuit or self._consecutive_failures >= FAILURE_THRESHOLD:
+                if not self._circuit_open_until:
+                    print(f"⚠️ RAG 服务连续失败，{CIRCUIT_COOLDOWN_SECONDS:.0f}秒内跳过检索 ({self.base_url})")
+                self._circuit_open_until = time.monotonic() + CIRCUIT_COOLDOWN_SECONDS
+    
+    def circuit_open(self) -> bool:
+        """熔断是否处于打开状态（冷却期内）"""
+        with self._state_lock:
+            return time.monotonic() < self._circuit_open_until
     
     def search(self, query: str, top_k: int = 10, min_similarity: float = 0.3) -> List[Dict]:
         """
@@ -43,8 +101,12 @@ class RAGClient:
         Returns:
             检索结果列表，每项包含 content, metadata, similarity
         """
+        if self.circuit_open():
+            self.stats["circuit_skips"] += 1
+            return []
+        self.stats["searches"] += 1
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/search",
                 json={
                     "query": query,
@@ -54,14 +116,45 @@ class RAGClient:
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            results = response.json()
+            self._record_success()
+            return results
         except requests.exceptions.RequestException as e:
             print(f"⚠️ RAG 检索请求失败: {e}")
+            self._record_failure()
             return []
         except Exception as e:
             print(f"⚠️ RAG 检索解析失败: {e}")
             return []
     
+    def search_many(self, queries: List[str], top_k: int = 10, min_similarity: float = 0.3) -> List[List[Dict]]:
+        """
+        批量语义检索：多个查询并发扇出，按输入顺序返回
+        
+        Args:
+            queries: 检索查询文本列表（相同查询只请求一次，空查询返回空列表）
+            top_k: 每个查询返回结果数量
+            min_similarity: 最小相似度阈值
+            
+        Returns:
+            与 queries 等长的检索结果列表
+        """
+        unique_queries = list(dict.fromkeys(q for q in queries if q))
+        if not unique_queries:
+            return [[] for _ in queries]
+        
+        if len(unique_queries) == 1:
+            results = {unique_queries[0]: self.search(unique_queries[0], top_k, min_similarity)}
+        else:
+            workers = min(self.pool_size, len(unique_queries))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-search") as executor:
+                futures = {
+                    q: executor.submit(self.search, q, top_k, min_similarity)
+                    for q in unique_queries
+                }
+                results = {q: future.result() for q, future in futures.items()}
+        return [results.get(q, []) if q else [] for q in queries]
+    
     def search_by_scene(
         self, 
         scene_description: str, 
@@ -91,7 +184,7 @@ class RAGClient:
             if writing_type:
                 payload["writing_type"] = writing_type
                 
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/search/scene",
                 json=payload,
                 timeout=self.timeout
@@ -113,7 +206,7 @@ class RAGClient:
             统计信息字典，失败返回 None
         """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/stats",
                 timeout=self.timeout
             )
@@ -125,23 +218,38 @@ class RAGClient:
     
     def is_available(self, max_retries: int = 2) -> bool:
         """
-        检查 RAG 服务是否可用（含重试机制）
+        检查 RAG 服务是否可用（健康缓存 + 熔断，必要时才请求 /stats）
+        
+        - TTL 内检索或探测成功过：直接返回 True
+        - 熔断冷却期内：直接返回 False
+        - 冷却结束（半开）：只探测一次，不再重试
         
         Args:
-            max_retries: 最大重试次数，默认2次
+            max_retries: 状态未知时的最大重试次数，默认2次
             
         Returns:
             服务可用返回 True，否则返回 False
         """
-        import time as _time
+        with self._state_lock:
+            now = time.monotonic()
+            if now < self._healthy_until:
+                return True
+            if now < self._circuit_open_until:
+                self.stats["circuit_skips"] += 1
+                return False
+            half_open = self._circuit_open_until > 0
+        if half_open:
+            max_retries = 0
         
         for attempt in range(max_retries + 1):
+            self.stats["health_probes"] += 1
             try:
-                response = requests.get(
+                response = self.session.get(
                     f"{self.base_url}/stats",
                     timeout=10  # 健康检查超时
                 )
                 if response.status_code == 200:
+                    self._record_success()
                     return True
                 else:
                     print(f"⚠️ RAG 健康检查返回非200状态码: {response.status_code}")
@@ -154,10 +262,15 @@ class RAGClient:
             
             # 如果还有重试机会，等待后重试
             if attempt < max_retries:
-                _time.sleep(1)
+                time.sleep(1)
         
+        self._record_failure(open_circuit=True)
         return False
     
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+    
     def format_references(self, results: List[Dict], max_length: int = 3000) -> str:
         """
         格式化检索结果为提示词格式
@@ -169,34 +282,71 @@ class RAGClient:
         Returns:
             格式化的参考文本
         """
-        if not results:
-            return ""
-        
-        formatted_parts = ["## 写作风格参考\n"]
-        formatted_parts.append("以下是与当前场景相似的优秀写作片段，请参考其用词和表达手法：\n")
-        
-        current_length = sum(len(p) for p in formatted_parts)
-        
-        for i, result in enumerate(results, 1):
-            content = result.get('content', '')
-            similarity = result.get('similarity', 0)
-            metadata = result.get('metadata', {})
-            content_type = metadata.get('type', 'unknown')
-            
-            # 构建单条参考
-            ref_text = f"\n### 参考{i} ({content_type}, 相似度: {similarity:.2f})\n"
-            ref_text += f"```\n{content}\n```\n"
-            
-            # 检查长度限制
-            if current_length + len(ref_text) > max_length:
-                break
-            
-            formatted_parts.append(ref_text)
-            current_length += len(ref_text)
-        
-        formatted_parts.append("\n> 请学习上述参考的用词习惯、句式结构和表达手法，但要创作全新的内容。\n")
-        
-        return "".join(formatted_parts)
+        return format_references(results, max_length)
+
+
+def format_references(results: List[Dict], max_length: int = 3000) -> str:
+    """
+    格式化检索结果为提示词格式（HTTP 服务与本地索引共用）
+
+    Args:
+        results: 检索结果列表
+        max_length: 最大输出长度
+
+    Returns:
+        格式化的参考文本
+    """
+    if not results:
+        return ""
+
+    formatted_parts = ["## 写作风格参考\n"]
+    formatted_parts.append("以下是与当前场景相似的优秀写作片段，请参考其用词和表达手法：\n")
+
+    current_length = sum(len(p) for p in formatted_parts)
+
+    for i, result in enumerate(results, 1):
+        content = result.get('content', '')
+        similarity = result.get('similarity', 0)
+        metadata = result.get('metadata', {})
+        content_type = metadata.get('type', 'unknown')
+
+        # 构建单条参考
+        ref_text = f"\n### 参考{i} ({content_type}, 相似度: {similarity:.2f})\n"
+        ref_text += f"```\n{content}\n```\n"
+
+        # 检查长度限制
+        if current_length + len(ref_text) > max_length:
+            break
+
+        formatted_parts.append(ref_text)
+        current_length += len(ref_text)
+
+    formatted_parts.append("\n> 请学习上述参考的用词习惯、句式结构和表达手法，但要创作全新的内容。\n")
+
+    return "".join(formatted_parts)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_rag_client(base_url: str, timeout: int = 30) -> RAGClient:
+    """获取指定服务地址的共享 RAG 客户端（连接池与健康状态跨调用复用）"""
+    key = (base_url.rstrip('/'), timeout)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = RAGClient(base_url, timeout=timeout)
+            _clients[key] = client
+        return client
+
+
+def reset_rag_clients():
+    """关闭并清空所有共享 RAG 客户端"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
 
 
 def extract_key_elements(content: str, max_length: int = 500) -> str: